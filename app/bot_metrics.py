@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+app/bot_metrics.py
+
+拆分买卖机器人的每轮耗时剖析。
+
+一轮卖出扫描慢下来时，过去只能翻 print 日志猜是 DB、snapshot、限速等待、
+查单轮询还是 SLEEP_BETWEEN_SYMBOLS。这里给热路径函数套一层计时（span），
+每轮结束时按 span 汇总 calls / total / p50 / p95 / max（毫秒），
+整轮一次 executemany 写进 bot_round_metrics，看板 /api/bot_metrics 读取。
+
+- install()：给 load_rows / _load_one_b_row / get_snapshot_realtime /
+  _submit_market_qty / _reconcile_fill / _update_ops_fields / rate_limiter.acquire
+  换上计时包装；strategy_f 等按名字 import 过去的同一个函数也一起换掉。
+- span(name)：手动包一段代码（例如品种间的 sleep）。
+- start_round() / finish_round()：由 split_core / async_core 的主循环调用。
+
+计时只有两次 perf_counter 和一次 list.append，一轮的写库在轮末做一次；
+BOT_METRICS_ENABLED=0 时 install() 不做任何替换，span() 直接 yield。
+写库失败只记日志，不影响交易主流程。
+"""
+
+import functools
+import importlib
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from app import schema_registry
+
+BOT_METRICS_ENABLED = int(os.getenv("BOT_METRICS_ENABLED", "1"))
+BOT_METRICS_TABLE = os.getenv("BOT_METRICS_TABLE", "bot_round_metrics")
+BOT_METRICS_KEEP_DAYS = int(os.getenv("BOT_METRICS_KEEP_DAYS", "7"))
+# 每写这么多轮清理一次过期数据
+BOT_METRICS_PRUNE_EVERY = int(os.getenv("BOT_METRICS_PRUNE_EVERY", "200"))
+
+# (span 名, 定义模块, 属性名)；同一个函数对象被别的模块按名字 import 时一并替换
+HOT_PATHS = (
+    ("load_rows", "app.bots.runtime_core", "load_rows"),
+    ("load_one_b_row", "app.strategy_b", "_load_one_b_row"),
+    ("snapshot", "app.strategy_b", "get_snapshot_realtime"),
+    ("submit_market", "app.strategy_b", "_submit_market_qty"),
+    ("reconcile_fill", "app.strategy_b", "_reconcile_fill"),
+    ("update_ops", "app.strategy_b", "_update_ops_fields"),
+    ("rate_limit_wait", "app.rate_limiter", "acquire"),
+)
+ALSO_PATCH = ("app.strategy_f", "app.bots.runtime_core")
+
+log = logging.getLogger("bot_metrics")
+
+_lock = threading.Lock()
+_samples: dict = {}  # span -> [秒]
+_round_started = 0.0
+_rounds_written = 0
+_installed = False
+
+
+# ============================================================
+# 采样
+# ============================================================
+def record(name: str, seconds: float) -> None:
+    with _lock:
+        lst = _samples.get(name)
+        if lst is None:
+            _samples[name] = [seconds]
+        else:
+            lst.append(seconds)
+
+
+@contextmanager
+def span(name: str):
+    if not BOT_METRICS_ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+
+def timed(name: str, fn):
+    """返回 fn 的计时包装；已经包过的原样返回。"""
+    if getattr(fn, "__bot_metrics_span__", None):
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - t0)
+
+    wrapper.__bot_metrics_span__ = name
+    return wrapper
+
+
+def install() -> int:
+    """给 HOT_PATHS 换上计时包装（幂等），返回本次替换的属性个数。"""
+    global _installed
+    if not BOT_METRICS_ENABLED or _installed:
+        return 0
+    replaced = 0
+    for name, module_name, attr in HOT_PATHS:
+        try:
+            owner = importlib.import_module(module_name)
+        except Exception as exc:
+            log.warning(f"[BOT METRICS] skip {module_name}.{attr}: {exc}")
+            continue
+        original = getattr(owner, attr, None)
+        if original is None or getattr(original, "__bot_metrics_span__", None):
+            continue
+        wrapped = timed(name, original)
+        for mod_name in (module_name, *ALSO_PATCH):
+            mod = owner if mod_name == module_name else importlib.import_module(mod_name)
+            if getattr(mod, attr, None) is original:
+                setattr(mod, attr, wrapped)
+                replaced += 1
+    _installed = True
+    return replaced
+
+
+# ============================================================
+# 每轮汇总
+# ============================================================
+def _pct(sorted_vals, q: float) -> float:
+    # nearest-rank，样本少时比插值更直观
+    idx = max(0, min(len(sorted_vals) - 1, math.ceil(q * len(sorted_vals)) - 1))
+    return sorted_vals[idx]
+
+
+def summarize(samples: dict) -> list[dict]:
+    out = []
+    for name in sorted(samples):
+        vals = sorted(samples[name])
+        if not vals:
+            continue
+        out.append(
+            {
+                "span": name,
+                "calls": len(vals),
+                "total_ms": round(sum(vals) * 1000, 3),
+                "p50_ms": round(_pct(vals, 0.50) * 1000, 3),
+                "p95_ms": round(_pct(vals, 0.95) * 1000, 3),
+                "max_ms": round(vals[-1] * 1000, 3),
+            }
+        )
+    return out
+
+
+def start_round() -> None:
+    global _round_started
+    with _lock:
+        _samples.clear()
+    _round_started = time.time()
+
+
+def _take_samples() -> dict:
+    with _lock:
+        taken = dict(_samples)
+        _samples.clear()
+    return taken
+
+
+@schema_registry.once(BOT_METRICS_TABLE)
+def ensure_table(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS `{BOT_METRICS_TABLE}` (
+              id BIGINT AUTO_INCREMENT PRIMARY KEY,
+              bot VARCHAR(64) NOT NULL,
+              pid INT NOT NULL,
+              round_no INT NOT NULL,
+              phase VARCHAR(32) NOT NULL,
+              started_at DATETIME(3) NOT NULL,
+              round_ms DOUBLE NOT NULL,
+              span VARCHAR(64) NOT NULL,
+              calls INT NOT NULL,
+              total_ms DOUBLE NOT NULL,
+              p50_ms DOUBLE NOT NULL,
+              p95_ms DOUBLE NOT NULL,
+              max_ms DOUBLE NOT NULL,
+              created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+              INDEX idx_started_at (started_at),
+              INDEX idx_bot_started (bot, started_at)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """
+        )
+
+
+def finish_round(conn, bot: str, round_no: int, phase: str) -> list[dict]:
+    """汇总本轮 span 并写库；返回汇总结果（写库失败也返回）。"""
+    global _rounds_written
+    if not BOT_METRICS_ENABLED or not _round_started:
+        return []
+    started = _round_started
+    round_ms = round((time.time() - started) * 1000, 3)
+    spans = summarize(_take_samples())
+    if not spans or conn is None:
+        return spans
+    started_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)) + f".{int(started * 1000) % 1000:03d}"
+    params = [
+        (bot, os.getpid(), int(round_no), phase, started_at, round_ms, s["span"], s["calls"],
+         s["total_ms"], s["p50_ms"], s["p95_ms"], s["max_ms"])
+        for s in spans
+    ]
+    try:
+        ensure_table(conn)
+        with conn.cursor() as cur:
+            cur.executemany(
+                f"""
+                INSERT INTO `{BOT_METRICS_TABLE}`
+                    (bot, pid, round_no, phase, started_at, round_ms, span, calls,
+                     total_ms, p50_ms, p95_ms, max_ms)
+                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+                """,
+                params,
+            )
+            _rounds_written += 1
+            if BOT_METRICS_PRUNE_EVERY > 0 and _rounds_written % BOT_METRICS_PRUNE_EVERY == 0:
+                cur.execute(
+                    f"DELETE FROM `{BOT_METRICS_TABLE}` WHERE started_at < DATE_SUB(NOW(), INTERVAL %s DAY)",
+                    (BOT_METRICS_KEEP_DAYS,),
+                )
+        conn.commit()
+    except Exception as exc:
+        log.warning(f"[BOT METRICS] write failed: {exc}")
+    return spans
+
+
+def recent_rounds(conn, bot: str = "", limit: int = 20) -> list[dict]:
+    """最近 limit 轮的汇总，按轮分组，最新的在前。"""
+    ensure_table(conn)
+    limit = max(1, min(int(limit), 500))
+    where = "WHERE bot=%s" if bot else ""
+    args = (bot,) if bot else ()
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT bot, pid, round_no, MAX(phase) AS phase, started_at, MAX(round_ms) AS round_ms
+            FROM `{BOT_METRICS_TABLE}`
+            {where}
+            GROUP BY bot, pid, round_no, started_at
+            ORDER BY started_at DESC
+            LIMIT %s
+            """,
+            (*args, limit),
+        )
+        heads = list(cur.fetchall() or [])
+        if not heads:
+            return []
+        oldest = min(h["started_at"] for h in heads)
+        cur.execute(
+            f"""
+            SELECT bot, pid, round_no, started_at, span, calls, total_ms, p50_ms, p95_ms, max_ms
+            FROM `{BOT_METRICS_TABLE}`
+            WHERE started_at >= %s {"AND bot=%s" if bot else ""}
+            """,
+            (oldest, *args),
+        )
+        span_rows = list(cur.fetchall() or [])
+    grouped = {}
+    for r in span_rows:
+        key = (r["bot"], int(r["pid"]), int(r["round_no"]), r["started_at"])
+        grouped.setdefault(key, []).append(
+            {k: r[k] for k in ("span", "calls", "total_ms", "p50_ms", "p95_ms", "max_ms")}
+        )
+    out = []
+    for h in heads:
+        key = (h["bot"], int(h["pid"]), int(h["round_no"]), h["started_at"])
+        spans = sorted(grouped.get(key, []), key=lambda s: -float(s["total_ms"] or 0))
+        out.append({**h, "spans": spans})
+    return out
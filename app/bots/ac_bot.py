@@ -5,8 +5,10 @@ from __future__ import annotations
 import argparse
 import time
 
+from ultimate_v1.db import db_conn
 from ultimate_v1.schema import ensure_schema
 from ultimate_v1.state_store import heartbeat, is_bot_enabled
+from app import market_stream, order_stream
 from app.strategy_ac_t import run_strategy_ac_t_once
 
 BOT_NAME = "ac_bot"
@@ -39,7 +41,14 @@ def main() -> None:
     parser.add_argument("--interval", type=int, default=300)
     args = parser.parse_args()
     if args.loop:
+        market_stream.start()
+        order_stream.start()
         while True:
+            try:
+                with db_conn() as conn:
+                    market_stream.sync_from_db(conn)
+            except Exception as exc:
+                print(f"[AC BOT] market stream resync failed: {exc}", flush=True)
             print(run_once(args.action, args.symbol, args.group), flush=True)
             time.sleep(args.interval)
     else:
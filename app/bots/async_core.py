@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+split 买卖机器人的 asyncio 运行时（BOT_RUNTIME=async）。
+
+split_core.main_loop 是一条阻塞循环：股票之间、成交之后、轮与轮之间都 t.sleep，
+某只股票一次慢 HTTP 就拖住整轮，几百只持仓时一轮要几分钟。这里保留同样的阶段判断
+（runtime_core.get_trade_phase + FORCE_PHASE）、同样的闸门和策略分发，只换调度方式：
+
+- 每只股票一个 task，Semaphore 控制并发；卖出默认 8 路，买入默认 1 路
+  （买入要按顺序吃购买力 / 持仓上限，并发没有意义）。卖出轮和止损触发共用同一个
+  Semaphore，而且每路卖出都要借一条池连接，所以卖出并发再按 DB_POOL_MAX_SIZE
+  扣掉主循环自己占的连接封顶；名额要等线程真正跑完才归还，超时的调用也算在内。
+- 策略函数如果是 async def 直接 await，否则丢到线程池执行（现有策略全是同步的，
+  HTTP 仍走各自的 requests / alpaca-py 会话，限速由 app/rate_limiter 统一管）。
+- 单只股票超过 ASYNC_SYMBOL_TIMEOUT_SEC 不再等它，本轮继续；它的线程跑完之前
+  这只股票不会被再次派发（in-flight 集合），避免同一只股票重复下单。
+- 止损触发队列由一个常驻 task 消费，不再夹在股票之间的 sleep 里。
+- runtime_core._STOP 置位后取消所有 task，等线程池里正在下单的调用自然结束。
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import os
+import random
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from app import bot_metrics, symbol_features
+from app.bots import runtime_core as tb
+from app.bots import split_core as sc
+from app.bots import stop_trigger
+
+
+ASYNC_SELL_CONCURRENCY = int(os.getenv("ASYNC_SELL_CONCURRENCY", "8"))
+ASYNC_BUY_CONCURRENCY = int(os.getenv("ASYNC_BUY_CONCURRENCY", "1"))
+ASYNC_SYMBOL_TIMEOUT_SEC = float(os.getenv("ASYNC_SYMBOL_TIMEOUT_SEC", "30"))
+ASYNC_EXECUTOR_WORKERS = int(os.getenv("ASYNC_EXECUTOR_WORKERS", "16"))
+# 主循环自己握着的池连接数（主连接 + 轮内零星的辅助查询），卖出并发要给它们留位置
+ASYNC_DB_RESERVED_CONNS = int(os.getenv("ASYNC_DB_RESERVED_CONNS", "2"))
+ASYNC_STOP_POLL_SEC = 0.2
+
+
+def sell_concurrency() -> int:
+    """卖出并发上限：不超过连接池扣掉主循环占用后剩下的连接数，否则止损卖出会排队等连接超时。"""
+    from ultimate_v1.db import DB_POOL_ENABLED, DB_POOL_MAX_SIZE
+
+    limit = max(ASYNC_SELL_CONCURRENCY, 1)
+    if DB_POOL_ENABLED:
+        limit = min(limit, max(DB_POOL_MAX_SIZE - ASYNC_DB_RESERVED_CONNS, 1))
+    return limit
+
+
+class AsyncRuntime:
+    def __init__(self, config: sc.SplitBotConfig, workers: int = ASYNC_EXECUTOR_WORKERS):
+        self.config = config
+        self.executor = ThreadPoolExecutor(max_workers=max(int(workers), 1), thread_name_prefix=f"{config.role}-bot")
+        # 卖出轮和止损触发共用一个名额池
+        self.sell_sem = asyncio.Semaphore(sell_concurrency())
+        self.buy_sem = asyncio.Semaphore(max(ASYNC_BUY_CONCURRENCY, 1))
+        self.inflight: set[tuple[str, str]] = set()
+        self.background: set[asyncio.Future] = set()
+        self.phase = "closed"
+
+    def spawn(self, coro) -> None:
+        """后台 task 要留引用，否则可能被回收。"""
+        task = asyncio.ensure_future(coro)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    async def call(self, fn, *args):
+        """async 函数直接 await，同步函数丢线程池。"""
+        if inspect.iscoroutinefunction(fn):
+            return await fn(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: fn(*args))
+
+    async def symbol(self, sem: asyncio.Semaphore, key: tuple[str, str], fn, *args) -> bool:
+        """跑一只股票；同一只股票上一次还没结束时直接跳过。
+
+        名额在调用真正结束时才归还：超时不再等的调用仍占着线程和数据库连接。
+        """
+        await sem.acquire()
+        if tb._STOP or key in self.inflight:
+            sem.release()
+            if key in self.inflight:
+                tb.log.info(f"[{self.config.role.upper()} BOT] skip {key[1]} {key[0]}: previous call still running")
+            return False
+        self.inflight.add(key)
+        try:
+            if inspect.iscoroutinefunction(fn):
+                fut = asyncio.ensure_future(fn(*args))
+            else:
+                fut = asyncio.get_running_loop().run_in_executor(self.executor, lambda: fn(*args))
+        except BaseException:
+            self.inflight.discard(key)
+            sem.release()
+            raise
+
+        def _done(_f):
+            self.inflight.discard(key)
+            sem.release()
+
+        fut.add_done_callback(_done)
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), ASYNC_SYMBOL_TIMEOUT_SEC) is True
+        except asyncio.TimeoutError:
+            tb.log.warning(
+                f"[{self.config.role.upper()} BOT] {key[1]} {key[0]} still running after "
+                f"{ASYNC_SYMBOL_TIMEOUT_SEC:.0f}s, round continues"
+            )
+            return False
+        except Exception as exc:
+            tb.log.error(f"[{self.config.role.upper()} BOT] {key[1]} {key[0]} error: {exc}")
+            return False
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def _after_trade_pause() -> None:
+    await asyncio.sleep(float(os.getenv("AFTER_TRADE_SLEEP_SEC", "2")))
+
+
+# ============================================================
+# 卖出
+# ============================================================
+async def _sell_task(rt: AsyncRuntime, sem: asyncio.Semaphore, code: str, stype: str, phase: str) -> bool:
+    if sc.LOG_EACH_SYMBOL:
+        tb.log.info(f"[SELL BOT] scan {stype} {code} phase={phase}")
+    traded = await rt.symbol(sem, (code, stype), sc._sell_one, code, stype, phase)
+    if traded:
+        await _after_trade_pause()
+    return traded
+
+
+async def run_sell_round(rt: AsyncRuntime, conn, phase: str) -> tuple[object, bool]:
+    config = rt.config
+    conn = await rt.call(tb.ensure_conn_alive, conn)
+    rows = await rt.call(tb.load_rows, conn, "sell") or []
+    sc._set_round_rows(rows)
+    if sc._event_sell_active(config, phase):
+        try:
+            armed = await rt.call(stop_trigger.rebuild, conn, config.strategies)
+            tb.log.info(f"[SELL BOT] stop trigger index armed={armed}")
+        except Exception as exc:
+            tb.log.warning(f"[SELL BOT] stop trigger rebuild failed: {exc}")
+    if "B" in config.strategies:
+        await rt.call(sc._check_b_holding_sources, conn, rows)
+
+    targets = [x for x in (sc._sell_target(row, config) for row in rows) if x is not None]
+    tb.log.info(
+        f"[SELL BOT] round phase={phase} db_rows={len(rows)} "
+        f"strategies={','.join(config.strategies)} runtime=async"
+    )
+
+    results = await asyncio.gather(*(_sell_task(rt, rt.sell_sem, code, stype, phase) for code, stype in targets))
+    traded_any = any(results)
+    tb.log.info(
+        f"[SELL BOT] round done phase={phase} scanned={len(rows)} "
+        f"eligible={len(targets)} traded={int(traded_any)}"
+    )
+    return conn, traded_any
+
+
+async def _stop_trigger_pump(rt: AsyncRuntime) -> None:
+    """常驻消费止损触发队列：行情流在线的 regular 阶段才工作。"""
+    while not tb._STOP:
+        if not sc._event_sell_active(rt.config, rt.phase):
+            await asyncio.sleep(0.5)
+            continue
+        fired = await rt.call(stop_trigger.get_fired, 0.5)
+        if fired is None:
+            continue
+        code, stype, price, level = fired
+        if stype not in rt.config.strategies:
+            continue
+        tb.log.info(f"[SELL BOT] event {stype} {code} price={price:.2f} <= level={level:.2f}")
+        sc._take_round_row(code, stype)
+        rt.spawn(_sell_task(rt, rt.sell_sem, code, stype, rt.phase))
+
+
+# ============================================================
+# 买入
+# ============================================================
+async def _buy_task(rt: AsyncRuntime, sem: asyncio.Semaphore, code: str, stype: str) -> bool:
+    traded = await rt.symbol(sem, (code, stype), sc._buy_one, code, stype)
+    if traded:
+        await _after_trade_pause()
+        await rt.call(tb.refresh_buy_gate, True)
+    return traded
+
+
+async def run_buy_round(rt: AsyncRuntime, conn, phase: str, control: dict) -> tuple[object, bool]:
+    config = rt.config
+    conn = await rt.call(tb.ensure_conn_alive, conn)
+    if not await rt.call(sc._buy_allowed, conn, config, phase, control):
+        return conn, False
+
+    if "F" in config.strategies:
+        await rt.call(tb.safe_call, tb.strategy_F_refresh_candidates)
+
+    rows = await rt.call(tb.load_rows, conn, "buy") or []
+    sc._set_round_rows(rows)
+    targets = [x for x in (sc._buy_target(row, config) for row in rows) if x is not None]
+    b_codes = [code for code, stype in targets if stype == "B"]
+    other = [(code, stype) for code, stype in targets if stype != "B"]
+    tb.log.info(
+        f"[BUY BOT] round phase={phase} db_rows={len(rows)} "
+        f"strategies={','.join(config.strategies)} runtime=async"
+    )
+
+    ordered = []
+    if b_codes:
+        confirmed_b = await rt.call(tb.safe_call, tb.strategy_B_rank_and_confirm, b_codes) or []
+        ordered.extend((code, "B") for code in confirmed_b)
+    ordered.extend(other)
+    for code, stype in ordered:
+        if sc.LOG_EACH_SYMBOL:
+            tb.log.info(f"[BUY BOT] dispatch {stype} {code} phase={phase}")
+
+    results = await asyncio.gather(*(_buy_task(rt, rt.buy_sem, code, stype) for code, stype in ordered))
+    traded_any = any(results)
+    tb.log.info(
+        f"[BUY BOT] round done phase={phase} scanned={len(rows)} "
+        f"eligible={len(targets)} traded={int(traded_any)}"
+    )
+    return conn, traded_any
+
+
+# ============================================================
+# 主循环
+# ============================================================
+async def _sleep_unless_stopped(seconds: float) -> None:
+    deadline = asyncio.get_running_loop().time() + max(seconds, 0.0)
+    while not tb._STOP:
+        left = deadline - asyncio.get_running_loop().time()
+        if left <= 0:
+            return
+        await asyncio.sleep(min(left, ASYNC_STOP_POLL_SEC))
+
+
+async def _loop(rt: AsyncRuntime, role: str) -> None:
+    conn = None
+    round_no = 0
+    try:
+        while not tb._STOP:
+            try:
+                round_no += 1
+                real_phase = tb.get_trade_phase()
+                if real_phase == "closed":
+                    rt.phase = "closed"
+                    tb.log.info(f"[{role.upper()} BOT] market closed, sleep 60s")
+                    await _sleep_unless_stopped(60)
+                    continue
+
+                phase = sc._effective_phase(role, real_phase)
+                rt.phase = phase
+
+                if conn is None:
+                    conn = await rt.call(tb.get_conn)
+                    tb.log.info(f"[{role.upper()} BOT] DB connected")
+
+                conn = await rt.call(tb.ensure_conn_alive, conn)
+                control = await rt.call(tb.load_bot_control, conn)
+                sc._log_round_control(role, round_no, phase, control)
+                await rt.call(symbol_features.ensure_loaded, conn)
+
+                if control.get("emergency_stop") == 1:
+                    tb.log.warning(f"[{role.upper()} BOT] emergency_stop=1, pause")
+                    await _sleep_unless_stopped(30)
+                    continue
+
+                bot_metrics.start_round()
+                if role == "sell":
+                    conn, traded_once = await run_sell_round(rt, conn, phase)
+                elif role == "buy":
+                    conn, traded_once = await run_buy_round(rt, conn, phase, control)
+                else:
+                    raise RuntimeError(f"unknown split bot role={role}")
+                await rt.call(sc._finish_round_metrics, conn, rt.config, round_no, phase)
+
+                # 止损触发由 _stop_trigger_pump 常驻处理，这里只是轮间等待
+                await _sleep_unless_stopped(sc._round_sleep_seconds(rt.config, traded_once))
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                tb.log.error(f"[{role.upper()} BOT] loop error: {e}")
+                traceback.print_exc()
+                backoff = random.randint(tb.ERROR_BACKOFF_MIN, tb.ERROR_BACKOFF_MAX)
+                tb.log.warning(f"[{role.upper()} BOT] backoff {backoff}s")
+                await _sleep_unless_stopped(backoff)
+                try:
+                    if conn:
+                        conn.close()
+                except Exception:
+                    pass
+                conn = None
+    finally:
+        try:
+            if conn:
+                conn.close()
+        except Exception:
+            pass
+
+
+async def _watch_stop(rt: AsyncRuntime, tasks) -> None:
+    while not tb._STOP:
+        await asyncio.sleep(ASYNC_STOP_POLL_SEC)
+    for task in [*tasks, *rt.background]:
+        task.cancel()
+
+
+async def main_async(role: str) -> None:
+    config = sc.load_config(role)
+    tb.log.info(
+        f"===== split {role} bot start ===== env={tb.TRADE_ENV} "
+        f"strategies={','.join(config.strategies)} runtime=async"
+    )
+    rt = AsyncRuntime(config)
+    if role == "buy":
+        await rt.call(tb.refresh_buy_gate, True)
+    sc._start_streams(role)
+    bot_metrics.install()
+
+    tasks = [asyncio.ensure_future(_loop(rt, role))]
+    if role == "sell":
+        tasks.append(asyncio.ensure_future(_stop_trigger_pump(rt)))
+    watcher = asyncio.ensure_future(_watch_stop(rt, tasks))
+    try:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        watcher.cancel()
+        rt.shutdown()
+        tb.log.info(f"===== split {role} bot stopped =====")
+
+
+def run(role: str) -> None:
+    asyncio.run(main_async(role))
@@ -46,6 +46,7 @@ else:
 os.environ["ALPACA_KEY"] = os.environ.get("APCA_API_KEY_ID", "")
 os.environ["ALPACA_SECRET"] = os.environ.get("APCA_API_SECRET_KEY", "")
 
+from app import market_stream, rate_limiter, schema_registry  # noqa: E402
 from app.strategy_b import (  # noqa: E402
     strategy_B_afterhours_add,
     strategy_B_buy,
@@ -103,6 +104,8 @@ _cached_buying_power = None
 _buy_allowed = True
 _alpaca_client = None
 
+_last_row_codes = {}  # mode -> frozenset(stock_code)，用于发现订阅集合变化
+
 _CONTROL = {
     "global_buy_enabled": 1,
     "strategy_b_enabled": 1,
@@ -184,8 +187,10 @@ def get_trade_phase(now=None) -> str:
 
 
 def get_conn():
-    """创建数据库连接。"""
-    return pymysql.connect(**DB)
+    """从连接池借数据库连接；close() 归还。"""
+    from ultimate_v1.db import pooled_connect
+
+    return pooled_connect(**DB)
 
 
 def ensure_conn_alive(conn):
@@ -210,7 +215,7 @@ def _get_alpaca_client():
 
     key = os.environ.get("APCA_API_KEY_ID", "")
     secret = os.environ.get("APCA_API_SECRET_KEY", "")
-    _alpaca_client = TradingClient(key, secret, paper=(TRADE_ENV == "paper"))
+    _alpaca_client = rate_limiter.limit_client(TradingClient(key, secret, paper=(TRADE_ENV == "paper")))
     return _alpaca_client
 
 
@@ -250,6 +255,7 @@ def refresh_buy_gate(force: bool = False) -> bool:
     return _buy_allowed
 
 
+@schema_registry.once("bot_control")
 def ensure_bot_control_table(conn):
     """确保机器人总控表存在。"""
     sql = """
@@ -315,10 +321,10 @@ def _strategy_buy_enabled(stype: str) -> bool:
 
 
 def load_rows(conn, mode: str):
-    """读取 stock_operations 中可买或可卖的股票。"""
+    """读取 stock_operations 中可买或可卖的股票；取整行，策略函数直接复用，不再逐只重读。"""
     if mode == "sell":
         sql = f"""
-        SELECT stock_code, stock_type, is_bought, can_sell, can_buy
+        SELECT *
         FROM `{TABLE}`
         WHERE stock_type IN ('A','B','D','E','F')
           AND is_bought=1 AND can_sell=1
@@ -326,7 +332,7 @@ def load_rows(conn, mode: str):
         """
     elif mode == "buy":
         sql = f"""
-        SELECT stock_code, stock_type, is_bought, can_sell, can_buy
+        SELECT *
         FROM `{TABLE}`
         WHERE stock_type IN ('A','B','D','E','F')
           AND can_buy=1 AND (is_bought IS NULL OR is_bought<>1)
@@ -337,7 +343,16 @@ def load_rows(conn, mode: str):
 
     with conn.cursor() as cur:
         cur.execute(sql)
-        return cur.fetchall()
+        rows = cur.fetchall()
+
+    codes = frozenset(str(r.get("stock_code") or "").upper() for r in (rows or []))
+    if _last_row_codes.get(mode) != codes:
+        _last_row_codes[mode] = codes
+        try:
+            market_stream.sync_from_db(conn)
+        except Exception as exc:
+            log.warning(f"[STREAM] 订阅集合同步失败：{exc}")
+    return rows
 
 
 def safe_call(fn, *args, **kwargs):
@@ -4,7 +4,7 @@
 
 这个文件不直接代表某一个策略。它负责：
 - 读取 BOT_STRATEGIES，决定当前进程只跑 B、F 或多个策略
-- 根据 buy/sell 角色扫描 stock_operations
+- 根据 buy/sell 角色扫描 stock_operations（每轮一次查出整行，分发时直接交给策略函数）
 - 把具体股票分发给 strategy_B_buy / strategy_F_sell 等策略函数
 - 控制每轮休眠、阶段判断、全局买入闸门和日志
 """
@@ -16,12 +16,21 @@ import time as t
 import traceback
 from dataclasses import dataclass
 
+from app import bot_metrics, order_stream, rate_limiter, symbol_features
 from app.bots import runtime_core as tb
+from app.bots import stop_trigger
 
 
 DEFAULT_STRATEGIES = ("B", "F")
 LOG_EACH_SYMBOL = int(os.getenv("SPLIT_BOT_LOG_EACH_SYMBOL", "1"))
+SELL_EVENT_TRIGGER_ENABLED = int(os.getenv("SELL_EVENT_TRIGGER_ENABLED", "1"))
 VALID_PHASES = {"premarket_sell", "preopen_record", "regular", "afterhours_add", "closed"}
+# sync：原来的阻塞循环；async：app/bots/async_core 的 asyncio 运行时
+BOT_RUNTIME = os.getenv("BOT_RUNTIME", "sync").strip().lower()
+
+# 本轮 load_rows 预读的整行，key=(code, stype)。策略函数拿到就不再逐只 SELECT，
+# 每行只用一次（取出即删），下单前由策略函数自己做版本校验。
+_round_rows: dict[tuple[str, str], dict] = {}
 
 
 @dataclass(frozen=True)
@@ -59,7 +68,33 @@ def _strategy_enabled(stype: str) -> bool:
     return tb._strategy_buy_enabled(stype)
 
 
+def _set_round_rows(rows) -> None:
+    _round_rows.clear()
+    for row in rows or []:
+        code = (row.get("stock_code") or "").strip().upper()
+        stype = (row.get("stock_type") or "").strip().upper()
+        if code and stype:
+            _round_rows[(code, stype)] = row
+
+
+def _take_round_row(code: str, stype: str):
+    return _round_rows.pop((code, stype), None)
+
+
+def _call_with_round_row(fn, code: str, stype: str):
+    row = _take_round_row(code, stype)
+    if row is None:
+        return tb.safe_call(fn, code)
+    return tb.safe_call(fn, code, row=row)
+
+
 def _sell_one(code: str, stype: str, phase: str) -> bool:
+    # 卖出 / 止损检查走最高优先级通道，买入打分再多也不会把它饿住
+    with rate_limiter.lane("high"):
+        return _sell_one_inner(code, stype, phase)
+
+
+def _sell_one_inner(code: str, stype: str, phase: str) -> bool:
     if stype == "B":
         if phase == "premarket_sell":
             return tb.safe_call(tb.strategy_B_premarket_manage, code) is True
@@ -69,7 +104,7 @@ def _sell_one(code: str, stype: str, phase: str) -> bool:
         if phase == "afterhours_add":
             return tb.safe_call(tb.strategy_B_afterhours_add, code) is True
         if phase == "regular":
-            return tb.safe_call(tb.strategy_B_sell, code) is True
+            return _call_with_round_row(tb.strategy_B_sell, code, "B") is True
 
     if stype == "F":
         if phase == "premarket_sell":
@@ -80,7 +115,7 @@ def _sell_one(code: str, stype: str, phase: str) -> bool:
         if phase == "afterhours_add":
             return tb.safe_call(tb.strategy_F_afterhours_add, code) is True
         if phase == "regular":
-            return tb.safe_call(tb.strategy_F_sell, code) is True
+            return _call_with_round_row(tb.strategy_F_sell, code, "F") is True
 
     return False
 
@@ -112,49 +147,132 @@ def _buy_one(code: str, stype: str) -> bool:
         except Exception as exc:
             tb.log.error(f"[BUY BOT] V1 gate error B {code}: {exc}")
             return False
-        return tb.safe_call(tb.strategy_B_buy, code) is True
+        return _call_with_round_row(tb.strategy_B_buy, code, "B") is True
     if stype == "F":
-        return tb.safe_call(tb.strategy_F_buy, code) is True
+        return _call_with_round_row(tb.strategy_F_buy, code, "F") is True
     return False
 
 
+def _event_sell_active(config: SplitBotConfig, phase: str) -> bool:
+    return (
+        SELL_EVENT_TRIGGER_ENABLED == 1
+        and config.role == "sell"
+        and phase == "regular"
+        and tb.market_stream.is_live()
+    )
+
+
+def _sleep_with_stop_triggers(seconds: float, config: SplitBotConfig, phase: str, wait_span: str | None = None) -> bool:
+    """
+    卖出机器人的 sleep：行情流在线时边等边处理触发队列，
+    穿越止损/回撤线的股票立刻交给策略函数；否则就是普通 sleep。
+    wait_span 给定时只把真正在等的时间记进这个 span（每次调用一条），
+    触发的卖出另记 event_sell，下单 / 对账的耗时不会算成空等。
+    """
+    if not _event_sell_active(config, phase):
+        if wait_span:
+            with bot_metrics.span(wait_span):
+                t.sleep(seconds)
+        else:
+            t.sleep(seconds)
+        return False
+
+    traded_any = False
+    waited = 0.0
+    deadline = t.time() + max(seconds, 0.0)
+    while not tb._STOP:
+        left = deadline - t.time()
+        if left <= 0:
+            break
+        w0 = t.perf_counter()
+        fired = stop_trigger.get_fired(left)
+        waited += t.perf_counter() - w0
+        if fired is None:
+            break
+        code, stype, price, level = fired
+        if stype not in config.strategies:
+            continue
+        tb.log.info(f"[SELL BOT] event {stype} {code} price={price:.2f} <= level={level:.2f}")
+        # 事件卖出不用预读行：止损要按最新状态走，这只股票本轮后面也改为重读
+        _take_round_row(code, stype)
+        with bot_metrics.span("event_sell"):
+            if _sell_one(code, stype, phase):
+                traded_any = True
+    if wait_span and bot_metrics.BOT_METRICS_ENABLED:
+        bot_metrics.record(wait_span, waited)
+    return traded_any
+
+
+def _sell_target(row: dict, config: SplitBotConfig):
+    """本轮要交给卖出策略的行返回 (code, stype)，否则 None。"""
+    code = (row.get("stock_code") or "").strip().upper()
+    stype = (row.get("stock_type") or "").strip().upper()
+    if not code or stype not in config.strategies:
+        return None
+    if int(row.get("is_bought") or 0) != 1 or int(row.get("can_sell") or 0) != 1:
+        return None
+    return code, stype
+
+
+def _buy_target(row: dict, config: SplitBotConfig):
+    code = (row.get("stock_code") or "").strip().upper()
+    stype = (row.get("stock_type") or "").strip().upper()
+    if not code or stype not in config.strategies:
+        return None
+    if int(row.get("can_buy") or 0) != 1:
+        return None
+    return code, stype
+
+
+def _check_b_holding_sources(conn, rows) -> None:
+    """position_holdings 里 B 的 open 持仓数和 stock_operations 可卖行数对不上时告警。"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT COUNT(*) AS n
+                FROM position_holdings
+                WHERE status='open'
+                  AND UPPER(
+                    CASE
+                      WHEN strategy_group IN ('A','B','C','D') THEN strategy_group
+                      WHEN stock_type IN ('A','B','C','D') THEN stock_type
+                      ELSE strategy_group
+                    END
+                  )='B'
+                """
+            )
+            real_b_count = int((cur.fetchone() or {}).get("n") or 0)
+        ops_b_count = sum(
+            1
+            for row in rows
+            if str(row.get("stock_type") or "").strip().upper() == "B"
+            and int(row.get("is_bought") or 0) == 1
+            and int(row.get("can_sell") or 0) == 1
+        )
+        if real_b_count != ops_b_count:
+            tb.log.warning(
+                f"[SELL BOT] B holding source mismatch: "
+                f"position_holdings_open={real_b_count} stock_operations_sellable={ops_b_count}. "
+                "老B卖策略当前只管理 stock_operations 中 can_sell=1 的记录。"
+            )
+    except Exception as exc:
+        tb.log.warning(f"[SELL BOT] cannot compare B holding sources: {exc}")
+
+
 def run_sell_round(conn, config: SplitBotConfig, phase: str) -> tuple[object, bool]:
     conn = tb.ensure_conn_alive(conn)
     traded_any = False
     rows = tb.load_rows(conn, mode="sell") or []
-    if "B" in config.strategies:
+    _set_round_rows(rows)
+    if _event_sell_active(config, phase):
         try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT COUNT(*) AS n
-                    FROM position_holdings
-                    WHERE status='open'
-                      AND UPPER(
-                        CASE
-                          WHEN strategy_group IN ('A','B','C','D') THEN strategy_group
-                          WHEN stock_type IN ('A','B','C','D') THEN stock_type
-                          ELSE strategy_group
-                        END
-                      )='B'
-                    """
-                )
-                real_b_count = int((cur.fetchone() or {}).get("n") or 0)
-            ops_b_count = sum(
-                1
-                for row in rows
-                if str(row.get("stock_type") or "").strip().upper() == "B"
-                and int(row.get("is_bought") or 0) == 1
-                and int(row.get("can_sell") or 0) == 1
-            )
-            if real_b_count != ops_b_count:
-                tb.log.warning(
-                    f"[SELL BOT] B holding source mismatch: "
-                    f"position_holdings_open={real_b_count} stock_operations_sellable={ops_b_count}. "
-                    "老B卖策略当前只管理 stock_operations 中 can_sell=1 的记录。"
-                )
+            armed = stop_trigger.rebuild(conn, config.strategies)
+            tb.log.info(f"[SELL BOT] stop trigger index armed={armed}")
         except Exception as exc:
-            tb.log.warning(f"[SELL BOT] cannot compare B holding sources: {exc}")
+            tb.log.warning(f"[SELL BOT] stop trigger rebuild failed: {exc}")
+    if "B" in config.strategies:
+        _check_b_holding_sources(conn, rows)
     scanned = 0
     eligible = 0
     tb.log.info(
@@ -167,15 +285,10 @@ def run_sell_round(conn, config: SplitBotConfig, phase: str) -> tuple[object, bo
             break
         scanned += 1
 
-        code = (row.get("stock_code") or "").strip().upper()
-        stype = (row.get("stock_type") or "").strip().upper()
-        is_bought = int(row.get("is_bought") or 0)
-        can_sell = int(row.get("can_sell") or 0)
-
-        if not code or stype not in config.strategies:
-            continue
-        if is_bought != 1 or can_sell != 1:
+        target = _sell_target(row, config)
+        if target is None:
             continue
+        code, stype = target
 
         eligible += 1
         if LOG_EACH_SYMBOL:
@@ -185,7 +298,10 @@ def run_sell_round(conn, config: SplitBotConfig, phase: str) -> tuple[object, bo
             traded_any = True
             t.sleep(float(os.getenv("AFTER_TRADE_SLEEP_SEC", "2")))
 
-        t.sleep(tb.SLEEP_BETWEEN_SYMBOLS + random.uniform(0, 0.08))
+        if _sleep_with_stop_triggers(
+            tb.SLEEP_BETWEEN_SYMBOLS + random.uniform(0, 0.08), config, phase, wait_span="between_symbols"
+        ):
+            traded_any = True
 
     tb.log.info(
         f"[SELL BOT] round done phase={phase} scanned={scanned} "
@@ -230,6 +346,7 @@ def run_buy_round(conn, config: SplitBotConfig, phase: str, control: dict) -> tu
         tb.safe_call(tb.strategy_F_refresh_candidates)
 
     rows = tb.load_rows(conn, mode="buy") or []
+    _set_round_rows(rows)
     scanned = 0
     eligible = 0
     b_codes = []
@@ -244,14 +361,10 @@ def run_buy_round(conn, config: SplitBotConfig, phase: str, control: dict) -> tu
             break
         scanned += 1
 
-        code = (row.get("stock_code") or "").strip().upper()
-        stype = (row.get("stock_type") or "").strip().upper()
-        can_buy = int(row.get("can_buy") or 0)
-
-        if not code or stype not in config.strategies:
-            continue
-        if can_buy != 1:
+        target = _buy_target(row, config)
+        if target is None:
             continue
+        code, stype = target
 
         eligible += 1
         if stype == "B":
@@ -272,7 +385,8 @@ def run_buy_round(conn, config: SplitBotConfig, phase: str, control: dict) -> tu
                 t.sleep(float(os.getenv("AFTER_TRADE_SLEEP_SEC", "2")))
                 tb.refresh_buy_gate(force=True)
 
-            t.sleep(tb.SLEEP_BETWEEN_SYMBOLS + random.uniform(0, 0.08))
+            with bot_metrics.span("between_symbols"):
+                t.sleep(tb.SLEEP_BETWEEN_SYMBOLS + random.uniform(0, 0.08))
 
     for code, stype in other_rows:
         if tb._STOP:
@@ -286,7 +400,8 @@ def run_buy_round(conn, config: SplitBotConfig, phase: str, control: dict) -> tu
             t.sleep(float(os.getenv("AFTER_TRADE_SLEEP_SEC", "2")))
             tb.refresh_buy_gate(force=True)
 
-        t.sleep(tb.SLEEP_BETWEEN_SYMBOLS + random.uniform(0, 0.08))
+        with bot_metrics.span("between_symbols"):
+            t.sleep(tb.SLEEP_BETWEEN_SYMBOLS + random.uniform(0, 0.08))
 
     tb.log.info(
         f"[BUY BOT] round done phase={phase} scanned={scanned} "
@@ -295,7 +410,79 @@ def run_buy_round(conn, config: SplitBotConfig, phase: str, control: dict) -> tu
     return conn, traded_any
 
 
+def _effective_phase(role: str, real_phase: str) -> str:
+    """SPLIT_BOT_FORCE_PHASE / <ROLE>_BOT_FORCE_PHASE 只在 paper 环境生效；结果写回 TRADE_PHASE。"""
+    phase = real_phase
+    forced_phase = (
+        os.getenv(f"{role.upper()}_BOT_FORCE_PHASE")
+        or os.getenv("SPLIT_BOT_FORCE_PHASE")
+        or ""
+    ).strip()
+    if forced_phase:
+        if forced_phase not in VALID_PHASES:
+            tb.log.warning(
+                f"[{role.upper()} BOT] ignore invalid force phase={forced_phase}; "
+                f"valid={','.join(sorted(VALID_PHASES))}"
+            )
+        elif tb.TRADE_ENV != "paper" and os.getenv("ALLOW_LIVE_FORCE_PHASE", "0") != "1":
+            tb.log.warning(
+                f"[{role.upper()} BOT] ignore force phase={forced_phase}: "
+                "only paper env is allowed unless ALLOW_LIVE_FORCE_PHASE=1"
+            )
+        else:
+            phase = forced_phase
+            tb.log.warning(
+                f"[{role.upper()} BOT] FORCE phase real={real_phase} effective={phase} "
+                f"env={tb.TRADE_ENV}"
+            )
+    os.environ["TRADE_PHASE"] = phase
+    return phase
+
+
+def _log_round_control(role: str, round_no: int, phase: str, control: dict) -> None:
+    tb.log.info(
+        f"[{role.upper()} BOT] loop round={round_no} phase={phase} "
+        f"emergency_stop={control.get('emergency_stop')} "
+        f"sell_only={control.get('sell_only_mode')} "
+        f"global_buy={control.get('global_buy_enabled')} "
+        f"B={control.get('strategy_b_enabled')} "
+        f"F={control.get('strategy_f_enabled')}"
+    )
+
+
+def _round_sleep_seconds(config: SplitBotConfig, traded_once: bool) -> float:
+    if traded_once:
+        return float(os.getenv("AFTER_ROUND_TRADE_SLEEP_SEC", "0.5"))
+    return config.sleep_between_rounds + random.uniform(0, config.round_jitter_max)
+
+
+def _metrics_bot_name(config: SplitBotConfig) -> str:
+    return f"{config.role}:{','.join(config.strategies)}"
+
+
+def _finish_round_metrics(conn, config: SplitBotConfig, round_no: int, phase: str) -> None:
+    spans = bot_metrics.finish_round(conn, _metrics_bot_name(config), round_no, phase)
+    if spans:
+        top = ", ".join(f"{s['span']}={s['total_ms']:.0f}ms" for s in sorted(spans, key=lambda s: -s["total_ms"])[:4])
+        tb.log.info(f"[{config.role.upper()} BOT] round {round_no} spans: {top}")
+
+
+def _start_streams(role: str) -> None:
+    if tb.market_stream.start():
+        tb.log.info(f"[{role.upper()} BOT] market stream started url={tb.market_stream.MARKET_STREAM_URL}")
+        if role == "sell" and SELL_EVENT_TRIGGER_ENABLED == 1:
+            tb.market_stream.add_tick_listener(stop_trigger.on_tick)
+    if order_stream.start():
+        tb.log.info(f"[{role.upper()} BOT] order stream started url={order_stream.ORDER_STREAM_URL}")
+
+
 def main_loop(role: str) -> None:
+    if BOT_RUNTIME == "async":
+        from app.bots import async_core
+
+        async_core.run(role)
+        return
+
     config = load_config(role)
     tb.log.info(
         f"===== split {role} bot start ===== env={tb.TRADE_ENV} "
@@ -306,6 +493,8 @@ def main_loop(role: str) -> None:
     round_no = 0
     if role == "buy":
         tb.refresh_buy_gate(force=True)
+    _start_streams(role)
+    bot_metrics.install()
 
     while not tb._STOP:
         try:
@@ -317,29 +506,7 @@ def main_loop(role: str) -> None:
                 t.sleep(60)
                 continue
 
-            forced_phase = (
-                os.getenv(f"{role.upper()}_BOT_FORCE_PHASE")
-                or os.getenv("SPLIT_BOT_FORCE_PHASE")
-                or ""
-            ).strip()
-            if forced_phase:
-                if forced_phase not in VALID_PHASES:
-                    tb.log.warning(
-                        f"[{role.upper()} BOT] ignore invalid force phase={forced_phase}; "
-                        f"valid={','.join(sorted(VALID_PHASES))}"
-                    )
-                elif tb.TRADE_ENV != "paper" and os.getenv("ALLOW_LIVE_FORCE_PHASE", "0") != "1":
-                    tb.log.warning(
-                        f"[{role.upper()} BOT] ignore force phase={forced_phase}: "
-                        "only paper env is allowed unless ALLOW_LIVE_FORCE_PHASE=1"
-                    )
-                else:
-                    phase = forced_phase
-                    tb.log.warning(
-                        f"[{role.upper()} BOT] FORCE phase real={real_phase} effective={phase} "
-                        f"env={tb.TRADE_ENV}"
-                    )
-            os.environ["TRADE_PHASE"] = phase
+            phase = _effective_phase(role, real_phase)
 
             if conn is None:
                 conn = tb.get_conn()
@@ -347,31 +514,27 @@ def main_loop(role: str) -> None:
 
             conn = tb.ensure_conn_alive(conn)
             control = tb.load_bot_control(conn)
-            tb.log.info(
-                f"[{role.upper()} BOT] loop round={round_no} phase={phase} "
-                f"emergency_stop={control.get('emergency_stop')} "
-                f"sell_only={control.get('sell_only_mode')} "
-                f"global_buy={control.get('global_buy_enabled')} "
-                f"B={control.get('strategy_b_enabled')} "
-                f"F={control.get('strategy_f_enabled')}"
-            )
+            _log_round_control(role, round_no, phase, control)
+            # 日线特征进程内常驻；首轮载入，跨日自动重载，其余轮次是空操作
+            symbol_features.ensure_loaded(conn)
 
             if control.get("emergency_stop") == 1:
                 tb.log.warning(f"[{role.upper()} BOT] emergency_stop=1, pause")
                 t.sleep(30)
                 continue
 
+            bot_metrics.start_round()
             if role == "sell":
                 conn, traded_once = run_sell_round(conn, config, phase)
             elif role == "buy":
                 conn, traded_once = run_buy_round(conn, config, phase, control)
             else:
                 raise RuntimeError(f"unknown split bot role={role}")
+            _finish_round_metrics(conn, config, round_no, phase)
 
-            if traded_once:
-                t.sleep(float(os.getenv("AFTER_ROUND_TRADE_SLEEP_SEC", "0.5")))
-            else:
-                t.sleep(config.sleep_between_rounds + random.uniform(0, config.round_jitter_max))
+            round_sleep = _round_sleep_seconds(config, traded_once)
+            # 卖出机器人轮间等待期间也响应止损触发，全量扫描只作兜底
+            _sleep_with_stop_triggers(round_sleep, config, phase)
 
         except Exception as e:
             tb.log.error(f"[{role.upper()} BOT] loop error: {e}")
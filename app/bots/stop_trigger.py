@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+卖出机器人的事件触发索引。
+
+run_sell_round 按顺序扫描持仓，每只之间还要 sleep，最后一只股票急跌时
+可能要等一整轮才被 strategy_B_sell / strategy_F_sell 看到。
+
+这里维护一张 symbol -> 阈值 的索引（stop_loss_price / pending stop /
+最高价回撤触发价，取最高的一条作为“向下穿越线”）。websocket 每来一个
+tick 只做一次字典查找 + 比较；穿越的股票放进队列，卖出机器人在 sleep
+的空档里立刻把它交给策略函数。真正卖不卖仍由策略函数按完整规则判断，
+每轮的全量扫描照旧作为兜底。
+
+触发过的股票会从索引里摘掉，下一轮 rebuild 时再装回，避免同一波下跌
+每个 tick 都重复派发。
+"""
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from dataclasses import dataclass, replace
+
+from app.strategy_b import b_giveback_pct_for_peak
+from app.strategy_f import F_INIT_STOP_PCT, _f_giveback_pct_for_peak
+
+OPS_TABLE = os.getenv("OPS_TABLE", "stock_operations")
+
+
+@dataclass(frozen=True)
+class StopThreshold:
+    code: str
+    stype: str
+    cost: float
+    stop_loss: float
+    pending_sl: float
+    peak: float
+    giveback_trigger: float
+
+    @property
+    def trigger_below(self) -> float:
+        return max(self.stop_loss, self.pending_sl, self.giveback_trigger)
+
+
+_index: dict = {}  # code -> StopThreshold；读不加锁，写（重建/抬高点/摘除）加锁
+_lock = threading.Lock()
+_fired: queue.Queue = queue.Queue()
+
+
+def _safe_float(v, default=0.0) -> float:
+    try:
+        return float(v) if v is not None else default
+    except Exception:
+        return default
+
+
+def _giveback_trigger(stype: str, cost: float, peak: float) -> float:
+    if cost <= 0 or peak <= 0:
+        return 0.0
+    gain = (peak - cost) / cost
+    pct = b_giveback_pct_for_peak(gain) if stype == "B" else _f_giveback_pct_for_peak(gain)
+    if pct is None:
+        return 0.0
+    return round(peak * (1.0 - float(pct)), 2)
+
+
+def threshold_from_row(row: dict) -> StopThreshold | None:
+    """按策略函数的同一套规则，从 stock_operations 行算出阈值。"""
+    code = str(row.get("stock_code") or "").strip().upper()
+    stype = str(row.get("stock_type") or "").strip().upper()
+    cost = _safe_float(row.get("cost_price"))
+    if not code or stype not in ("B", "F") or cost <= 0:
+        return None
+
+    stop_loss = _safe_float(row.get("stop_loss_price"))
+    if stop_loss <= 0:
+        stop_loss = round(cost * (0.98 if stype == "B" else 1.0 - float(F_INIT_STOP_PCT)), 2)
+    pending_sl = _safe_float(row.get("b_stop_pending_sl")) if stype == "B" else 0.0
+    peak = max(_safe_float(row.get("b_peak_price")), cost)
+    if stype == "B" and peak < cost * 0.5:
+        peak = cost
+
+    return StopThreshold(
+        code=code,
+        stype=stype,
+        cost=cost,
+        stop_loss=stop_loss,
+        pending_sl=pending_sl,
+        peak=peak,
+        giveback_trigger=_giveback_trigger(stype, cost, peak),
+    )
+
+
+def rebuild(conn, strategies=("B", "F")) -> int:
+    """每轮扫描前从 DB 重建索引；返回装入的股票数。"""
+    types = tuple(s for s in strategies if s in ("B", "F"))
+    if not types:
+        clear()
+        return 0
+    placeholders = ",".join(["%s"] * len(types))
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT stock_code, stock_type, cost_price, stop_loss_price,
+                   b_stop_pending_sl, b_peak_price
+            FROM `{OPS_TABLE}`
+            WHERE is_bought=1 AND can_sell=1 AND stock_type IN ({placeholders})
+            """,
+            types,
+        )
+        rows = cur.fetchall() or []
+
+    new_index = {}
+    for row in rows:
+        th = threshold_from_row(row)
+        if th is not None:
+            new_index[th.code] = th
+    with _lock:
+        _index.clear()
+        _index.update(new_index)
+    return len(new_index)
+
+
+def clear() -> None:
+    with _lock:
+        _index.clear()
+
+
+def get(code: str) -> StopThreshold | None:
+    return _index.get((code or "").strip().upper())
+
+
+def on_tick(symbol: str, price: float) -> None:
+    """market_stream 的 tick 回调：O(1) 检查，穿越阈值就入队。"""
+    th = _index.get(symbol)
+    if th is None or price is None or price <= 0:
+        return
+    if price > th.peak:
+        # 盘中创新高：跟着抬回撤触发价，不用等下一轮写库
+        with _lock:
+            cur = _index.get(symbol)
+            if cur is not None and price > cur.peak:
+                _index[symbol] = replace(
+                    cur, peak=price, giveback_trigger=_giveback_trigger(cur.stype, cur.cost, price)
+                )
+        return
+    if price <= th.trigger_below:
+        with _lock:
+            hit = _index.pop(symbol, None)
+        if hit is not None:
+            _fired.put((hit.code, hit.stype, float(price), float(hit.trigger_below)))
+
+
+def get_fired(timeout: float):
+    """等待一个触发事件，超时返回 None。"""
+    try:
+        return _fired.get(timeout=max(timeout, 0.0)) if timeout > 0 else _fired.get_nowait()
+    except queue.Empty:
+        return None
+
+
+def armed_count() -> int:
+    return len(_index)
@@ -55,13 +55,18 @@ def _get_attr(obj, name: str, default=None):
 def _get_client():
     from alpaca.trading.client import TradingClient
 
+    try:
+        from app import rate_limiter
+    except ImportError:  # python app/check_alpaca_account_power.py：app/ 本身在 sys.path 上
+        import rate_limiter  # type: ignore
+
     trade_env = (os.getenv("TRADE_ENV") or os.getenv("ALPACA_MODE") or "paper").strip().lower()
     key = os.getenv("APCA_API_KEY_ID", "") or os.getenv("ALPACA_KEY", "")
     secret = os.getenv("APCA_API_SECRET_KEY", "") or os.getenv("ALPACA_SECRET", "")
     if not key or not secret:
         raise RuntimeError("缺少 Alpaca key: APCA_API_KEY_ID / APCA_API_SECRET_KEY")
 
-    return TradingClient(key, secret, paper=(trade_env != "live")), trade_env
+    return rate_limiter.limit_client(TradingClient(key, secret, paper=(trade_env != "live"))), trade_env
 
 
 def print_account_fields(acct):
@@ -16,7 +16,11 @@ getdata_alpaca.py
 - 命令行传参 tickers：python -u app/getdata_alpaca.py QQQ AAPL
 - 或从 CSV 读取（SYMBOLS_CSV=/app/data/symbols/low_price_symbols.csv）
 - 支持区间：START_DATE=YYYY-MM-DD END_DATE=YYYY-MM-DD（end inclusive）
+- 增量：INCREMENTAL=1 按库里已有日期和交易日历算出每只缺哪些天，缺口相同的股票合成一次请求
 - 批量参数：BATCH_SIZE / MAX_TICKERS
+- 并发：GETDATA_WORKERS 个线程同时拉不同批次，主线程负责写库
+- 写库：一批（多只股票）的所有行一次 executemany（pymysql 会拼成多行 INSERT ... ON DUPLICATE KEY UPDATE）
+- 断点续跑：每只写完记进 getdata_checkpoints，同一表 + 同一区间重跑时跳过已完成的股票（GETDATA_RESUME）
 - 失败导出：/app/data/symbols/failed_symbols_today.csv
 """
 
@@ -24,7 +28,9 @@ import os
 import sys
 import time
 import csv
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime, timedelta, date as dt_date
 
 import pandas as pd
@@ -34,6 +40,11 @@ from alpaca.data.historical import StockHistoricalDataClient
 from alpaca.data.timeframe import TimeFrame
 from alpaca.data.requests import StockBarsRequest
 
+try:
+    from app import rate_limiter
+except ImportError:  # run.sh / run_getdata_daily.sh 直接 python app/getdata_alpaca.py，app/ 本身在 sys.path 上
+    import rate_limiter  # type: ignore
+
 
 # =========================
 # 0) 环境参数
@@ -52,12 +63,19 @@ INTERVAL = os.getenv("INTERVAL", "1d").strip()   # 目前只实现 1d -> Alpaca
 DAILY = os.getenv("DAILY", "0").strip()  # "1" or "0"
 DAILY_DAYS = int(os.getenv("DAILY_DAYS", "2"))  # DAILY=1 时生效：拉最近几天（建议 2 或 3）
 
+# 3) INCREMENTAL=1：只补缺。回看 GETDATA_HEAL_DAYS 个自然日，库里缺的已收盘交易日都会补上
+INCREMENTAL = os.getenv("INCREMENTAL", "0").strip()
+GETDATA_HEAL_DAYS = int(os.getenv("GETDATA_HEAL_DAYS", "30"))
+# 收盘后多久才认为当天日线已经定型
+GETDATA_CLOSE_GRACE_MIN = int(os.getenv("GETDATA_CLOSE_GRACE_MIN", "20"))
+
 START_DATE = os.getenv("START_DATE", "").strip()  # YYYY-MM-DD
 END_DATE = os.getenv("END_DATE", "").strip()      # YYYY-MM-DD (inclusive)
 
 ALPACA_KEY = os.getenv("ALPACA_KEY", "").strip()
 ALPACA_SECRET = os.getenv("ALPACA_SECRET", "").strip()
 ALPACA_DATA_FEED = os.getenv("ALPACA_DATA_FEED", "iex").strip()  # iex / sip（sip通常要权限）
+TRADE_ENV = (os.getenv("TRADE_ENV") or os.getenv("ALPACA_MODE") or "paper").strip().lower()
 # =========================
 # 1) MySQL 配置
 # =========================
@@ -67,6 +85,12 @@ DB_USER = os.getenv("DB_USER", "tradebot").strip()
 DB_PASS = os.getenv("DB_PASS", "").strip()
 DB_NAME = os.getenv("DB_NAME", "cszy2000").strip()
 
+# 并发拉取的线程数；Alpaca 历史数据接口限速 200 次/分钟，4 个并发足够把它用满
+GETDATA_WORKERS = max(1, int(os.getenv("GETDATA_WORKERS", "4")))
+# 断点表；DAILY=1 默认不续跑（当天的 bar 可能还没收完，重跑就是为了覆盖）
+CHECKPOINT_TABLE = os.getenv("GETDATA_CHECKPOINT_TABLE", "getdata_checkpoints").strip()
+GETDATA_RESUME = os.getenv("GETDATA_RESUME", "0" if "1" in (DAILY, INCREMENTAL) else "1").strip() == "1"
+
 # 输出文件
 FAILED_OUT = os.getenv("FAILED_OUT", "/app/data/symbols/failed_symbols_today.csv").strip()
 
@@ -106,6 +130,77 @@ def resolve_range() -> tuple[dt_date, dt_date]:
     e = parse_date(END_DATE) + timedelta(days=1)
     return s, e
 
+def trading_calendar(start_dt: dt_date, end_dt: dt_date) -> list[tuple[dt_date, datetime]]:
+    """
+    [start_dt, end_dt) 内的交易日和收盘时间（美东，naive）。
+    优先 Alpaca 交易日历（含节假日、半天市）；拿不到就退回工作日 + 16:00。
+    """
+    try:
+        from alpaca.trading.client import TradingClient
+        from alpaca.trading.requests import GetCalendarRequest
+
+        tc = rate_limiter.limit_client(TradingClient(ALPACA_KEY, ALPACA_SECRET, paper=(TRADE_ENV != "live")))
+        cal = tc.get_calendar(GetCalendarRequest(start=start_dt, end=end_dt - timedelta(days=1)))
+        out = [(c.date, c.close) for c in cal if start_dt <= c.date < end_dt]
+        if out:
+            return out
+    except Exception as e:
+        print(f"[{now_ts()}] ⚠ 交易日历获取失败，按工作日估算: {e}", flush=True)
+
+    days = pd.bdate_range(start_dt, end_dt - timedelta(days=1))
+    return [(d.date(), datetime.combine(d.date(), datetime.min.time()).replace(hour=16)) for d in days]
+
+
+def closed_trading_days(now_et: datetime | None = None) -> list[dt_date]:
+    """回看窗口内已经收盘（过了 GETDATA_CLOSE_GRACE_MIN）的交易日，升序。"""
+    if now_et is None:
+        try:
+            from zoneinfo import ZoneInfo
+            now_et = datetime.now(ZoneInfo("America/New_York")).replace(tzinfo=None)
+        except Exception:
+            now_et = datetime.now()
+    start_dt = now_et.date() - timedelta(days=max(1, GETDATA_HEAL_DAYS))
+    end_dt = now_et.date() + timedelta(days=1)
+    grace = timedelta(minutes=GETDATA_CLOSE_GRACE_MIN)
+    return [d for d, close in trading_calendar(start_dt, end_dt) if close + grace <= now_et]
+
+
+def load_stored_dates(conn, table: str, since: dt_date) -> dict[str, set[dt_date]]:
+    """一次 GROUP BY symbol 拿到回看窗口内每只股票已有的日期。"""
+    sql = f"""
+    SELECT `symbol`, GROUP_CONCAT(DATE_FORMAT(`date`, '%%Y-%%m-%%d')) AS dates
+    FROM `{table}`
+    WHERE `date` >= %s
+    GROUP BY `symbol`;
+    """
+    with conn.cursor() as cur:
+        # 默认 1024 字节只够 ~100 个日期
+        cur.execute("SET SESSION group_concat_max_len = 1048576;")
+        cur.execute(sql, (since,))
+        rows = cur.fetchall() or []
+    out = {}
+    for r in rows:
+        dates = str(r.get("dates") or "")
+        out[str(r["symbol"]).upper()] = {parse_date(x) for x in dates.split(",") if x}
+    return out
+
+
+def plan_incremental(tickers: list[str], stored: dict[str, set[dt_date]], days: list[dt_date]) -> dict[tuple[dt_date, dt_date], list[str]]:
+    """
+    每只股票缺的交易日 -> 覆盖它们的区间 [首个缺口, 最后缺口+1)；区间相同的股票归为一组。
+    区间里已有的日期会被重复 upsert，值不变，换来的是一组一次请求。
+    """
+    groups = {}
+    for sym in tickers:
+        have = stored.get(sym, set())
+        missing = [d for d in days if d not in have]
+        if not missing:
+            continue
+        key = (missing[0], missing[-1] + timedelta(days=1))
+        groups.setdefault(key, []).append(sym)
+    return groups
+
+
 def mysql_conn():
     return pymysql.connect(
         host=DB_HOST,
@@ -140,6 +235,42 @@ def ensure_table(conn, table: str):
         cur.execute(sql)
 
 
+def ensure_checkpoint_table(conn):
+    sql = f"""
+    CREATE TABLE IF NOT EXISTS `{CHECKPOINT_TABLE}` (
+      `job` varchar(96) NOT NULL,
+      `symbol` varchar(10) NOT NULL,
+      `rows` int NOT NULL DEFAULT 0,
+      `done_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (`job`,`symbol`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql)
+
+
+def checkpoint_job(table: str, start_dt: dt_date, end_dt: dt_date) -> str:
+    return f"{table}:{start_dt}:{end_dt}:{ALPACA_DATA_FEED}"
+
+
+def load_checkpoints(conn, job: str) -> set[str]:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT `symbol` FROM `{CHECKPOINT_TABLE}` WHERE `job`=%s", (job,))
+        return {str(r["symbol"]).upper() for r in (cur.fetchall() or [])}
+
+
+def save_checkpoints(conn, job: str, counts: dict[str, int]):
+    if not counts:
+        return
+    sql = f"""
+    INSERT INTO `{CHECKPOINT_TABLE}` (`job`,`symbol`,`rows`)
+    VALUES (%s,%s,%s)
+    ON DUPLICATE KEY UPDATE `rows`=VALUES(`rows`), `done_at`=CURRENT_TIMESTAMP;
+    """
+    with conn.cursor() as cur:
+        cur.executemany(sql, [(job, sym, n) for sym, n in counts.items()])
+
+
 def read_symbols_from_csv(path: str) -> list[str]:
     if not os.path.exists(path):
         die(f"找不到 SYMBOLS_CSV 文件：{path}")
@@ -182,14 +313,31 @@ def get_tickers() -> list[str]:
     return t
 
 
+_local = threading.local()
+
+
 def alpaca_client():
     if not ALPACA_KEY or not ALPACA_SECRET:
         die("缺少 ALPACA_KEY / ALPACA_SECRET")
-    return StockHistoricalDataClient(ALPACA_KEY, ALPACA_SECRET)
+    # 和机器人共用 data 桶；批量拉取走 low 通道（见 fetch），不挤占盘中行情 / 卖出的额度
+    return rate_limiter.limit_client(StockHistoricalDataClient(ALPACA_KEY, ALPACA_SECRET), account_bucket="data")
 
 
-def upsert_rows(conn, table: str, symbol: str, df: pd.DataFrame) -> int:
-    if df is None or df.empty:
+def thread_client():
+    """每个拉取线程一个 client（各自的 HTTP session，连接复用、互不抢锁）。"""
+    client = getattr(_local, "client", None)
+    if client is None:
+        client = alpaca_client()
+        _local.client = client
+    return client
+
+
+def upsert_rows(conn, table: str, rows: list[tuple]) -> int:
+    """
+    rows: [(symbol, date, open, high, low, close, volume), ...]，可以跨多只股票。
+    pymysql 的 executemany 会把它拼成少量多行 INSERT（单条 ~1MB），整批一个事务。
+    """
+    if not rows:
         return 0
 
     sql = f"""
@@ -203,27 +351,53 @@ def upsert_rows(conn, table: str, symbol: str, df: pd.DataFrame) -> int:
       `volume`=VALUES(`volume`);
     """
 
-    rows = []
-    for _, r in df.iterrows():
-        rows.append((
-            symbol,
-            r["date"],
-            None if pd.isna(r["open"]) else float(r["open"]),
-            None if pd.isna(r["high"]) else float(r["high"]),
-            None if pd.isna(r["low"]) else float(r["low"]),
-            None if pd.isna(r["close"]) else float(r["close"]),
-            None if pd.isna(r["volume"]) else int(r["volume"]),
-        ))
-
-    with conn.cursor() as cur:
-        cur.executemany(sql, rows)
+    conn.begin()
+    try:
+        with conn.cursor() as cur:
+            cur.executemany(sql, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
 
     return len(rows)
 
 
-def fetch_bars_batch(client: StockHistoricalDataClient, symbols: list[str], start_dt: dt_date, end_dt: dt_date) -> dict[str, pd.DataFrame]:
+def bars_to_rows(df_all: pd.DataFrame, start_dt: dt_date, end_dt: dt_date) -> dict[str, list[tuple]]:
+    """
+    bars.df.reset_index() -> {symbol: [(symbol, date, open, high, low, close, volume), ...]}
+    整列向量化转换（不走 iterrows），NaN 转 None，数值转成 pymysql 认识的 float / int。
+    """
+    if df_all is None or df_all.empty:
+        return {}
+
+    d = pd.DataFrame({
+        "symbol": df_all["symbol"].astype(str),
+        # timestamp -> date
+        "date": pd.to_datetime(df_all["timestamp"]).dt.date,
+        "open": df_all["open"].astype(float),
+        "high": df_all["high"].astype(float),
+        "low": df_all["low"].astype(float),
+        "close": df_all["close"].astype(float),
+        "volume": df_all["volume"].round().astype("Int64"),
+    })
+    d = d.dropna(subset=["date"])
+
+    # 过滤到区间内（end_exclusive）
+    d = d[(d["date"] >= start_dt) & (d["date"] < end_dt)].sort_values(["symbol", "date"])
+    if d.empty:
+        return {}
+
+    d = d.astype(object).where(d.notna(), None)
+    out = {}
+    for sym, part in d.groupby("symbol", sort=False):
+        out[sym] = list(part.itertuples(index=False, name=None))
+    return out
+
+
+def fetch_bars_batch(client: StockHistoricalDataClient, symbols: list[str], start_dt: dt_date, end_dt: dt_date) -> dict[str, list[tuple]]:
     """
-    Alpaca 批量拉 bars，返回 {symbol: df(date,open,high,low,close,volume)}
+    Alpaca 批量拉 bars，返回 {symbol: rows}；没有数据的股票不在结果里。
     """
     if INTERVAL != "1d":
         die(f"当前只支持 INTERVAL=1d，你给的是 {INTERVAL}")
@@ -241,37 +415,9 @@ def fetch_bars_batch(client: StockHistoricalDataClient, symbols: list[str], star
 
     # bars.df: MultiIndex (symbol, timestamp)
     if bars is None or bars.df is None or bars.df.empty:
-        return {s: pd.DataFrame() for s in symbols}
-
-    df_all = bars.df.reset_index()
-
-    out = {}
-    for s in symbols:
-        d = df_all[df_all["symbol"] == s].copy()
-        if d.empty:
-            out[s] = pd.DataFrame()
-            continue
-
-        # timestamp -> date
-        d["date"] = pd.to_datetime(d["timestamp"]).dt.date
-
-        # 标准列名
-        d.rename(columns={
-            "open": "open",
-            "high": "high",
-            "low": "low",
-            "close": "close",
-            "volume": "volume",
-        }, inplace=True)
-
-        keep = ["date", "open", "high", "low", "close", "volume"]
-        d = d[keep].dropna(subset=["date"]).sort_values("date")
+        return {}
 
-        # 过滤到区间内（end_exclusive）
-        d = d[(d["date"] >= start_dt) & (d["date"] < end_dt)]
-        out[s] = d
-
-    return out
+    return bars_to_rows(bars.df.reset_index(), start_dt, end_dt)
 
 
 def chunked(lst, n):
@@ -280,63 +426,116 @@ def chunked(lst, n):
 
 
 def main():
-    start_dt, end_dt = resolve_range()
     tickers = get_tickers()
 
     print(f"[{now_ts()}] ===== getdata_alpaca.py start =====", flush=True)
     print(f"[{now_ts()}] DB={DB_HOST}:{DB_PORT}/{DB_NAME}  TABLE={TABLE_NAME}", flush=True)
     print(f"[{now_ts()}] tickers={len(tickers)} timeframe=1Day feed={ALPACA_DATA_FEED}", flush=True)
-    print(f"[{now_ts()}] range: {start_dt} -> {end_dt} (end_exclusive)", flush=True)
     print(f"[{now_ts()}] csv: {SYMBOLS_CSV}", flush=True)
 
     conn = mysql_conn()
     ensure_table(conn, TABLE_NAME)
-
-    client = alpaca_client()
+    ensure_checkpoint_table(conn)
+
+    # (batch, start_dt, end_dt_exclusive)
+    jobs = []
+    if INCREMENTAL == "1":
+        days = closed_trading_days()
+        if not days:
+            die("回看窗口内没有已收盘的交易日")
+        stored = load_stored_dates(conn, TABLE_NAME, days[0])
+        plan = plan_incremental(tickers, stored, days)
+        up_to_date = len(tickers) - sum(len(v) for v in plan.values())
+        print(
+            f"[{now_ts()}] incremental: days={days[0]}..{days[-1]} up_to_date={up_to_date} "
+            f"groups={len(plan)}",
+            flush=True,
+        )
+        for (s_dt, e_dt), syms in sorted(plan.items()):
+            print(f"[{now_ts()}]   {s_dt} -> {e_dt} (end_exclusive): {len(syms)} symbols", flush=True)
+            jobs.extend((batch, s_dt, e_dt) for batch in chunked(syms, BATCH_SIZE))
+    else:
+        start_dt, end_dt = resolve_range()
+        print(f"[{now_ts()}] range: {start_dt} -> {end_dt} (end_exclusive)", flush=True)
+        if GETDATA_RESUME:
+            done = load_checkpoints(conn, checkpoint_job(TABLE_NAME, start_dt, end_dt))
+            if done:
+                tickers = [t for t in tickers if t not in done]
+                print(f"[{now_ts()}] resume: skip {len(done)} done, left={len(tickers)}", flush=True)
+        jobs = [(batch, start_dt, end_dt) for batch in chunked(tickers, BATCH_SIZE)]
+
+    alpaca_client()  # 缺 key 时在起线程之前退出
 
     ok = 0
     failed = 0
     total_rows = 0
     failed_syms = []
-
-    # 批量拉取，减少请求次数
-    for batch in chunked(tickers, BATCH_SIZE):
+    t_start = time.perf_counter()
+
+    def fetch(job):
+        batch, s_dt, e_dt = job
+        with rate_limiter.lane("low"):
+            return fetch_bars_batch(thread_client(), batch, s_dt, e_dt)
+
+    def write(job, data_map):
+        nonlocal ok, failed, total_rows
+        batch, s_dt, e_dt = job
+        rows = []
+        counts = {}
+        for sym in batch:
+            sym_rows = data_map.get(sym)
+            if not sym_rows:
+                # DAILY 模式下，周末/节假日空数据是正常的，不算失败；
+                # 增量模式下停牌 / iex 无成交的日子也会一直“缺”，同样不算失败
+                if DAILY != "1" and INCREMENTAL != "1":
+                    failed += 1
+                    failed_syms.append(sym)
+                continue
+            rows.extend(sym_rows)
+            counts[sym] = len(sym_rows)
         try:
-            data_map = fetch_bars_batch(client, batch, start_dt, end_dt)
+            n = upsert_rows(conn, TABLE_NAME, rows)
+            save_checkpoints(conn, checkpoint_job(TABLE_NAME, s_dt, e_dt), counts)
         except Exception as e:
-            # 整个 batch 挂了
-            print(f"[{now_ts()}] ❌ batch 拉取失败: {batch} err={e}", flush=True)
+            print(f"[{now_ts()}] ❌ batch 写入失败: {batch[0]}..{batch[-1]} err={e}", flush=True)
             traceback.print_exc()
-            failed += len(batch)
-            failed_syms.extend(batch)
-            continue
-
-        for sym in batch:
-            try:
-                df = data_map.get(sym, pd.DataFrame())
-                if df is None or df.empty:
-                    # DAILY 模式下，周末/节假日空数据是正常的，不算失败
-                    if DAILY == "1":
-                        print(f"[{now_ts()}] ⚠ {sym}: 空数据（可能非交易日/当天无bar）", flush=True)
-                        continue
-                    else:
-                        print(f"[{now_ts()}] ⚠ {sym}: 空数据", flush=True)
-                        failed += 1
-                        failed_syms.append(sym)
-                        continue
-                n = upsert_rows(conn, TABLE_NAME, sym, df)
-                total_rows += n
-                ok += 1
-                print(f"[{now_ts()}] ✅ {sym}: upsert {n} rows ({df['date'].min()} -> {df['date'].max()})", flush=True)
-
-            except Exception as e:
-                print(f"[{now_ts()}] ❌ {sym} 写入失败: {e}", flush=True)
-                traceback.print_exc()
-                failed += 1
-                failed_syms.append(sym)
-
-        # 控制节奏（别太激进）
-        time.sleep(0.2)
+            failed += len(counts)
+            failed_syms.extend(counts)
+            return
+        total_rows += n
+        ok += len(counts)
+        empty = len(batch) - len(counts)
+        elapsed = max(time.perf_counter() - t_start, 1e-6)
+        print(
+            f"[{now_ts()}] ✅ batch {batch[0]}..{batch[-1]}: symbols={len(counts)} empty={empty} "
+            f"upsert {n} rows (total={total_rows}, {total_rows / elapsed:.0f} rows/s)",
+            flush=True,
+        )
+
+    # 多个批次并发拉取，主线程按完成顺序写库；在途批次有上限，内存不会随股票数膨胀
+    max_inflight = GETDATA_WORKERS * 2
+    with ThreadPoolExecutor(max_workers=GETDATA_WORKERS, thread_name_prefix="getdata") as pool:
+        pending = {}
+        next_i = 0
+        while pending or next_i < len(jobs):
+            while next_i < len(jobs) and len(pending) < max_inflight:
+                job = jobs[next_i]
+                pending[pool.submit(fetch, job)] = job
+                next_i += 1
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                job = pending.pop(fut)
+                batch = job[0]
+                try:
+                    data_map = fut.result()
+                except Exception as e:
+                    # 整个 batch 挂了
+                    print(f"[{now_ts()}] ❌ batch 拉取失败: {batch} err={e}", flush=True)
+                    traceback.print_exc()
+                    failed += len(batch)
+                    failed_syms.extend(batch)
+                    continue
+                write(job, data_map)
 
     conn.close()
 
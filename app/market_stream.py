@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+"""
+app/market_stream.py
+
+Alpaca 行情 websocket 订阅 + 进程内最新行情簿（last trade / last quote / 当日 OHLCV）。
+
+- 后台线程连 stream.data.alpaca.markets，订阅 trades / quotes / dailyBars。
+- 行情簿每只股票是一个不可变 BookEntry，更新时整体替换字典里的值：
+  读端（策略线程）不加锁直接读；写端（stream 线程 + REST 回填）用一把小锁串行。
+- 订阅集合 = stock_operations 中 can_buy=1 或 is_bought=1 的股票；
+  runtime_core.load_rows 发现股票集合变化时调用 sync_from_db 重新订阅。
+- websocket 只推今天的数据，没有昨收：prev_close 由 REST snapshot 回填（seed）。
+- 当日累计成交量 day_volume：dailyBars 推送（每分钟一次）给出权威值，
+  两次推送之间把逐笔成交的 size 累加上去，延迟是秒级。
+- 每个条目记着当日字段属于哪个美东交易日（session_day）；推送的时间戳换了一天时，
+  昨收 / 开高低 / 累计量先清空再更新，长时间运行的机器人不会把昨天的量接着累加。
+  昨收清空后由下一次 REST snapshot 重新回填。
+- MARKET_STREAM_URL 可以指向本地假服务器，测试用。
+
+拿不到新鲜数据（未连接、未订阅、太久没消息、缺昨收）时 get_quote 返回 None，
+调用方回退 REST snapshot。
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+
+try:
+    from zoneinfo import ZoneInfo
+except Exception:
+    ZoneInfo = None
+
+MARKET_STREAM_ENABLED = int(os.getenv("MARKET_STREAM_ENABLED", "1"))
+MARKET_STREAM_FEED = os.getenv("MARKET_STREAM_FEED", os.getenv("B_DATA_FEED", "iex")).strip().lower()
+MARKET_STREAM_URL = os.getenv("MARKET_STREAM_URL", f"wss://stream.data.alpaca.markets/v2/{MARKET_STREAM_FEED}")
+# 行情簿条目多久没有任何推送就不再信任（冷门股没成交时也会有报价推送）
+MARKET_STREAM_MAX_AGE_SEC = float(os.getenv("MARKET_STREAM_MAX_AGE_SEC", "30"))
+MARKET_STREAM_RECONNECT_MIN = float(os.getenv("MARKET_STREAM_RECONNECT_MIN", "1"))
+MARKET_STREAM_RECONNECT_MAX = float(os.getenv("MARKET_STREAM_RECONNECT_MAX", "30"))
+OPS_TABLE = os.getenv("OPS_TABLE", "stock_operations")
+MARKET_TZ = ZoneInfo("America/New_York") if ZoneInfo else timezone.utc
+
+
+@dataclass(frozen=True)
+class BookEntry:
+    last_price: float | None = None
+    bid: float | None = None
+    ask: float | None = None
+    day_open: float | None = None
+    day_high: float | None = None
+    day_low: float | None = None
+    prev_close: float | None = None
+    day_volume: float | None = None
+    updated_at: float = 0.0
+    stream_seen: bool = False
+    session_day: str | None = None  # 当日字段所属的美东交易日 YYYY-MM-DD
+
+
+# 换日时要清空的当日字段
+_DAY_FIELDS = dict(day_open=None, day_high=None, day_low=None, prev_close=None, day_volume=None)
+
+
+_book: dict = {}  # symbol -> BookEntry，只做整体替换
+_write_lock = threading.Lock()
+_tick_listeners = []
+
+_day_cache: dict = {}  # 时间戳的 "YYYY-MM-DDTHH" -> 美东日期
+_wanted: frozenset = frozenset()
+_subscribed: frozenset = frozenset()
+_live = False
+_thread = None
+_stop_event = threading.Event()
+
+
+def _f(v):
+    try:
+        return float(v) if v is not None else None
+    except Exception:
+        return None
+
+
+def session_day(ts=None) -> str:
+    """推送时间戳（RFC3339 UTC，如 2026-10-16T13:30:00.123456789Z）所在的美东日期；不给就是现在。"""
+    hour = str(ts)[:13] if ts else ""
+    day = _day_cache.get(hour) if hour else None
+    if day is None:
+        try:
+            dt = datetime.strptime(hour, "%Y-%m-%dT%H").replace(tzinfo=timezone.utc)
+        except ValueError:
+            return datetime.now(MARKET_TZ).strftime("%Y-%m-%d")
+        day = dt.astimezone(MARKET_TZ).strftime("%Y-%m-%d")
+        if len(_day_cache) > 256:
+            _day_cache.clear()
+        _day_cache[hour] = day
+    return day
+
+
+# =========================
+# 行情簿
+# =========================
+def _update(symbol: str, day: str | None = None, merge=None, **fields):
+    """
+    day 给定时：条目属于别的交易日就先清空当日字段。
+    merge(old) -> dict：要根据当前条目算的字段（累计量、高低点）在锁内算，
+    不会被 seed / 换日清空插队后用旧条目覆盖回去。
+    """
+    with _write_lock:
+        old = _book.get(symbol) or BookEntry()
+        if day is not None and old.session_day != day:
+            old = replace(old, session_day=day, **_DAY_FIELDS)
+        if merge is not None:
+            fields = {**fields, **merge(old)}
+        new = replace(old, **fields)
+        _book[symbol] = new
+    return new
+
+
+def seed(symbol: str, quote: dict) -> None:
+    """用 REST snapshot 回填（主要是昨收），已有的推送字段不覆盖。"""
+    symbol = (symbol or "").strip().upper()
+    if not symbol or not quote:
+        return
+    today = session_day()
+
+    def _seed(old):
+        if old.stream_seen and old.session_day == today:
+            # 推送字段更新，只补推送给不了的
+            fields = {}
+            if old.prev_close is None and quote.get("prev_close") is not None:
+                fields["prev_close"] = _f(quote.get("prev_close"))
+            if old.day_volume is None and quote.get("day_volume") is not None:
+                # 开盘后才订阅的股票要等下一根日线推送，先用 snapshot 的量做累加基数
+                fields["day_volume"] = _f(quote.get("day_volume"))
+            return fields
+        return dict(
+            _DAY_FIELDS if old.session_day != today else {},
+            session_day=today,
+            last_price=_f(quote.get("last_price")),
+            bid=_f(quote.get("bid")),
+            ask=_f(quote.get("ask")),
+            day_open=_f(quote.get("day_open")),
+            day_high=_f(quote.get("day_high")),
+            day_low=_f(quote.get("day_low")),
+            prev_close=_f(quote.get("prev_close")),
+            day_volume=_f(quote.get("day_volume")),
+        )
+
+    _update(symbol, merge=_seed)
+
+
+def get_entry(symbol: str):
+    return _book.get((symbol or "").strip().upper())
+
+
+def get_quote(symbol: str, max_age: float | None = None):
+    """返回和 get_snapshot_quote_realtime 同结构的 dict；数据不可信时返回 None。"""
+    symbol = (symbol or "").strip().upper()
+    if not _live or symbol not in _subscribed:
+        return None
+    e = _book.get(symbol)
+    if e is None or not e.stream_seen or e.prev_close is None:
+        return None
+    if e.last_price is None and not (e.bid and e.ask):
+        return None
+    max_age = MARKET_STREAM_MAX_AGE_SEC if max_age is None else max_age
+    if time.time() - e.updated_at > max_age:
+        return None
+    return {
+        "last_price": e.last_price,
+        "bid": e.bid,
+        "ask": e.ask,
+        "day_open": e.day_open,
+        "day_high": e.day_high,
+        "day_low": e.day_low,
+        "prev_close": e.prev_close,
+        "day_volume": e.day_volume,
+        "feed": MARKET_STREAM_FEED,
+    }
+
+
+def get_last_price(symbol: str, max_age: float | None = None):
+    """只要最新价（不需要昨收）时用：成交价优先，其次买卖中间价；不可信返回 None。"""
+    symbol = (symbol or "").strip().upper()
+    if not _live or symbol not in _subscribed:
+        return None
+    e = _book.get(symbol)
+    if e is None or not e.stream_seen:
+        return None
+    max_age = MARKET_STREAM_MAX_AGE_SEC if max_age is None else max_age
+    if time.time() - e.updated_at > max_age:
+        return None
+    if e.last_price and e.last_price > 0:
+        return e.last_price
+    if e.bid and e.ask and e.bid > 0 and e.ask > 0:
+        return (e.bid + e.ask) / 2.0
+    return None
+
+
+def get_day_volume(symbol: str, max_age: float | None = None):
+    """当日累计成交量（股数）；未连接 / 未订阅 / 不新鲜 / 还没有日线推送时返回 None。"""
+    symbol = (symbol or "").strip().upper()
+    if not _live or symbol not in _subscribed:
+        return None
+    e = _book.get(symbol)
+    if e is None or not e.stream_seen or e.day_volume is None:
+        return None
+    max_age = MARKET_STREAM_MAX_AGE_SEC if max_age is None else max_age
+    if time.time() - e.updated_at > max_age:
+        return None
+    return e.day_volume
+
+
+def add_tick_listener(fn) -> None:
+    """fn(symbol, price) 在每笔成交/报价推送后调用（stream 线程里，必须很快返回）。"""
+    if fn not in _tick_listeners:
+        _tick_listeners.append(fn)
+
+
+def remove_tick_listener(fn) -> None:
+    try:
+        _tick_listeners.remove(fn)
+    except ValueError:
+        pass
+
+
+def _notify(symbol: str, price):
+    if price is None:
+        return
+    for fn in list(_tick_listeners):
+        try:
+            fn(symbol, price)
+        except Exception as e:
+            print(f"[STREAM] tick listener error {symbol}: {e}", flush=True)
+
+
+def handle_message(msg: dict) -> None:
+    """处理一条推送（T=t 成交 / q 报价 / d 当日日线）。"""
+    kind = msg.get("T")
+    symbol = (msg.get("S") or "").strip().upper()
+    if not symbol:
+        return
+    now = time.time()
+    day = session_day(msg.get("t"))
+    if kind == "t":
+        price = _f(msg.get("p"))
+        if price is None or price <= 0:
+            return
+        size = _f(msg.get("s"))
+
+        def _trade(e):
+            # e 已经按 day 清过当日字段：新的一天第一笔不会接着用昨天的高低 / 累计量
+            return dict(
+                day_high=max(e.day_high, price) if e.day_high is not None else None,
+                day_low=min(e.day_low, price) if e.day_low is not None else None,
+                # 只在已有日线基数时累加，否则会把半天的量当成全天
+                day_volume=e.day_volume + size if e.day_volume is not None and size else e.day_volume,
+            )
+
+        _update(symbol, day=day, merge=_trade, last_price=price, updated_at=now, stream_seen=True)
+        _notify(symbol, price)
+    elif kind == "q":
+        bid = _f(msg.get("bp"))
+        ask = _f(msg.get("ap"))
+        e = _update(symbol, day=day, bid=bid, ask=ask, updated_at=now, stream_seen=True)
+        if e.last_price is None and bid and ask:
+            _notify(symbol, (bid + ask) / 2.0)
+    elif kind == "d":
+        _update(
+            symbol,
+            day=day,
+            day_open=_f(msg.get("o")),
+            day_high=_f(msg.get("h")),
+            day_low=_f(msg.get("l")),
+            day_volume=_f(msg.get("v")),
+            merge=lambda e: {"last_price": _f(msg.get("c")) or e.last_price},
+            updated_at=now,
+            stream_seen=True,
+        )
+    elif kind == "error":
+        print(f"[STREAM] error code={msg.get('code')} msg={msg.get('msg')}", flush=True)
+
+
+# =========================
+# 订阅集合
+# =========================
+def set_symbols(symbols) -> bool:
+    """设置想要订阅的股票；集合有变化返回 True，stream 线程会在下一次循环补发订阅。"""
+    global _wanted
+    new = frozenset((s or "").strip().upper() for s in (symbols or []) if (s or "").strip())
+    if new == _wanted:
+        return False
+    _wanted = new
+    return True
+
+
+def wanted_symbols() -> frozenset:
+    return _wanted
+
+
+def sync_from_db(conn) -> bool:
+    """按 stock_operations 重新计算订阅集合：can_buy=1 或 is_bought=1。"""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT DISTINCT stock_code
+            FROM `{OPS_TABLE}`
+            WHERE can_buy=1 OR is_bought=1
+            """
+        )
+        rows = cur.fetchall() or []
+    codes = [r["stock_code"] if isinstance(r, dict) else r[0] for r in rows]
+    changed = set_symbols(codes)
+    if changed:
+        print(f"[STREAM] resync symbols n={len(_wanted)}", flush=True)
+    return changed
+
+
+# =========================
+# websocket 线程
+# =========================
+def _credentials():
+    key = os.getenv("APCA_API_KEY_ID", "") or os.getenv("ALPACA_KEY", "")
+    secret = os.getenv("APCA_API_SECRET_KEY", "") or os.getenv("ALPACA_SECRET", "")
+    return key, secret
+
+
+def _send_subscription_diff(ws):
+    global _subscribed
+    wanted = _wanted
+    add = sorted(wanted - _subscribed)
+    drop = sorted(_subscribed - wanted)
+    if drop:
+        ws.send(json.dumps({"action": "unsubscribe", "trades": drop, "quotes": drop, "dailyBars": drop}))
+    if add:
+        ws.send(json.dumps({"action": "subscribe", "trades": add, "quotes": add, "dailyBars": add}))
+    _subscribed = wanted
+
+
+def _recv_batch(ws, timeout):
+    raw = ws.recv(timeout=timeout)
+    data = json.loads(raw)
+    return data if isinstance(data, list) else [data]
+
+
+def _run_once():
+    global _live, _subscribed
+    from websockets.sync.client import connect
+
+    key, secret = _credentials()
+    with connect(MARKET_STREAM_URL, open_timeout=10, close_timeout=2) as ws:
+        _recv_batch(ws, 10)  # connected
+        ws.send(json.dumps({"action": "auth", "key": key, "secret": secret}))
+        for m in _recv_batch(ws, 10):
+            if m.get("T") == "error":
+                raise RuntimeError(f"stream auth failed: {m.get('code')} {m.get('msg')}")
+        _subscribed = frozenset()
+        _live = True
+        print(f"[STREAM] connected url={MARKET_STREAM_URL}", flush=True)
+        try:
+            while not _stop_event.is_set():
+                if _wanted != _subscribed:
+                    _send_subscription_diff(ws)
+                try:
+                    batch = _recv_batch(ws, 1.0)
+                except TimeoutError:
+                    continue
+                for m in batch:
+                    if isinstance(m, dict):
+                        handle_message(m)
+        finally:
+            _live = False
+            _subscribed = frozenset()
+
+
+def _loop():
+    backoff = MARKET_STREAM_RECONNECT_MIN
+    while not _stop_event.is_set():
+        started = time.time()
+        try:
+            _run_once()
+        except Exception as e:
+            print(f"[STREAM] disconnected: {e}", flush=True)
+        if _stop_event.is_set():
+            break
+        if time.time() - started > 60:
+            backoff = MARKET_STREAM_RECONNECT_MIN
+        _stop_event.wait(backoff + random.uniform(0, 0.5))
+        backoff = min(backoff * 2, MARKET_STREAM_RECONNECT_MAX)
+
+
+def start() -> bool:
+    """启动后台订阅线程（幂等）。关闭开关或缺 key 时不启动，全部走 REST。"""
+    global _thread
+    if not MARKET_STREAM_ENABLED:
+        return False
+    if _thread is not None and _thread.is_alive():
+        return True
+    key, secret = _credentials()
+    if not (key and secret) and MARKET_STREAM_URL.startswith("wss://stream.data.alpaca.markets"):
+        print("[STREAM] Alpaca key missing, stream disabled", flush=True)
+        return False
+    _stop_event.clear()
+    _thread = threading.Thread(target=_loop, name="market-stream", daemon=True)
+    _thread.start()
+    return True
+
+
+def stop(timeout: float = 3.0) -> None:
+    global _thread
+    _stop_event.set()
+    if _thread is not None:
+        _thread.join(timeout)
+    _thread = None
+
+
+def is_live() -> bool:
+    return _live
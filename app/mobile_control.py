@@ -25,6 +25,12 @@ from urllib.parse import parse_qs, quote, urlparse
 
 import pymysql
 
+try:
+    from app import rate_limiter, schema_registry
+except ImportError:  # docker 里直接 python app/mobile_control.py，app/ 本身在 sys.path 上
+    import rate_limiter  # type: ignore
+    import schema_registry  # type: ignore
+
 try:
     from zoneinfo import ZoneInfo
 except Exception:
@@ -206,7 +212,7 @@ def _get_trading_client():
 
     from alpaca.trading.client import TradingClient
 
-    _trading_client = TradingClient(key, secret, paper=(env != "live"))
+    _trading_client = rate_limiter.limit_client(TradingClient(key, secret, paper=(env != "live")))
     _trading_client_key = cache_key
     return _trading_client
 
@@ -429,6 +435,7 @@ def _esc(v) -> str:
     return html.escape("" if v is None else str(v))
 
 
+@schema_registry.once("bot_control")
 def _ensure_control(conn):
     sql = """
     CREATE TABLE IF NOT EXISTS bot_control (
@@ -448,6 +455,7 @@ def _ensure_control(conn):
         cur.execute("INSERT IGNORE INTO bot_control (id) VALUES (1);")
 
 
+@schema_registry.once(POSITION_CLOSE_TABLE)
 def _ensure_position_close_table(conn):
     """
     记录每天收盘前的券商持仓盈亏快照。
@@ -478,6 +486,7 @@ def _ensure_position_close_table(conn):
         cur.execute(sql)
 
 
+@schema_registry.once(PRICE_CATEGORY_TABLE)
 def _ensure_price_category_table(conn):
     sql = f"""
     CREATE TABLE IF NOT EXISTS `{PRICE_CATEGORY_TABLE}` (
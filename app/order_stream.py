@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+app/order_stream.py
+
+Alpaca trade_updates websocket + 进程内订单状态表，用来代替下单后的轮询确认。
+
+过去 _reconcile_fill / _reconcile_sell_fill / _reconcile_add_fill 和
+strategy_ac_t._submit_limit_and_wait 每 0.4s 调一次 get_order_by_id / get_open_position，
+一笔单最多等 4~12s，整轮机器人都卡在这里，还要占 REST 额度。
+
+- 后台线程连 paper-api / api.alpaca.markets/stream，listen trade_updates。
+- 每个订单一个不可变 OrderState，收到事件整体替换；读端不加锁。
+- watch(order_id) 返回 Future：订单进入终态（filled/canceled/expired/rejected...）时给结果；
+  先到的事件也会保存下来，下单后再 watch 也不会漏。
+- 断线时所有等待中的 Future 立即以 None 结束，调用方回退原来的 REST 轮询。
+- ORDER_STREAM_URL 可以指向本地假服务器，测试用。
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+
+ORDER_STREAM_ENABLED = int(os.getenv("ORDER_STREAM_ENABLED", "1"))
+_TRADE_ENV = (os.getenv("TRADE_ENV") or os.getenv("ALPACA_MODE") or "paper").strip().lower()
+ORDER_STREAM_URL = os.getenv(
+    "ORDER_STREAM_URL",
+    "wss://api.alpaca.markets/stream" if _TRADE_ENV == "live" else "wss://paper-api.alpaca.markets/stream",
+)
+ORDER_STREAM_RECONNECT_MIN = float(os.getenv("ORDER_STREAM_RECONNECT_MIN", "1"))
+ORDER_STREAM_RECONNECT_MAX = float(os.getenv("ORDER_STREAM_RECONNECT_MAX", "30"))
+# 订单状态在内存里保留多久（只为了“事件先到、watch 后到”的情况）
+ORDER_STREAM_KEEP_SEC = float(os.getenv("ORDER_STREAM_KEEP_SEC", "1800"))
+
+FINAL_STATUSES = frozenset({"filled", "canceled", "cancelled", "expired", "rejected", "done_for_day", "replaced"})
+
+
+@dataclass(frozen=True)
+class OrderState:
+    order_id: str
+    symbol: str = ""
+    side: str = ""
+    status: str = ""
+    event: str = ""
+    filled_qty: float = 0.0
+    filled_avg_price: float = 0.0
+    position_qty: float | None = None
+    updated_at: float = 0.0
+
+    @property
+    def is_final(self) -> bool:
+        return self.status in FINAL_STATUSES
+
+
+_orders: dict = {}  # order_id -> OrderState，只做整体替换
+_waiters: dict = {}  # order_id -> [Future]
+_lock = threading.Lock()
+_live = False
+_thread = None
+_stop_event = threading.Event()
+_updates = 0
+
+
+def _f(v, default=0.0):
+    try:
+        return float(v) if v is not None and str(v).strip() != "" else default
+    except Exception:
+        return default
+
+
+# =========================
+# 订单状态表
+# =========================
+def _prune(now: float) -> None:
+    cutoff = now - ORDER_STREAM_KEEP_SEC
+    for oid in [k for k, v in _orders.items() if v.updated_at < cutoff and k not in _waiters]:
+        _orders.pop(oid, None)
+
+
+def handle_message(msg: dict) -> None:
+    """处理一条 trade_updates 推送。"""
+    global _updates
+    if msg.get("stream") != "trade_updates":
+        return
+    data = msg.get("data") or {}
+    order = data.get("order") or {}
+    oid = str(order.get("id") or "")
+    if not oid:
+        return
+    now = time.time()
+    side = order.get("side")
+    state = OrderState(
+        order_id=oid,
+        symbol=str(order.get("symbol") or "").upper(),
+        side=str(getattr(side, "value", side) or "").lower(),
+        status=str(order.get("status") or "").lower(),
+        event=str(data.get("event") or "").lower(),
+        filled_qty=_f(order.get("filled_qty")),
+        filled_avg_price=_f(order.get("filled_avg_price")),
+        position_qty=_f(data.get("position_qty"), None),
+        updated_at=now,
+    )
+    with _lock:
+        _orders[oid] = state
+        done = _waiters.pop(oid, []) if state.is_final else []
+        _updates += 1
+        if _updates % 200 == 0:
+            _prune(now)
+    for fut in done:
+        if not fut.done():
+            fut.set_result(state)
+
+
+def get_order(order_id: str):
+    return _orders.get(str(order_id or ""))
+
+
+def watch(order_id: str) -> Future:
+    """
+    返回一个 Future：订单进入终态时 result() 是 OrderState；
+    订阅断线时是 None（调用方应回退 REST 轮询）。
+    """
+    oid = str(order_id or "")
+    fut = Future()
+    with _lock:
+        state = _orders.get(oid)
+        if state is not None and state.is_final:
+            fut.set_result(state)
+        elif not _live:
+            fut.set_result(None)
+        else:
+            _waiters.setdefault(oid, []).append(fut)
+    return fut
+
+
+def _unwatch(order_id: str, fut: Future) -> None:
+    with _lock:
+        lst = _waiters.get(order_id)
+        if lst and fut in lst:
+            lst.remove(fut)
+            if not lst:
+                _waiters.pop(order_id, None)
+
+
+def wait_final(order_id: str, timeout: float):
+    """
+    等订单终态，最多 timeout 秒。
+    - 返回终态 OrderState：直接用
+    - 返回非终态 OrderState：流在线但超时，调用方做一次 REST 查询收尾即可
+    - 返回 None：流不在线 / 中途断线，调用方走原来的轮询
+    """
+    oid = str(order_id or "")
+    if not oid or not _live:
+        return None
+    fut = watch(oid)
+    try:
+        return fut.result(timeout=max(float(timeout), 0.0))
+    except FutureTimeout:
+        _unwatch(oid, fut)
+        return _orders.get(oid) or OrderState(order_id=oid)
+
+
+def _release_waiters() -> None:
+    with _lock:
+        pending = [f for lst in _waiters.values() for f in lst]
+        _waiters.clear()
+    for fut in pending:
+        if not fut.done():
+            fut.set_result(None)
+
+
+# =========================
+# websocket 线程
+# =========================
+def _credentials():
+    key = os.getenv("APCA_API_KEY_ID", "") or os.getenv("ALPACA_KEY", "")
+    secret = os.getenv("APCA_API_SECRET_KEY", "") or os.getenv("ALPACA_SECRET", "")
+    return key, secret
+
+
+def _recv(ws, timeout):
+    # Alpaca 交易流发的是二进制帧，json.loads 两种都能吃
+    return json.loads(ws.recv(timeout=timeout))
+
+
+def _run_once():
+    global _live
+    from websockets.sync.client import connect
+
+    key, secret = _credentials()
+    with connect(ORDER_STREAM_URL, open_timeout=10, close_timeout=2) as ws:
+        ws.send(json.dumps({"action": "auth", "key": key, "secret": secret}))
+        auth = _recv(ws, 10)
+        status = str(((auth or {}).get("data") or {}).get("status") or "")
+        if status != "authorized":
+            raise RuntimeError(f"order stream auth failed: {auth}")
+        ws.send(json.dumps({"action": "listen", "data": {"streams": ["trade_updates"]}}))
+        _recv(ws, 10)  # listening
+        _live = True
+        print(f"[ORDER STREAM] connected url={ORDER_STREAM_URL}", flush=True)
+        try:
+            while not _stop_event.is_set():
+                try:
+                    msg = _recv(ws, 1.0)
+                except TimeoutError:
+                    continue
+                if isinstance(msg, dict):
+                    handle_message(msg)
+        finally:
+            _live = False
+            _release_waiters()
+
+
+def _loop():
+    backoff = ORDER_STREAM_RECONNECT_MIN
+    while not _stop_event.is_set():
+        started = time.time()
+        try:
+            _run_once()
+        except Exception as e:
+            print(f"[ORDER STREAM] disconnected: {e}", flush=True)
+        if _stop_event.is_set():
+            break
+        if time.time() - started > 60:
+            backoff = ORDER_STREAM_RECONNECT_MIN
+        _stop_event.wait(backoff + random.uniform(0, 0.5))
+        backoff = min(backoff * 2, ORDER_STREAM_RECONNECT_MAX)
+
+
+def start() -> bool:
+    """启动后台订阅线程（幂等）。关闭开关或缺 key 时不启动，全部走 REST 轮询。"""
+    global _thread
+    if not ORDER_STREAM_ENABLED:
+        return False
+    if _thread is not None and _thread.is_alive():
+        return True
+    key, secret = _credentials()
+    if not (key and secret) and ORDER_STREAM_URL.startswith("wss://") and "alpaca.markets" in ORDER_STREAM_URL:
+        print("[ORDER STREAM] Alpaca key missing, stream disabled", flush=True)
+        return False
+    _stop_event.clear()
+    _thread = threading.Thread(target=_loop, name="order-stream", daemon=True)
+    _thread.start()
+    return True
+
+
+def stop(timeout: float = 3.0) -> None:
+    global _thread
+    _stop_event.set()
+    if _thread is not None:
+        _thread.join(timeout)
+    _thread = None
+
+
+def is_live() -> bool:
+    return _live
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+app/price_cache.py
+
+stock_prices_pool 的本地列式缓存（研究脚本用）。
+
+回测 / 选股 / 分类刷新 / strategy_b_levels 这些脚本每次都从 MySQL 全表扫同一段
+日线。这里把日线按年分区存成每列一个 .npy：
+
+    {PRICE_CACHE_DIR}/
+        meta.json             max_date / 每年行数
+        symbols.json          symbol 字典（只追加，下标 = symbol_id）
+        2026/date.npy         datetime64[D]
+        2026/symbol_id.npy    int32
+        2026/open.npy ...     float64（和 MySQL DOUBLE 一样，不丢精度）
+
+- 每年内按 (date, symbol_id) 排序：日期区间就是一段连续行，np.load(mmap_mode="r")
+  之后 searchsorted 切片即可，不拷贝；再按股票过滤才会生成副本。
+- refresh(conn) 从缓存里的 max_date 开始增量拉取（最后一天重拉，盘中写了一半的也能补齐），
+  只重写受影响的年份目录。max_date 之前的日期不会再看：getdata 增量模式（INCREMENTAL=1）
+  补上的历史缺口、被修正的历史日线，要用 refresh(conn, since=缺口起始日) / --since 重拉
+  那一段，或者 --full 全量重建。
+- 写入有文件锁，年份目录先写临时目录再换名，读端最多看到旧的一份；symbols.json 只追加，
+  总是在年份目录之前写，读端不会看到引用了未知 symbol_id 的年份数据。
+
+脚本侧：PRICE_CACHE_ENABLED=1 时从缓存读，ensure_fresh(conn) 先用一条
+MAX(date) 查询判断要不要增量刷新。
+
+手动刷新：python -m app.price_cache refresh [--full | --since 2026-03-01]
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+PRICE_CACHE_ENABLED = int(os.getenv("PRICE_CACHE_ENABLED", "0"))
+PRICE_CACHE_DIR = os.getenv(
+    "PRICE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "price_cache"),
+)
+PRICES_TABLE = os.getenv("PRICES_TABLE", "stock_prices_pool")
+# 增量刷新时一次从 MySQL 取多少行
+PRICE_CACHE_FETCH_BATCH = int(os.getenv("PRICE_CACHE_FETCH_BATCH", "200000"))
+
+PRICE_COLUMNS = ("open", "high", "low", "close", "volume")
+ALL_COLUMNS = ("date", "symbol_id") + PRICE_COLUMNS
+
+_mmaps: dict = {}  # (列文件路径, mtime) -> memmap
+
+
+def enabled() -> bool:
+    return bool(PRICE_CACHE_ENABLED)
+
+
+# =========================
+# 元数据
+# =========================
+def _path(*parts) -> str:
+    return os.path.join(PRICE_CACHE_DIR, *parts)
+
+
+def _read_json(name: str, default):
+    try:
+        with open(_path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def _write_json(name: str, obj) -> None:
+    tmp = _path(f".{name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp, _path(name))
+
+
+def read_meta() -> dict:
+    return _read_json("meta.json", {"max_date": None, "years": {}})
+
+
+def symbols() -> list:
+    return _read_json("symbols.json", [])
+
+
+def max_date():
+    d = read_meta().get("max_date")
+    return date.fromisoformat(d) if d else None
+
+
+@contextmanager
+def _write_lock():
+    os.makedirs(PRICE_CACHE_DIR, exist_ok=True)
+    with open(_path(".lock"), "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# =========================
+# 读
+# =========================
+def _year_dir(year: int) -> str:
+    return _path(str(year))
+
+
+def _column(year: int, name: str) -> np.ndarray:
+    """返回只读 memmap；年份目录被替换后 mtime 变化会重新打开。"""
+    p = os.path.join(_year_dir(year), f"{name}.npy")
+    key = (p, os.stat(p).st_mtime_ns)
+    arr = _mmaps.get(key)
+    if arr is None:
+        for k in [k for k in _mmaps if k[0] == p]:
+            _mmaps.pop(k, None)
+        arr = np.load(p, mmap_mode="r")
+        _mmaps[key] = arr
+    return arr
+
+
+def _years_between(start, end) -> list:
+    meta = read_meta()
+    years = sorted(int(y) for y in meta.get("years", {}))
+    if start is not None:
+        years = [y for y in years if y >= start.year]
+    if end is not None:
+        years = [y for y in years if y <= end.year]
+    return years
+
+
+def _as_date(v):
+    if v is None or isinstance(v, date):
+        return v
+    return pd.to_datetime(v).date()
+
+
+def load_arrays(start=None, end=None, symbols_filter=None, columns=PRICE_COLUMNS) -> dict:
+    """
+    按日期区间（含两端）取列；返回 {"date", "symbol_id", 各列} -> ndarray。
+
+    不按股票过滤、且区间落在一个年份内时，返回的是 memmap 的切片（零拷贝）；
+    跨年会拼接，按股票过滤会按掩码取副本。
+    """
+    start, end = _as_date(start), _as_date(end)
+    want = ("date", "symbol_id") + tuple(c for c in columns if c not in ("date", "symbol_id"))
+    ids = None
+    if symbols_filter is not None:
+        pos = {s: i for i, s in enumerate(symbols())}
+        ids = np.array(
+            sorted({pos[s] for s in (str(x).strip().upper() for x in symbols_filter) if s in pos}),
+            dtype=np.int32,
+        )
+
+    parts = {c: [] for c in want}
+    for year in _years_between(start, end):
+        d = _column(year, "date")
+        lo = 0 if start is None else int(np.searchsorted(d, np.datetime64(start, "D"), side="left"))
+        hi = len(d) if end is None else int(np.searchsorted(d, np.datetime64(end, "D"), side="right"))
+        if hi <= lo:
+            continue
+        mask = None
+        if ids is not None:
+            mask = np.isin(_column(year, "symbol_id")[lo:hi], ids)
+        for c in want:
+            arr = _column(year, c)[lo:hi]
+            parts[c].append(arr if mask is None else arr[mask])
+
+    out = {}
+    for c in want:
+        chunks = parts[c]
+        if not chunks:
+            dtype = "datetime64[D]" if c == "date" else (np.int32 if c == "symbol_id" else np.float64)
+            out[c] = np.empty(0, dtype=dtype)
+        else:
+            out[c] = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+    return out
+
+
+def load_frame(start=None, end=None, symbols_filter=None, columns=PRICE_COLUMNS, sort_by_symbol=False) -> pd.DataFrame:
+    """
+    和脚本里 SELECT symbol, date, open, high, low, close, volume 的结果同形：
+    symbol 大写字符串，date 为 datetime.date。
+    """
+    arr = load_arrays(start, end, symbols_filter, columns)
+    names = np.array(symbols(), dtype=object)
+    df = pd.DataFrame({
+        "symbol": names[arr["symbol_id"]],
+        "date": arr["date"].astype(object),
+        **{c: arr[c] for c in columns if c not in ("date", "symbol_id")},
+    })
+    if sort_by_symbol and not df.empty:
+        df = df.sort_values(["symbol", "date"], kind="stable").reset_index(drop=True)
+    return df
+
+
+def load_records(start=None, end=None, dates=None, columns=PRICE_COLUMNS, date_key="trade_date", require=("close",)) -> list:
+    """
+    和脚本里 SELECT UPPER(symbol) AS symbol, DATE(`date`) AS trade_date, ... ORDER BY symbol, trade_date
+    的 fetchall() 同形（dict 列表）；dates 给定时只取这些交易日。
+    """
+    if dates:
+        dates = {_as_date(d) for d in dates}
+        start, end = min(dates), max(dates)
+    df = load_frame(start, end, columns=columns, sort_by_symbol=True)
+    if dates:
+        df = df[df["date"].isin(dates)]
+    if require:
+        df = df.dropna(subset=list(require))
+    return df.rename(columns={"date": date_key}).to_dict("records")
+
+
+def latest_dates(limit: int) -> list:
+    """缓存里最近 limit 个交易日（升序）。"""
+    out = []
+    for year in sorted(_years_between(None, None), reverse=True):
+        u = np.unique(_column(year, "date"))
+        out = list(u.astype(object)) + out
+        if len(out) >= limit:
+            break
+    return out[-limit:] if limit else out
+
+
+# =========================
+# 写
+# =========================
+def _fetch_since(conn, since):
+    sql = f"""
+    SELECT UPPER(symbol) AS symbol, DATE(`date`) AS d, `open`, high, low, `close`, volume
+    FROM `{PRICES_TABLE}`
+    WHERE symbol IS NOT NULL AND symbol <> '' AND `close` IS NOT NULL
+      {"AND `date` >= %s" if since is not None else ""}
+    """
+    args = (since,) if since is not None else None
+    frames = []
+    with conn.cursor() as cur:
+        cur.execute(sql, args)
+        while True:
+            rows = cur.fetchmany(PRICE_CACHE_FETCH_BATCH)
+            if not rows:
+                break
+            if isinstance(rows[0], dict):
+                frames.append(pd.DataFrame(list(rows)))
+            else:
+                frames.append(pd.DataFrame(list(rows), columns=["symbol", "d"] + list(PRICE_COLUMNS)))
+    if not frames:
+        return pd.DataFrame(columns=["symbol", "d"] + list(PRICE_COLUMNS))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _write_year(year: int, cols: dict) -> None:
+    final = _year_dir(year)
+    tmp = f"{final}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for c in ALL_COLUMNS:
+        np.save(os.path.join(tmp, f"{c}.npy"), cols[c])
+    old = f"{final}.old{os.getpid()}"
+    if os.path.isdir(final):
+        os.replace(final, old)
+    os.replace(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _read_year(year: int) -> dict:
+    if not os.path.isdir(_year_dir(year)):
+        return {}
+    return {c: np.load(os.path.join(_year_dir(year), f"{c}.npy")) for c in ALL_COLUMNS}
+
+
+def refresh(conn, full: bool = False, since=None) -> dict:
+    """
+    增量刷新：从缓存的 max_date（含）开始重拉；since 给定时从 since（含）开始重拉，
+    用于补历史缺口；full=True 全量重建。
+    返回 {"fetched": 行数, "years": [重写的年份], "max_date": ...}。
+    """
+    t0 = time.time()
+    with _write_lock():
+        meta = {"max_date": None, "years": {}} if full else read_meta()
+        if full:
+            since = None
+        elif since is not None:
+            since = _as_date(since)
+        elif meta.get("max_date"):
+            since = date.fromisoformat(meta["max_date"])
+        df = _fetch_since(conn, since)
+
+        if full:
+            for name in os.listdir(PRICE_CACHE_DIR):
+                if name.isdigit():
+                    shutil.rmtree(_path(name), ignore_errors=True)
+
+        if df.empty:
+            return {"fetched": 0, "years": [], "max_date": meta.get("max_date"), "sec": round(time.time() - t0, 2)}
+
+        # symbol 字典只追加（全量重建也保留原有下标），先于年份目录写：
+        # 读端拿到的任何年份数据引用的 id 都已经在 symbols.json 里
+        syms = symbols()
+        pos = {s: i for i, s in enumerate(syms)}
+        added = False
+        for s in df["symbol"].astype(str).unique():
+            if s not in pos:
+                pos[s] = len(syms)
+                syms.append(s)
+                added = True
+        if added:
+            _write_json("symbols.json", syms)
+
+        d = pd.to_datetime(df["d"], errors="coerce")
+        df = df.assign(d=d).dropna(subset=["d"])
+        new = {
+            "date": df["d"].to_numpy().astype("datetime64[D]"),
+            "symbol_id": df["symbol"].astype(str).map(pos).to_numpy().astype(np.int32),
+            **{c: pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64) for c in PRICE_COLUMNS},
+        }
+        new_years = new["date"].astype("datetime64[Y]").astype(int) + 1970
+
+        written = []
+        for year in sorted(set(new_years.tolist())):
+            sel = new_years == year
+            cols = {c: new[c][sel] for c in ALL_COLUMNS}
+            old = _read_year(year)
+            if old and since is not None:
+                keep = old["date"] < np.datetime64(since, "D")
+                cols = {c: np.concatenate([old[c][keep], cols[c]]) for c in ALL_COLUMNS}
+            order = np.lexsort((cols["symbol_id"], cols["date"]))
+            cols = {c: np.ascontiguousarray(cols[c][order]) for c in ALL_COLUMNS}
+            # 同一 (date, symbol) 重复时保留最后一条
+            if len(order) > 1:
+                dup = (cols["date"][1:] == cols["date"][:-1]) & (cols["symbol_id"][1:] == cols["symbol_id"][:-1])
+                if dup.any():
+                    keep_last = np.append(~dup, True)
+                    cols = {c: cols[c][keep_last] for c in ALL_COLUMNS}
+            _write_year(year, cols)
+            meta.setdefault("years", {})[str(year)] = int(len(cols["date"]))
+            written.append(year)
+
+        new_max = new["date"].max().astype(object)
+        if meta.get("max_date") and since is not None and date.fromisoformat(meta["max_date"]) > new_max:
+            new_max = date.fromisoformat(meta["max_date"])
+        meta["max_date"] = str(new_max)
+        meta["refreshed_at"] = time.time()
+        meta["table"] = PRICES_TABLE
+        _write_json("meta.json", meta)
+
+    return {"fetched": int(len(df)), "years": written, "max_date": meta["max_date"], "sec": round(time.time() - t0, 2)}
+
+
+def ensure_fresh(conn) -> bool:
+    """缓存落后于 MySQL 的最新交易日时增量刷新；返回是否刷新过。"""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT MAX(DATE(`date`)) AS d FROM `{PRICES_TABLE}`")
+        row = cur.fetchone()
+    db_max = (row.get("d") if isinstance(row, dict) else (row[0] if row else None)) if row else None
+    cached = max_date()
+    if db_max is None or (cached is not None and _as_date(db_max) <= cached):
+        return False
+    r = refresh(conn)
+    print(f"[PRICE_CACHE] refresh fetched={r['fetched']} years={r['years']} max_date={r['max_date']} sec={r['sec']}", flush=True)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="stock_prices_pool 本地列式缓存")
+    parser.add_argument("cmd", choices=["refresh", "info"])
+    parser.add_argument("--full", action="store_true", help="全量重建")
+    parser.add_argument("--since", default="", help="从这一天（含）开始重拉，补历史缺口用，例如 2026-03-01")
+    args = parser.parse_args()
+
+    if args.cmd == "info":
+        print(json.dumps({"dir": PRICE_CACHE_DIR, **read_meta(), "symbols": len(symbols())}, ensure_ascii=False, indent=2))
+        return
+
+    import pymysql
+
+    conn = pymysql.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=int(os.getenv("DB_PORT", "3306")),
+        user=os.getenv("DB_USER", "root"),
+        password=os.getenv("DB_PASS", ""),
+        database=os.getenv("DB_NAME", "cszy2000"),
+        charset="utf8mb4",
+        autocommit=True,
+        cursorclass=pymysql.cursors.SSDictCursor,
+    )
+    try:
+        print(json.dumps(refresh(conn, full=args.full, since=args.since.strip() or None), ensure_ascii=False))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
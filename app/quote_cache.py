@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+app/quote_cache.py
+
+跨进程共享行情缓存。
+
+b_buy_bot / b_sell_bot / f_* / quick_trade_bot / ac_bot 和网页看板都由同一个
+supervisor 拉起，过去各自维护进程内 _snapshot_cache，同一只股票会被每个进程
+各请求一次 Alpaca。这里用本机 SQLite（WAL 模式）做一张共享表：
+
+- quotes：每个字段一行，带独立的 ts，盘中流式行情只刷新 last_price/bid/ask
+  时，prev_close 仍按自己的时间判断新鲜度。
+- fetch_leases：single-flight 租约。某只股票过期时只有拿到租约的进程去请求，
+  其他进程短暂等待后直接读结果；租约过期或等待超时才自己兜底请求。
+
+任何 SQLite 异常都只打印日志并退回直接请求，不影响交易主流程。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+SHARED_QUOTE_CACHE_ENABLED = int(os.getenv("SHARED_QUOTE_CACHE_ENABLED", "1"))
+SHARED_QUOTE_CACHE_PATH = os.getenv(
+    "SHARED_QUOTE_CACHE_PATH",
+    os.path.join(
+        os.getenv("SHARED_CACHE_DIR", "/tmp"),
+        f"cszy_shared_quotes_{(os.getenv('TRADE_ENV') or os.getenv('ALPACA_MODE') or 'paper').strip().lower()}.sqlite3",
+    ),
+)
+# 租约最长持有时间；持有进程崩溃后其他进程最多等这么久就能接手。
+SHARED_QUOTE_LEASE_SEC = float(os.getenv("SHARED_QUOTE_LEASE_SEC", "5"))
+# 没拿到租约时最多等别人多久。
+SHARED_QUOTE_WAIT_SEC = float(os.getenv("SHARED_QUOTE_WAIT_SEC", "2"))
+SHARED_QUOTE_POLL_SEC = float(os.getenv("SHARED_QUOTE_POLL_SEC", "0.05"))
+# 昨收一天只变一次，允许比实时字段旧得多。
+SHARED_QUOTE_PREV_CLOSE_MAX_AGE = float(os.getenv("SHARED_QUOTE_PREV_CLOSE_MAX_AGE", "21600"))
+
+QUOTE_FIELDS = ("last_price", "bid", "ask", "day_open", "day_high", "prev_close")
+# 可选字段：有且新鲜就带上，缺了不影响命中（老进程写的报价没有这些字段）
+OPTIONAL_FIELDS = ("day_low", "day_volume")
+
+_local = threading.local()
+
+
+def _owner() -> str:
+    return f"{os.getpid()}:{threading.get_ident()}"
+
+
+def _field_max_age(field: str, max_age: float) -> float:
+    if field == "prev_close":
+        return max(float(max_age), SHARED_QUOTE_PREV_CLOSE_MAX_AGE)
+    return float(max_age)
+
+
+def _conn():
+    """每个线程一条 SQLite 连接；路径变化（测试切换）时自动重建。"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "path", None) == SHARED_QUOTE_CACHE_PATH:
+        return conn
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    parent = os.path.dirname(SHARED_QUOTE_CACHE_PATH)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    conn = sqlite3.connect(SHARED_QUOTE_CACHE_PATH, timeout=5, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS quotes (
+            symbol TEXT NOT NULL,
+            field TEXT NOT NULL,
+            value REAL NULL,
+            ts REAL NOT NULL,
+            source TEXT NULL,
+            PRIMARY KEY (symbol, field)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fetch_leases (
+            symbol TEXT NOT NULL PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """
+    )
+    _local.conn = conn
+    _local.path = SHARED_QUOTE_CACHE_PATH
+    return conn
+
+
+def _norm(symbols) -> list:
+    return sorted({(s or "").strip().upper() for s in (symbols or []) if (s or "").strip()})
+
+
+def get_many(symbols, max_age: float, now: float | None = None) -> dict:
+    """读取所有字段都还新鲜的报价，返回 {symbol: quote_dict}；任一字段过期就当作没有。"""
+    symbols = _norm(symbols)
+    if not symbols or not SHARED_QUOTE_CACHE_ENABLED:
+        return {}
+    now = time.time() if now is None else now
+    placeholders = ",".join(["?"] * len(symbols))
+    rows = _conn().execute(
+        f"SELECT symbol, field, value, ts, source FROM quotes WHERE symbol IN ({placeholders})",
+        tuple(symbols),
+    ).fetchall()
+
+    grouped = {}
+    for symbol, field, value, ts, source in rows:
+        grouped.setdefault(symbol, {})[field] = (value, float(ts), source)
+
+    out = {}
+    for symbol, fields in grouped.items():
+        if any(f not in fields for f in QUOTE_FIELDS):
+            continue
+        if any(now - fields[f][1] > _field_max_age(f, max_age) for f in QUOTE_FIELDS):
+            continue
+        quote = {f: fields[f][0] for f in QUOTE_FIELDS}
+        for f in OPTIONAL_FIELDS:
+            if f in fields and now - fields[f][1] <= _field_max_age(f, max_age):
+                quote[f] = fields[f][0]
+        quote["feed"] = fields["last_price"][2]
+        out[symbol] = quote
+    return out
+
+
+def get_quote(symbol: str, max_age: float) -> dict | None:
+    return get_many([symbol], max_age).get((symbol or "").strip().upper())
+
+
+def put_many(quotes: dict, ts: float | None = None) -> None:
+    """写入 {symbol: quote_dict}；只写 quote_dict 里出现的字段，各字段单独记时间。"""
+    if not quotes or not SHARED_QUOTE_CACHE_ENABLED:
+        return
+    ts = time.time() if ts is None else ts
+    args = []
+    for symbol, quote in quotes.items():
+        symbol = (symbol or "").strip().upper()
+        if not symbol or not quote:
+            continue
+        source = quote.get("feed")
+        for field in QUOTE_FIELDS + OPTIONAL_FIELDS:
+            if field in quote:
+                value = quote.get(field)
+                args.append((symbol, field, float(value) if value is not None else None, ts, source))
+    if not args:
+        return
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        conn.executemany(
+            """
+            INSERT INTO quotes (symbol, field, value, ts, source)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(symbol, field) DO UPDATE SET
+                value=excluded.value,
+                ts=excluded.ts,
+                source=excluded.source
+            """,
+            args,
+        )
+        conn.execute("COMMIT;")
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+
+
+def put_quote(symbol: str, quote: dict, ts: float | None = None) -> None:
+    put_many({symbol: quote}, ts=ts)
+
+
+def try_acquire(symbols, now: float | None = None) -> list:
+    """尝试为一批股票拿 fetch 租约，返回本进程拿到的股票列表。"""
+    symbols = _norm(symbols)
+    if not symbols:
+        return []
+    now = time.time() if now is None else now
+    owner = _owner()
+    placeholders = ",".join(["?"] * len(symbols))
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        held = {
+            symbol
+            for symbol, lease_owner, expires_at in conn.execute(
+                f"SELECT symbol, owner, expires_at FROM fetch_leases WHERE symbol IN ({placeholders})",
+                tuple(symbols),
+            ).fetchall()
+            if lease_owner != owner and float(expires_at) > now
+        }
+        acquired = [s for s in symbols if s not in held]
+        if acquired:
+            conn.executemany(
+                """
+                INSERT INTO fetch_leases (symbol, owner, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET owner=excluded.owner, expires_at=excluded.expires_at
+                """,
+                [(s, owner, now + SHARED_QUOTE_LEASE_SEC) for s in acquired],
+            )
+        conn.execute("COMMIT;")
+        return acquired
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+
+
+def release(symbols) -> None:
+    symbols = _norm(symbols)
+    if not symbols:
+        return
+    placeholders = ",".join(["?"] * len(symbols))
+    _conn().execute(
+        f"DELETE FROM fetch_leases WHERE owner=? AND symbol IN ({placeholders})",
+        (_owner(), *symbols),
+    )
+
+
+def get_or_fetch_many(symbols, fetch_many, max_age: float) -> dict:
+    """
+    共享缓存 + single-flight 的批量读取。
+
+    fetch_many(symbols) -> {symbol: quote_dict}，只会对本进程拿到租约的股票调用。
+    别的进程正在请求的股票，等待 SHARED_QUOTE_WAIT_SEC 读它的结果；仍拿不到再自己请求。
+    """
+    symbols = _norm(symbols)
+    if not symbols:
+        return {}
+    if not SHARED_QUOTE_CACHE_ENABLED:
+        return fetch_many(symbols) or {}
+
+    try:
+        out = get_many(symbols, max_age)
+        missing = [s for s in symbols if s not in out]
+        if not missing:
+            return out
+        acquired = try_acquire(missing)
+    except Exception as e:
+        print(f"[QUOTE CACHE] shared cache unavailable, fetch direct: {e}", flush=True)
+        return fetch_many(symbols) or {}
+
+    if acquired:
+        try:
+            fetched = fetch_many(acquired) or {}
+            out.update(fetched)
+            try:
+                put_many(fetched)
+            except Exception as e:
+                print(f"[QUOTE CACHE] write failed: {e}", flush=True)
+        finally:
+            try:
+                release(acquired)
+            except Exception:
+                pass
+
+    waiting = [s for s in missing if s not in acquired]
+    deadline = time.time() + max(SHARED_QUOTE_WAIT_SEC, 0.0)
+    while waiting and time.time() < deadline:
+        time.sleep(SHARED_QUOTE_POLL_SEC)
+        try:
+            got = get_many(waiting, max_age)
+        except Exception:
+            break
+        out.update(got)
+        waiting = [s for s in waiting if s not in got]
+
+    if waiting:
+        # 持有租约的进程没写回结果（失败或超时），自己兜底请求。
+        fetched = fetch_many(waiting) or {}
+        out.update(fetched)
+        try:
+            put_many(fetched)
+        except Exception:
+            pass
+    return out
+
+
+def get_or_fetch(symbol: str, fetch_one, max_age: float) -> dict:
+    """单只版本；fetch_one(symbol) 失败时把异常原样抛给调用方。"""
+    symbol = (symbol or "").strip().upper()
+    errors = []
+
+    def _fetch_many(codes):
+        out = {}
+        for code in codes:
+            try:
+                out[code] = fetch_one(code)
+            except Exception as e:
+                errors.append(e)
+        return out
+
+    quote = get_or_fetch_many([symbol], _fetch_many, max_age).get(symbol)
+    if quote is None:
+        if errors:
+            raise errors[-1]
+        raise RuntimeError(f"shared quote unavailable: {symbol}")
+    return quote
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+app/rate_limiter.py
+
+所有 Alpaca REST 调用共用的令牌桶限速。
+
+过去只有 strategy_b 的 snapshot 请求按 SNAPSHOT_MIN_INTERVAL 在进程内排队，
+TradingClient 的下单 / 查单 / 查账户完全不限速，几个机器人同时跑时很容易 429。
+这里按接口类别分三个桶，桶的状态放在本机 SQLite（和 quote_cache 一样的 WAL 用法），
+supervisor 拉起的所有进程共用一份额度：
+
+- data：行情（snapshot / bars / latest trade）
+- orders：下单、撤单、查订单
+- account：账户、持仓
+
+优先级通道（lane）：
+- high：卖出 / 止损检查，可以把桶用到 0
+- normal：默认
+- low：买入打分、看板刷新，必须给上面的通道留出 RATE_LIMIT_RESERVE_* 个令牌
+低优先级的请求再多也只能吃掉预留线以上的令牌，卖单永远有额度可用。
+
+任何 SQLite 异常都退回进程内的同样算法，不影响交易主流程；
+等待超过 RATE_LIMIT_MAX_WAIT_SEC 也直接放行，只记一次 timeout。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+RATE_LIMIT_SHARED = int(os.getenv("RATE_LIMIT_SHARED", "1"))
+RATE_LIMIT_PATH = os.getenv(
+    "RATE_LIMIT_PATH",
+    os.path.join(
+        os.getenv("SHARED_CACHE_DIR", "/tmp"),
+        f"cszy_rate_limit_{(os.getenv('TRADE_ENV') or os.getenv('ALPACA_MODE') or 'paper').strip().lower()}.sqlite3",
+    ),
+)
+RATE_LIMIT_MAX_WAIT_SEC = float(os.getenv("RATE_LIMIT_MAX_WAIT_SEC", "15"))
+# 低优先级每次最多睡这么久再重试，期间高优先级可以插队
+RATE_LIMIT_POLL_MAX_SEC = float(os.getenv("RATE_LIMIT_POLL_MAX_SEC", "0.25"))
+RATE_LIMIT_STATS_FLUSH_SEC = float(os.getenv("RATE_LIMIT_STATS_FLUSH_SEC", "5"))
+
+LANES = ("high", "normal", "low")
+# normal 至少给 high 留几个令牌；low 再额外给 normal 留几个
+RATE_LIMIT_RESERVE_HIGH = float(os.getenv("RATE_LIMIT_RESERVE_HIGH", "3"))
+RATE_LIMIT_RESERVE_NORMAL = float(os.getenv("RATE_LIMIT_RESERVE_NORMAL", "2"))
+
+
+@dataclass(frozen=True)
+class Bucket:
+    name: str
+    per_min: float
+    burst: float
+
+    @property
+    def rate(self) -> float:
+        return max(self.per_min, 0.001) / 60.0
+
+
+def _bucket_from_env(name: str, per_min: float, burst: float) -> Bucket:
+    prefix = f"RATE_LIMIT_{name.upper()}"
+    return Bucket(
+        name=name,
+        per_min=float(os.getenv(f"{prefix}_PER_MIN", str(per_min))),
+        burst=float(os.getenv(f"{prefix}_BURST", str(burst))),
+    )
+
+
+# 行情默认沿用原来的 B_SNAPSHOT_MIN_INTERVAL 节奏；下单 + 账户合计留在 Alpaca 200 次/分钟以内
+BUCKETS = {
+    b.name: b
+    for b in (
+        _bucket_from_env("data", 60.0 / float(os.getenv("B_SNAPSHOT_MIN_INTERVAL", "0.35")), 6),
+        _bucket_from_env("orders", 110, 10),
+        _bucket_from_env("account", 70, 6),
+    )
+}
+
+_local = threading.local()
+_mem_lock = threading.Lock()
+_mem_buckets = {}  # name -> [tokens, updated_at]，SQLite 不可用时的进程内兜底
+_stats_lock = threading.Lock()
+_stats = {}  # (bucket, lane) -> [calls, waited_sec, max_wait_sec, timeouts]
+_stats_flushed_at = 0.0
+
+
+# ============================================================
+# 优先级通道
+# ============================================================
+def current_lane() -> str:
+    return getattr(_local, "lane", None) or "normal"
+
+
+@contextmanager
+def lane(name: str):
+    """with rate_limiter.lane("high"): 块内本线程的 Alpaca 请求都走这个通道。"""
+    name = name if name in LANES else "normal"
+    prev = getattr(_local, "lane", None)
+    _local.lane = name
+    try:
+        yield
+    finally:
+        _local.lane = prev
+
+
+def _floor(bucket: Bucket, lane_name: str, cost: float) -> float:
+    if lane_name == "high":
+        reserve = 0.0
+    elif lane_name == "low":
+        reserve = RATE_LIMIT_RESERVE_HIGH + RATE_LIMIT_RESERVE_NORMAL
+    else:
+        reserve = RATE_LIMIT_RESERVE_HIGH
+    # 桶很小时也要保证桶满的情况下每个通道都能拿到
+    return max(0.0, min(reserve, bucket.burst - cost))
+
+
+def _refill(bucket: Bucket, tokens: float, updated_at: float, now: float) -> float:
+    return min(bucket.burst, tokens + max(now - updated_at, 0.0) * bucket.rate)
+
+
+def _take(bucket: Bucket, lane_name: str, cost: float, tokens: float) -> tuple:
+    """返回 (拿到没有, 剩余令牌, 还要等多久)。"""
+    floor = _floor(bucket, lane_name, cost)
+    if tokens - cost >= floor:
+        return True, tokens - cost, 0.0
+    return False, tokens, (floor + cost - tokens) / bucket.rate
+
+
+# ============================================================
+# 存储
+# ============================================================
+def _conn():
+    """每个线程一条 SQLite 连接；路径变化（测试切换）时自动重建。"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "path", None) == RATE_LIMIT_PATH:
+        return conn
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    parent = os.path.dirname(RATE_LIMIT_PATH)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    conn = sqlite3.connect(RATE_LIMIT_PATH, timeout=5, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS buckets (
+            name TEXT NOT NULL PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS lane_stats (
+            bucket TEXT NOT NULL,
+            lane TEXT NOT NULL,
+            calls INTEGER NOT NULL DEFAULT 0,
+            waited_sec REAL NOT NULL DEFAULT 0,
+            max_wait_sec REAL NOT NULL DEFAULT 0,
+            timeouts INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (bucket, lane)
+        )
+        """
+    )
+    _local.conn = conn
+    _local.path = RATE_LIMIT_PATH
+    return conn
+
+
+def _try_shared(bucket: Bucket, lane_name: str, cost: float, now: float) -> tuple:
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name=?", (bucket.name,)).fetchone()
+        tokens = bucket.burst if row is None else _refill(bucket, float(row[0]), float(row[1]), now)
+        ok, left, wait = _take(bucket, lane_name, cost, tokens)
+        conn.execute(
+            """
+            INSERT INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET tokens=excluded.tokens, updated_at=excluded.updated_at
+            """,
+            (bucket.name, left, now),
+        )
+        conn.execute("COMMIT;")
+        return ok, wait
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+
+
+def _try_local(bucket: Bucket, lane_name: str, cost: float, now: float) -> tuple:
+    with _mem_lock:
+        tokens, updated_at = _mem_buckets.get(bucket.name, (bucket.burst, now))
+        tokens = _refill(bucket, tokens, updated_at, now)
+        ok, left, wait = _take(bucket, lane_name, cost, tokens)
+        _mem_buckets[bucket.name] = (left, now)
+        return ok, wait
+
+
+# ============================================================
+# 对外接口
+# ============================================================
+def acquire(bucket_name: str, lane_name: str | None = None, cost: float = 1.0) -> float:
+    """
+    从 bucket_name 拿 cost 个令牌，拿不到就睡到够为止；返回实际等待秒数。
+    lane_name 不传时用当前线程的通道（见 lane()）。
+    """
+    bucket = BUCKETS.get(bucket_name)
+    if bucket is None:
+        return 0.0
+    lane_name = lane_name if lane_name in LANES else current_lane()
+    t0 = time.time()
+    deadline = t0 + max(RATE_LIMIT_MAX_WAIT_SEC, 0.0)
+    timed_out = False
+
+    while True:
+        now = time.time()
+        ok = False
+        wait = 0.0
+        if RATE_LIMIT_SHARED:
+            try:
+                ok, wait = _try_shared(bucket, lane_name, cost, now)
+            except Exception as e:
+                print(f"[RATE LIMIT] shared bucket unavailable, use local: {e}", flush=True)
+                ok, wait = _try_local(bucket, lane_name, cost, now)
+        else:
+            ok, wait = _try_local(bucket, lane_name, cost, now)
+        if ok:
+            break
+        if now + wait > deadline:
+            timed_out = True
+            print(
+                f"[RATE LIMIT] {bucket.name}/{lane_name} waited {now - t0:.2f}s, let through",
+                flush=True,
+            )
+            break
+        if lane_name != "high":
+            wait = min(wait, RATE_LIMIT_POLL_MAX_SEC)
+        time.sleep(max(wait, 0.001))
+
+    waited = time.time() - t0
+    _record(bucket.name, lane_name, waited, timed_out)
+    return waited
+
+
+def _record(bucket_name: str, lane_name: str, waited: float, timed_out: bool) -> None:
+    global _stats_flushed_at
+    with _stats_lock:
+        s = _stats.setdefault((bucket_name, lane_name), [0, 0.0, 0.0, 0])
+        s[0] += 1
+        s[1] += waited
+        s[2] = max(s[2], waited)
+        s[3] += 1 if timed_out else 0
+        now = time.time()
+        if now - _stats_flushed_at < RATE_LIMIT_STATS_FLUSH_SEC:
+            return
+        _stats_flushed_at = now
+        pending = {k: list(v) for k, v in _stats.items()}
+        _stats.clear()
+    if RATE_LIMIT_SHARED:
+        try:
+            _flush_stats(pending, now)
+        except Exception:
+            pass
+
+
+def _flush_stats(pending: dict, now: float) -> None:
+    args = [(b, l, v[0], v[1], v[2], v[3], now) for (b, l), v in pending.items()]
+    if not args:
+        return
+    _conn().executemany(
+        """
+        INSERT INTO lane_stats (bucket, lane, calls, waited_sec, max_wait_sec, timeouts, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(bucket, lane) DO UPDATE SET
+            calls=calls + excluded.calls,
+            waited_sec=waited_sec + excluded.waited_sec,
+            max_wait_sec=MAX(max_wait_sec, excluded.max_wait_sec),
+            timeouts=timeouts + excluded.timeouts,
+            updated_at=excluded.updated_at
+        """,
+        args,
+    )
+
+
+def metrics() -> dict:
+    """
+    看板用：各桶当前令牌数 + 各通道累计等待。
+    共享模式读 SQLite（所有进程合计），否则只有本进程。
+    """
+    now = time.time()
+    levels = {}
+    lanes = {}
+    if RATE_LIMIT_SHARED:
+        try:
+            conn = _conn()
+            for name, tokens, updated_at in conn.execute("SELECT name, tokens, updated_at FROM buckets").fetchall():
+                levels[name] = (float(tokens), float(updated_at))
+            for b, l, calls, waited, max_wait, timeouts in conn.execute(
+                "SELECT bucket, lane, calls, waited_sec, max_wait_sec, timeouts FROM lane_stats"
+            ).fetchall():
+                lanes[(b, l)] = [int(calls), float(waited), float(max_wait), int(timeouts)]
+        except Exception as e:
+            print(f"[RATE LIMIT] metrics read failed: {e}", flush=True)
+    else:
+        with _mem_lock:
+            levels = dict(_mem_buckets)
+    with _stats_lock:
+        for key, v in _stats.items():
+            agg = lanes.setdefault(key, [0, 0.0, 0.0, 0])
+            agg[0] += v[0]
+            agg[1] += v[1]
+            agg[2] = max(agg[2], v[2])
+            agg[3] += v[3]
+
+    buckets = []
+    for name, bucket in BUCKETS.items():
+        tokens, updated_at = levels.get(name, (bucket.burst, now))
+        buckets.append({
+            "bucket": name,
+            "tokens": round(_refill(bucket, tokens, updated_at, now), 3),
+            "burst": bucket.burst,
+            "per_min": round(bucket.per_min, 2),
+        })
+    lane_rows = [
+        {
+            "bucket": b,
+            "lane": l,
+            "calls": v[0],
+            "avg_wait_ms": round(v[1] / v[0] * 1000, 2) if v[0] else 0.0,
+            "max_wait_ms": round(v[2] * 1000, 2),
+            "timeouts": v[3],
+        }
+        for (b, l), v in sorted(lanes.items())
+    ]
+    return {"shared": bool(RATE_LIMIT_SHARED), "buckets": buckets, "lanes": lane_rows}
+
+
+# ============================================================
+# TradingClient 包装
+# ============================================================
+def _order_side(args, kwargs) -> str:
+    order_data = kwargs.get("order_data") if "order_data" in kwargs else (args[0] if args else None)
+    side = getattr(order_data, "side", "")
+    return str(getattr(side, "value", side) or "").lower()
+
+
+class LimitedClient:
+    """
+    透明代理 alpaca TradingClient / StockHistoricalDataClient：每次调用前先拿令牌。
+    方法名带 order 的进 orders 桶，其余进 account_bucket；卖单自动走 high 通道。
+    """
+
+    def __init__(self, client, account_bucket: str = "account"):
+        self._client = client
+        self._account_bucket = account_bucket
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        bucket_name = "orders" if "order" in name else self._account_bucket
+
+        def call(*args, **kwargs):
+            lane_name = None
+            if name == "submit_order" and _order_side(args, kwargs) == "sell":
+                lane_name = "high"
+            acquire(bucket_name, lane_name)
+            return attr(*args, **kwargs)
+
+        return call
+
+
+def limit_client(client, account_bucket: str = "account"):
+    if client is None or isinstance(client, LimitedClient):
+        return client
+    return LimitedClient(client, account_bucket=account_bucket)
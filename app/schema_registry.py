@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+app/schema_registry.py
+
+进程内的建表 / 补字段登记表。
+
+过去每个 _ensure_xxx_table 都挂在热路径上：B 每轮打分跑两次 CREATE TABLE IF NOT EXISTS，
+F 每次扫描跑两次，runtime_core 每个循环跑一次 bot_control，看板每个请求跑一次 stock_quote_cache。
+这些 DDL 本身是空操作，但每次都要和 MySQL 往返一趟，还要拿表的元数据锁，
+碰上别的连接在做长事务 / ALTER 时会被一起卡住。
+
+用法：
+
+    @schema_registry.once(B_SCORE_TABLE)
+    def _ensure_b_score_table(conn):
+        ...
+
+同一个 key 在进程内只成功执行一次，之后直接返回。
+- 执行抛异常不记账，下次调用还会重试；
+- 每个 key 一把锁，多线程同时首次调用只有一个真正去跑 DDL；
+- 表被手工删掉 / 重建时调用 forget() 让下次重新检查；
+- SCHEMA_ONCE_ENABLED=0 退回每次都执行的旧行为。
+"""
+
+import os
+import threading
+from functools import wraps
+
+SCHEMA_ONCE_ENABLED = int(os.getenv("SCHEMA_ONCE_ENABLED", "1"))
+
+_lock = threading.Lock()
+_key_locks: dict = {}  # key -> threading.Lock
+_verified: set = set()
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _lock:
+        lock = _key_locks.get(key)
+        if lock is None:
+            lock = _key_locks[key] = threading.Lock()
+        return lock
+
+
+def ensure(key: str, fn, *args, **kwargs) -> bool:
+    """key 还没登记时执行 fn(*args, **kwargs) 并登记；真正执行了返回 True。"""
+    if not SCHEMA_ONCE_ENABLED:
+        fn(*args, **kwargs)
+        return True
+    if key in _verified:
+        return False
+    with _lock_for(key):
+        if key in _verified:
+            return False
+        fn(*args, **kwargs)
+        _verified.add(key)
+    return True
+
+
+def once(key: str):
+    """装饰器版 ensure：被装饰的建表函数在进程内只成功执行一次。"""
+
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            ensure(key, fn, *args, **kwargs)
+
+        wrapper.schema_key = key
+        return wrapper
+
+    return deco
+
+
+def is_verified(key: str) -> bool:
+    return key in _verified
+
+
+def verified() -> list[str]:
+    return sorted(_verified)
+
+
+def forget(key: str | None = None) -> None:
+    """清掉某个 key（不传则全部），下次调用重新执行 DDL。"""
+    with _lock:
+        if key is None:
+            _verified.clear()
+        else:
+            _verified.discard(key)
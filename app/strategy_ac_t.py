@@ -20,6 +20,7 @@ from decimal import Decimal, ROUND_HALF_UP
 
 from zoneinfo import ZoneInfo
 
+from app import order_stream, symbol_features
 from ultimate_v1.alpaca_gateway import get_latest_stock_price, trading_client
 from ultimate_v1.config import env_bool, env_float, env_str, settings
 from ultimate_v1.db import db_conn
@@ -254,6 +255,15 @@ def _submit_limit_and_wait(client, symbol: str, qty: int, side: str, price: floa
     order_id = str(getattr(order, "id", "") or "")
     result = FillResult(True, order_id=order_id, status=str(getattr(order, "status", "") or ""))
     deadline = sleep_time.time() + max(float(FILL_WAIT_SEC), 0.5)
+    # 订单流在线时等 trade_updates 推送；不在线 / 中途断线才回退下面的轮询
+    st = order_stream.wait_final(order_id, deadline - sleep_time.time())
+    if st is not None:
+        if st.is_final:
+            result.status = st.status
+            result.filled_qty = int(st.filled_qty)
+            result.filled_avg_price = float(st.filled_avg_price)
+            return result
+        deadline = 0.0  # 超时仍未终态：直接走最后一次查询 + 撤单
     while sleep_time.time() < deadline:
         try:
             fresh = client.get_order_by_id(order_id)
@@ -405,6 +415,9 @@ def _base_price(conn, row: dict, current_price: float) -> float:
 
 def _prev_close_from_db(conn, symbol: str) -> float:
     """从日线表读取今天以前最近一个收盘价，用于判断当日涨跌幅和开盘缺口。"""
+    feat = symbol_features.get(symbol, conn)
+    if feat is not None and feat["as_of_date"] < _today_la() and _safe_float(feat.get("last_close")) > 0:
+        return _safe_float(feat["last_close"])
     try:
         with conn.cursor() as cur:
             cur.execute(
@@ -8,11 +8,14 @@ import os
 import math
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import pymysql
 import requests
 
+from app import market_stream, order_stream, quote_cache, rate_limiter, schema_registry, symbol_features
+
 try:
     from zoneinfo import ZoneInfo
 except Exception:
@@ -57,6 +60,8 @@ B_SCORE_TOP_N = int(os.getenv("B_SCORE_TOP_N", "3"))
 B_SCORE_INTERVAL_MINUTES = int(os.getenv("B_SCORE_INTERVAL_MINUTES", "5"))
 B_SCORE_CONFIRMATIONS = int(os.getenv("B_SCORE_CONFIRMATIONS", "3"))
 B_SCORE_LOOKBACK_MINUTES = int(os.getenv("B_SCORE_LOOKBACK_MINUTES", "30"))
+# 打分并发线程数；每个线程从连接池借连接（DB_POOL_MAX_SIZE 默认 8，主流程占 1 条）
+B_SCORE_WORKERS = int(os.getenv("B_SCORE_WORKERS", "6"))
 B_MIN_BUYING_POWER = float(os.getenv("B_MIN_BUYING_POWER", "2500"))
 B_MIN_OPEN_BUYING_POWER = float(os.getenv("B_MIN_OPEN_BUYING_POWER", "2500"))
 
@@ -85,6 +90,12 @@ B_POS_RETRY = int(os.getenv("B_POS_RETRY", "2"))
 
 ALPACA_DATA_BASE_URL = os.getenv("ALPACA_DATA_BASE_URL", "https://data.alpaca.markets").rstrip("/")
 B_DATA_FEED = os.getenv("B_DATA_FEED", "iex").strip().lower()
+# 盘中量优先用 Alpaca 行情里的当日累计量（snapshot dailyBar.v / websocket 日线+逐笔）。
+# 只信任这些 feed：iex 只有 IEX 一家交易所的量，和 20 日均量（全市场）不可比。
+# 置空则一律读 stock_operations.intraday_volume。
+B_LIVE_VOLUME_FEEDS = {
+    x.strip().lower() for x in os.getenv("B_LIVE_VOLUME_FEEDS", "sip").split(",") if x.strip()
+}
 
 TRADE_ENV = (os.getenv("TRADE_ENV") or os.getenv("ALPACA_MODE") or "paper").strip().lower()
 if TRADE_ENV == "live":
@@ -96,10 +107,12 @@ else:
 
 MAX_INTENT_LEN = int(os.getenv("B_INTENT_MAXLEN", "70"))
 
-SNAPSHOT_MIN_INTERVAL = float(os.getenv("B_SNAPSHOT_MIN_INTERVAL", "0.35"))
 SNAPSHOT_CACHE_SEC = int(os.getenv("B_SNAPSHOT_CACHE_SEC", "2"))
-_snapshot_last_ts = 0.0
+# 多代码 snapshot：每批最多多少只、拼出来的 symbols 参数最长多少字符（防止 URL 超长被拒）
+SNAPSHOT_BATCH_MAX_SYMBOLS = int(os.getenv("B_SNAPSHOT_BATCH_MAX_SYMBOLS", "200"))
+SNAPSHOT_BATCH_MAX_URL_CHARS = int(os.getenv("B_SNAPSHOT_BATCH_MAX_URL_CHARS", "1800"))
 _snapshot_cache = {}  # code -> (ts, price, prev_close, feed)
+_snapshot_quote_cache = {}  # code -> (ts, quote_dict)
 
 FILL_POLL_TIMES = int(os.getenv("B_FILL_POLL_TIMES", "5"))
 FILL_POLL_SLEEP = float(os.getenv("B_FILL_POLL_SLEEP", "0.4"))
@@ -111,7 +124,10 @@ def _d(msg: str):
 
 
 def _connect():
-    return pymysql.connect(**DB)
+    # 连接池借出，conn.close() 即归还（见 ultimate_v1/db.py）
+    from ultimate_v1.db import pooled_connect
+
+    return pooled_connect(**DB)
 
 
 def _intent_short(s: str) -> str:
@@ -159,12 +175,11 @@ def _alpaca_headers():
 
 
 def _sleep_for_rate_limit():
-    global _snapshot_last_ts
-    now = time.time()
-    gap = now - _snapshot_last_ts
-    if gap < SNAPSHOT_MIN_INTERVAL:
-        time.sleep(SNAPSHOT_MIN_INTERVAL - gap)
-    _snapshot_last_ts = time.time()
+    """
+    行情请求前领一个 data 令牌：所有进程、所有线程共用 app/rate_limiter 的额度，
+    优先级取当前线程的通道（卖出 high / 打分 low）。
+    """
+    rate_limiter.acquire("data")
 
 
 # ✅ 优化：加重试逻辑，网络抖动自动重试 3 次
@@ -213,27 +228,187 @@ def _parse_snapshot(js: dict):
     return price, prev_close
 
 
-def get_snapshot_realtime(code: str):
-    code = (code or "").strip().upper()
-    if not code:
-        raise RuntimeError("empty symbol")
+def _parse_snapshot_quote(js: dict, feed: str):
+    lt = js.get("latestTrade") or {}
+    lq = js.get("latestQuote") or {}
+    db = js.get("dailyBar") or {}
+    pb = js.get("prevDailyBar") or {}
 
-    now = time.time()
-    cached = _snapshot_cache.get(code)
-    if cached:
-        ts, price, prev_close, feed = cached
-        if (now - ts) <= SNAPSHOT_CACHE_SEC:
-            return price, prev_close, feed
+    last_price = float(lt["p"]) if lt.get("p") is not None else None
+    bid = float(lq["bp"]) if lq.get("bp") is not None else None
+    ask = float(lq["ap"]) if lq.get("ap") is not None else None
+    day_open = float(db["o"]) if db.get("o") is not None else None
+    day_high = float(db["h"]) if db.get("h") is not None else None
+    day_low = float(db["l"]) if db.get("l") is not None else None
+    day_volume = float(db["v"]) if db.get("v") is not None else None
+    prev_close = float(pb["c"]) if pb.get("c") is not None else None
 
-    _sleep_for_rate_limit()
+    return {
+        "last_price": last_price,
+        "bid": bid,
+        "ask": ask,
+        "day_open": day_open,
+        "day_high": day_high,
+        "day_low": day_low,
+        "prev_close": prev_close,
+        "day_volume": day_volume,
+        "feed": feed,
+    }
 
+
+def _chunk_symbols_for_url(codes):
+    """按数量和 symbols 参数长度切批，保证每批 URL 不超长。"""
+    chunks = []
+    cur = []
+    cur_len = 0
+    max_n = max(int(SNAPSHOT_BATCH_MAX_SYMBOLS), 1)
+    max_chars = max(int(SNAPSHOT_BATCH_MAX_URL_CHARS), 16)
+    for code in codes:
+        add_len = len(code) + (1 if cur else 0)
+        if cur and (len(cur) >= max_n or cur_len + add_len > max_chars):
+            chunks.append(cur)
+            cur = []
+            cur_len = 0
+            add_len = len(code)
+        cur.append(code)
+        cur_len += add_len
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+def _snapshots_http(codes, feed: str, retries: int = 3, backoff: float = 1.5):
+    url = f"{ALPACA_DATA_BASE_URL}/v2/stocks/snapshots"
+    last_err = None
+    for attempt in range(retries):
+        try:
+            return requests.get(
+                url,
+                headers=_alpaca_headers(),
+                params={"symbols": ",".join(codes), "feed": feed},
+                timeout=HTTP_TIMEOUT,
+            )
+        except (requests.exceptions.ConnectTimeout,
+                requests.exceptions.ReadTimeout,
+                requests.exceptions.ConnectionError) as e:
+            last_err = e
+            if attempt < retries - 1:
+                wait = backoff * (attempt + 1)
+                print(f"[B SNAP] batch n={len(codes)} timeout attempt={attempt+1}/{retries} wait={wait:.1f}s err={e}", flush=True)
+                time.sleep(wait)
+    raise last_err
+
+
+def _price_from_quote(quote: dict):
+    """和 _parse_snapshot 一样：优先成交价，没有就用买卖中间价。"""
+    price = quote.get("last_price")
+    if price is None:
+        bid = float(quote.get("bid") or 0)
+        ask = float(quote.get("ask") or 0)
+        if bid > 0 and ask > 0:
+            price = (bid + ask) / 2.0
+    return price
+
+
+def _remember_quote(code: str, quote: dict, ts: float = None):
+    """写进程内两份缓存。"""
+    ts = time.time() if ts is None else ts
+    _snapshot_quote_cache[code] = (ts, quote)
+    price = _price_from_quote(quote)
+    prev_close = quote.get("prev_close")
+    if price is not None and prev_close is not None:
+        _snapshot_cache[code] = (ts, float(price), float(prev_close), quote.get("feed") or B_DATA_FEED)
+
+
+def _fetch_snapshot_quote_http(code: str) -> dict:
+    _sleep_for_rate_limit()
     r = _snapshot_http(code, B_DATA_FEED)
-    if r.status_code == 200:
-        price, prev_close = _parse_snapshot(r.json())
-        _snapshot_cache[code] = (time.time(), price, prev_close, B_DATA_FEED)
-        return price, prev_close, B_DATA_FEED
+    if r.status_code != 200:
+        raise RuntimeError(f"snapshot http {r.status_code}: {r.text[:200]}")
+    return _parse_snapshot_quote(r.json(), B_DATA_FEED)
+
+
+def _fetch_snapshots_batch_http(codes) -> dict:
+    out = {}
+    for chunk in _chunk_symbols_for_url(codes):
+        _sleep_for_rate_limit()
+        try:
+            r = _snapshots_http(chunk, B_DATA_FEED)
+        except Exception as e:
+            print(f"[B SNAP] batch n={len(chunk)} error: {e}", flush=True)
+            continue
+        if r.status_code != 200:
+            print(f"[B SNAP] batch n={len(chunk)} http {r.status_code}: {r.text[:200]}", flush=True)
+            continue
 
-    raise RuntimeError(f"snapshot http {r.status_code}: {r.text[:200]}")
+        js = r.json() or {}
+        for code in chunk:
+            item = js.get(code)
+            if item:
+                out[code] = _parse_snapshot_quote(item, B_DATA_FEED)
+    return out
+
+
+def get_snapshots_batch(codes) -> dict:
+    """
+    多代码 snapshot：一次 HTTP 拿一整批股票的行情。
+
+    返回 {code: quote_dict}，quote_dict 和 get_snapshot_quote_realtime 的结构一致。
+    依次查 websocket 行情簿（app/market_stream.py）、进程内缓存、
+    跨进程共享缓存（app/quote_cache.py），都没有才请求 Alpaca；
+    结果写回两级缓存，本轮后续的单只调用直接命中。
+    某一批失败只打印日志，缺的股票由调用方回退到单只接口。
+    """
+    codes = sorted({(c or "").strip().upper() for c in (codes or []) if (c or "").strip()})
+    out = {}
+    if not codes:
+        return out
+
+    now = time.time()
+    missing = []
+    for code in codes:
+        live = market_stream.get_quote(code)
+        if live is not None:
+            out[code] = live
+            continue
+        cached = _snapshot_quote_cache.get(code)
+        if cached and (now - cached[0]) <= SNAPSHOT_CACHE_SEC:
+            out[code] = dict(cached[1])
+        else:
+            missing.append(code)
+
+    if missing:
+        got = quote_cache.get_or_fetch_many(missing, _fetch_snapshots_batch_http, SNAPSHOT_CACHE_SEC)
+        ts = time.time()
+        for code, quote in got.items():
+            _remember_quote(code, quote, ts)
+            market_stream.seed(code, quote)
+            out[code] = dict(quote)
+
+    _d(f"[B SNAP] batch requested={len(codes)} cached={len(codes) - len(missing)} got={len(out)}")
+    return out
+
+
+def get_snapshot_realtime(code: str):
+    code = (code or "").strip().upper()
+    if not code:
+        raise RuntimeError("empty symbol")
+
+    live = market_stream.get_quote(code)
+    if live is None:
+        now = time.time()
+        cached = _snapshot_cache.get(code)
+        if cached:
+            ts, price, prev_close, feed = cached
+            if (now - ts) <= SNAPSHOT_CACHE_SEC:
+                return price, prev_close, feed
+
+    quote = live or get_snapshot_quote_realtime(code)
+    price = _price_from_quote(quote)
+    prev_close = quote.get("prev_close")
+    if price is None or prev_close is None:
+        raise RuntimeError(f"snapshot missing fields: price={price} prev_close={prev_close}")
+    return float(price), float(prev_close), quote.get("feed") or B_DATA_FEED
 
 
 # ✅ 优化：TradingClient 单例，不再每次新建
@@ -245,7 +420,8 @@ def _get_trading_client():
         return _trading_client
     from alpaca.trading.client import TradingClient
     paper = (TRADE_ENV != "live")
-    _trading_client = TradingClient(APCA_API_KEY_ID, APCA_API_SECRET_KEY, paper=paper)
+    # 下单 / 查单 / 查账户都经过共享令牌桶
+    _trading_client = rate_limiter.limit_client(TradingClient(APCA_API_KEY_ID, APCA_API_SECRET_KEY, paper=paper))
     return _trading_client
 
 
@@ -286,6 +462,13 @@ def _submit_market_qty(trading_client, code: str, qty: int, side: str):
 def _poll_filled_avg_price(trading_client, order_id: str):
     if not order_id:
         return None
+    # 订单流在线时等推送，不在线 / 断线才轮询
+    st = order_stream.wait_final(order_id, max(FILL_POLL_TIMES, 1) * FILL_POLL_SLEEP)
+    if st is not None:
+        if st.filled_avg_price > 0:
+            return float(st.filled_avg_price)
+        if st.is_final:
+            return None
     for _ in range(max(FILL_POLL_TIMES, 1)):
         try:
             o = trading_client.get_order_by_id(order_id)
@@ -357,7 +540,54 @@ def _load_one_b_row(conn, code: str):
         cur.execute(sql, (code,))
         return cur.fetchone()
 
+
+def _load_b_rows(conn, codes) -> dict:
+    """一次查出多只股票的 B 行，返回 {stock_code: row}；打分时代替逐只 _load_one_b_row。"""
+    codes = sorted({(c or "").strip().upper() for c in (codes or []) if (c or "").strip()})
+    if not codes:
+        return {}
+    placeholders = ",".join(["%s"] * len(codes))
+    sql = f"""
+    SELECT *
+    FROM `{OPS_TABLE}`
+    WHERE stock_type='B' AND stock_code IN ({placeholders});
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql, tuple(codes))
+        rows = cur.fetchall() or []
+    return {str(r.get("stock_code") or "").strip().upper(): r for r in rows}
+
+
+# 机器人每轮预读一次 stock_operations；真正下单前只比较这几列，
+# 有任何一列变了说明别的进程（或上一笔成交回写）动过这只股票，本轮跳过。
+ROW_GUARD_FIELDS = ("is_bought", "can_buy", "can_sell", "qty", "last_order_side", "last_order_time")
+
+
+class StaleRowError(RuntimeError):
+    """预读的 stock_operations 行在下单前已被改动。"""
+
+
+def _row_guard(row) -> tuple:
+    row = row or {}
+    return tuple(str(row.get(k)) for k in ROW_GUARD_FIELDS)
+
+
+def _check_preloaded_row(conn, code: str, row, loader=None):
+    """
+    下单前的版本校验：重读一行，守护列和预读时一致才返回最新行，否则抛 StaleRowError。
+    loader 默认读 B 行，F 传 _load_one_f_row。
+    """
+    fresh = (loader or _load_one_b_row)(conn, code)
+    if not fresh or _row_guard(fresh) != _row_guard(row):
+        raise StaleRowError(f"{code} stock_operations row changed since round preload")
+    return fresh
+
 def _get_recent_closes(conn, code: str, n: int = 4):
+    feat = symbol_features.get(code, conn)
+    if feat is not None:
+        closes = feat["recent_closes"]
+        if len(closes) >= int(n) or len(closes) >= int(feat.get("bars") or 0):
+            return list(closes[: int(n)])
     sql = f"""
     SELECT `close`
     FROM `{PRICES_TABLE}`
@@ -391,6 +621,7 @@ def _update_ops_fields(conn, code: str, **kwargs):
         cur.execute(sql, tuple(vals))
 
 
+@schema_registry.once(MONSTER_TABLE)
 def _ensure_monster_watchlist_table(conn):
     """确保 B->F 二次启动观察池存在。"""
     sql = f"""
@@ -497,36 +728,20 @@ def get_snapshot_quote_realtime(code: str):
     if not code:
         raise RuntimeError("empty symbol")
 
-    _sleep_for_rate_limit()
+    # websocket 推送的最新行情优先，断线/未订阅/缺昨收时才走 REST
+    live = market_stream.get_quote(code)
+    if live is not None:
+        return live
 
-    r = _snapshot_http(code, B_DATA_FEED)
-    if r.status_code != 200:
-        raise RuntimeError(f"snapshot http {r.status_code}: {r.text[:200]}")
-
-    js = r.json()
-
-    lt = js.get("latestTrade") or {}
-    lq = js.get("latestQuote") or {}
-    db = js.get("dailyBar") or {}
-    pb = js.get("prevDailyBar") or {}
-
-    last_price = float(lt["p"]) if lt.get("p") is not None else None
-    bid = float(lq["bp"]) if lq.get("bp") is not None else None
-    ask = float(lq["ap"]) if lq.get("ap") is not None else None
-    day_open = float(db["o"]) if db.get("o") is not None else None
-    day_high = float(db["h"]) if db.get("h") is not None else None
-    prev_close = float(pb["c"]) if pb.get("c") is not None else None
-
-    return {
-        "last_price": last_price,
-        "bid": bid,
-        "ask": ask,
-        "day_open": day_open,
-        "day_high": day_high,
-        "prev_close": prev_close,
-        "feed": B_DATA_FEED,
-    }
+    cached = _snapshot_quote_cache.get(code)
+    if cached and (time.time() - cached[0]) <= SNAPSHOT_CACHE_SEC:
+        return dict(cached[1])
 
+    # 其他 bot / 网页刚拉过的直接用；过期时只有一个进程去请求 Alpaca
+    quote = quote_cache.get_or_fetch(code, _fetch_snapshot_quote_http, SNAPSHOT_CACHE_SEC)
+    _remember_quote(code, quote)
+    market_stream.seed(code, quote)
+    return dict(quote)
 
 
 def _submit_limit_buy_qty(trading_client, code: str, qty: int, limit_price: float):
@@ -631,12 +846,27 @@ def _cancel_open_buy_orders(tc, code: str) -> int:
         return 0
 
 
+def _position_fill(tc, code: str):
+    """Alpaca 真实持仓 (qty, avg_entry_price)；没有持仓或查询失败返回 None。"""
+    try:
+        pos = tc.get_open_position(code)
+        qty = int(float(getattr(pos, "qty", 0) or 0))
+        avg = float(getattr(pos, "avg_entry_price", 0) or 0)
+        if qty > 0 and avg > 0:
+            return qty, avg
+    except Exception:
+        pass  # position does not exist 是常态,不打印
+    return None
+
+
 def _reconcile_fill(tc, code: str, order_id: str, wait_sec: float = 4.0):
     """
     确认订单成交结果。返回 (filled_qty, filled_avg_price)。
 
     优先级：Alpaca 真实持仓 > 订单 filled_qty/filled_avg_price。
     一旦订单进入终态（filled/canceled/expired/rejected）立即返回，不死等。
+    订单流在线时直接等 trade_updates 推送，只有流不在线 / 中途断线才回退轮询；
+    推送到终态后仍查一次持仓，和轮询路径的返回口径一致（已有 / 合并持仓时均价以持仓为准）。
     """
     import time
 
@@ -646,16 +876,17 @@ def _reconcile_fill(tc, code: str, order_id: str, wait_sec: float = 4.0):
     last_filled_qty = 0
     last_filled_avg = 0.0
 
+    st = order_stream.wait_final(order_id, deadline - time.time())
+    if st is not None:
+        if st.is_final:
+            return _position_fill(tc, code) or (int(st.filled_qty), float(st.filled_avg_price))
+        deadline = 0.0  # 流在线但等到超时：跳过轮询，直接做最后一次查询
+
     while time.time() < deadline:
         # 优先看真实持仓（最准）
-        try:
-            pos = tc.get_open_position(code)
-            qty = int(float(getattr(pos, "qty", 0) or 0))
-            avg = float(getattr(pos, "avg_entry_price", 0) or 0)
-            if qty > 0 and avg > 0:
-                return qty, avg
-        except Exception:
-            pass  # position does not exist 是常态,不打印
+        pos = _position_fill(tc, code)
+        if pos is not None:
+            return pos
 
         # 再看订单状态;终态则立刻返回
         try:
@@ -1316,7 +1547,7 @@ def _reconcile_sell_fill(tc, code: str, order_id: str, expected_real_qty: int, w
     确认卖单成交结果。返回实际卖出 qty。
 
     优先级：订单 filled_qty > 真实持仓减少量。
-    一旦订单进入终态立即返回。
+    一旦订单进入终态立即返回；订单流在线时等推送，断线才轮询。
     """
     import time
 
@@ -1325,6 +1556,12 @@ def _reconcile_sell_fill(tc, code: str, order_id: str, expected_real_qty: int, w
 
     last_filled_qty = 0
 
+    st = order_stream.wait_final(order_id, deadline - time.time())
+    if st is not None:
+        if st.is_final:
+            return int(st.filled_qty)
+        deadline = 0.0
+
     while time.time() < deadline:
         # ① 直接看订单 filled_qty(最准)
         try:
@@ -1371,6 +1608,7 @@ def _reconcile_add_fill(tc, order_id: str, wait_sec: float = 4.0):
 
     专用于加仓：只看订单的 filled_qty / filled_avg_price，不看 position
     （因为 position 的 avg 是合并后的均价，不是本次加仓的成交价）。
+    订单流在线时等推送，断线才轮询。
     """
     import time
 
@@ -1380,6 +1618,12 @@ def _reconcile_add_fill(tc, order_id: str, wait_sec: float = 4.0):
     last_filled_qty = 0
     last_filled_avg = 0.0
 
+    st = order_stream.wait_final(order_id, deadline - time.time())
+    if st is not None:
+        if st.is_final:
+            return _position_fill(tc, code) or (int(st.filled_qty), float(st.filled_avg_price))
+        deadline = 0.0
+
     while time.time() < deadline:
         try:
             o = tc.get_order_by_id(str(order_id))
@@ -1416,6 +1660,9 @@ def _reconcile_add_fill(tc, order_id: str, wait_sec: float = 4.0):
 # BUY
 # =========================
 def _get_prev_close_from_db(conn, code: str):
+    feat = symbol_features.get(code, conn)
+    if feat is not None and float(feat.get("last_close") or 0) > 0:
+        return float(feat["last_close"])
     sql = f"""
     SELECT `close`
     FROM `{PRICES_TABLE}`
@@ -1537,6 +1784,9 @@ def get_b_buy_plan_for_gate() -> dict:
 
 
 def _get_avg_volume20(conn, code: str) -> float:
+    feat = symbol_features.get(code, conn)
+    if feat is not None and float(feat.get("avg_vol20") or 0) > 0:
+        return float(feat["avg_vol20"])
     sql = f"""
     SELECT AVG(volume) AS avg_vol
     FROM (
@@ -1585,11 +1835,35 @@ def _required_intraday_volume_ratio(now_dt=None) -> float:
     return B_VOLUME_RATIO_LATE
 
 
-def _intraday_volume_check(conn, code: str):
+def _live_intraday_volume(code: str, snap=None) -> int:
+    """
+    内存里的当日累计量：先看本次行情 snap，再看 websocket 行情簿。
+    feed 不在 B_LIVE_VOLUME_FEEDS、拿不到、或行情簿条目不是今天这个交易日的时返回 0，
+    由调用方回退数据库（stock_operations.intraday_volume）。
+    """
+    if not B_LIVE_VOLUME_FEEDS:
+        return 0
+    if snap and str(snap.get("feed") or "").lower() in B_LIVE_VOLUME_FEEDS:
+        volume = float(snap.get("day_volume") or 0)
+        if volume > 0:
+            return int(volume)
+    if market_stream.MARKET_STREAM_FEED in B_LIVE_VOLUME_FEEDS:
+        entry = market_stream.get_entry(code)
+        if entry is None or entry.session_day != market_stream.session_day():
+            return 0
+        volume = float(market_stream.get_day_volume(code) or 0)
+        if volume > 0:
+            return int(volume)
+    return 0
+
+
+def _intraday_volume_check(conn, code: str, snap=None):
     if B_REQUIRE_INTRADAY_VOLUME != 1:
         return True, 0, 0.0, 0.0, 0.0, "disabled"
 
-    intraday_volume = _get_ops_intraday_volume(conn, code)
+    intraday_volume = _live_intraday_volume(code, snap)
+    if intraday_volume <= 0:
+        intraday_volume = _get_ops_intraday_volume(conn, code)
     avg_volume20 = _get_avg_volume20(conn, code)
     required_ratio = _required_intraday_volume_ratio()
 
@@ -1641,6 +1915,7 @@ def _intraday_reversal_reject(ref_price: float, day_open: float, day_high: float
     return False, ""
 
 
+@schema_registry.once(B_SCORE_TABLE)
 def _ensure_b_score_table(conn):
     sql = f"""
     CREATE TABLE IF NOT EXISTS `{B_SCORE_TABLE}` (
@@ -1681,9 +1956,10 @@ def _latest_score_bucket(conn):
     return row.get("bucket_time")
 
 
-def _score_b_candidate(conn, code: str):
+def _score_b_candidate(conn, code: str, snap=None, row=None):
     code = (code or "").strip().upper()
-    row = _load_one_b_row(conn, code)
+    if row is None:
+        row = _load_one_b_row(conn, code)
     if not row:
         return None
 
@@ -1699,7 +1975,8 @@ def _score_b_candidate(conn, code: str):
     if trigger <= 0 or entry_close <= 0:
         return None
 
-    snap = get_snapshot_quote_realtime(code)
+    if snap is None:
+        snap = get_snapshot_quote_realtime(code)
     price = float(snap.get("last_price") or 0.0)
     day_open = float(snap.get("day_open") or 0.0)
     day_high = float(snap.get("day_high") or 0.0)
@@ -1733,7 +2010,7 @@ def _score_b_candidate(conn, code: str):
         required_volume_ratio,
         volume_ratio,
         _volume_reason,
-    ) = _intraday_volume_check(conn, code)
+    ) = _intraday_volume_check(conn, code, snap)
     if not volume_ok:
         return None
 
@@ -1774,6 +2051,57 @@ def _score_b_candidate(conn, code: str):
     }
 
 
+def _score_b_candidate_pooled(code: str, snap=None, row=None):
+    # 并发打分时每个任务单独借一条连接，用完归还
+    conn = _connect()
+    try:
+        return _score_b_candidate(conn, code, snap=snap, row=row)
+    finally:
+        conn.close()
+
+
+def _score_workers(n: int) -> int:
+    """打分并发数：每路单独借一条池连接，机器人主连接和打分主连接各占一条，不能把池借空。"""
+    from ultimate_v1.db import DB_POOL_ENABLED, DB_POOL_MAX_SIZE
+
+    workers = max(1, min(int(B_SCORE_WORKERS), n))
+    if DB_POOL_ENABLED:
+        workers = min(workers, max(DB_POOL_MAX_SIZE - 2, 1))
+    return workers
+
+
+def _score_b_candidates(conn, codes, snaps, rows=None) -> list:
+    """
+    给一批股票打分：行读取 / 补 snapshot / 20 日均量 / 盘中量都是 I/O，
+    B_SCORE_WORKERS>1 时用线程池重叠等待；Alpaca 请求仍走 _sleep_for_rate_limit 的全局节奏。
+    rows 是 _load_b_rows 预读的 {code: row}，给了就不再逐只读行。
+    返回按 (score 降序, symbol) 排好的列表，和线程完成顺序无关。
+    """
+    workers = _score_workers(len(codes))
+    rows = rows or {}
+
+    def one(code):
+        try:
+            # 打分走低优先级通道，不和卖出抢 Alpaca 额度
+            with rate_limiter.lane("low"):
+                if workers <= 1:
+                    return _score_b_candidate(conn, code, snap=snaps.get(code), row=rows.get(code))
+                return _score_b_candidate_pooled(code, snap=snaps.get(code), row=rows.get(code))
+        except Exception as e:
+            print(f"[B SCORE] {code} skip score error: {e}", flush=True)
+            return None
+
+    if workers <= 1:
+        items = [one(code) for code in codes]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="b-score") as ex:
+            items = list(ex.map(one, codes))
+
+    scored = [x for x in items if x]
+    scored.sort(key=lambda x: (-x["score"], x["symbol"]))
+    return scored
+
+
 def strategy_B_rank_and_confirm(codes) -> list[str]:
     """
     B 买入选择器：
@@ -1815,16 +2143,14 @@ def strategy_B_rank_and_confirm(codes) -> list[str]:
         should_record = latest_bucket is None or latest_bucket < bucket_time
 
         if should_record:
-            scored = []
-            for code in codes:
-                try:
-                    item = _score_b_candidate(conn, code)
-                    if item:
-                        scored.append(item)
-                except Exception as e:
-                    print(f"[B SCORE] {code} skip score error: {e}", flush=True)
-
-            scored.sort(key=lambda x: x["score"], reverse=True)
+            # 先用多代码 snapshot 一次拿全池行情，避免逐只请求 + 限速等待。
+            with rate_limiter.lane("low"):
+                snaps = get_snapshots_batch(codes)
+            t0 = time.time()
+            # 全池的 B 行一次查出来，打分时不再逐只 SELECT
+            b_rows = _load_b_rows(conn, codes)
+            scored = _score_b_candidates(conn, [c for c in codes if c in b_rows], snaps, rows=b_rows)
+            score_sec = time.time() - t0
             top = scored[: max(int(B_SCORE_TOP_N), 1)]
 
             sql = f"""
@@ -1862,7 +2188,8 @@ def strategy_B_rank_and_confirm(codes) -> list[str]:
                 with conn.cursor() as cur:
                     cur.executemany(sql, args)
             print(
-                f"[B SCORE] bucket={bucket_time} scored={len(scored)} "
+                f"[B SCORE] bucket={bucket_time} scored={len(scored)}/{len(codes)} "
+                f"workers={_score_workers(len(codes))} sec={score_sec:.2f} "
                 f"top={','.join([x['symbol'] for x in top]) or '-'}",
                 flush=True,
             )
@@ -1958,7 +2285,8 @@ def strategy_B_rank_and_confirm(codes) -> list[str]:
             pass
 
 
-def strategy_B_buy(code: str) -> bool:
+def strategy_B_buy(code: str, row=None) -> bool:
+    """row 是买入机器人本轮预读的行；给了就不再重读，下单前用 _check_preloaded_row 做版本校验。"""
     import math
     import traceback
     from datetime import datetime
@@ -1977,9 +2305,11 @@ def strategy_B_buy(code: str) -> bool:
 
     conn = None
     order_id = None
+    preloaded = row is not None
     try:
         conn = _connect()
-        row = _load_one_b_row(conn, code)
+        if not preloaded:
+            row = _load_one_b_row(conn, code)
         if not row:
             print(f"[B BUY] {code} skip: no B row", flush=True)
             return False
@@ -2108,7 +2438,7 @@ def strategy_B_buy(code: str) -> bool:
             required_volume_ratio,
             volume_ratio,
             volume_reason,
-        ) = _intraday_volume_check(conn, code)
+        ) = _intraday_volume_check(conn, code, snap)
         if not volume_ok:
             print(
                 f"[B BUY] {code} skip: intraday volume {volume_reason} "
@@ -2229,6 +2559,13 @@ def strategy_B_buy(code: str) -> bool:
             flush=True,
         )
 
+        if preloaded:
+            try:
+                row = _check_preloaded_row(conn, code, row)
+            except StaleRowError as e:
+                print(f"[B BUY] {code} skip: {e}", flush=True)
+                return False
+
         # 防御：先取消同 symbol 下任何残留的 open 买单
         _cancel_open_buy_orders(tc, code)
 
@@ -2998,7 +3335,30 @@ def strategy_B_buy(code: str) -> bool:
 #             pass
 
 
-def strategy_B_sell(code: str) -> bool:
+# 最高价回撤保护：
+# 这不是替代分层止盈，而是保护“已经涨起来但又回落”的剩余仓位。
+# 涨幅越大，允许从高点回撤的空间越大，避免妖股后期被太早洗掉。
+B_PEAK_GIVEBACK_RULES = [
+    (0.40, 0.05),   # 最高涨 >=40%，从最高价回撤 5% 卖
+    (0.20, 0.035),  # 最高涨 >=20%，从最高价回撤 3.5% 卖
+    (0.10, 0.025),  # 最高涨 >=10%，从最高价回撤 2.5% 卖
+    (0.05, 0.02),   # 最高涨 >=5%，从最高价回撤 2% 卖
+]
+
+
+def b_giveback_pct_for_peak(peak_gain_pct: float):
+    """
+    根据持仓以来最高涨幅，决定允许从最高价回撤多少。
+
+    返回 None 表示还没涨够，不启用最高价回撤保护。
+    """
+    for min_gain, giveback_pct in B_PEAK_GIVEBACK_RULES:
+        if peak_gain_pct >= min_gain:
+            return giveback_pct
+    return None
+
+
+def strategy_B_sell(code: str, row=None) -> bool:
     """
     策略B：持仓后的动态管理（无加仓清爽版）
 
@@ -3012,6 +3372,8 @@ def strategy_B_sell(code: str) -> bool:
     搭配建议：
     - 把 B_TARGET_NOTIONAL_USD 抬到 1500-2500（用更大基础仓换金字塔效应）
     - _buy_add_qty 不再被调用,可以删,也可以留着不影响
+
+    row：卖出机器人本轮预读的行。给了就不再重读，第一笔 _sell_qty 之前做一次版本校验。
     """
 
     import math
@@ -3035,15 +3397,7 @@ def strategy_B_sell(code: str) -> bool:
     INITIAL_STOP_GRACE_SECONDS = int(os.getenv("B_INITIAL_STOP_GRACE_SECONDS", "180"))
     CATASTROPHIC_STOP_LOSS_PCT = float(os.getenv("B_CATASTROPHIC_STOP_LOSS_PCT", "-0.05"))
 
-    # 最高价回撤保护：
-    # 这不是替代分层止盈，而是保护“已经涨起来但又回落”的剩余仓位。
-    # 涨幅越大，允许从高点回撤的空间越大，避免妖股后期被太早洗掉。
-    PEAK_GIVEBACK_RULES = [
-        (0.40, 0.05),   # 最高涨 >=40%，从最高价回撤 5% 卖
-        (0.20, 0.035),  # 最高涨 >=20%，从最高价回撤 3.5% 卖
-        (0.10, 0.025),  # 最高涨 >=10%，从最高价回撤 2.5% 卖
-        (0.05, 0.02),   # 最高涨 >=5%，从最高价回撤 2% 卖
-    ]
+    # 最高价回撤保护：见模块级 B_PEAK_GIVEBACK_RULES（卖出机器人的触发索引也用同一份）
 
     # 现在账户不再受日内交易限制，买入后立刻允许按止损/止盈规则卖出。
     BLOCK_SAME_DAY_SELL_AFTER_BUY = False
@@ -3169,6 +3523,16 @@ def strategy_B_sell(code: str) -> bool:
         except Exception:
             return fallback_row
 
+    guard_row = row
+
+    def _sell_qty_checked(conn_, code_, qty_, reason_):
+        # 预读的行只在第一笔卖单前校验一次；之后的行都是本函数自己重读的
+        nonlocal guard_row
+        if guard_row is not None:
+            _check_preloaded_row(conn_, code_, guard_row)
+            guard_row = None
+        return _sell_qty(conn_, code_, qty_, reason_)
+
     def _cap_sl_below_price(sl_, price_):
         """只在 SL >= 当前价时才动手,避免误压。"""
         sl_ = _safe_float(sl_, 0.0)
@@ -3202,15 +3566,7 @@ def strategy_B_sell(code: str) -> bool:
         return round(new_sl, 2)
 
     def _giveback_pct_for_peak(peak_gain_pct_):
-        """
-        根据持仓以来最高涨幅，决定允许从最高价回撤多少。
-
-        返回 None 表示还没涨够，不启用最高价回撤保护。
-        """
-        for min_gain, giveback_pct in PEAK_GIVEBACK_RULES:
-            if peak_gain_pct_ >= min_gain:
-                return giveback_pct
-        return None
+        return b_giveback_pct_for_peak(peak_gain_pct_)
 
     def _update_peak_tracking(conn_, code_, row_, cost_, qty_, price_):
         """
@@ -3303,7 +3659,8 @@ def strategy_B_sell(code: str) -> bool:
 
     try:
         conn = _connect()
-        row = _load_one_b_row(conn, code)
+        if row is None:
+            row = _load_one_b_row(conn, code)
 
         if not row:
             print(f"[B SELL] {code} no row", flush=True)
@@ -3406,7 +3763,7 @@ def strategy_B_sell(code: str) -> bool:
                     f"pullback={giveback_pct:.2%} profit_now={profit_now:.2f} peak_profit={peak_profit:.2f}"
                 )
                 print(f"[B SELL] {code} peak giveback sell qty={qty} reason={reason}", flush=True)
-                traded = _sell_qty(conn, code, qty, reason) or traded
+                traded = _sell_qty_checked(conn, code, qty, reason) or traded
                 return traded
 
         # ----- 3) 已存在的 pending stop -----
@@ -3433,7 +3790,7 @@ def strategy_B_sell(code: str) -> bool:
                     return False
                 reason = f"PENDING_STOP_TIMEOUT price={price:.2f} <= pending_sl={pending_sl:.2f} waited={flash_wait_minutes}m"
                 print(f"[B SELL] {code} pending stop timeout sell qty={qty} reason={reason}", flush=True)
-                traded = _sell_qty(conn, code, qty, reason) or traded
+                traded = _sell_qty_checked(conn, code, qty, reason) or traded
                 if traded:
                     _clear_pending_stop(conn, code)
                 return traded
@@ -3485,7 +3842,7 @@ def strategy_B_sell(code: str) -> bool:
 
                 reason = f"PENDING_STOP_TIMEOUT price={price:.2f} <= pending_sl={pending_sl2:.2f} waited={flash_wait_minutes}m"
                 print(f"[B SELL] {code} timeout hard stop sell qty={qty} reason={reason}", flush=True)
-                traded = _sell_qty(conn, code, qty, reason) or traded
+                traded = _sell_qty_checked(conn, code, qty, reason) or traded
                 if traded:
                     _clear_pending_stop(conn, code)
                 return traded
@@ -3499,7 +3856,7 @@ def strategy_B_sell(code: str) -> bool:
 
             reason = f"STOP price={price:.2f} <= sl={sl:.2f}"
             print(f"[B SELL] {code} hard stop sell qty={qty} reason={reason}", flush=True)
-            traded = _sell_qty(conn, code, qty, reason) or traded
+            traded = _sell_qty_checked(conn, code, qty, reason) or traded
             return traded
         else:
             if pending_since:
@@ -3530,7 +3887,7 @@ def strategy_B_sell(code: str) -> bool:
                                 f"price={price:.2f} qty={sell_qty} last_stage={last_stage}"
                             )
                             print(f"[B SELL] {code} jump sell qty={sell_qty} reason={reason}", flush=True)
-                            sell_ok = _sell_qty(conn, code, sell_qty, reason)
+                            sell_ok = _sell_qty_checked(conn, code, sell_qty, reason)
                             traded = sell_ok or traded
 
                             row_after = _load_one_b_row(conn, code) or {}
@@ -3592,7 +3949,7 @@ def strategy_B_sell(code: str) -> bool:
 
                             reason = f"STAGE{stage}_SELL{int(sell_ratio * 100)} price={price:.2f} qty={sell_qty}"
                             print(f"[B SELL] {code} sell qty={sell_qty} reason={reason}", flush=True)
-                            sell_ok = _sell_qty(conn, code, sell_qty, reason)
+                            sell_ok = _sell_qty_checked(conn, code, sell_qty, reason)
                             traded = sell_ok or traded
 
                             row3 = _load_one_b_row(conn, code) or {}
@@ -3633,11 +3990,15 @@ def strategy_B_sell(code: str) -> bool:
                         return False
                     reason = f"STRUCT_EXIT close0={c0:.2f} < min3={min3:.2f}"
                     print(f"[B SELL] {code} structure exit qty={qty} reason={reason}", flush=True)
-                    traded = _sell_qty(conn, code, qty, reason) or traded
+                    traded = _sell_qty_checked(conn, code, qty, reason) or traded
                     return traded
 
         return traded
 
+    except StaleRowError as e:
+        print(f"[B SELL] {code} skip: {e}", flush=True)
+        return traded
+
     except Exception as e:
         print(f"[B SELL] {code} ❌ error: {e}", flush=True)
         traceback.print_exc()
@@ -5,9 +5,13 @@
 """
 
 import os
+from datetime import timedelta
+
 import pymysql
 import pandas as pd
 
+from app import price_cache
+
 DB = dict(
     host=os.getenv("DB_HOST", "mysql"),
     port=int(os.getenv("DB_PORT", "3306")),
@@ -23,11 +27,46 @@ DST_TABLE = "strategy_b_levels"
 LOOKBACK_DAYS = 180
 
 
+def _pick_from_cache(conn):
+    """和 pick_sql 同一规则，从本地列式缓存算（PRICE_CACHE_ENABLED=1）。"""
+    price_cache.ensure_fresh(conn)
+    latest_day = price_cache.max_date()
+    if latest_day is None:
+        raise RuntimeError("stock_prices_pool 里没有数据")
+    print("[INFO] 最新交易日:", latest_day)
+
+    start = latest_day - timedelta(days=LOOKBACK_DAYS - 1)
+    # 窗口第一天的“上一根日线”可能在窗口之前，多读一年足够覆盖停牌
+    df = price_cache.load_frame(
+        start - timedelta(days=366), latest_day, columns=("open", "close", "volume"), sort_by_symbol=True
+    )
+    df["prev_close"] = df.groupby("symbol", sort=False)["close"].shift(1)
+    w = df[df["date"] >= start]
+    bear = w[w["open"] > w["close"]]
+    max_vol = bear.groupby("symbol", sort=False)["volume"].transform("max")
+    hit = bear[(bear["close"] < bear["prev_close"]) & (bear["volume"] == max_vol)]
+    return pd.DataFrame({
+        "symbol": hit["symbol"].to_numpy(),
+        "pressure_price": hit["open"].to_numpy(),
+        "pressure_date": hit["date"].to_numpy(),
+    })
+
+
 def main():
     print("[MARK] running v57 file OK")
 
     conn = pymysql.connect(**DB)
 
+    if price_cache.enabled():
+        df = _pick_from_cache(conn)
+        print("[INFO] 命中股票数:", len(df))
+        if df.empty:
+            print("[WARN] 没有符合条件的数据")
+            return
+        _upsert_levels(conn, df)
+        conn.close()
+        return
+
     latest_day = pd.read_sql(
         f"SELECT MAX(DATE(`date`)) AS d FROM {SRC_TABLE};", conn
     )["d"].iloc[0]
@@ -72,6 +111,11 @@ def main():
         print("[WARN] 没有符合条件的数据")
         return
 
+    _upsert_levels(conn, df)
+    conn.close()
+
+
+def _upsert_levels(conn, df):
     upsert_sql = f"""
     INSERT INTO {DST_TABLE} (symbol, pressure_price, pressure_date)
     VALUES (%s, %s, %s)
@@ -91,8 +135,6 @@ def main():
     )
     print(preview)
 
-    conn.close()
-
 
 if __name__ == "__main__":
     main()
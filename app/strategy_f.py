@@ -20,8 +20,11 @@ from datetime import datetime, timedelta
 
 import pymysql
 
+from app import schema_registry
 from app.strategy_b import (
     B_DATA_FEED,
+    StaleRowError,
+    _check_preloaded_row,
     _cancel_open_buy_orders,
     _get_extended_quote_realtime,
     _get_buying_power,
@@ -30,11 +33,10 @@ from app.strategy_b import (
     _intent_short,
     _reconcile_fill,
     _reconcile_sell_fill,
-    _sleep_for_rate_limit,
-    _snapshot_http,
     _submit_limit_buy_qty,
     _submit_limit_qty_ext,
     _submit_market_qty,
+    get_snapshot_quote_realtime,
     get_snapshot_realtime,
 )
 
@@ -105,7 +107,10 @@ F_STAGE_RULES = [
 
 
 def _connect():
-    return pymysql.connect(**DB)
+    # 连接池借出，conn.close() 即归还（见 ultimate_v1/db.py）
+    from ultimate_v1.db import pooled_connect
+
+    return pooled_connect(**DB)
 
 
 def _safe_float(v, default=0.0):
@@ -128,6 +133,7 @@ def _bucket_time_now():
     return datetime.fromtimestamp(bucket_seconds)
 
 
+@schema_registry.once(MONSTER_TABLE)
 def _ensure_monster_watchlist_table(conn):
     sql = f"""
     CREATE TABLE IF NOT EXISTS `{MONSTER_TABLE}` (
@@ -154,6 +160,7 @@ def _ensure_monster_watchlist_table(conn):
         cur.execute(sql)
 
 
+@schema_registry.once(F_SCORE_TABLE)
 def _ensure_f_score_table(conn):
     sql = f"""
     CREATE TABLE IF NOT EXISTS `{F_SCORE_TABLE}` (
@@ -286,31 +293,20 @@ def _get_realtime_daily_bar(code: str):
     if not code:
         raise RuntimeError("empty symbol")
 
-    _sleep_for_rate_limit()
-    r = _snapshot_http(code, B_DATA_FEED)
-
-    if r.status_code != 200:
-        raise RuntimeError(f"snapshot http {r.status_code}: {r.text[:200]}")
-
-    js = r.json()
-    db = js.get("dailyBar") or {}
-    lt = js.get("latestTrade") or {}
-    lq = js.get("latestQuote") or {}
-    pb = js.get("prevDailyBar") or {}
+    # 和 B 共用：websocket 行情簿 → 进程内缓存 → 跨进程共享缓存（single-flight），都没有才请求 Alpaca
+    q = get_snapshot_quote_realtime(code)
 
-    bid = _safe_float(lq.get("bp"), 0.0)
-    ask = _safe_float(lq.get("ap"), 0.0)
+    bid = _safe_float(q.get("bid"), 0.0)
+    ask = _safe_float(q.get("ask"), 0.0)
 
-    last = _safe_float(lt.get("p"), 0.0)
-    if last <= 0:
-        last = _safe_float(db.get("c"), 0.0)
+    last = _safe_float(q.get("last_price"), 0.0)
     if last <= 0 and bid > 0 and ask > 0:
         last = (bid + ask) / 2.0
 
-    open_ = _safe_float(db.get("o"), last)
-    high = _safe_float(db.get("h"), last)
-    low = _safe_float(db.get("l"), last)
-    prev_close = _safe_float(pb.get("c"), 0.0)
+    open_ = _safe_float(q.get("day_open"), last)
+    high = _safe_float(q.get("day_high"), last)
+    low = _safe_float(q.get("day_low"), last)
+    prev_close = _safe_float(q.get("prev_close"), 0.0)
 
     if last <= 0 or prev_close <= 0:
         raise RuntimeError(f"snapshot missing fields: last={last} prev_close={prev_close}")
@@ -319,7 +315,7 @@ def _get_realtime_daily_bar(code: str):
     low = min(low if low > 0 else last, last)
 
     return {
-        "date": db.get("t") or "realtime",
+        "date": "realtime",
         "open": open_,
         "high": high,
         "low": low,
@@ -327,7 +323,7 @@ def _get_realtime_daily_bar(code: str):
         "prev_close": prev_close,
         "bid": bid,
         "ask": ask,
-        "feed": B_DATA_FEED,
+        "feed": q.get("feed") or B_DATA_FEED,
     }
 
 
@@ -786,17 +782,20 @@ def strategy_F_refresh_candidates():
     return len(rows)
 
 
-def strategy_F_buy(code: str) -> bool:
+def strategy_F_buy(code: str, row=None) -> bool:
     code = (code or "").strip().upper()
     print(f"[F BUY] {code}", flush=True)
 
     conn = None
     order_id = None
+    # row 是买入机器人本轮预读的行；给了就不再重读，下单前做一次版本校验
+    preloaded = row is not None
 
     try:
         conn = _connect()
 
-        row = _load_one_f_row(conn, code)
+        if not preloaded:
+            row = _load_one_f_row(conn, code)
 
         if not row:
             print(f"[F BUY] {code} skip: no F row", flush=True)
@@ -915,6 +914,13 @@ def strategy_F_buy(code: str) -> bool:
             f"intraday_pos={m['intraday_pos']:.2f}"
         )
 
+        if preloaded:
+            try:
+                row = _check_preloaded_row(conn, code, row, loader=_load_one_f_row)
+            except StaleRowError as e:
+                print(f"[F BUY] {code} skip: {e}", flush=True)
+                return False
+
         _cancel_open_buy_orders(tc, code)
 
         order = _submit_limit_buy_qty(tc, code, qty, limit_price=limit_price)
@@ -1255,15 +1261,18 @@ def strategy_F_premarket_manage(code: str) -> bool:
             pass
 
 
-def strategy_F_sell(code: str) -> bool:
+def strategy_F_sell(code: str, row=None) -> bool:
     code = (code or "").strip().upper()
     print(f"[F SELL] {code}", flush=True)
 
     conn = None
+    # row 是卖出机器人本轮预读的行；给了就不再重读，下单前做一次版本校验
+    preloaded = row is not None
 
     try:
         conn = _connect()
-        row = _load_one_f_row(conn, code)
+        if not preloaded:
+            row = _load_one_f_row(conn, code)
 
         if not row:
             print(f"[F SELL] {code} skip: no F row", flush=True)
@@ -1401,6 +1410,13 @@ def strategy_F_sell(code: str) -> bool:
         if not reason:
             return False
 
+        if preloaded:
+            try:
+                _check_preloaded_row(conn, code, row, loader=_load_one_f_row)
+            except StaleRowError as e:
+                print(f"[F SELL] {code} skip: {e}", flush=True)
+                return False
+
         order = _submit_market_qty(tc, code, sell_qty, side="sell")
         order_id = getattr(order, "id", None) or getattr(order, "order_id", None)
         status = str(getattr(order, "status", "") or "")
@@ -28,6 +28,8 @@ from typing import Optional
 
 import pymysql
 
+from app import symbol_features
+
 try:
     from zoneinfo import ZoneInfo
 except Exception:
@@ -251,7 +253,10 @@ class SpreadPricing:
 
 
 def _connect():
-    return pymysql.connect(**DB)
+    # 连接池借出，conn.close() 即归还（见 ultimate_v1/db.py）
+    from ultimate_v1.db import pooled_connect
+
+    return pooled_connect(**DB)
 
 
 def _safe_float(v, default: float = 0.0) -> float:
@@ -382,7 +387,9 @@ def _get_trading_client():
     if not key or not secret:
         raise RuntimeError("Alpaca key missing: APCA_API_KEY_ID / APCA_API_SECRET_KEY")
 
-    _trading_client = TradingClient(key, secret, paper=(trade_env != "live"))
+    from app import rate_limiter
+
+    _trading_client = rate_limiter.limit_client(TradingClient(key, secret, paper=(trade_env != "live")))
     return _trading_client
 
 
@@ -536,7 +543,9 @@ def _option_data_client_and_feed():
     secret = os.getenv("APCA_API_SECRET_KEY", "") or os.getenv("ALPACA_SECRET", "")
     if not key or not secret:
         raise RuntimeError("Alpaca option key missing: APCA_API_KEY_ID / APCA_API_SECRET_KEY")
-    return OptionHistoricalDataClient(key, secret), feed
+    from app import rate_limiter
+
+    return rate_limiter.limit_client(OptionHistoricalDataClient(key, secret), account_bucket="data"), feed
 
 
 def _option_quote_from_snapshot(sym: str, snap) -> OptionQuote:
@@ -972,6 +981,43 @@ def _mean(xs: list[float]) -> float:
     return sum(xs) / float(len(xs)) if xs else 0.0
 
 
+def _stats_from_bars(bars: list[dict]) -> dict:
+    closes = [_safe_float(r.get("close")) for r in bars]
+    highs = [_safe_float(r.get("high")) for r in bars]
+    lows = [_safe_float(r.get("low")) for r in bars]
+    vols = [_safe_float(r.get("volume")) for r in bars]
+    close = closes[-1]
+    return {
+        "close": close,
+        "ma5": _mean(closes[-5:]),
+        "ma10": _mean(closes[-10:]),
+        "ma20": _mean(closes[-20:]),
+        "ma50": _mean(closes[-50:]),
+        "ret3": close / closes[-4] - 1 if len(closes) >= 4 and closes[-4] > 0 else 0.0,
+        "ret5": close / closes[-6] - 1 if len(closes) >= 6 and closes[-6] > 0 else 0.0,
+        "ret10": close / closes[-11] - 1 if len(closes) >= 11 and closes[-11] > 0 else 0.0,
+        "high20": max(highs[-20:]),
+        "low20": min(lows[-20:]),
+        "vol20": _mean(vols[-20:]),
+        "last_volume": vols[-1],
+    }
+
+
+def _stats_from_features(symbol: str, conn):
+    """symbol_daily_features 里预算好的同口径指标；没有或窗口不一致时返回 None，走 _load_bars。"""
+    if C_LOOKBACK_DAYS != symbol_features.SYMBOL_FEATURES_BARS:
+        return None
+    feat = symbol_features.get(symbol, conn)
+    if feat is None or int(feat.get("bars") or 0) < C_MIN_BARS:
+        return None
+    stats = {
+        k: _safe_float(feat.get(k))
+        for k in ("ma5", "ma10", "ma20", "ma50", "ret3", "ret5", "ret10", "high20", "low20", "vol20", "last_volume")
+    }
+    stats["close"] = _safe_float(feat.get("last_close"))
+    return stats
+
+
 def analyze_market(symbol: str) -> dict:
     """
     只使用本地 OHLCV 日线数据判断行情。
@@ -985,44 +1031,34 @@ def analyze_market(symbol: str) -> dict:
     symbol = (symbol or "").strip().upper()
     conn = _connect()
     try:
-        bars = _load_bars(conn, symbol)
+        stats = _stats_from_features(symbol, conn)
+        bars = [] if stats else _load_bars(conn, symbol)
     finally:
         conn.close()
 
-    if len(bars) < C_MIN_BARS:
-        return {
-            "trend": "unknown",
-            "bias": "neutral",
-            "score": 0.0,
-            "reason": f"not enough bars: {len(bars)} < {C_MIN_BARS}",
-            "price": 0.0,
-        }
-
-    closes = [_safe_float(r.get("close")) for r in bars]
-    highs = [_safe_float(r.get("high")) for r in bars]
-    lows = [_safe_float(r.get("low")) for r in bars]
-    vols = [_safe_float(r.get("volume")) for r in bars]
-
-    close = closes[-1]
+    if stats is None:
+        if len(bars) < C_MIN_BARS:
+            return {
+                "trend": "unknown",
+                "bias": "neutral",
+                "score": 0.0,
+                "reason": f"not enough bars: {len(bars)} < {C_MIN_BARS}",
+                "price": 0.0,
+            }
+        stats = _stats_from_bars(bars)
+
+    close = stats["close"]
     if close <= 0:
         return {"trend": "unknown", "bias": "neutral", "score": 0.0, "reason": "invalid close", "price": 0.0}
 
-    ma5 = _mean(closes[-5:])
-    ma10 = _mean(closes[-10:])
-    ma20 = _mean(closes[-20:])
-    ma50 = _mean(closes[-50:])
-
-    ret3 = close / closes[-4] - 1 if len(closes) >= 4 and closes[-4] > 0 else 0.0
-    ret5 = close / closes[-6] - 1 if len(closes) >= 6 and closes[-6] > 0 else 0.0
-    ret10 = close / closes[-11] - 1 if len(closes) >= 11 and closes[-11] > 0 else 0.0
-
-    high20 = max(highs[-20:])
-    low20 = min(lows[-20:])
+    ma5, ma10, ma20, ma50 = stats["ma5"], stats["ma10"], stats["ma20"], stats["ma50"]
+    ret3, ret5, ret10 = stats["ret3"], stats["ret5"], stats["ret10"]
+    high20, low20 = stats["high20"], stats["low20"]
     range20_pct = (high20 - low20) / close if close > 0 else 0.0
     dist_high20 = close / high20 - 1 if high20 > 0 else 0.0
     dist_low20 = close / low20 - 1 if low20 > 0 else 0.0
-    vol20 = _mean(vols[-20:])
-    vol_ratio = vols[-1] / vol20 if vol20 > 0 else 0.0
+    vol20 = stats["vol20"]
+    vol_ratio = stats["last_volume"] / vol20 if vol20 > 0 else 0.0
 
     strong_up = (
         close > ma5 > ma10 > ma20
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+app/symbol_features.py
+
+每只股票的日线滚动指标（昨收、20 日均量、ATR14、均线、近 N 日收盘）预计算。
+
+过去盘中每次判断都要对 stock_prices_pool 跑一条 ORDER BY date DESC LIMIT n：
+strategy_b 的 20 日均量 / 昨收 / 近几日收盘、strategy_ac_t 的昨收、
+strategy_q.analyze_market 的 90 根日线、risk_gate_qqq 的近 30 日收盘。
+日线只在盘后变化，所以改成：
+
+- build(conn)：收盘后（getdata 之后）一次把回看窗口内所有股票的日线读进 DataFrame，
+  按 symbol 分组向量化算完，整批 upsert 进 symbol_daily_features（主键 symbol）。
+  命令行：python -m app.symbol_features
+- ensure_loaded(conn) / get(symbol, conn)：进程内整表载入成 dict，之后 O(1) 查；
+  跨日自动重载，载入失败隔 SYMBOL_FEATURES_RETRY_SEC 再试；同一天内每
+  SYMBOL_FEATURES_CHECK_SEC 查一次表里的 MAX(as_of_date)，比内存里的新就重载
+  （当天第一轮跑在 getdata / build 之前时，不会整个交易日都用着前一天的特征）。
+
+只有“跟上全表最新日期”的股票才返回特征（某只没拉到最新日线时返回 None），
+表整体太旧（超过 SYMBOL_FEATURES_MAX_AGE_DAYS）也全部返回 None；
+调用方拿到 None 一律回退原来的 SQL。
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+SYMBOL_FEATURES_ENABLED = int(os.getenv("SYMBOL_FEATURES_ENABLED", "1"))
+SYMBOL_FEATURES_TABLE = os.getenv("SYMBOL_FEATURES_TABLE", "symbol_daily_features")
+PRICES_TABLE = os.getenv("SYMBOL_FEATURES_PRICES_TABLE", os.getenv("B_PRICES_TABLE", "stock_prices_pool"))
+# 每只最多用最近多少根日线（strategy_q 的 C_LOOKBACK_DAYS 默认 90）
+SYMBOL_FEATURES_BARS = int(os.getenv("SYMBOL_FEATURES_BARS", "90"))
+# 读日线时回看的自然日，要能覆盖 SYMBOL_FEATURES_BARS 根交易日
+SYMBOL_FEATURES_LOOKBACK_DAYS = int(os.getenv("SYMBOL_FEATURES_LOOKBACK_DAYS", "150"))
+RECENT_CLOSES_N = int(os.getenv("SYMBOL_FEATURES_RECENT_CLOSES", "30"))
+# 周末 + 节假日最多 4 个自然日没有新日线
+SYMBOL_FEATURES_MAX_AGE_DAYS = int(os.getenv("SYMBOL_FEATURES_MAX_AGE_DAYS", "4"))
+SYMBOL_FEATURES_RETRY_SEC = float(os.getenv("SYMBOL_FEATURES_RETRY_SEC", "300"))
+SYMBOL_FEATURES_CHECK_SEC = float(os.getenv("SYMBOL_FEATURES_CHECK_SEC", "300"))
+
+FEATURE_COLUMNS = (
+    "as_of_date",
+    "bars",
+    "last_close",
+    "last_volume",
+    "avg_vol20",
+    "vol20",
+    "atr14",
+    "ma5",
+    "ma10",
+    "ma20",
+    "ma50",
+    "ret3",
+    "ret5",
+    "ret10",
+    "high20",
+    "low20",
+    "recent_closes",
+)
+
+_lock = threading.Lock()
+_features: dict = {}  # symbol -> dict，只做整体替换
+_max_as_of = None
+_loaded_day = None
+_last_attempt = 0.0
+_checked_at = 0.0
+
+
+# ============================================================
+# 表
+# ============================================================
+def ensure_table(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS `{SYMBOL_FEATURES_TABLE}` (
+              symbol VARCHAR(16) NOT NULL PRIMARY KEY,
+              as_of_date DATE NOT NULL,
+              bars INT NOT NULL,
+              last_close DOUBLE NULL,
+              last_volume DOUBLE NULL,
+              avg_vol20 DOUBLE NULL,
+              vol20 DOUBLE NULL,
+              atr14 DOUBLE NULL,
+              ma5 DOUBLE NULL,
+              ma10 DOUBLE NULL,
+              ma20 DOUBLE NULL,
+              ma50 DOUBLE NULL,
+              ret3 DOUBLE NULL,
+              ret5 DOUBLE NULL,
+              ret10 DOUBLE NULL,
+              high20 DOUBLE NULL,
+              low20 DOUBLE NULL,
+              recent_closes TEXT NULL,
+              updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+              INDEX idx_as_of_date (as_of_date)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """
+        )
+
+
+# ============================================================
+# 计算
+# ============================================================
+def compute_features(bars):
+    """
+    bars: DataFrame(symbol, date, open, high, low, close, volume)，任意顺序。
+    返回以 symbol 为索引的 DataFrame，列见 FEATURE_COLUMNS。
+
+    口径和原来的逐只 SQL 一致：
+    - last_close / ma / ret / high20 / low20 / vol20：最近 SYMBOL_FEATURES_BARS 根 close 非空的日线
+      （vol20 把缺失量当 0，和 strategy_q.analyze_market 一样）
+    - avg_vol20：最近 20 根 volume>0 的均量（strategy_b._get_avg_volume20）
+    - atr14：最近 14 根真实波幅的简单平均
+    - recent_closes：最近 RECENT_CLOSES_N 个收盘，新的在前
+    """
+    import pandas as pd
+
+    df = bars.dropna(subset=["symbol", "date", "close"]).copy()
+    if df.empty:
+        return pd.DataFrame(columns=list(FEATURE_COLUMNS))
+    df["symbol"] = df["symbol"].astype(str).str.strip().str.upper()
+    df["date"] = pd.to_datetime(df["date"]).dt.normalize()
+    for col in ("open", "high", "low", "close", "volume"):
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df = df.sort_values(["symbol", "date"], kind="mergesort")
+
+    # k=0 是最新一根
+    df["k"] = df.groupby("symbol", sort=False).cumcount(ascending=False)
+    df = df[df["k"] < SYMBOL_FEATURES_BARS]
+    g = df.groupby("symbol", sort=False)
+
+    last = df[df["k"] == 0].set_index("symbol")
+    out = pd.DataFrame(index=last.index)
+    out["as_of_date"] = last["date"].dt.date
+    out["bars"] = g.size()
+    out["last_close"] = last["close"]
+    out["last_volume"] = last["volume"].fillna(0.0)
+
+    for n in (5, 10, 20, 50):
+        out[f"ma{n}"] = df[df["k"] < n].groupby("symbol")["close"].mean()
+
+    for n in (3, 5, 10):
+        base = df[df["k"] == n].set_index("symbol")["close"]
+        base = base.reindex(out.index)
+        ret = out["last_close"] / base - 1
+        out[f"ret{n}"] = ret.where(base > 0, 0.0).fillna(0.0)
+
+    w20 = df[df["k"] < 20]
+    g20 = w20.groupby("symbol")
+    out["high20"] = g20["high"].max()
+    out["low20"] = g20["low"].min()
+    out["vol20"] = w20["volume"].fillna(0.0).groupby(w20["symbol"]).mean()
+
+    pos = df[df["volume"] > 0]
+    pos = pos[pos.groupby("symbol", sort=False).cumcount(ascending=False) < 20]
+    out["avg_vol20"] = pos.groupby("symbol")["volume"].mean().reindex(out.index).fillna(0.0)
+
+    prev_close = g["close"].shift(1)
+    tr = pd.concat(
+        [
+            df["high"] - df["low"],
+            (df["high"] - prev_close).abs(),
+            (df["low"] - prev_close).abs(),
+        ],
+        axis=1,
+    ).max(axis=1)
+    w14 = tr[df["k"] < 14]
+    out["atr14"] = w14.groupby(df.loc[w14.index, "symbol"]).mean()
+
+    rc = df[df["k"] < RECENT_CLOSES_N].sort_values(["symbol", "k"], kind="mergesort")
+    out["recent_closes"] = rc.groupby("symbol", sort=False)["close"].agg(
+        lambda s: json.dumps([round(float(x), 6) for x in s])
+    )
+    return out[list(FEATURE_COLUMNS)]
+
+
+def _load_bars_frame(conn):
+    import pandas as pd
+
+    since = date.today() - timedelta(days=max(SYMBOL_FEATURES_LOOKBACK_DAYS, 1))
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT `symbol`, `date`, `open`, `high`, `low`, `close`, `volume`
+            FROM `{PRICES_TABLE}`
+            WHERE `date` >= %s
+              AND `close` IS NOT NULL
+            """,
+            (since,),
+        )
+        rows = cur.fetchall() or []
+    return pd.DataFrame(list(rows), columns=["symbol", "date", "open", "high", "low", "close", "volume"])
+
+
+def _nullable(v):
+    if v is None:
+        return None
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    return v
+
+
+def build(conn) -> int:
+    """全量重算并 upsert，返回写入的股票数。"""
+    t0 = time.perf_counter()
+    ensure_table(conn)
+    bars = _load_bars_frame(conn)
+    feats = compute_features(bars)
+    if feats.empty:
+        print(f"[FEATURES] no bars in {PRICES_TABLE}", flush=True)
+        return 0
+
+    cols = ", ".join(f"`{c}`" for c in FEATURE_COLUMNS)
+    updates = ", ".join(f"`{c}`=VALUES(`{c}`)" for c in FEATURE_COLUMNS)
+    sql = f"""
+    INSERT INTO `{SYMBOL_FEATURES_TABLE}` (`symbol`, {cols})
+    VALUES ({", ".join(["%s"] * (len(FEATURE_COLUMNS) + 1))})
+    ON DUPLICATE KEY UPDATE {updates}
+    """
+    params = [
+        (symbol, *(_nullable(v.item() if hasattr(v, "item") else v) for v in values))
+        for symbol, *values in feats.itertuples(index=True, name=None)
+    ]
+    with conn.cursor() as cur:
+        cur.executemany(sql, params)
+    try:
+        conn.commit()
+    except Exception:
+        pass
+    print(
+        f"[FEATURES] built symbols={len(params)} bars={len(bars)} "
+        f"elapsed={time.perf_counter() - t0:.1f}s",
+        flush=True,
+    )
+    return len(params)
+
+
+# ============================================================
+# 进程内查表
+# ============================================================
+def _as_date(v):
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    try:
+        return datetime.strptime(str(v)[:10], "%Y-%m-%d").date()
+    except Exception:
+        return None
+
+
+def _table_as_of(conn):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT MAX(`as_of_date`) AS d FROM `{SYMBOL_FEATURES_TABLE}`")
+        row = cur.fetchone()
+    if not row:
+        return None
+    return _as_date(row.get("d") if isinstance(row, dict) else row[0])
+
+
+def load(conn) -> int:
+    """整表载入内存，返回股票数。"""
+    global _features, _max_as_of, _loaded_day, _checked_at
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT `symbol`, {', '.join(f'`{c}`' for c in FEATURE_COLUMNS)} FROM `{SYMBOL_FEATURES_TABLE}`")
+        rows = cur.fetchall() or []
+    feats = {}
+    max_as_of = None
+    for r in rows:
+        r = dict(r)
+        symbol = str(r.pop("symbol") or "").strip().upper()
+        as_of = _as_date(r.get("as_of_date"))
+        if not symbol or as_of is None:
+            continue
+        r["as_of_date"] = as_of
+        try:
+            r["recent_closes"] = [float(x) for x in json.loads(r.get("recent_closes") or "[]")]
+        except Exception:
+            r["recent_closes"] = []
+        feats[symbol] = r
+        if max_as_of is None or as_of > max_as_of:
+            max_as_of = as_of
+    with _lock:
+        _features = feats
+        _max_as_of = max_as_of
+        _loaded_day = date.today()
+        _checked_at = time.time()
+    return len(feats)
+
+
+def ensure_loaded(conn) -> bool:
+    """没载入过、跨日了、或表里出现更新的 as_of_date 就（重新）载入；失败不抛，隔一段时间再试。"""
+    global _last_attempt, _checked_at
+    if not SYMBOL_FEATURES_ENABLED or conn is None:
+        return bool(_features)
+    now = time.time()
+    if _loaded_day == date.today():
+        if now - _checked_at < SYMBOL_FEATURES_CHECK_SEC:
+            return True
+        _checked_at = now
+        try:
+            latest = _table_as_of(conn)
+        except Exception as exc:
+            print(f"[FEATURES] as_of check failed: {exc}", flush=True)
+            return True
+        if latest is None or (_max_as_of is not None and latest <= _max_as_of):
+            return True
+        print(f"[FEATURES] table as_of={latest} newer than loaded {_max_as_of}, reload", flush=True)
+    elif now - _last_attempt < SYMBOL_FEATURES_RETRY_SEC:
+        return bool(_features)
+    _last_attempt = now
+    try:
+        n = load(conn)
+        print(f"[FEATURES] loaded symbols={n} as_of={_max_as_of}", flush=True)
+        return True
+    except Exception as exc:
+        print(f"[FEATURES] load failed, fall back to SQL: {exc}", flush=True)
+        return False
+
+
+def get(symbol: str, conn=None):
+    """返回该股票的特征 dict；没有 / 落后于全表最新日期 / 全表过旧时返回 None。"""
+    if not SYMBOL_FEATURES_ENABLED:
+        return None
+    if conn is not None:
+        ensure_loaded(conn)
+    f = _features.get((symbol or "").strip().upper())
+    if f is None or _max_as_of is None or f["as_of_date"] != _max_as_of:
+        return None
+    if (date.today() - _max_as_of).days > SYMBOL_FEATURES_MAX_AGE_DAYS:
+        return None
+    return f
+
+
+def main():
+    from ultimate_v1.db import db_conn
+
+    with db_conn() as conn:
+        build(conn)
+
+
+if __name__ == "__main__":
+    main()
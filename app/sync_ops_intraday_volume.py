@@ -7,11 +7,20 @@ Purpose:
 - This local-only bot updates today's cumulative intraday volume directly on stock_operations
   so live buy rules can later use current volume without depending on cloud
   Yahoo access or Alpaca market-data entitlements.
+
+Throughput (1000+ symbols per minute):
+- chart_meta requests run on a bounded worker pool; every worker keeps its own
+  requests.Session so the Yahoo connection is reused across symbols and passes.
+- Symbols whose fetched volume equals what stock_operations already holds are
+  skipped; the rest are written with one multi-row insert into a temporary
+  table plus a single UPDATE ... JOIN per pass.
 """
 from __future__ import annotations
 
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import pandas as pd
@@ -19,6 +28,11 @@ import pymysql
 import requests
 import yfinance as yf
 
+try:
+    from app import schema_registry
+except ImportError:  # run directly as app/sync_ops_intraday_volume.py (see README): app/ is on sys.path
+    import schema_registry  # type: ignore
+
 try:
     from zoneinfo import ZoneInfo
 except Exception:
@@ -51,6 +65,13 @@ LA_TZ = ZoneInfo(LA_TZ_NAME) if ZoneInfo else None
 START_LA = os.getenv("OPS_VOLUME_START_LA", "06:00")
 END_LA = os.getenv("OPS_VOLUME_END_LA", "17:00")
 IGNORE_WINDOW = int(os.getenv("OPS_VOLUME_IGNORE_WINDOW", "0"))
+WORKERS = max(1, int(os.getenv("OPS_VOLUME_WORKERS", "16")))
+WRITE_CHUNK = max(1, int(os.getenv("OPS_VOLUME_WRITE_CHUNK", "1000")))
+TMP_TABLE = "tmp_ops_intraday_volume"
+
+_local = threading.local()
+_executor = None
+_executor_lock = threading.Lock()
 
 
 def _connect():
@@ -93,6 +114,7 @@ def _in_active_window():
     return ok, now.strftime("%H:%M")
 
 
+@schema_registry.once(f"{OPS_TABLE}.intraday_volume")
 def _ensure_columns(conn):
     wanted = {
         "intraday_volume": "BIGINT NULL",
@@ -117,33 +139,47 @@ def _ensure_columns(conn):
 
 
 def _load_symbols(conn):
+    """
+    Return {symbol: stored intraday_volume}.
+
+    A symbol may own several rows (one per stock_type); when they disagree the
+    stored value is None so the next pass rewrites all of them.
+    """
     stock_types = [x.strip().upper() for x in STOCK_TYPES.split(",") if x.strip()]
     if stock_types and "ALL" not in stock_types:
         placeholders = ",".join(["%s"] * len(stock_types))
-        sql = f"""
-        SELECT DISTINCT UPPER(stock_code) AS symbol
-        FROM `{OPS_TABLE}`
-        WHERE stock_code IS NOT NULL
-          AND stock_code <> ''
-          AND stock_type IN ({placeholders})
-        ORDER BY symbol;
-        """
+        type_filter = f"AND stock_type IN ({placeholders})"
         args = tuple(stock_types)
     else:
-        sql = f"""
-        SELECT DISTINCT UPPER(stock_code) AS symbol
-        FROM `{OPS_TABLE}`
-        WHERE stock_code IS NOT NULL
-          AND stock_code <> ''
-        ORDER BY symbol;
-        """
+        type_filter = ""
         args = ()
 
+    sql = f"""
+    SELECT UPPER(stock_code) AS symbol,
+           MIN(intraday_volume) AS min_volume,
+           MAX(intraday_volume) AS max_volume,
+           SUM(intraday_volume IS NULL) AS null_rows
+    FROM `{OPS_TABLE}`
+    WHERE stock_code IS NOT NULL
+      AND stock_code <> ''
+      {type_filter}
+    GROUP BY UPPER(stock_code)
+    ORDER BY symbol;
+    """
+
     with conn.cursor() as cur:
         cur.execute(sql, args)
         rows = cur.fetchall() or []
 
-    return [str(r.get("symbol") or "").strip().upper() for r in rows if r.get("symbol")]
+    out = {}
+    for r in rows:
+        symbol = str(r.get("symbol") or "").strip().upper()
+        if not symbol:
+            continue
+        lo, hi = r.get("min_volume"), r.get("max_volume")
+        same = lo is not None and lo == hi and not int(r.get("null_rows") or 0)
+        out[symbol] = int(lo) if same else None
+    return out
 
 
 def _extract_symbol_frame(df: pd.DataFrame, symbol: str):
@@ -183,6 +219,26 @@ def _volume_tuple(symbol: str, subdf: pd.DataFrame):
     return symbol, volume
 
 
+def _session():
+    sess = getattr(_local, "session", None)
+    if sess is None:
+        sess = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4)
+        sess.mount("https://", adapter)
+        sess.headers.update({"User-Agent": "Mozilla/5.0", "Accept": "application/json"})
+        _local.session = sess
+    return sess
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Kept for the life of the process so worker Sessions stay warm between passes.
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="ops-vol")
+        return _executor
+
+
 def _fetch_yahoo_chart_volume(symbol: str):
     """
     Prefer Yahoo chart meta.regularMarketVolume.
@@ -198,12 +254,8 @@ def _fetch_yahoo_chart_volume(symbol: str):
         "interval": INTERVAL,
         "includePrePost": "false",
     }
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "application/json",
-    }
     try:
-        r = requests.get(url, params=params, headers=headers, timeout=YAHOO_TIMEOUT)
+        r = _session().get(url, params=params, timeout=YAHOO_TIMEOUT)
         if r.status_code != 200:
             return None
         js = r.json()
@@ -246,8 +298,8 @@ def _fetch_batch(symbols):
 
     if SOURCE == "chart_meta":
         fallback_symbols = []
-        for symbol in symbols:
-            item = _fetch_yahoo_chart_volume(symbol)
+        results = _get_executor().map(_fetch_yahoo_chart_volume, symbols)
+        for symbol, item in zip(symbols, results):
             if item:
                 rows.append(item)
             else:
@@ -272,47 +324,83 @@ def _fetch_batch(symbols):
     return rows, failed
 
 
+def _changed_rows(rows, stored):
+    return [(symbol, volume) for symbol, volume in rows if stored.get(symbol) != volume]
+
+
 def _update_ops(conn, rows):
+    """One pass = one temp-table load + one UPDATE ... JOIN."""
     if not rows:
         return 0
-    sql = f"""
-    UPDATE `{OPS_TABLE}`
-    SET intraday_volume=%s
-    WHERE stock_code=%s;
-    """
-    args = [(volume, symbol) for symbol, volume in rows]
     with conn.cursor() as cur:
-        return cur.executemany(sql, args)
+        cur.execute(
+            f"""
+            CREATE TEMPORARY TABLE IF NOT EXISTS `{TMP_TABLE}` (
+              stock_code VARCHAR(16) NOT NULL PRIMARY KEY,
+              intraday_volume BIGINT NULL
+            ) ENGINE=MEMORY;
+            """
+        )
+        cur.execute(f"TRUNCATE TABLE `{TMP_TABLE}`;")
+        for chunk in _chunked(rows, WRITE_CHUNK):
+            values = ",".join(["(%s,%s)"] * len(chunk))
+            args = [x for symbol, volume in chunk for x in (symbol, volume)]
+            cur.execute(
+                f"""
+                INSERT INTO `{TMP_TABLE}` (stock_code, intraday_volume)
+                VALUES {values}
+                ON DUPLICATE KEY UPDATE intraday_volume=VALUES(intraday_volume);
+                """,
+                args,
+            )
+        return cur.execute(
+            f"""
+            UPDATE `{OPS_TABLE}` o
+            JOIN `{TMP_TABLE}` t ON t.stock_code = o.stock_code
+            SET o.intraday_volume = t.intraday_volume
+            WHERE NOT (o.intraday_volume <=> t.intraday_volume);
+            """
+        )
 
 
 def sync_once():
     conn = _connect()
     try:
         _ensure_columns(conn)
-        symbols = _load_symbols(conn)
+        stored = _load_symbols(conn)
+        symbols = list(stored)
         print(
             f"[OPS VOL] symbols={len(symbols)} types={STOCK_TYPES or 'ALL'} "
-            f"period={PERIOD} interval={INTERVAL}",
+            f"period={PERIOD} interval={INTERVAL} workers={WORKERS}",
             flush=True,
         )
         if not symbols:
             return 0, 0
 
-        total_rows = 0
+        fetched = []
         failed_all = []
         for batch_no, batch in enumerate(_chunked(symbols, BATCH_SIZE), start=1):
             t0 = time.perf_counter()
             rows, failed = _fetch_batch(batch)
-            affected = _update_ops(conn, rows)
-            total_rows += len(rows)
+            fetched.extend(rows)
             failed_all.extend(failed)
             print(
                 f"[OPS VOL] batch={batch_no} requested={len(batch)} "
-                f"fetched={len(rows)} updated={affected} failed={len(failed)} "
+                f"fetched={len(rows)} failed={len(failed)} "
                 f"elapsed={time.perf_counter() - t0:.1f}s",
                 flush=True,
             )
 
+        t0 = time.perf_counter()
+        changed = _changed_rows(fetched, stored)
+        affected = _update_ops(conn, changed)
+        total_rows = len(fetched)
+        print(
+            f"[OPS VOL] write changed={len(changed)} unchanged={total_rows - len(changed)} "
+            f"updated={affected} elapsed={time.perf_counter() - t0:.2f}s",
+            flush=True,
+        )
+
         if failed_all:
             print(f"[OPS VOL] failed={','.join(sorted(set(failed_all))[:50])}", flush=True)
         print(f"[OPS VOL] done updated_symbols={total_rows} failed={len(set(failed_all))}", flush=True)
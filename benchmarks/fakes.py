@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/fakes.py
+
+基准测试用的进程内假 Alpaca（行情 + 交易）和假 MySQL。
+
+- SyntheticPool：按 seed 生成 N 只股票的日线 / 实时行情 / stock_operations 行，
+  同一个 seed 每次完全一样，基线之间可比。
+- FakeDataAPI：替换 strategy_b._snapshot_http / _snapshots_http、
+  get_latest_stock_price，每次 HTTP 先睡 latency。
+- FakeTradingAPI：TradingClient 的子集（下单、查单、持仓、账户），下单立即成交。
+- FakeDB / FakeConn：按 SQL 里的表名和关键字路由到内存数据，
+  写语句只计数；每条 SQL 可加 db_latency。
+
+只覆盖被测热路径用到的 SQL，不追求通用；新基准用到没覆盖的查询时
+SELECT 返回空结果，不会报错，结果里 db_unrouted 会变大，提醒补路由。
+"""
+
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# 卖出基准里触发止损的比例；买入打分里能过滤到打分阶段的比例
+SELL_STOP_RATIO = 0.1
+B_PASS_RATIO = 0.3
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code: int = 200):
+        self._payload = payload
+        self.status_code = status_code
+        self.text = ""
+
+    def json(self):
+        return self._payload
+
+
+class SyntheticPool:
+    """N 只合成股票：S0000…；价格、成交量、持仓都由 seed 决定。"""
+
+    def __init__(self, size: int, seed: int = 7):
+        rng = random.Random(seed)
+        self.size = int(size)
+        self.symbols = [f"S{i:04d}" for i in range(self.size)]
+        self.quotes = {}
+        self.prev_close = {}
+        self.avg_volume = {}
+        self.b_buy_rows = {}
+        self.b_sell_rows = {}
+        self.watch_rows = []
+        self.quick_rows = []
+        self.ac_rows = []
+        old = (datetime.now() - timedelta(days=3)).strftime("%Y-%m-%d %H:%M:%S")
+
+        for i, code in enumerate(self.symbols):
+            prev = round(rng.uniform(5, 300), 2)
+            passes = rng.random() < B_PASS_RATIO
+            up = rng.uniform(0.02, 0.07) if passes else rng.uniform(-0.04, 0.015)
+            last = round(prev * (1 + up), 2)
+            high = round(max(last, prev) * (1 + rng.uniform(0, 0.004)), 2)
+            low = round(min(last, prev) * (1 - rng.uniform(0, 0.02)), 2)
+            spread = max(0.01, round(last * 0.0004, 2))
+            self.prev_close[code] = prev
+            self.avg_volume[code] = rng.uniform(2e5, 2e7)
+            self.quotes[code] = {
+                "latestTrade": {"p": last},
+                "latestQuote": {"bp": round(last - spread / 2, 2), "ap": round(last + spread / 2, 2)},
+                "dailyBar": {"o": round(prev * (1 + up / 3), 2), "h": high, "l": low, "c": last, "t": "today"},
+                "prevDailyBar": {"c": prev},
+            }
+
+            self.b_buy_rows[code] = {
+                "id": i + 1,
+                "stock_code": code,
+                "stock_type": "B",
+                "is_bought": 0,
+                "can_buy": 1,
+                "can_sell": 0,
+                "qty": 0,
+                "trigger_price": round(prev * 1.005, 2),
+                "entry_close": prev,
+                "close_price": prev,
+                "intraday_volume": int(self.avg_volume[code] * rng.uniform(0.2, 1.2)),
+                "last_order_side": None,
+                "last_order_time": None,
+            }
+
+            stop_hit = rng.random() < SELL_STOP_RATIO
+            cost = round(last / 0.93, 2) if stop_hit else round(last / rng.uniform(1.0, 1.12), 2)
+            self.b_sell_rows[code] = {
+                "id": i + 1,
+                "stock_code": code,
+                "stock_type": "B",
+                "is_bought": 1,
+                "can_buy": 0,
+                "can_sell": 1,
+                "qty": rng.randint(5, 200),
+                "base_qty": 0,
+                "cost_price": cost,
+                "stop_loss_price": round(cost * 0.98, 2),
+                "take_profit_price": 0,
+                "trigger_price": cost,
+                "b_stage": 0,
+                "b_peak_price": cost,
+                "b_peak_profit": 0,
+                "b_last_profit": 0,
+                "last_order_side": "buy",
+                "last_order_time": old,
+            }
+
+            last_sell = round(last / rng.uniform(1.0, 1.2), 2)
+            self.watch_rows.append(
+                {
+                    "id": i + 1,
+                    "stock_code": code,
+                    "source_reason": "B:STOP",
+                    "last_sell_price": last_sell,
+                    "last_sell_time": old,
+                    "b_peak_price": last_sell * 1.1,
+                    "b_peak_profit": 0,
+                    "watch_since": old,
+                }
+            )
+
+            self.quick_rows.append(
+                {
+                    "id": i + 1,
+                    "stock_code": code,
+                    "stock_type": "B",
+                    "strategy_group": "B",
+                    "trigger_price": round(prev * 1.002, 2),
+                    "current_price": last,
+                    "close_price": prev,
+                    "entry_close": prev,
+                    "entry_open": prev,
+                    "is_bought": 0,
+                    "can_buy": 1,
+                }
+            )
+
+            self.ac_rows.append(
+                {
+                    "id": i + 1,
+                    "stock_code": code,
+                    "stock_type": "C",
+                    "ac_t_enabled": 1,
+                    "ac_t_type": "C",
+                    "ac_t_state": "IDLE",
+                    "qty": 100,
+                    "ac_t_core_qty": 100,
+                    "ac_t_base_price": None,
+                    "ac_t_base_date": None,
+                }
+            )
+
+    def last_price(self, code: str) -> float:
+        q = self.quotes.get(code) or {}
+        return float((q.get("latestTrade") or {}).get("p") or 0.0)
+
+    def feature_rows(self) -> list:
+        """symbol_daily_features 的整表内容：昨天收盘的日线特征。"""
+        as_of = (datetime.now() - timedelta(days=1)).date()
+        return [
+            {
+                "symbol": code,
+                "as_of_date": as_of,
+                "bars": 90,
+                "last_close": self.prev_close[code],
+                "avg_vol20": self.avg_volume[code],
+                "recent_closes": json.dumps([self.prev_close[code]] * 30),
+            }
+            for code in self.symbols
+        ]
+
+
+# ============================================================
+# 行情
+# ============================================================
+class FakeDataAPI:
+    def __init__(self, pool: SyntheticPool, latency_sec: float = 0.0):
+        self.pool = pool
+        self.latency_sec = float(latency_sec)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _hit(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency_sec > 0:
+            time.sleep(self.latency_sec)
+
+    def snapshot_http(self, code, feed, retries=3, backoff=1.5):
+        self._hit()
+        js = self.pool.quotes.get(code)
+        return FakeResponse(js, 200) if js else FakeResponse({}, 404)
+
+    def snapshots_http(self, codes, feed, retries=3, backoff=1.5):
+        self._hit()
+        return FakeResponse({c: self.pool.quotes[c] for c in codes if c in self.pool.quotes})
+
+    def latest_price(self, symbol, feed=None):
+        self._hit()
+        return self.pool.last_price((symbol or "").strip().upper())
+
+
+# ============================================================
+# 交易
+# ============================================================
+class FakeTradingAPI:
+    """TradingClient 的子集；市价 / 限价单都按当前价立即全部成交。"""
+
+    def __init__(self, pool: SyntheticPool, latency_sec: float = 0.0):
+        self.pool = pool
+        self.latency_sec = float(latency_sec)
+        self.calls = 0
+        self.orders = {}
+        self.positions = {c: int(r["qty"]) for c, r in pool.b_sell_rows.items()}
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def _hit(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency_sec > 0:
+            time.sleep(self.latency_sec)
+
+    def submit_order(self, order_data):
+        self._hit()
+        side = str(getattr(order_data.side, "value", order_data.side)).lower()
+        code = order_data.symbol
+        qty = int(float(order_data.qty))
+        with self._lock:
+            self._seq += 1
+            oid = f"bench-{self._seq}"
+            if side == "sell":
+                self.positions[code] = max(self.positions.get(code, 0) - qty, 0)
+            else:
+                self.positions[code] = self.positions.get(code, 0) + qty
+            self.orders[oid] = SimpleNamespace(
+                id=oid,
+                symbol=code,
+                side=side,
+                status="filled",
+                qty=qty,
+                filled_qty=str(qty),
+                filled_avg_price=str(self.pool.last_price(code)),
+            )
+        return SimpleNamespace(id=oid, status="accepted", symbol=code)
+
+    def get_order_by_id(self, order_id):
+        self._hit()
+        return self.orders[str(order_id)]
+
+    def get_open_position(self, symbol):
+        self._hit()
+        qty = self.positions.get(symbol, 0)
+        if qty <= 0:
+            raise RuntimeError('{"code":40410000,"message":"position does not exist"}')
+        return SimpleNamespace(qty=str(qty), avg_entry_price=str(self.pool.last_price(symbol)))
+
+    def get_account(self):
+        self._hit()
+        return SimpleNamespace(buying_power="1000000", cash="1000000", non_marginable_buying_power="1000000")
+
+    def get_orders(self, filter=None):
+        self._hit()
+        return []
+
+    def cancel_order_by_id(self, order_id):
+        self._hit()
+
+
+# ============================================================
+# MySQL
+# ============================================================
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+        self._result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        return False
+
+    def execute(self, sql, args=()):
+        self._result, self.rowcount = self.db.route(str(sql), tuple(args or ()))
+        return self.rowcount
+
+    def executemany(self, sql, rows):
+        rows = list(rows or [])
+        self.db.write(len(rows))
+        self.rowcount = len(rows)
+        return self.rowcount
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return list(self._result)
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, *_args, **_kwargs):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=True):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeDB:
+    """
+    按 SQL 路由的内存库。mode 决定 stock_operations 单行查询返回买入行还是持仓行：
+    b_buy / b_sell / f_scan / quick / ac_t。
+    """
+
+    def __init__(self, pool: SyntheticPool, mode: str, latency_sec: float = 0.0):
+        self.pool = pool
+        self.mode = mode
+        self.latency_sec = float(latency_sec)
+        self.selects = 0
+        self.writes = 0
+        self.unrouted = 0
+        self._lock = threading.Lock()
+        rows = pool.b_sell_rows if mode == "b_sell" else pool.b_buy_rows
+        # 写语句不改内存行，每次取行都给副本，多轮之间互不影响
+        self.ops = rows
+
+    def connect(self, *_args, **_kwargs):
+        return FakeConn(self)
+
+    @contextmanager
+    def db_conn(self, *_args, **_kwargs):
+        yield FakeConn(self)
+
+    def write(self, n: int = 1):
+        with self._lock:
+            self.writes += n
+        if self.latency_sec > 0:
+            time.sleep(self.latency_sec)
+
+    def route(self, sql: str, args: tuple):
+        head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+        if head != "SELECT":
+            self.write()
+            return [], 1
+        with self._lock:
+            self.selects += 1
+        if self.latency_sec > 0:
+            time.sleep(self.latency_sec)
+        rows = self._select(sql, args)
+        if rows is None:
+            with self._lock:
+                self.unrouted += 1
+            rows = []
+        return rows, len(rows)
+
+    def _select(self, sql: str, args: tuple):
+        pool = self.pool
+        if "COUNT(*)" in sql:
+            return [{"n": 0}]
+        if "MAX(bucket_time)" in sql and "JOIN" not in sql:
+            return [{"bucket_time": None}]
+        if "_buy_scores" in sql:
+            return []
+        if "symbol_daily_features" in sql:
+            rows = pool.feature_rows()
+            if "MAX(`as_of_date`)" in sql:
+                return [{"d": rows[0]["as_of_date"] if rows else None}]
+            return rows
+        if "AVG(volume)" in sql:
+            return [{"avg_vol": pool.avg_volume.get(args[0], 0.0)}]
+        if "stock_prices_pool" in sql:
+            prev = pool.prev_close.get(args[0], 0.0) if args else 0.0
+            n = int(args[1]) if len(args) > 1 and isinstance(args[1], int) else 1
+            return [{"close": prev}] * max(n, 1)
+        if "monster_watchlist" in sql:
+            if "watch_status='WATCHING'" in sql:
+                return [dict(r) for r in pool.watch_rows]
+            return []
+        if "stock_operations" in sql:
+            if "ac_t_enabled" in sql:
+                return [dict(r) for r in pool.ac_rows]
+            if "COALESCE(can_buy, 0)=1" in sql:
+                limit = int(args[-1]) if args else len(pool.quick_rows)
+                return [dict(r) for r in pool.quick_rows[:limit]]
+            if "COALESCE(is_bought, 0)=1" in sql:
+                return []
+            if " IN (" in sql and "stock_code IN" in sql:
+                want = set(args)
+                return [dict(r) for c, r in self.ops.items() if c in want]
+            if "stock_code=%s" in sql and args:
+                row = self.ops.get(args[0])
+                return [dict(row)] if row else []
+        return None
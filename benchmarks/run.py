@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/run.py
+
+交易热路径的吞吐基准：不连网、不连库，全部跑在 benchmarks/fakes.py 的假 Alpaca / 假 MySQL 上。
+
+覆盖：
+- b_rank       strategy_B_rank_and_confirm(全池)
+- b_sell       strategy_B_sell(逐只，带预读行；约 10% 触发止损走完整卖出 + 对账)
+- b_sell_metrics  同 b_sell，但先 bot_metrics.install() 并按一轮 start_round / finish_round，
+               用来核对计时包装的开销预算（--metrics-budget，默认 1%）
+- f_scan       strategy_F_scan()
+- quick_trade  quick_trade.run_once(dry_run=True)，候选数放开到池大小
+- ac_t         run_strategy_ac_t_once()，时间固定在 08:00 LA
+
+每个 (case, size) 先跑 --repeat 次取最快一次算 symbols/sec，
+再单独开 tracemalloc 跑一次，记录每只股票的峰值分配（KiB）和每只股票的 HTTP / SQL 次数。
+限速桶调成不限速，只测 rate_limiter 本身的开销；quote_cache 用临时目录，每次都是冷缓存。
+
+用法：
+python -m benchmarks.run                         # 50/500/5000 全部 case，和 baseline.json 比
+python -m benchmarks.run --sizes 500 --cases b_rank,b_sell
+python -m benchmarks.run --data-latency-ms 20 --order-latency-ms 50
+python -m benchmarks.run --save-baseline         # 覆盖 benchmarks/baseline.json
+
+和基线比：symbols/sec 低于基线 (1 - tolerance) 或分配高于基线 (1 + tolerance) 记为回退，退出码 1。
+b_sell_metrics 打印两种开销：和 b_sell 的墙钟差（单核机器上 ±5% 的抖动，只做参考），
+以及 本轮 span 采样数 × 单次包装耗时 / 总耗时 的实测开销，后者按预算判回退；
+只有带了 --data-latency-ms / --order-latency-ms 才判：零延迟下假接口本身只有几微秒，占比没有意义。
+基线只在同一台机器、同样的延迟参数下有意义；参数不一致时只打印不比较。
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.fakes import FakeDataAPI, FakeDB, FakeTradingAPI, SyntheticPool  # noqa: E402
+
+DEFAULT_SIZES = (50, 500, 5000)
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DB_MODE = {
+    "b_rank": "b_buy",
+    "b_sell": "b_sell",
+    "b_sell_metrics": "b_sell",
+    "f_scan": "f_scan",
+    "quick_trade": "quick",
+    "ac_t": "ac_t",
+}
+
+
+class BenchEnv:
+    def __init__(self, pool, data_latency, order_latency, db_latency, mode, tmpdir):
+        self.pool = pool
+        self.data = FakeDataAPI(pool, data_latency)
+        self.trading = FakeTradingAPI(pool, order_latency)
+        self.db = FakeDB(pool, mode, db_latency)
+        self.tmpdir = tmpdir
+        self.metric_samples = 0
+
+
+@contextlib.contextmanager
+def _patched(pairs):
+    saved = [(obj, name, getattr(obj, name)) for obj, name, _ in pairs]
+    try:
+        for obj, name, value in pairs:
+            setattr(obj, name, value)
+        yield
+    finally:
+        for obj, name, value in reversed(saved):
+            setattr(obj, name, value)
+
+
+@contextlib.contextmanager
+def _fake_world(env: BenchEnv):
+    from app import quick_trade as qt
+    from app import quote_cache, rate_limiter, symbol_features
+    from app import strategy_ac_t as ac
+    from app import strategy_b as b
+    from app import strategy_f as f
+
+    b._snapshot_cache.clear()
+    b._snapshot_quote_cache.clear()
+    unlimited = {
+        name: rate_limiter.Bucket(name, per_min=1e9, burst=1e9) for name in rate_limiter.BUCKETS
+    }
+    fixed_now = datetime.now(ac.LA_TZ).replace(hour=8, minute=0, second=0, microsecond=0)
+    snap = type(
+        "Snap",
+        (),
+        {"buying_power": 1e6, "account_blocked": False, "trading_blocked": False, "trade_suspended_by_user": False},
+    )()
+    stamp = f"{time.time_ns()}"
+    pairs = [
+        (rate_limiter, "RATE_LIMIT_PATH", os.path.join(env.tmpdir, f"rl-{stamp}.sqlite3")),
+        (rate_limiter, "BUCKETS", unlimited),
+        (quote_cache, "SHARED_QUOTE_CACHE_PATH", os.path.join(env.tmpdir, f"qc-{stamp}.sqlite3")),
+        (b, "_snapshot_http", env.data.snapshot_http),
+        (b, "_snapshots_http", env.data.snapshots_http),
+        (b, "_connect", env.db.connect),
+        (b, "_trading_client", rate_limiter.limit_client(env.trading)),
+        (b, "_is_b_buy_window_open", lambda: (True, "08:00", b.B_BUY_WINDOW_START_LA, b.B_BUY_WINDOW_END_LA)),
+        (b, "_b_buy_plan", lambda active_b=0: b._fallback_b_buy_plan(active_b)),
+        (f, "_connect", env.db.connect),
+        (qt, "get_account_snapshot", lambda: snap),
+        (qt, "db_conn", env.db.db_conn),
+        (qt, "MAX_CANDIDATES", env.pool.size),
+        (ac, "ensure_schema", lambda: None),
+        (ac, "trading_client", lambda: rate_limiter.limit_client(env.trading)),
+        (ac, "db_conn", env.db.db_conn),
+        (ac, "get_latest_stock_price", env.data.latest_price),
+        (ac, "_now_la", lambda: fixed_now),
+        (symbol_features, "_features", {}),
+        (symbol_features, "_max_as_of", None),
+        (symbol_features, "_loaded_day", None),
+        (symbol_features, "_last_attempt", 0.0),
+        (symbol_features, "_checked_at", 0.0),
+    ]
+    with _patched(pairs):
+        # 机器人在每轮开头载入日线特征（split_core / async_core），不算进 case 的耗时 / 内存 / SQL 次数
+        symbol_features.load(env.db.connect())
+        env.db.selects = 0
+        yield
+
+
+# ============================================================
+# cases：返回本次处理的股票数
+# ============================================================
+def case_b_rank(env: BenchEnv) -> int:
+    from app import strategy_b as b
+
+    b.strategy_B_rank_and_confirm(env.pool.symbols)
+    return env.pool.size
+
+
+def case_b_sell(env: BenchEnv) -> int:
+    from app import strategy_b as b
+
+    for code in env.pool.symbols:
+        b.strategy_B_sell(code, row=dict(env.pool.b_sell_rows[code]))
+    return env.pool.size
+
+
+@contextlib.contextmanager
+def _bot_metrics_installed():
+    # install() 直接替换模块属性；case 结束后换回原函数，同一进程里后面的 case 不带计时
+    import importlib
+
+    from app import bot_metrics as bm
+
+    pairs = [(bm, "BOT_METRICS_ENABLED", 1), (bm, "_installed", False)]
+    for _span, module_name, attr in bm.HOT_PATHS:
+        for mod_name in (module_name, *bm.ALSO_PATCH):
+            mod = importlib.import_module(mod_name)
+            if hasattr(mod, attr):
+                pairs.append((mod, attr, getattr(mod, attr)))
+    with _patched(pairs):
+        bm.install()
+        try:
+            yield bm
+        finally:
+            bm._samples.clear()
+
+
+def case_b_sell_metrics(env: BenchEnv) -> int:
+    from app import strategy_b as b
+
+    with _bot_metrics_installed() as bm:
+        bm.start_round()
+        for code in env.pool.symbols:
+            b.strategy_B_sell(code, row=dict(env.pool.b_sell_rows[code]))
+        # conn=None 只汇总不写库：写库是每轮一次 executemany，不随股票数增长
+        spans = bm.finish_round(None, "bench", 1, "regular")
+    env.metric_samples = sum(s["calls"] for s in spans)
+    return env.pool.size
+
+
+def case_f_scan(env: BenchEnv) -> int:
+    from app import strategy_f as f
+
+    f.strategy_F_scan(prepare_buy=False)
+    return env.pool.size
+
+
+def case_quick_trade(env: BenchEnv) -> int:
+    from app import quick_trade as qt
+
+    qt.run_once(dry_run=True)
+    return env.pool.size
+
+
+def case_ac_t(env: BenchEnv) -> int:
+    from app import strategy_ac_t as ac
+
+    ac.run_strategy_ac_t_once()
+    return env.pool.size
+
+
+CASES = {
+    "b_rank": case_b_rank,
+    "b_sell": case_b_sell,
+    "b_sell_metrics": case_b_sell_metrics,
+    "f_scan": case_f_scan,
+    "quick_trade": case_quick_trade,
+    "ac_t": case_ac_t,
+}
+
+
+# ============================================================
+# 执行 / 对比
+# ============================================================
+@contextlib.contextmanager
+def _quiet():
+    # 策略函数逐只 print；丢进 devnull，不用 StringIO 以免日志本身占内存
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink), contextlib.redirect_stderr(sink):
+        yield
+
+
+def _run_once(case: str, pool, args, tmpdir, trace: bool = False):
+    env = BenchEnv(
+        pool,
+        args.data_latency_ms / 1000.0,
+        args.order_latency_ms / 1000.0,
+        args.db_latency_ms / 1000.0,
+        DB_MODE[case],
+        tmpdir,
+    )
+    with _fake_world(env), _quiet():
+        if trace:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            n = CASES[case](env)
+        finally:
+            elapsed = time.perf_counter() - t0
+            peak = 0
+            if trace:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+    return env, n, elapsed, peak
+
+
+def run_case(case: str, size: int, args, tmpdir) -> dict:
+    # 先用小池子热身一次：alpaca-py 等模块的首次 import 不算进成绩
+    _run_once(case, SyntheticPool(5, seed=args.seed), args, tmpdir)
+    pool = SyntheticPool(size, seed=args.seed)
+    best = None
+    env = None
+    n = size
+    for _ in range(max(int(args.repeat), 1)):
+        env, n, elapsed, _ = _run_once(case, pool, args, tmpdir)
+        best = elapsed if best is None else min(best, elapsed)
+    _, _, _, peak = _run_once(case, pool, args, tmpdir, trace=True)
+    n = max(n, 1)
+    return {
+        "case": case,
+        "size": size,
+        "seconds": round(best, 4),
+        "symbols_per_sec": round(n / best, 1) if best > 0 else 0.0,
+        "alloc_kib_per_symbol": round(peak / 1024.0 / n, 2),
+        "http_per_symbol": round(env.data.calls / n, 3),
+        "orders_api_per_symbol": round(env.trading.calls / n, 3),
+        "sql_select_per_symbol": round(env.db.selects / n, 3),
+        "sql_write_per_symbol": round(env.db.writes / n, 3),
+        "db_unrouted": env.db.unrouted,
+        "metric_samples_per_symbol": round(env.metric_samples / n, 3),
+    }
+
+
+def _params(args) -> dict:
+    return {
+        "data_latency_ms": args.data_latency_ms,
+        "order_latency_ms": args.order_latency_ms,
+        "db_latency_ms": args.db_latency_ms,
+        "seed": args.seed,
+    }
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    base = baseline.get("results") or {}
+    problems = []
+    for r in results:
+        key = f"{r['case']}/{r['size']}"
+        old = base.get(key)
+        if not old:
+            continue
+        if r["symbols_per_sec"] < float(old["symbols_per_sec"]) * (1.0 - tolerance):
+            problems.append(
+                f"{key} symbols/sec {r['symbols_per_sec']:.1f} < baseline {float(old['symbols_per_sec']):.1f}"
+            )
+        old_alloc = float(old.get("alloc_kib_per_symbol") or 0)
+        if old_alloc > 0 and r["alloc_kib_per_symbol"] > old_alloc * (1.0 + tolerance):
+            problems.append(
+                f"{key} alloc {r['alloc_kib_per_symbol']:.2f}KiB/sym > baseline {old_alloc:.2f}"
+            )
+    return problems
+
+
+def _timed_call_cost(n: int = 20000) -> float:
+    """bot_metrics.timed 包装一次调用的耗时（秒），不含被包的函数本身。"""
+    from app import bot_metrics as bm
+
+    def noop():
+        return None
+
+    wrapped = bm.timed("bench_noop", noop)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        noop()
+    bare = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(n):
+        wrapped()
+    cost = max(time.perf_counter() - t0 - bare, 0.0) / n
+    bm._samples.pop("bench_noop", None)
+    return cost
+
+
+def metrics_overhead(results: list[dict], args) -> list[str]:
+    """b_sell_metrics 的计时开销；带 I/O 延迟时实测开销超过 --metrics-budget 记为回退。"""
+    plain = {r["size"]: r for r in results if r["case"] == "b_sell"}
+    problems = []
+    per_call = None
+    for r in results:
+        if r["case"] != "b_sell_metrics" or r["seconds"] <= 0:
+            continue
+        per_call = _timed_call_cost() if per_call is None else per_call
+        measured = r["metric_samples_per_symbol"] * r["size"] * per_call / r["seconds"]
+        base = plain.get(r["size"])
+        wall = f"{r['seconds'] / base['seconds'] - 1.0:+.2%}" if base and base["seconds"] > 0 else "n/a"
+        print(
+            f"bot_metrics size={r['size']}: {r['metric_samples_per_symbol']:.1f} spans/sym x "
+            f"{per_call * 1e6:.2f}us = {measured:.3%} of round (budget {args.metrics_budget:.0%}); "
+            f"wall vs b_sell {wall}"
+        )
+        if (args.data_latency_ms > 0 or args.order_latency_ms > 0) and measured > args.metrics_budget:
+            problems.append(f"b_sell_metrics/{r['size']} overhead {measured:.2%} > budget {args.metrics_budget:.0%}")
+    return problems
+
+
+def _print_table(results: list[dict], baseline: dict) -> None:
+    base = baseline.get("results") or {}
+    print(
+        f"{'case':<16}{'size':>6}{'sec':>9}{'sym/s':>11}{'base':>11}"
+        f"{'KiB/sym':>9}{'http':>7}{'order':>7}{'sql_r':>7}{'sql_w':>7}"
+    )
+    for r in results:
+        old = base.get(f"{r['case']}/{r['size']}") or {}
+        print(
+            f"{r['case']:<16}{r['size']:>6}{r['seconds']:>9.3f}{r['symbols_per_sec']:>11.1f}"
+            f"{float(old.get('symbols_per_sec') or 0):>11.1f}{r['alloc_kib_per_symbol']:>9.2f}"
+            f"{r['http_per_symbol']:>7.2f}{r['orders_api_per_symbol']:>7.2f}"
+            f"{r['sql_select_per_symbol']:>7.2f}{r['sql_write_per_symbol']:>7.2f}"
+        )
+        if r["db_unrouted"]:
+            print(f"  ! {r['case']} db_unrouted={r['db_unrouted']} (fakes.FakeDB 缺路由)")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="trading hot-path benchmarks (fake Alpaca / fake MySQL)")
+    ap.add_argument("--sizes", default=",".join(str(x) for x in DEFAULT_SIZES))
+    ap.add_argument("--cases", default=",".join(CASES))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--data-latency-ms", type=float, default=0.0)
+    ap.add_argument("--order-latency-ms", type=float, default=0.0)
+    ap.add_argument("--db-latency-ms", type=float, default=0.0)
+    ap.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.30)
+    ap.add_argument("--metrics-budget", type=float, default=0.01, help="bot_metrics 计时开销上限（比例）")
+    ap.add_argument("--json", default="", help="结果另存一份 JSON")
+    args = ap.parse_args(argv)
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    cases = [x.strip() for x in args.cases.split(",") if x.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        ap.error(f"unknown case: {','.join(unknown)}; valid={','.join(CASES)}")
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="cszy_bench_") as tmpdir:
+        for case in cases:
+            for size in sizes:
+                results.append(run_case(case, size, args, tmpdir))
+
+    _print_table(results, baseline)
+    overhead = metrics_overhead(results, args)
+    payload = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "params": _params(args),
+        },
+        "results": {f"{r['case']}/{r['size']}": r for r in results},
+    }
+    if args.json:
+        Path(args.json).write_text(json.dumps(payload, indent=2, ensure_ascii=False))
+
+    if args.save_baseline:
+        merged = dict(baseline.get("results") or {})
+        merged.update(payload["results"])
+        baseline_path.write_text(json.dumps({**payload, "results": merged}, indent=2, ensure_ascii=False) + "\n")
+        print(f"baseline saved: {baseline_path}")
+        return 0
+
+    problems = list(overhead)
+    if not baseline:
+        print("no baseline; run with --save-baseline first")
+    elif (baseline.get("meta") or {}).get("params") != _params(args):
+        print(f"baseline params differ {baseline.get('meta', {}).get('params')}; skip comparison")
+    else:
+        problems += compare(results, baseline, args.tolerance)
+    for p in problems:
+        print(f"REGRESSION {p}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
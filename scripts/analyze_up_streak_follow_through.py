@@ -20,11 +20,19 @@ from __future__ import annotations
 import argparse
 import csv
 import os
+import sys
 from collections import defaultdict
 from datetime import date, timedelta
+from pathlib import Path
 
 import pymysql
 
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app import price_cache  # noqa: E402
+
 
 DB = dict(
     host=os.getenv("DB_HOST", "mysql"),
@@ -49,6 +57,9 @@ def _connect():
 def _fetch_prices(conn, start: date, end: date):
     # Need several pre-start trading days so Apr 1 can still have a valid prior streak.
     lookback_start = start - timedelta(days=20)
+    if price_cache.enabled():
+        price_cache.ensure_fresh(conn)
+        return price_cache.load_records(lookback_start, end, columns=("close",))
     sql = f"""
     SELECT UPPER(symbol) AS symbol, DATE(`date`) AS trade_date, `close`
     FROM `{SRC_TABLE}`
@@ -50,6 +50,8 @@ try:
 except Exception as e:
     raise RuntimeError(f"无法导入 app.strategy_b，PROJECT_ROOT={PROJECT_ROOT}，错误: {e}")
 
+from app import price_cache  # noqa: E402
+
 # ============================================================
 # DB
 # 默认本地；连云库示例：
@@ -232,6 +234,15 @@ def load_all_price_data(symbols: List[str], start_date: str, end_date: str) -> p
     ORDER BY `symbol`, `date` ASC
     """
 
+    if price_cache.enabled():
+        conn = _connect()
+        try:
+            price_cache.ensure_fresh(conn)
+        finally:
+            conn.close()
+        df = price_cache.load_frame(start_date, end_date, symbols_filter=symbols, sort_by_symbol=True)
+        return df.dropna(subset=["open", "high", "low", "close"]).reset_index(drop=True)
+
     params = list(symbols) + [start_date, end_date]
 
     conn = _connect()
@@ -339,25 +350,23 @@ def get_recent_closes_for_structure(df: pd.DataFrame, idx: int) -> Optional[Tupl
 # ============================================================
 # 买入检查：对单只股票、某一天
 # ============================================================
-def check_entry_on_day(
-    df_sym: pd.DataFrame,
-    idx: int,
+def check_entry_values(
+    prev_close: float,
+    open_price: float,
+    high: float,
+    close: float,
     trigger_price: Optional[float],
 ) -> Tuple[bool, str, Optional[float], Optional[float], Optional[float]]:
     """
+    买入规则本体（标量版），check_entry_on_day 和向量化引擎共用。
+
     返回:
       passed, reason, buy_price, initial_sl, used_trigger
     """
-    if idx <= 0:
-        return False, "没有前一交易日", None, None, None
-
-    row = df_sym.iloc[idx]
-    prev_row = df_sym.iloc[idx - 1]
-
-    prev_close = _safe_float(prev_row["close"], 0.0)
-    open_price = _safe_float(row["open"], 0.0)
-    high = _safe_float(row["high"], 0.0)
-    close = _safe_float(row["close"], 0.0)
+    prev_close = _safe_float(prev_close, 0.0)
+    open_price = _safe_float(open_price, 0.0)
+    high = _safe_float(high, 0.0)
+    close = _safe_float(close, 0.0)
 
     if prev_close <= 0:
         return False, "prev_close<=0", None, None, None
@@ -384,6 +393,23 @@ def check_entry_on_day(
     return True, "PASS", round(buy_price, 2), round(initial_sl, 2), used_trigger
 
 
+def check_entry_on_day(
+    df_sym: pd.DataFrame,
+    idx: int,
+    trigger_price: Optional[float],
+) -> Tuple[bool, str, Optional[float], Optional[float], Optional[float]]:
+    """
+    返回:
+      passed, reason, buy_price, initial_sl, used_trigger
+    """
+    if idx <= 0:
+        return False, "没有前一交易日", None, None, None
+
+    row = df_sym.iloc[idx]
+    prev_row = df_sym.iloc[idx - 1]
+    return check_entry_values(prev_row["close"], row["open"], row["high"], row["close"], trigger_price)
+
+
 # ============================================================
 # 单只持仓的一天卖出处理
 # ============================================================
@@ -400,12 +426,34 @@ def process_position_one_day(
     cash_delta > 0 表示卖出回笼现金
     """
     row = df_sym.iloc[idx]
-    dt = str(row["date"])
-    o = _safe_float(row["open"])
-    h = _safe_float(row["high"])
-    l = _safe_float(row["low"])
-    c = _safe_float(row["close"])
+    return process_position_bar(
+        pos=pos,
+        dt=str(row["date"]),
+        o=_safe_float(row["open"]),
+        h=_safe_float(row["high"]),
+        l=_safe_float(row["low"]),
+        c=_safe_float(row["close"]),
+        closes4=get_recent_closes_for_structure(df_sym, idx),
+        sim_mode=sim_mode,
+        trade_log=trade_log,
+    )
+
 
+def process_position_bar(
+    pos: Position,
+    dt: str,
+    o: float,
+    h: float,
+    l: float,
+    c: float,
+    closes4: Optional[Tuple[float, float, float, float]],
+    sim_mode: str,
+    trade_log: List[TradeRecord],
+) -> Tuple[Position, float, bool]:
+    """
+    持仓状态机本体（标量版）：一根日线 OHLC + 结构退出用的最近 4 个收盘价。
+    process_position_one_day 和向量化引擎共用。
+    """
     qty = pos.qty
     sl = pos.sl
     cost = pos.cost
@@ -525,7 +573,6 @@ def process_position_one_day(
 
     # 4) 结构退出
     if pos.qty > 0 and pos.last_stage >= ENABLE_STRUCTURE_EXIT_STAGE:
-        closes4 = get_recent_closes_for_structure(df_sym, idx)
         if closes4 is not None:
             c0, c1, c2, c3 = closes4
             min3 = min(c1, c2, c3)
@@ -556,13 +603,7 @@ def process_position_one_day(
 # ============================================================
 # 主回测
 # ============================================================
-def backtest_pool(
-    symbols: List[str],
-    start_date: str,
-    initial_capital: float,
-    trade_notional: float,
-    sim_mode: str,
-) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+def load_backtest_inputs(symbols: List[str], start_date: str) -> Tuple[pd.DataFrame, Dict[str, float]]:
     end_date = date.today()
 
     # 向前多读一些，为了首日能拿到 prev_close / 结构退出
@@ -571,9 +612,23 @@ def backtest_pool(
     df_all = load_all_price_data(symbols, str(load_start), str(end_date))
     if df_all.empty:
         raise RuntimeError("没有读取到任何历史数据。")
+    return df_all, load_trigger_map_from_ops(symbols)
+
+
+def backtest_pool(
+    symbols: List[str],
+    start_date: str,
+    initial_capital: float,
+    trade_notional: float,
+    sim_mode: str,
+    df_all: Optional[pd.DataFrame] = None,
+    trigger_map: Optional[Dict[str, float]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+    if df_all is None:
+        df_all, trigger_map = load_backtest_inputs(symbols, start_date)
+    trigger_map = trigger_map or {}
 
     frames = build_symbol_frames(df_all)
-    trigger_map = load_trigger_map_from_ops(symbols)
 
     # 建立全局交易日历
     calendar = sorted({d for d in df_all["date"].tolist() if d >= pd.to_datetime(start_date).date()})
@@ -703,6 +758,49 @@ def backtest_pool(
             holding_count=len(positions),
         ))
 
+    last_closes: Dict[str, float] = {}
+    if positions:
+        last_date = calendar[-1]
+        for sym in positions:
+            df_sym = frames.get(sym)
+            if df_sym is None or df_sym.empty:
+                continue
+            idx_list = df_sym.index[df_sym["date"] == last_date].tolist()
+            if not idx_list:
+                continue
+            last_closes[sym] = _safe_float(df_sym.iloc[idx_list[0]]["close"], 0.0)
+
+    return build_backtest_results(
+        trade_log=trade_log,
+        equity_log=equity_log,
+        positions=positions,
+        last_closes=last_closes,
+        calendar=calendar,
+        start_date=start_date,
+        initial_capital=initial_capital,
+        trade_notional=trade_notional,
+        sim_mode=sim_mode,
+        symbols_count=len(symbols),
+    )
+
+
+def build_backtest_results(
+    trade_log: List[TradeRecord],
+    equity_log: List[EquityRecord],
+    positions: Dict[str, Position],
+    last_closes: Dict[str, float],
+    calendar: list,
+    start_date: str,
+    initial_capital: float,
+    trade_notional: float,
+    sim_mode: str,
+    symbols_count: int,
+) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """
+    统计 + 汇总（两个回测引擎共用）。
+
+    last_closes: 最后一个交易日有行情的持仓 -> 收盘价，用于未实现盈亏。
+    """
     # ------------------------------------------------------------
     # 统计
     # ------------------------------------------------------------
@@ -717,28 +815,21 @@ def backtest_pool(
 
     unrealized_pnl = 0.0
     open_positions = []
-    if positions:
-        last_date = calendar[-1]
-        for sym, pos in positions.items():
-            df_sym = frames.get(sym)
-            if df_sym is None or df_sym.empty:
-                continue
-            idx_list = df_sym.index[df_sym["date"] == last_date].tolist()
-            if not idx_list:
-                continue
-            idx = idx_list[0]
-            last_close = _safe_float(df_sym.iloc[idx]["close"], 0.0)
-            upnl = pos.qty * (last_close - pos.cost)
-            unrealized_pnl += upnl
-            open_positions.append({
-                "symbol": sym,
-                "qty": pos.qty,
-                "cost": round(pos.cost, 2),
-                "last_close": round(last_close, 2),
-                "sl": round(pos.sl, 2),
-                "last_stage": pos.last_stage,
-                "unrealized_pnl": round(upnl, 2),
-            })
+    for sym, pos in positions.items():
+        if sym not in last_closes:
+            continue
+        last_close = last_closes[sym]
+        upnl = pos.qty * (last_close - pos.cost)
+        unrealized_pnl += upnl
+        open_positions.append({
+            "symbol": sym,
+            "qty": pos.qty,
+            "cost": round(pos.cost, 2),
+            "last_close": round(last_close, 2),
+            "sl": round(pos.sl, 2),
+            "last_stage": pos.last_stage,
+            "unrealized_pnl": round(upnl, 2),
+        })
 
     final_equity = float(equity_df.iloc[-1]["total_equity"]) if not equity_df.empty else initial_capital
     total_pnl = final_equity - float(initial_capital)
@@ -755,7 +846,7 @@ def backtest_pool(
         "initial_capital": round(float(initial_capital), 2),
         "trade_notional": round(float(trade_notional), 2),
         "sim_mode": sim_mode,
-        "symbols_count": len(symbols),
+        "symbols_count": symbols_count,
         "buy_count": int((trades_df["side"] == "BUY").sum()) if not trades_df.empty else 0,
         "sell_count": int((trades_df["side"] == "SELL").sum()) if not trades_df.empty else 0,
         "partial_sell_count": int((trades_df["side"] == "PARTIAL_SELL").sum()) if not trades_df.empty else 0,
@@ -842,6 +933,13 @@ def main():
     parser.add_argument("--max-trades-print", type=int, default=300, help="最多打印多少行交易明细")
     parser.add_argument("--save-trades", default="", help="可选，保存交易明细 CSV 路径")
     parser.add_argument("--save-equity", default="", help="可选，保存权益曲线 CSV 路径")
+    parser.add_argument("--engine", choices=["vec", "loop"], default="vec", help="vec=向量化引擎，loop=逐只逐日原引擎")
+    parser.add_argument(
+        "--dtype",
+        choices=["float32", "float64"],
+        default="float64",
+        help="向量化引擎的价格存储精度；float32 省内存但有损（价格>=1024 或超过 4 位小数时和 loop 引擎可能不一致）",
+    )
     args = parser.parse_args()
 
     symbols: List[str] = []
@@ -866,13 +964,26 @@ def main():
     if not pool:
         raise RuntimeError("没有股票池。请传 --symbols 或 --pool-file 或 --pool-from-ops")
 
-    trades_df, equity_df, summary = backtest_pool(
-        symbols=pool,
-        start_date=args.start_date,
-        initial_capital=float(args.capital),
-        trade_notional=float(args.trade_notional),
-        sim_mode=args.mode,
-    )
+    if args.engine == "vec":
+        import numpy as np
+        from backtest_strategy_b_vec import backtest_pool_vec
+
+        trades_df, equity_df, summary = backtest_pool_vec(
+            symbols=pool,
+            start_date=args.start_date,
+            initial_capital=float(args.capital),
+            trade_notional=float(args.trade_notional),
+            sim_mode=args.mode,
+            dtype=np.float32 if args.dtype == "float32" else np.float64,
+        )
+    else:
+        trades_df, equity_df, summary = backtest_pool(
+            symbols=pool,
+            start_date=args.start_date,
+            initial_capital=float(args.capital),
+            trade_notional=float(args.trade_notional),
+            sim_mode=args.mode,
+        )
 
     print_summary(summary)
     print_trades(trades_df, max_rows=args.max_trades_print)
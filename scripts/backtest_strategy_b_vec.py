@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+scripts/backtest_strategy_b_vec.py
+
+策略B股票池回测的向量化引擎；默认 float64 时结果与 backtest_strategy_b_pool.backtest_pool 逐笔一致。
+
+做法：
+1) stock_prices_pool 整理成稠密的 (symbol × date) 数组：open/high/low/close/volume，
+   默认 float64；没有行情的格子是 NaN，valid 标记是否有这根日线
+2) prev_idx[s, d] 记录同一只股票上一根有效日线的位置，
+   prev_close / 结构退出要的前 3 个收盘价都靠它直接索引，不再 df.iloc
+3) 每天先对全池一次性算买入规则（涨幅区间 + 触发价），得到候选；
+   候选再按原引擎同一个标量函数 check_entry_values 精确确认
+   （触发价的 round 与 Python round 在 0.005 边界上可能不同，所以向量筛选放宽 0.006）
+4) 卖出只对持仓逐只跑原来的状态机 process_position_bar（SL 拖移 / STAGE_RULES / 当日锁）
+
+float32 是有损的可选项（--dtype float32，省一半内存）：只用于存储，取出来转 float64 后
+按 PRICE_DECIMALS 位小数还原。float32 只有 24 位尾数，价格 >= 1024 时已经分辨不出
+0.0001，复权价超过 4 位小数的也还原不回来，这两种情况下成交价 / 触发判断会和原引擎有出入。
+
+用法：
+python scripts/backtest_strategy_b_pool.py --start-date 2026-04-01 --pool-from-ops --engine vec
+"""
+
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS_DIR = Path(__file__).resolve().parent
+for _p in (PROJECT_ROOT, SCRIPTS_DIR):
+    if str(_p) not in sys.path:
+        sys.path.insert(0, str(_p))
+
+import backtest_strategy_b_pool as bp  # noqa: E402
+
+PRICE_DECIMALS = 4
+# 触发价 round(x, 2) 最多移动 0.005，向量筛选时放宽一点，最终以标量函数为准
+_TRIGGER_SLACK = 0.006
+
+
+@dataclass
+class PriceCube:
+    symbols: List[str]
+    dates: list
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    valid: np.ndarray      # bool (S, D)
+    prev_idx: np.ndarray   # int32 (S, D)，同一只股票上一根有效日线的列号，没有为 -1
+
+    def col(self, arr: np.ndarray, j: int) -> np.ndarray:
+        """取第 j 天整列并还原成 float64。"""
+        out = arr[:, j].astype(np.float64)
+        if arr.dtype != np.float64:
+            out = np.round(out, PRICE_DECIMALS)
+        return out
+
+    def at(self, arr: np.ndarray, i: int, j: int) -> float:
+        v = float(arr[i, j])
+        if arr.dtype != np.float64:
+            v = round(v, PRICE_DECIMALS)
+        return v
+
+
+def build_price_cube(df_all: pd.DataFrame, symbols: List[str], dtype=np.float64) -> PriceCube:
+    """把 load_all_price_data 的长表转成 (symbol × date) 稠密数组；行顺序 = symbols 顺序。"""
+    symbols = list(dict.fromkeys(symbols))
+    sym_pos = {s: i for i, s in enumerate(symbols)}
+    dates = sorted(set(df_all["date"].tolist()))
+    date_pos = {d: j for j, d in enumerate(dates)}
+
+    S, D = len(symbols), len(dates)
+    cube = {name: np.full((S, D), np.nan, dtype=dtype) for name in ("open", "high", "low", "close", "volume")}
+    valid = np.zeros((S, D), dtype=bool)
+
+    syms = df_all["symbol"].astype(str).str.strip().str.upper().map(sym_pos)
+    keep = syms.notna().to_numpy()
+    rows = syms.to_numpy()[keep].astype(np.int64)
+    cols = df_all["date"].map(date_pos).to_numpy()[keep].astype(np.int64)
+    for name in cube:
+        cube[name][rows, cols] = pd.to_numeric(df_all[name], errors="coerce").to_numpy()[keep]
+    valid[rows, cols] = True
+
+    # 上一根有效日线：有效位置写自己的列号，累计取最大，再整体右移一格
+    idx = np.where(valid, np.arange(D, dtype=np.int32)[None, :], -1).astype(np.int32)
+    last_valid = np.maximum.accumulate(idx, axis=1) if D else idx
+    prev_idx = np.full((S, D), -1, dtype=np.int32)
+    if D > 1:
+        prev_idx[:, 1:] = last_valid[:, :-1]
+
+    return PriceCube(
+        symbols=symbols,
+        dates=dates,
+        open=cube["open"],
+        high=cube["high"],
+        low=cube["low"],
+        close=cube["close"],
+        volume=cube["volume"],
+        valid=valid,
+        prev_idx=prev_idx,
+    )
+
+
+def _closes4(cube: PriceCube, i: int, j: int) -> Optional[Tuple[float, float, float, float]]:
+    p1 = int(cube.prev_idx[i, j])
+    p2 = int(cube.prev_idx[i, p1]) if p1 >= 0 else -1
+    p3 = int(cube.prev_idx[i, p2]) if p2 >= 0 else -1
+    if p3 < 0:
+        return None
+    c = cube.close
+    return cube.at(c, i, j), cube.at(c, i, p1), cube.at(c, i, p2), cube.at(c, i, p3)
+
+
+def backtest_pool_vec(
+    symbols: List[str],
+    start_date: str,
+    initial_capital: float,
+    trade_notional: float,
+    sim_mode: str,
+    df_all: Optional[pd.DataFrame] = None,
+    trigger_map: Optional[Dict[str, float]] = None,
+    dtype=np.float64,
+    cube: Optional[PriceCube] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """cube 可以直接传已经建好的（参数扫描时多个进程共享同一份）。"""
+    if cube is None:
+        if df_all is None:
+            df_all, trigger_map = bp.load_backtest_inputs(symbols, start_date)
+        cube = build_price_cube(df_all, symbols, dtype=dtype)
+    trigger_map = trigger_map or {}
+
+    S = len(cube.symbols)
+    rows = np.arange(S)
+    trig_arr = np.array([float(trigger_map.get(s) or 0.0) for s in cube.symbols], dtype=np.float64)
+    has_trig = trig_arr > 0
+
+    start = pd.to_datetime(start_date).date()
+    cal_cols = [j for j, d in enumerate(cube.dates) if d >= start]
+    calendar = [cube.dates[j] for j in cal_cols]
+
+    cash = float(initial_capital)
+    positions: Dict[str, bp.Position] = {}
+    pos_row: Dict[str, int] = {}
+    trade_log: List[bp.TradeRecord] = []
+    equity_log: List[bp.EquityRecord] = []
+
+    for j in cal_cols:
+        cur_date = cube.dates[j]
+        dt = str(cur_date)
+        valid_j = cube.valid[:, j]
+        sold_today = set()
+
+        # 1) 卖出：只对持仓跑状态机
+        for sym in list(positions.keys()):
+            pos = positions.get(sym)
+            i = pos_row[sym]
+            if pos is None or not valid_j[i]:
+                continue
+            new_pos, cash_delta, closed_today = bp.process_position_bar(
+                pos=pos,
+                dt=dt,
+                o=cube.at(cube.open, i, j),
+                h=cube.at(cube.high, i, j),
+                l=cube.at(cube.low, i, j),
+                c=cube.at(cube.close, i, j),
+                closes4=_closes4(cube, i, j),
+                sim_mode=sim_mode,
+                trade_log=trade_log,
+            )
+            cash += cash_delta
+            if new_pos.qty <= 0:
+                positions.pop(sym, None)
+            else:
+                positions[sym] = new_pos
+            if closed_today:
+                sold_today.add(sym)
+
+        # 2) 买入：全池一次性筛选，候选按股票池顺序精确确认
+        if cash >= trade_notional:
+            p = cube.prev_idx[:, j]
+            has_prev = valid_j & (p >= 0)
+            pc = cube.close[rows, np.maximum(p, 0)].astype(np.float64)
+            if cube.close.dtype != np.float64:
+                pc = np.round(pc, PRICE_DECIMALS)
+            prev_close = np.where(has_prev, pc, 0.0)
+            o = cube.col(cube.open, j)
+            h = cube.col(cube.high, j)
+            c = cube.col(cube.close, j)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                day_up = (c - prev_close) / prev_close
+                trig = np.where(has_trig, trig_arr, prev_close * (1.0 + bp.B_MIN_UP_PCT))
+                mask = (
+                    has_prev
+                    & (prev_close > 0)
+                    & (day_up > bp.B_MIN_UP_PCT)
+                    & (day_up < bp.B_MAX_BUY_UP_PCT)
+                    & (h > trig - _TRIGGER_SLACK)
+                )
+
+            for i in np.flatnonzero(mask):
+                sym = cube.symbols[i]
+                if sym in positions or sym in sold_today:
+                    continue
+                if cash < trade_notional:
+                    break
+
+                passed, _reason, buy_price, initial_sl, used_trigger = bp.check_entry_values(
+                    float(prev_close[i]), float(o[i]), float(h[i]), float(c[i]), trigger_map.get(sym)
+                )
+                if not passed:
+                    continue
+
+                qty = int(trade_notional // buy_price) if buy_price and buy_price > 0 else 0
+                if qty <= 0:
+                    continue
+
+                amount = round(qty * buy_price, 2)
+                if cash < amount:
+                    continue
+
+                cash -= amount
+                positions[sym] = bp.Position(
+                    symbol=sym,
+                    entry_date=dt,
+                    buy_price=round(buy_price, 2),
+                    cost=round(buy_price, 2),
+                    qty=int(qty),
+                    sl=round(initial_sl, 2),
+                    last_stage=0,
+                )
+                pos_row[sym] = int(i)
+                trade_log.append(bp.TradeRecord(
+                    date=dt,
+                    symbol=sym,
+                    side="BUY",
+                    price=round(buy_price, 2),
+                    qty=int(qty),
+                    amount=amount,
+                    realized_pnl=0.0,
+                    note=f"trigger={used_trigger:.2f}",
+                ))
+
+        # 3) 日终权益
+        market_value = 0.0
+        for sym, pos in positions.items():
+            i = pos_row[sym]
+            if valid_j[i]:
+                market_value += pos.qty * cube.at(cube.close, i, j)
+
+        total_equity = cash + market_value
+        equity_log.append(bp.EquityRecord(
+            date=dt,
+            cash=round(cash, 2),
+            market_value=round(market_value, 2),
+            total_equity=round(total_equity, 2),
+            holding_count=len(positions),
+        ))
+
+    last_closes: Dict[str, float] = {}
+    if positions and cal_cols:
+        j = cal_cols[-1]
+        for sym in positions:
+            i = pos_row[sym]
+            if cube.valid[i, j]:
+                last_closes[sym] = cube.at(cube.close, i, j)
+
+    return bp.build_backtest_results(
+        trade_log=trade_log,
+        equity_log=equity_log,
+        positions=positions,
+        last_closes=last_closes,
+        calendar=calendar,
+        start_date=start_date,
+        initial_capital=initial_capital,
+        trade_notional=trade_notional,
+        sim_mode=sim_mode,
+        symbols_count=len(symbols),
+    )
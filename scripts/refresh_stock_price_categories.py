@@ -18,12 +18,20 @@ from __future__ import annotations
 
 import argparse
 import os
+import sys
 import time
 from collections import defaultdict
 from datetime import date, datetime, timedelta
+from pathlib import Path
 
 import pymysql
 
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app import price_cache  # noqa: E402
+
 try:
     from zoneinfo import ZoneInfo
 except Exception:
@@ -116,6 +124,9 @@ def _ensure_table(conn):
 
 
 def _latest_dates(conn, limit: int = 9):
+    if price_cache.enabled():
+        price_cache.ensure_fresh(conn)
+        return price_cache.latest_dates(limit)
     sql = f"""
     SELECT DISTINCT DATE(`date`) AS d
     FROM `{SRC_TABLE}`
@@ -131,6 +142,8 @@ def _latest_dates(conn, limit: int = 9):
 
 
 def _fetch_prices(conn, dates):
+    if price_cache.enabled():
+        return price_cache.load_records(dates=dates)
     placeholders = ",".join(["%s"] * len(dates))
     sql = f"""
     SELECT UPPER(symbol) AS symbol, DATE(`date`) AS trade_date, `open`, high, low, `close`, volume
@@ -24,6 +24,10 @@ case "$cmd" in
   getdata_full)
     exec python -u app/getdata_alpaca.py
     ;;
+  features_build)
+    echo "$(ts) ===== START symbol_daily_features build ====="
+    exec python -u -m app.symbol_features
+    ;;
   strategy_a)
     echo "$(ts) strategy_a has been removed. Starting AC T strategy instead." >&2
     shift
@@ -130,7 +134,7 @@ case "$cmd" in
     exit 0
     ;;
   *)
-    echo "Usage: ./scripts/run.sh {main|getdata_full|strategy_ac_t|strategy_a|b_buy_bot|b_sell_bot|f_buy_bot|f_sell_bot|ops_volume|price_categories_once|price_categories_loop|unlock_can_sell|ultimate_startup|ultimate_web|ultimate_sync_positions|ultimate_flatten_d|ultimate_rebalance|ultimate_strategy|ultimate_dashboard_bot|ultimate_risk_bot|ultimate_rebalance_bot|ultimate_ac_bot|ultimate_d_buy_bot|ultimate_d_sell_bot|ultimate_q_sell_bot|healthcheck}" >&2
+    echo "Usage: ./scripts/run.sh {main|getdata_full|features_build|strategy_ac_t|strategy_a|b_buy_bot|b_sell_bot|f_buy_bot|f_sell_bot|ops_volume|price_categories_once|price_categories_loop|unlock_can_sell|ultimate_startup|ultimate_web|ultimate_sync_positions|ultimate_flatten_d|ultimate_rebalance|ultimate_strategy|ultimate_dashboard_bot|ultimate_risk_bot|ultimate_rebalance_bot|ultimate_ac_bot|ultimate_d_buy_bot|ultimate_d_sell_bot|ultimate_q_sell_bot|healthcheck}" >&2
     exit 2
     ;;
 esac
@@ -4,5 +4,7 @@ set -euo pipefail
 echo "[$(date '+%F %T')] run_getdata_daily.sh start"
 
 python -u /app/app/getdata_alpaca.py
+# 日线更新完再重算 symbol_daily_features（盘中各策略从这里读昨收 / 均量 / 均线）
+(cd /app && python -u -m app.symbol_features)
 
 echo "[$(date '+%F %T')] run_getdata_daily.sh done"
\ No newline at end of file
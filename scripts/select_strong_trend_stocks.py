@@ -19,6 +19,7 @@ from __future__ import annotations
 import argparse
 import csv
 import os
+import sys
 from collections import defaultdict
 from datetime import date
 from pathlib import Path
@@ -26,6 +27,12 @@ from typing import Any
 
 import pymysql
 
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app import price_cache  # noqa: E402
+
 
 DB = dict(
     host=os.getenv("DB_HOST", "mysql"),
@@ -56,6 +63,9 @@ def _as_float(value: Any, default: float = 0.0) -> float:
 
 
 def _latest_dates(conn, limit: int) -> list[date]:
+    if price_cache.enabled():
+        price_cache.ensure_fresh(conn)
+        return price_cache.latest_dates(limit)
     sql = f"""
     SELECT DISTINCT DATE(`date`) AS d
     FROM `{SRC_TABLE}`
@@ -70,6 +80,8 @@ def _latest_dates(conn, limit: int) -> list[date]:
 
 
 def _fetch_prices(conn, dates: list[date]) -> list[dict]:
+    if price_cache.enabled():
+        return price_cache.load_records(dates=dates, require=("open", "high", "low", "close", "volume"))
     placeholders = ",".join(["%s"] * len(dates))
     sql = f"""
     SELECT UPPER(symbol) AS symbol, DATE(`date`) AS trade_date,
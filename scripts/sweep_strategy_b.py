@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+scripts/sweep_strategy_b.py
+
+策略B参数扫描：价格数据只从 MySQL 读一次，建成 PriceCube 放进共享内存，
+ProcessPoolExecutor 的每个 worker 只读挂载同一份数组，各自跑 backtest_pool_vec。
+
+可扫参数 = backtest_strategy_b_pool 的模块常量（SWEEPABLE）。
+worker 每跑一组先恢复默认值，再把这一组的值 setattr 上去，互不影响。
+
+输出按收益排序的结果表：每组参数的收益率 / 最大回撤 / 交易笔数 / 胜率 / 耗时。
+
+用法：
+python scripts/sweep_strategy_b.py --start-date 2026-01-02 --pool-from-ops \\
+  --param B_MIN_UP_PCT=0.02,0.03,0.04 \\
+  --param TRAIL_BACKOFF_PCT=0.05,0.07,0.10 \\
+  --out outputs/sweep_b.csv
+
+STAGE_RULES 这类结构化参数用 --grid-file（JSON：{"STAGE_RULES": [[[1,0.2,0.2],...], ...]}）。
+组合太多时 --random N 只随机抽 N 组。
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+import backtest_strategy_b_pool as bp  # noqa: E402
+import backtest_strategy_b_vec as bv  # noqa: E402
+
+SWEEPABLE = (
+    "B_MIN_UP_PCT",
+    "B_MAX_BUY_UP_PCT",
+    "DYNAMIC_TRAIL_START_PCT",
+    "TRAIL_BREAKEVEN_PCT",
+    "TRAIL_LOCK_LIGHT_PCT",
+    "TRAIL_PRICE_TRACK_PCT",
+    "TRAIL_BACKOFF_PCT",
+    "SAME_DAY_FORCE_SELL_LOSS_PCT",
+    "SAME_DAY_FORCE_SELL_WIN_PCT",
+    "ENABLE_STRUCTURE_EXIT_STAGE",
+    "STAGE_RULES",
+)
+
+_ARRAY_FIELDS = ("open", "high", "low", "close", "volume", "valid", "prev_idx")
+
+
+# ============================================================
+# 共享内存里的 PriceCube
+# ============================================================
+def share_cube(cube: bv.PriceCube):
+    """把 cube 的数组拷进共享内存；返回 (meta, segments)，segments 由父进程负责 unlink。"""
+    meta = {"symbols": cube.symbols, "dates": cube.dates, "arrays": {}}
+    segments = []
+    for name in _ARRAY_FIELDS:
+        arr = getattr(cube, name)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        meta["arrays"][name] = (shm.name, arr.shape, arr.dtype.str)
+        segments.append(shm)
+    return meta, segments
+
+
+def attach_cube(meta: dict):
+    """worker 侧挂载：数组直接指向共享内存，不拷贝，只读。"""
+    arrays = {}
+    handles = []
+    for name, (shm_name, shape, dtype) in meta["arrays"].items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        arrays[name] = arr
+        handles.append(shm)
+    cube = bv.PriceCube(symbols=meta["symbols"], dates=meta["dates"], **arrays)
+    return cube, handles
+
+
+# ============================================================
+# worker
+# ============================================================
+_W: dict = {}
+
+
+def _init_worker(meta: dict, run_kwargs: dict):
+    cube, handles = attach_cube(meta)
+    _W["cube"] = cube
+    _W["handles"] = handles  # 持有引用，防止 buffer 被回收
+    _W["run_kwargs"] = run_kwargs
+    _W["defaults"] = {k: getattr(bp, k) for k in SWEEPABLE}
+
+
+def _apply_params(params: dict):
+    for k, v in _W["defaults"].items():
+        setattr(bp, k, v)
+    for k, v in params.items():
+        if k not in SWEEPABLE:
+            raise ValueError(f"不支持扫描的参数: {k}")
+        if k == "STAGE_RULES":
+            v = [tuple(x) for x in v]
+        setattr(bp, k, v)
+
+
+def max_drawdown_pct(equity: pd.Series) -> float:
+    if equity.empty:
+        return 0.0
+    eq = equity.astype(float).to_numpy()
+    peak = np.maximum.accumulate(eq)
+    dd = (peak - eq) / np.where(peak > 0, peak, 1.0)
+    return round(float(dd.max()) * 100.0, 2)
+
+
+def _run_one(task):
+    combo_id, params = task
+    t0 = time.perf_counter()
+    _apply_params(params)
+    trades_df, equity_df, summary = bv.backtest_pool_vec(cube=_W["cube"], **_W["run_kwargs"])
+    elapsed = time.perf_counter() - t0
+    return {
+        "combo_id": combo_id,
+        **{k: (json.dumps(v) if k == "STAGE_RULES" else v) for k, v in params.items()},
+        "total_return_pct": summary["total_return_pct"],
+        "max_drawdown_pct": max_drawdown_pct(equity_df["total_equity"]) if not equity_df.empty else 0.0,
+        "trade_count": int(len(trades_df)),
+        "buy_count": summary["buy_count"],
+        "win_rate": summary["win_rate"],
+        "final_equity": summary["final_equity"],
+        "runtime_sec": round(elapsed, 3),
+    }
+
+
+# ============================================================
+# 参数组合
+# ============================================================
+def parse_param(spec: str):
+    """NAME=v1,v2,v3"""
+    name, _, values = spec.partition("=")
+    name = name.strip().upper()
+    if name not in SWEEPABLE or name == "STAGE_RULES":
+        raise ValueError(f"--param 不支持 {name}（STAGE_RULES 请用 --grid-file）")
+    vals = [json.loads(x) for x in values.split(",") if x.strip()]
+    if not vals:
+        raise ValueError(f"--param {name} 没有取值")
+    return name, vals
+
+
+def build_combos(grid: Dict[str, list], random_n: int = 0, seed: int = 0) -> List[dict]:
+    """网格全组合；random_n>0 时从全组合里不重复随机抽 random_n 组（不展开全网格）。"""
+    names = list(grid.keys())
+    sizes = [len(grid[k]) for k in names]
+    total = int(np.prod(sizes)) if names else 1
+
+    def decode(n: int) -> dict:
+        out = {}
+        for k, size in zip(reversed(names), reversed(sizes)):
+            n, r = divmod(n, size)
+            out[k] = grid[k][r]
+        return {k: out[k] for k in names}
+
+    if random_n and random_n < total:
+        picks = sorted(random.Random(seed).sample(range(total), random_n))
+        return [decode(n) for n in picks]
+    return [dict(zip(names, vals)) for vals in itertools.product(*(grid[k] for k in names))]
+
+
+def _default_workers() -> int:
+    # 容器/taskset 限核时 cpu_count 会偏大，按实际可用核数
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def run_sweep(
+    cube: bv.PriceCube,
+    combos: List[dict],
+    run_kwargs: dict,
+    workers: Optional[int] = None,
+    rank_by: str = "total_return_pct",
+) -> pd.DataFrame:
+    workers = max(1, min(workers or _default_workers(), len(combos) or 1))
+    meta, segments = share_cube(cube)
+    try:
+        tasks = list(enumerate(combos))
+        # 每个 worker 分几块，块太小调度开销大，太大尾部不均衡
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(meta, run_kwargs)) as ex:
+            rows = list(ex.map(_run_one, tasks, chunksize=chunksize))
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    ascending = rank_by == "max_drawdown_pct"
+    df = df.sort_values([rank_by, "combo_id"], ascending=[ascending, True]).reset_index(drop=True)
+    df.insert(0, "rank", range(1, len(df) + 1))
+    return df
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="策略B参数扫描（共享内存 + 多进程）")
+    parser.add_argument("--start-date", required=True, help="开始日期，例如 2026-04-01")
+    parser.add_argument("--capital", type=float, default=20000, help="初始本金，默认 20000")
+    parser.add_argument("--trade-notional", type=float, default=bp.B_TARGET_NOTIONAL_USD, help="单笔目标资金")
+    parser.add_argument("--symbols", default="", help="逗号分隔股票池")
+    parser.add_argument("--pool-file", default="", help="股票池文件路径")
+    parser.add_argument("--pool-from-ops", action="store_true", help="直接从 stock_operations 读取 B 股票池")
+    parser.add_argument("--mode", choices=["stop_first", "profit_first"], default=bp.DEFAULT_SIM_MODE)
+    parser.add_argument("--param", action="append", default=[], help="NAME=v1,v2,...，可重复")
+    parser.add_argument("--grid-file", default="", help="JSON 网格文件 {NAME: [v1, v2, ...]}")
+    parser.add_argument("--random", type=int, default=0, help="随机抽 N 组（0=全网格）")
+    parser.add_argument("--seed", type=int, default=0, help="随机抽样种子")
+    parser.add_argument("--workers", type=int, default=0, help="进程数，默认可用核数")
+    parser.add_argument("--dtype", choices=["float32", "float64"], default="float64", help="float32 省一半共享内存但有损，见 backtest_strategy_b_vec")
+    parser.add_argument("--rank-by", choices=["total_return_pct", "max_drawdown_pct", "win_rate"], default="total_return_pct")
+    parser.add_argument("--top", type=int, default=20, help="打印前 N 名")
+    parser.add_argument("--out", default="", help="可选，保存完整结果 CSV")
+    args = parser.parse_args()
+
+    grid: Dict[str, list] = {}
+    if args.grid_file.strip():
+        with open(args.grid_file, "r", encoding="utf-8") as f:
+            for k, v in json.load(f).items():
+                k = k.strip().upper()
+                if k not in SWEEPABLE:
+                    raise ValueError(f"不支持扫描的参数: {k}")
+                grid[k] = list(v)
+    for spec in args.param:
+        k, vals = parse_param(spec)
+        grid[k] = vals
+    if not grid:
+        raise RuntimeError("没有参数网格。请传 --param 或 --grid-file")
+
+    pool: List[str] = []
+    if args.symbols.strip():
+        pool.extend([x.strip().upper() for x in args.symbols.split(",") if x.strip()])
+    if args.pool_file.strip():
+        pool.extend(bp.load_symbols_from_file(args.pool_file.strip()))
+    if args.pool_from_ops:
+        pool.extend(bp.load_symbols_from_ops("B"))
+    pool = list(dict.fromkeys(s for s in pool if s))
+    if not pool:
+        raise RuntimeError("没有股票池。请传 --symbols 或 --pool-file 或 --pool-from-ops")
+
+    t0 = time.perf_counter()
+    df_all, trigger_map = bp.load_backtest_inputs(pool, args.start_date)
+    cube = bv.build_price_cube(df_all, pool, dtype=np.float32 if args.dtype == "float32" else np.float64)
+    del df_all
+    print(f"[SWEEP] loaded symbols={len(cube.symbols)} days={len(cube.dates)} in {time.perf_counter() - t0:.1f}s", flush=True)
+
+    combos = build_combos(grid, random_n=args.random, seed=args.seed)
+    run_kwargs = dict(
+        symbols=pool,
+        start_date=args.start_date,
+        initial_capital=float(args.capital),
+        trade_notional=float(args.trade_notional),
+        sim_mode=args.mode,
+        trigger_map=trigger_map,
+    )
+
+    t1 = time.perf_counter()
+    result = run_sweep(cube, combos, run_kwargs, workers=args.workers or None, rank_by=args.rank_by)
+    wall = time.perf_counter() - t1
+    cpu = float(result["runtime_sec"].sum()) if not result.empty else 0.0
+    print(f"[SWEEP] combos={len(combos)} wall={wall:.1f}s cpu={cpu:.1f}s speedup={cpu / wall if wall > 0 else 0:.1f}x", flush=True)
+
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(result.head(args.top).to_string(index=False))
+
+    if args.out.strip():
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        result.to_csv(args.out, index=False, encoding="utf-8-sig")
+        print(f"\n扫描结果已保存: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
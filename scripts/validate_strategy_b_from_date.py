@@ -51,6 +51,8 @@ except Exception as e:
         f"无法导入 app.strategy_b，PROJECT_ROOT={PROJECT_ROOT}，错误: {e}"
     )
 
+from app import price_cache  # noqa: E402
+
 # ============================================================
 # DB
 # 默认本地；你可以像这样连云库：
@@ -163,6 +165,17 @@ def load_price_data(symbol: str, start_date: str, end_date: str) -> pd.DataFrame
     ORDER BY `date` ASC
     """
 
+    if price_cache.enabled():
+        conn = _connect()
+        try:
+            price_cache.ensure_fresh(conn)
+        finally:
+            conn.close()
+        df = price_cache.load_frame(start_date, end_date, symbols_filter=[symbol])
+        df = df.dropna(subset=["open", "high", "low", "close"]).reset_index(drop=True)
+        print(f"[DEBUG] price_cache rows = {len(df)}")
+        return df
+
     conn = _connect()
     try:
         with conn.cursor() as cur:
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import unittest
+
+
+class FakeConn:
+    def close(self):
+        pass
+
+
+def _row(code, stype="F"):
+    return {"stock_code": code, "stock_type": stype, "is_bought": 1, "can_sell": 1, "can_buy": 0}
+
+
+class AsyncRuntimeTests(unittest.TestCase):
+    def setUp(self):
+        import app.bots.async_core as ac
+        import app.bots.runtime_core as tb
+        import app.bots.split_core as sc
+
+        self.ac, self.tb, self.sc = ac, tb, sc
+        self.originals = {
+            (tb, "ensure_conn_alive"): tb.ensure_conn_alive,
+            (tb, "load_rows"): tb.load_rows,
+            (tb, "get_trade_phase"): tb.get_trade_phase,
+            (tb, "get_conn"): tb.get_conn,
+            (tb, "load_bot_control"): tb.load_bot_control,
+            (sc, "_sell_one"): sc._sell_one,
+            (sc, "_start_streams"): sc._start_streams,
+            (ac, "ASYNC_SYMBOL_TIMEOUT_SEC"): ac.ASYNC_SYMBOL_TIMEOUT_SEC,
+            (ac, "ASYNC_SELL_CONCURRENCY"): ac.ASYNC_SELL_CONCURRENCY,
+        }
+        self.old_env = os.environ.get("AFTER_TRADE_SLEEP_SEC")
+        os.environ["AFTER_TRADE_SLEEP_SEC"] = "0"
+        tb.ensure_conn_alive = lambda conn: conn
+        self.rows = [_row(f"S{i}") for i in range(8)]
+        tb.load_rows = lambda _conn, mode: list(self.rows)
+        self.config = sc.SplitBotConfig("sell", ("F",), 0, 0)
+
+    def tearDown(self):
+        for (mod, name), value in self.originals.items():
+            setattr(mod, name, value)
+        if self.old_env is None:
+            os.environ.pop("AFTER_TRADE_SLEEP_SEC", None)
+        else:
+            os.environ["AFTER_TRADE_SLEEP_SEC"] = self.old_env
+        self.tb._STOP = False
+        self.sc._round_rows.clear()
+
+    def test_slow_symbol_does_not_stall_round(self):
+        ac, sc = self.ac, self.sc
+        ac.ASYNC_SELL_CONCURRENCY = 4
+        ac.ASYNC_SYMBOL_TIMEOUT_SEC = 0.2
+        calls = []
+
+        def fake_sell(code, stype, phase):
+            calls.append(code)
+            time.sleep(0.6 if code == "S0" else 0.05)
+            return code == "S3"
+
+        sc._sell_one = fake_sell
+
+        async def two_rounds():
+            rt = ac.AsyncRuntime(self.config, workers=8)
+            try:
+                t0 = time.time()
+                _, traded = await ac.run_sell_round(rt, FakeConn(), "regular")
+                first = time.time() - t0
+                # S0 的线程还在跑：下一轮不能再派发它
+                await ac.run_sell_round(rt, FakeConn(), "regular")
+                return traded, first
+            finally:
+                rt.shutdown()
+
+        traded, first = asyncio.run(two_rounds())
+        self.assertTrue(traded)
+        self.assertLess(first, 0.45)
+        self.assertEqual(1, calls.count("S0"))
+        self.assertEqual(2, calls.count("S1"))
+
+    def test_sell_slots_capped_by_pool_and_held_until_done(self):
+        import threading
+
+        import ultimate_v1.db as db
+
+        ac, sc = self.ac, self.sc
+        old_pool = db.DB_POOL_MAX_SIZE
+        db.DB_POOL_MAX_SIZE = 5
+        ac.ASYNC_SELL_CONCURRENCY = 8
+        ac.ASYNC_SYMBOL_TIMEOUT_SEC = 0.05
+        lock = threading.Lock()
+        running = [0, 0]  # 当前, 峰值
+
+        def fake_sell(code, stype, phase):
+            with lock:
+                running[0] += 1
+                running[1] = max(running[1], running[0])
+            time.sleep(0.15)
+            with lock:
+                running[0] -= 1
+            return False
+
+        sc._sell_one = fake_sell
+
+        async def round_and_events():
+            rt = ac.AsyncRuntime(self.config, workers=16)
+            try:
+                # 卖出轮和止损触发用的是同一个名额池
+                extra = [ac._sell_task(rt, rt.sell_sem, f"E{i}", "F", "regular") for i in range(4)]
+                await asyncio.gather(ac.run_sell_round(rt, FakeConn(), "regular"), *extra)
+                while rt.inflight:
+                    await asyncio.sleep(0.02)
+            finally:
+                rt.shutdown()
+
+        expected = 5 - ac.ASYNC_DB_RESERVED_CONNS
+        try:
+            self.assertEqual(expected, ac.sell_concurrency())
+            asyncio.run(round_and_events())
+        finally:
+            db.DB_POOL_MAX_SIZE = old_pool
+        # 超时不再等的调用也占着名额，峰值不会超过连接池能给的数量
+        self.assertEqual(expected, running[1])
+
+    def test_stop_flag_ends_main_loop(self):
+        ac, tb, sc = self.ac, self.tb, self.sc
+        tb.get_trade_phase = lambda now=None: "regular"
+        tb.get_conn = lambda: FakeConn()
+        tb.load_bot_control = lambda _conn: {"emergency_stop": 0}
+        sc._start_streams = lambda role: None
+        seen = []
+
+        def fake_sell(code, stype, phase):
+            seen.append(code)
+            tb._STOP = True
+            return False
+
+        sc._sell_one = fake_sell
+        self.rows = [_row("S0")]
+
+        t0 = time.time()
+        old = os.environ.get("BOT_STRATEGIES")
+        os.environ["BOT_STRATEGIES"] = "F"
+        try:
+            asyncio.run(ac.main_async("sell"))
+        finally:
+            if old is None:
+                os.environ.pop("BOT_STRATEGIES", None)
+            else:
+                os.environ["BOT_STRATEGIES"] = old
+        self.assertEqual(["S0"], seen)
+        self.assertLess(time.time() - t0, 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import sys
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+
+def _fixture(n_symbols=12, n_days=120, seed=7):
+    """随机游走 + 不时的 4%~9% 跳涨，随机缺几天；两只低价股用 4 位小数。"""
+    rng = np.random.default_rng(seed)
+    start = date(2026, 1, 5)
+    days = []
+    d = start
+    while len(days) < n_days:
+        if d.weekday() < 5:
+            days.append(d)
+        d += timedelta(days=1)
+
+    rows = []
+    for k in range(n_symbols):
+        sym = f"S{k:02d}"
+        nd = 4 if k >= n_symbols - 2 else 2
+        px = 0.8 if nd == 4 else float(rng.uniform(3, 40))
+        for day in days:
+            if rng.random() < 0.04:
+                continue
+            if rng.random() < 0.12:
+                ret = rng.uniform(0.04, 0.09)
+            else:
+                ret = rng.normal(0, 0.03)
+            o = px * (1 + rng.normal(0, 0.01))
+            c = max(px * (1 + ret), 0.05)
+            h = max(o, c) * (1 + abs(rng.normal(0, 0.02)))
+            lo = min(o, c) * (1 - abs(rng.normal(0, 0.02)))
+            rows.append({
+                "symbol": sym,
+                "date": day,
+                "open": round(o, nd),
+                "high": round(h, nd),
+                "low": round(lo, nd),
+                "close": round(c, nd),
+                "volume": float(rng.integers(1e5, 5e6)),
+            })
+            px = c
+    df = pd.DataFrame(rows)
+    symbols = [f"S{k:02d}" for k in range(n_symbols)]
+    trigger_map = {"S01": round(float(df[df.symbol == "S01"].close.median()), 2), "S05": 0.0}
+    return df, symbols, trigger_map, str(days[20])
+
+
+class VectorBacktestTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import backtest_strategy_b_pool as bp
+        import backtest_strategy_b_vec as bv
+
+        cls.bp = bp
+        cls.bv = bv
+        cls.df, cls.symbols, cls.trigger_map, cls.start = _fixture()
+
+    def _run_both(self, mode, dtype):
+        kw = dict(
+            symbols=self.symbols,
+            start_date=self.start,
+            initial_capital=20000.0,
+            trade_notional=2100.0,
+            sim_mode=mode,
+            df_all=self.df,
+            trigger_map=self.trigger_map,
+        )
+        loop = self.bp.backtest_pool(**kw)
+        vec = self.bv.backtest_pool_vec(dtype=dtype, **kw)
+        return loop, vec
+
+    def test_trades_match_loop_engine(self):
+        for mode in ("stop_first", "profit_first"):
+            for dtype in (np.float64, np.float32):
+                with self.subTest(mode=mode, dtype=dtype.__name__):
+                    (lt, le, ls), (vt, ve, vs) = self._run_both(mode, dtype)
+                    self.assertGreater(len(lt), 10)
+                    pd.testing.assert_frame_equal(lt, vt)
+                    pd.testing.assert_frame_equal(le, ve)
+                    self.assertEqual(ls, vs)
+
+    def test_cube_prev_index_skips_missing_days(self):
+        df = self.df[~((self.df.symbol == "S00") & (self.df.date == self.df.date.min() + timedelta(days=1)))]
+        cube = self.bv.build_price_cube(df, ["S00", "ZZZ"])
+        self.assertEqual(np.float64, cube.close.dtype)
+        self.assertFalse(cube.valid[1].any())
+        self.assertEqual(-1, cube.prev_idx[0, 0])
+        # 第 2 列缺失，第 3 列的上一根是第 1 列
+        self.assertFalse(cube.valid[0, 1])
+        self.assertEqual(0, cube.prev_idx[0, 2])
+
+    def test_float32_is_lossy_for_large_prices(self):
+        df = self.df[self.df.symbol == "S00"].head(3).copy()
+        df["close"] = [1234.5678, 0.123456, 12.34]
+        exact = self.bv.build_price_cube(df, ["S00"])
+        lossy = self.bv.build_price_cube(df, ["S00"], dtype=np.float32)
+        self.assertEqual([1234.5678, 0.123456, 12.34], [exact.at(exact.close, 0, j) for j in range(3)])
+        self.assertNotEqual(1234.5678, lossy.at(lossy.close, 0, 0))
+        self.assertNotEqual(0.123456, lossy.at(lossy.close, 0, 1))
+        self.assertEqual(12.34, lossy.at(lossy.close, 0, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -138,6 +138,41 @@ class BCStrategyFlowTests(unittest.TestCase):
             sc.t.sleep = originals["sleep"]
             sc.random.uniform = originals["uniform"]
 
+    def test_sell_round_hands_preloaded_row_to_strategy_once(self):
+        import app.bots.runtime_core as tb
+        import app.bots.split_core as sc
+
+        seen = []
+        row = {"stock_code": "MOCKB", "stock_type": "B", "is_bought": 1, "can_buy": 0, "can_sell": 1, "qty": 5}
+        originals = {
+            "ensure_conn_alive": tb.ensure_conn_alive,
+            "load_rows": tb.load_rows,
+            "safe_call": tb.safe_call,
+            "strategy_B_sell": tb.strategy_B_sell,
+            "sleep": sc.t.sleep,
+            "uniform": sc.random.uniform,
+        }
+        try:
+            tb.ensure_conn_alive = lambda conn: conn
+            tb.load_rows = lambda _conn, mode: [dict(row)]
+            tb.safe_call = lambda fn, *args, **kwargs: fn(*args, **kwargs)
+            tb.strategy_B_sell = lambda code, row=None: seen.append((code, row)) or False
+            sc.t.sleep = lambda _seconds: None
+            sc.random.uniform = lambda *_args: 0
+
+            sc.run_sell_round(FakeConn(), sc.SplitBotConfig("sell", ("B",), 0, 0), "regular")
+            sc._sell_one("MOCKB", "B", "regular")
+
+            self.assertEqual([("MOCKB", row), ("MOCKB", None)], seen)
+        finally:
+            tb.ensure_conn_alive = originals["ensure_conn_alive"]
+            tb.load_rows = originals["load_rows"]
+            tb.safe_call = originals["safe_call"]
+            tb.strategy_B_sell = originals["strategy_B_sell"]
+            sc.t.sleep = originals["sleep"]
+            sc.random.uniform = originals["uniform"]
+            sc._round_rows.clear()
+
     def test_b_buy_round_blocks_when_risk_gate_is_closed(self):
         import app.bots.runtime_core as tb
         import app.bots.split_core as sc
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import argparse
+import tempfile
+import unittest
+
+
+class BenchmarkSmokeTests(unittest.TestCase):
+    def test_every_case_runs_on_fakes_without_unrouted_sql(self):
+        from benchmarks import run
+
+        args = argparse.Namespace(data_latency_ms=0, order_latency_ms=0, db_latency_ms=0, seed=7, repeat=1)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for case in run.CASES:
+                with self.subTest(case=case):
+                    r = run.run_case(case, 20, args, tmpdir)
+                    self.assertGreater(r["symbols_per_sec"], 0)
+                    self.assertGreater(r["alloc_kib_per_symbol"], 0)
+                    self.assertEqual(0, r["db_unrouted"])
+
+    def test_compare_flags_throughput_and_alloc_regressions(self):
+        from benchmarks import run
+
+        baseline = {"results": {"b_sell/50": {"symbols_per_sec": 1000.0, "alloc_kib_per_symbol": 1.0}}}
+        ok = [{"case": "b_sell", "size": 50, "symbols_per_sec": 800.0, "alloc_kib_per_symbol": 1.2}]
+        bad = [{"case": "b_sell", "size": 50, "symbols_per_sec": 500.0, "alloc_kib_per_symbol": 2.0}]
+
+        self.assertEqual([], run.compare(ok, baseline, 0.3))
+        self.assertEqual(2, len(run.compare(bad, baseline, 0.3)))
+
+
+if __name__ == "__main__":
+    unittest.main()
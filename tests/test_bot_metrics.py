@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import time
+import unittest
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, args=None):
+        self.conn.executed.append(sql)
+
+    def executemany(self, sql, rows):
+        self.conn.inserted.extend(rows)
+
+
+class FakeConn:
+    def __init__(self):
+        self.executed = []
+        self.inserted = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+class BotMetricsTests(unittest.TestCase):
+    def setUp(self):
+        import app.bot_metrics as bm
+        import app.strategy_b as b
+        import app.strategy_f as f
+
+        self.bm, self.b, self.f = bm, b, f
+        self.saved = {
+            (b, "_reconcile_fill"): b._reconcile_fill,
+            (f, "_reconcile_fill"): f._reconcile_fill,
+            (bm, "HOT_PATHS"): bm.HOT_PATHS,
+            (bm, "_installed"): bm._installed,
+        }
+
+    def tearDown(self):
+        for (mod, name), value in self.saved.items():
+            setattr(mod, name, value)
+        self.bm._samples.clear()
+
+    def test_install_wraps_every_binding_and_round_is_written(self):
+        from app import schema_registry
+
+        bm, b, f = self.bm, self.b, self.f
+        calls = []
+
+        def fake_reconcile(tc, code, order_id, wait_sec=4.0):
+            calls.append(code)
+            time.sleep(0.002)
+            return 1, 10.0
+
+        b._reconcile_fill = fake_reconcile
+        f._reconcile_fill = fake_reconcile
+        bm.HOT_PATHS = (("reconcile_fill", "app.strategy_b", "_reconcile_fill"),)
+        bm._installed = False
+        schema_registry.forget(bm.BOT_METRICS_TABLE)
+
+        self.assertEqual(2, bm.install())
+        self.assertEqual(0, bm.install())
+        self.assertIs(b._reconcile_fill, f._reconcile_fill)
+
+        bm.start_round()
+        for _ in range(3):
+            self.assertEqual((1, 10.0), b._reconcile_fill(None, "AAA", "o1"))
+        with bm.span("between_symbols"):
+            pass
+        conn = FakeConn()
+        spans = {s["span"]: s for s in bm.finish_round(conn, "sell:B,F", 7, "regular")}
+
+        self.assertEqual(["AAA"] * 3, calls)
+        self.assertEqual(3, spans["reconcile_fill"]["calls"])
+        self.assertGreaterEqual(spans["reconcile_fill"]["p50_ms"], 2.0)
+        self.assertEqual(2, len(conn.inserted))
+        self.assertEqual(("sell:B,F", 7, "regular"), (conn.inserted[0][0], conn.inserted[0][2], conn.inserted[0][3]))
+        self.assertEqual(1, conn.commits)
+
+        # 建表走 schema_registry：同一进程第二轮不再发 DDL
+        bm.start_round()
+        with bm.span("between_symbols"):
+            pass
+        bm.finish_round(conn, "sell:B,F", 8, "regular")
+        self.assertEqual(1, sum("CREATE TABLE" in sql for sql in conn.executed))
+
+    def test_triggered_sells_are_not_counted_as_between_symbols_wait(self):
+        bm = self.bm
+        import app.bots.split_core as sc
+        from app.bots import stop_trigger
+
+        fired = [("AAA", "B", 9.5, 9.6)]
+        for obj, name in ((sc, "_event_sell_active"), (sc, "_sell_one"), (stop_trigger, "get_fired")):
+            self.saved[(obj, name)] = getattr(obj, name)
+        sc._event_sell_active = lambda config, phase: True
+        stop_trigger.get_fired = lambda timeout: fired.pop() if fired else time.sleep(min(timeout, 0.01))
+
+        def slow_sell(code, stype, phase):
+            time.sleep(0.08)  # 下单 + 对账
+            return True
+
+        sc._sell_one = slow_sell
+        bm.start_round()
+        config = sc.SplitBotConfig("sell", ("B",), 0, 0)
+        self.assertTrue(sc._sleep_with_stop_triggers(0.02, config, "regular", wait_span="between_symbols"))
+
+        waits = bm._samples["between_symbols"]
+        self.assertEqual(1, len(waits))
+        self.assertLess(waits[0], 0.05)
+        self.assertGreaterEqual(bm._samples["event_sell"][0], 0.08)
+
+    def test_percentiles_and_wrapper_overhead(self):
+        bm = self.bm
+        rows = {r["span"]: r for r in bm.summarize({"x": [i / 1000 for i in range(1, 101)]})}
+        self.assertEqual((50.0, 95.0, 100.0), (rows["x"]["p50_ms"], rows["x"]["p95_ms"], rows["x"]["max_ms"]))
+
+        def noop():
+            return None
+
+        wrapped = bm.timed("noop", noop)
+        n = 20000
+        t0 = time.perf_counter()
+        for _ in range(n):
+            wrapped()
+        per_call = (time.perf_counter() - t0) / n
+        bm._samples.clear()
+        # 热路径都是毫秒级的 HTTP / SQL，包装开销要远小于 1%（10µs / 1ms）
+        self.assertLess(per_call, 10e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import unittest
+
+
+class FakeRawConn:
+    def __init__(self):
+        self.open = True
+        self._autocommit = False
+        self.rollbacks = 0
+        self.pings = 0
+
+    def get_autocommit(self):
+        return self._autocommit
+
+    def autocommit(self, value):
+        self._autocommit = bool(value)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+
+    def close(self):
+        self.open = False
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        import ultimate_v1.db as db
+
+        self.db = db
+        self.created = []
+        self.originals = {
+            "connect": db.pymysql.connect,
+            "DB_POOL_MAX_LIFETIME_SEC": db.DB_POOL_MAX_LIFETIME_SEC,
+        }
+
+        def fake_connect(**kwargs):
+            conn = FakeRawConn()
+            conn._autocommit = bool(kwargs.get("autocommit"))
+            self.created.append(conn)
+            return conn
+
+        db.pymysql.connect = fake_connect
+        self.pool = db.ConnectionPool({"host": "fake", "autocommit": False}, max_size=2)
+
+    def tearDown(self):
+        self.db.pymysql.connect = self.originals["connect"]
+        self.db.DB_POOL_MAX_LIFETIME_SEC = self.originals["DB_POOL_MAX_LIFETIME_SEC"]
+
+    def test_reuses_connection_and_rolls_back_on_release(self):
+        conn = self.pool.acquire()
+        # 假连接没有任何事务标记：归还时照样回滚，不看 pymysql 的 IN_TRANS
+        self.assertFalse(hasattr(conn._raw.conn, "server_status"))
+        conn.close()
+        conn.close()  # 重复 close 无副作用
+
+        again = self.pool.acquire()
+        self.assertIs(self.created[0], again._raw.conn)
+        self.assertEqual(1, self.created[0].rollbacks)
+        again.close()
+
+        stats = self.pool.stats()
+        self.assertEqual(1, stats["created"])
+        self.assertEqual(2, stats["checkouts"])
+        self.assertEqual(1, stats["idle"])
+
+    def test_always_rolls_back_non_autocommit_checkout(self):
+        # 只跑过 SELECT：pymysql 没置 IN_TRANS，但连接已经握着旧快照
+        conn = self.pool.acquire()
+        conn.close()
+        self.assertEqual(1, self.created[0].rollbacks)
+
+        auto = self.db.ConnectionPool({"host": "fake", "autocommit": True}, max_size=1)
+        conn = auto.acquire()
+        conn.close()
+        self.assertEqual(0, self.created[1].rollbacks)
+
+    def test_bounded_and_times_out(self):
+        a = self.pool.acquire()
+        b = self.pool.acquire()
+        with self.assertRaises(TimeoutError):
+            self.pool.acquire(timeout=0.05)
+        a.close()
+        c = self.pool.acquire(timeout=0.05)
+        self.assertEqual(1, self.pool.stats()["timeouts"])
+        b.close()
+        c.close()
+
+    def test_expired_connection_is_recycled(self):
+        self.db.DB_POOL_MAX_LIFETIME_SEC = -1
+        self.pool.acquire().close()
+        self.assertFalse(self.created[0].open)
+        self.pool.acquire().close()
+        self.assertEqual(2, len(self.created))
+        self.assertEqual(2, self.pool.stats()["recycled"])
+
+
+if __name__ == "__main__":
+    unittest.main()
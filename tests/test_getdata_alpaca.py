@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, args=None):
+        if "SELECT `symbol`" in sql:
+            self._rows = [{"symbol": s} for s in sorted(self.conn.checkpoints)]
+
+    def executemany(self, sql, rows):
+        if "getdata_checkpoints" in sql:
+            self.conn.checkpoints.update(r[1] for r in rows)
+        else:
+            self.conn.bar_writes.append(list(rows))
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConn:
+    def __init__(self, checkpoints=()):
+        self.checkpoints = set(checkpoints)
+        self.bar_writes = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _bars(symbols, days):
+    rows = []
+    for sym in symbols:
+        for i, d in enumerate(days):
+            rows.append({
+                "symbol": sym,
+                "timestamp": pd.Timestamp(d, tz="UTC") + pd.Timedelta(hours=5),
+                "open": 1.0 + i,
+                "high": 2.0 + i,
+                "low": np.nan if i == 0 else 0.5,
+                "close": 1.5 + i,
+                "volume": 1000.0 * (i + 1),
+            })
+    return pd.DataFrame(rows)
+
+
+class GetdataAlpacaTests(unittest.TestCase):
+    def setUp(self):
+        import app.getdata_alpaca as g
+
+        self.g = g
+        self.saved = {
+            name: getattr(g, name)
+            for name in ("mysql_conn", "alpaca_client", "thread_client", "fetch_bars_batch", "GETDATA_RESUME", "BATCH_SIZE",
+                         "DAILY", "START_DATE", "END_DATE", "FAILED_OUT",
+                         "trading_calendar", "GETDATA_HEAL_DAYS")
+        }
+        self.argv = sys.argv
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(self.g, name, value)
+        sys.argv = self.argv
+
+    def test_bars_to_rows_converts_without_numpy_scalars(self):
+        df = _bars(["AAA", "BBB"], ["2024-01-02", "2024-01-03", "2024-01-10"])
+        out = self.g.bars_to_rows(df, date(2024, 1, 2), date(2024, 1, 4))
+
+        self.assertEqual({"AAA", "BBB"}, set(out))
+        self.assertEqual(
+            [("AAA", date(2024, 1, 2), 1.0, 2.0, None, 1.5, 1000), ("AAA", date(2024, 1, 3), 2.0, 3.0, 0.5, 2.5, 2000)],
+            out["AAA"],
+        )
+        self.assertEqual([str, date, float, float, float, float, int], [type(x) for x in out["BBB"][1]])
+
+    def test_main_writes_multi_symbol_batches_and_resumes(self):
+        g = self.g
+        conn = FakeConn(checkpoints={"CCC"})
+        fetched = []
+
+        def fake_fetch(client, symbols, start_dt, end_dt):
+            fetched.append(list(symbols))
+            return g.bars_to_rows(_bars([s for s in symbols if s != "EEE"], ["2024-01-02"]), start_dt, end_dt)
+
+        g.mysql_conn = lambda: conn
+        g.alpaca_client = lambda: None
+        g.thread_client = lambda: None
+        g.fetch_bars_batch = fake_fetch
+        g.GETDATA_RESUME = True
+        g.BATCH_SIZE = 2
+        g.DAILY = "0"
+        g.START_DATE, g.END_DATE = "2024-01-01", "2024-01-05"
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        g.FAILED_OUT = os.path.join(tmp.name, "failed.csv")
+        sys.argv = ["getdata_alpaca.py", "AAA", "BBB", "CCC", "DDD", "EEE"]
+
+        g.main()
+
+        self.assertEqual([["AAA", "BBB"], ["DDD", "EEE"]], sorted(fetched))
+        self.assertEqual([2, 1], sorted((len(w) for w in conn.bar_writes), reverse=True))
+        self.assertEqual({"AAA", "BBB", "CCC", "DDD"}, conn.checkpoints)
+        # 区间模式下空数据算失败，不记断点，下次还会重拉
+        with open(g.FAILED_OUT, encoding="utf-8") as f:
+            self.assertEqual("EEE", f.read().strip())
+
+    def test_incremental_plan_groups_identical_gaps(self):
+        g = self.g
+
+        def fake_calendar(start_dt, end_dt):
+            days = [date(2024, 1, d) for d in (2, 3, 4, 5, 8)]  # 1/6、1/7 周末
+            return [(d, datetime(d.year, d.month, d.day, 16)) for d in days if start_dt <= d < end_dt]
+
+        g.trading_calendar = fake_calendar
+        g.GETDATA_HEAL_DAYS = 10
+        # 1/8 15:00 还没收盘：当天不算缺
+        days = g.closed_trading_days(datetime(2024, 1, 8, 15, 0))
+        self.assertEqual([date(2024, 1, d) for d in (2, 3, 4, 5)], days)
+
+        full = set(days)
+        stored = {
+            "UPD": full,
+            "NEW1": full - {date(2024, 1, 5)},
+            "NEW2": full - {date(2024, 1, 5)},
+            "HOLE": full - {date(2024, 1, 3)},
+        }
+        plan = g.plan_incremental(["UPD", "NEW1", "NEW2", "HOLE", "NONE"], stored, days)
+        self.assertEqual(
+            {
+                (date(2024, 1, 5), date(2024, 1, 6)): ["NEW1", "NEW2"],
+                (date(2024, 1, 3), date(2024, 1, 4)): ["HOLE"],
+                (date(2024, 1, 2), date(2024, 1, 6)): ["NONE"],
+            },
+            plan,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
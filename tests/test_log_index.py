@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class LogIndexTests(unittest.TestCase):
+    def setUp(self):
+        from ultimate_v1.log_index import LogIndex
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "AAA_b_buy_bot_paper.log"
+        self.clock = Clock()
+        self.index = LogIndex(lambda bot: self.path if bot == "b_buy_bot" and self.path.exists() else None,
+                              max_lines=5, poll_sec=1.0, clock=self.clock)
+
+    def write(self, data: bytes, mode="ab"):
+        with self.path.open(mode) as fh:
+            fh.write(data)
+        self.clock.now += 1
+
+    def test_since_returns_only_new_complete_lines(self):
+        self.write(b"t | INFO | a\nt | INFO | b\nt | INFO | par")
+        first = self.index.read("b_buy_bot")
+        self.assertEqual((["t | INFO | a", "t | INFO | b"], False), (first.lines, first.append))
+
+        self.write(b"tial\n")
+        nxt = self.index.read("b_buy_bot", since=first.offset)
+        self.assertEqual((["t | INFO | partial"], True), (nxt.lines, nxt.append))
+        self.assertEqual(self.path.stat().st_size, nxt.offset)
+
+        # 轮询间隔内不碰文件
+        self.write(b"t | INFO | c\n")
+        self.clock.now -= 1
+        self.assertEqual([], self.index.read("b_buy_bot", since=nxt.offset).lines)
+        self.assertEqual(2, self.index.stats()["polls"])
+
+        self.assertIsNone(self.index.read("other_bot").path)
+
+    def test_since_slice_cut_by_limit_is_not_appended(self):
+        self.write(b"t | INFO | start\n")
+        first = self.index.read("b_buy_bot")
+        self.write(b"t | INFO | a\nt | INFO | b\nt | INFO | c\n")
+        exact = self.index.read("b_buy_bot", since=first.offset, lines=3)
+        self.assertEqual((["t | INFO | a", "t | INFO | b", "t | INFO | c"], True), (exact.lines, exact.append))
+        # 新行比 lines 多：中间的行不在结果里，客户端要整体替换而不是拼接
+        cut = self.index.read("b_buy_bot", since=first.offset, lines=2)
+        self.assertEqual((["t | INFO | b", "t | INFO | c"], False), (cut.lines, cut.append))
+
+    def test_ring_bound_truncation_and_filters(self):
+        self.write(b"".join(b"t | INFO | line%d\n" % i for i in range(3)))
+        self.index.read("b_buy_bot")
+        self.write(b"t | ERROR | boom\nTraceback (most recent call last)\nt | WARNING | slow\nt | INFO | ok\n")
+        out = self.index.read("b_buy_bot", level="warning")
+        self.assertEqual(["t | ERROR | boom", "Traceback (most recent call last)", "t | WARNING | slow"], out.lines)
+        self.assertEqual(["t | ERROR | boom"], self.index.read("b_buy_bot", keyword="BOOM").lines)
+        # 缓冲只留 5 行：line0 之后的游标已经覆盖不到（line1 被挤掉），回全量
+        old = self.index.read("b_buy_bot", since=len(b"t | INFO | line0\n"))
+        self.assertEqual((False, 5), (old.append, len(old.lines)))
+        newer = self.index.read("b_buy_bot", since=2 * len(b"t | INFO | line0\n"))
+        self.assertEqual((True, 5), (newer.append, len(newer.lines)))
+
+        # 被清空：旧游标作废，新游标比旧的大
+        self.write(b"t | INFO | fresh\n", mode="wb")
+        fresh = self.index.read("b_buy_bot", since=out.offset)
+        self.assertEqual((["t | INFO | fresh"], False), (fresh.lines, fresh.append))
+        self.assertGreater(fresh.offset, out.offset)
+
+    def test_rotation_is_detected_by_inode(self):
+        self.write(b"t | INFO | old\n")
+        before = self.index.read("b_buy_bot")
+        os.rename(self.path, self.path.with_suffix(".log.1"))
+        self.write(b"t | INFO | new day\n", mode="wb")
+        after = self.index.read("b_buy_bot", since=before.offset)
+        self.assertEqual((["t | INFO | new day"], False), (after.lines, after.append))
+
+    def test_parse_log_cursor(self):
+        from ultimate_v1.web_app import _parse_log_cursor
+
+        self.assertEqual({"b_buy_bot": 12, "ac_bot": 3}, _parse_log_cursor("b_buy_bot:12,ac_bot:3,bad,x:y"))
+        # 只按最后一个冒号切；空串 / 负数 / 空名字都丢掉
+        self.assertEqual({"a:b": 5, "c": 7}, _parse_log_cursor(" a:b:5 , c:7,d:-1,:9,"))
+        self.assertEqual({}, _parse_log_cursor(""))
+        self.assertEqual({}, _parse_log_cursor(None))
+
+    def test_payload_cursor_round_trip(self):
+        import ultimate_v1.web_app as web
+
+        saved = {name: getattr(web, name) for name in ("_LOG_INDEX", "managed_bot_names", "process_status")}
+        self.addCleanup(lambda: [setattr(web, name, value) for name, value in saved.items()])
+        web._LOG_INDEX = self.index
+        web.managed_bot_names = lambda: ["b_buy_bot"]
+        web.process_status = lambda: []
+
+        self.write(b"t | INFO | a\n")
+        first = web._bot_logs_payload()
+        self.assertEqual(f"b_buy_bot:{self.path.stat().st_size}", first["cursor"])
+        self.assertEqual((["t | INFO | a"], False), (first["rows"][0]["lines"], first["rows"][0]["append"]))
+
+        # 上次的 cursor 原样传回 since=：只拿新增的行，前端接在旧行后面
+        self.write(b"t | INFO | b\n")
+        nxt = web._bot_logs_payload(since=first["cursor"])
+        self.assertEqual((["t | INFO | b"], True), (nxt["rows"][0]["lines"], nxt["rows"][0]["append"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
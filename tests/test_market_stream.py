@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+import unittest
+
+from websockets.sync.server import serve
+
+
+def _fake_alpaca_handler(ws):
+    ws.send(json.dumps([{"T": "success", "msg": "connected"}]))
+    auth = json.loads(ws.recv())
+    assert auth["action"] == "auth"
+    ws.send(json.dumps([{"T": "success", "msg": "authenticated"}]))
+    for raw in ws:
+        msg = json.loads(raw)
+        if msg.get("action") != "subscribe":
+            continue
+        ws.send(json.dumps([{"T": "subscription", "trades": msg["trades"], "quotes": msg["quotes"]}]))
+        for symbol in msg["trades"]:
+            ws.send(json.dumps([
+                {"T": "q", "S": symbol, "bp": 10.4, "ap": 10.6},
+                {"T": "d", "S": symbol, "o": 10.0, "h": 10.8, "l": 9.9, "c": 10.5, "v": 1000},
+                {"T": "t", "S": symbol, "p": 10.55, "s": 50},
+            ]))
+
+
+def _wait_for(fn, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        value = fn()
+        if value:
+            return value
+        time.sleep(0.02)
+    return None
+
+
+class MarketStreamTests(unittest.TestCase):
+    def setUp(self):
+        import app.market_stream as ms
+        import app.strategy_b as b
+
+        self.ms = ms
+        self.b = b
+        self.server = serve(_fake_alpaca_handler, "127.0.0.1", 0)
+        port = self.server.socket.getsockname()[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.originals = {
+            "MARKET_STREAM_URL": ms.MARKET_STREAM_URL,
+            "MARKET_STREAM_ENABLED": ms.MARKET_STREAM_ENABLED,
+        }
+        self.b_snapshot_http = b._snapshot_http
+        ms.MARKET_STREAM_URL = f"ws://127.0.0.1:{port}"
+        ms.MARKET_STREAM_ENABLED = 1
+        ms._book.clear()
+        b._snapshot_cache.clear()
+        b._snapshot_quote_cache.clear()
+
+    def tearDown(self):
+        self.ms.stop()
+        self.server.shutdown()
+        for name, value in self.originals.items():
+            setattr(self.ms, name, value)
+        self.ms.set_symbols([])
+        self.ms._book.clear()
+        self.b._snapshot_http = self.b_snapshot_http
+
+    def test_book_serves_quotes_and_ticks_without_rest(self):
+        ms = self.ms
+        ticks = []
+        listener = lambda symbol, price: ticks.append((symbol, price))
+        ms.add_tick_listener(listener)
+        self.addCleanup(ms.remove_tick_listener, listener)
+
+        def fail_rest(code, feed):
+            raise AssertionError(f"unexpected REST snapshot for {code}")
+
+        self.b._snapshot_http = fail_rest
+        ms.seed("MOCKB", {"prev_close": 9.5})
+        ms.set_symbols(["mockb"])
+        self.assertTrue(ms.start())
+
+        quote = _wait_for(lambda: ms.get_quote("MOCKB") if ms.get_entry("MOCKB").last_price == 10.55 else None)
+        self.assertIsNotNone(quote)
+        self.assertEqual(9.9, quote["day_low"])
+        self.assertEqual(10.55, self.b.get_snapshot_quote_realtime("MOCKB")["last_price"])
+        self.assertEqual((10.55, 9.5, ms.MARKET_STREAM_FEED), self.b.get_snapshot_realtime("MOCKB"))
+        self.assertIn(("MOCKB", 10.55), ticks)
+
+    def test_live_day_volume_feeds_volume_gate_without_db(self):
+        ms, b = self.ms, self.b
+        saved = {
+            name: getattr(b, name)
+            for name in ("B_LIVE_VOLUME_FEEDS", "B_REQUIRE_INTRADAY_VOLUME", "_get_ops_intraday_volume", "_get_avg_volume20")
+        }
+        self.addCleanup(lambda: [setattr(b, k, v) for k, v in saved.items()])
+        b.B_LIVE_VOLUME_FEEDS = {ms.MARKET_STREAM_FEED}
+        b.B_REQUIRE_INTRADAY_VOLUME = 1
+        b._get_avg_volume20 = lambda conn, code: 2000.0
+
+        def fail_db(conn, code):
+            raise AssertionError(f"unexpected DB volume read for {code}")
+
+        b._get_ops_intraday_volume = fail_db
+        ms.set_symbols(["MOCKB"])
+        ms.start()
+
+        # 日线推送给基数，之后的逐笔成交累加上去
+        self.assertEqual(1050, _wait_for(lambda: ms.get_day_volume("MOCKB") if ms.get_day_volume("MOCKB") == 1050 else None))
+        ok, volume, avg20, _, ratio, _ = b._intraday_volume_check(None, "MOCKB")
+        self.assertEqual((1050, 2000.0), (volume, avg20))
+        self.assertAlmostEqual(0.525, ratio)
+
+        # 行情簿里的量不是今天这个交易日的（换日后还没有新推送）：回退数据库列
+        b._get_ops_intraday_volume = lambda conn, code: 5
+        ms._update("MOCKB", session_day="2000-01-03")
+        self.assertEqual(5, b._intraday_volume_check(None, "MOCKB")[1])
+
+        # feed 不在信任列表（例如 iex）时回退数据库列
+        b.B_LIVE_VOLUME_FEEDS = {"sip"}
+        b._get_ops_intraday_volume = lambda conn, code: 7
+        ms.MARKET_STREAM_FEED, saved_feed = "iex", ms.MARKET_STREAM_FEED
+        self.addCleanup(setattr, ms, "MARKET_STREAM_FEED", saved_feed)
+        self.assertEqual(7, b._intraday_volume_check(None, "MOCKB", {"day_volume": 99, "feed": "iex"})[1])
+        self.assertEqual(99, b._intraday_volume_check(None, "MOCKB", {"day_volume": 99, "feed": "sip"})[1])
+
+    def test_day_fields_reset_when_session_rolls_over(self):
+        ms = self.ms
+        # 美东 10-15 收盘前后的推送（UTC 19:59 / 20:30）
+        ms.handle_message({"T": "d", "S": "ROLL", "o": 10.0, "h": 11.0, "l": 9.0, "c": 10.5, "v": 5000, "t": "2026-10-15T04:00:00Z"})
+        ms.handle_message({"T": "t", "S": "ROLL", "p": 10.6, "s": 100, "t": "2026-10-15T19:59:59.123456789Z"})
+        ms._update("ROLL", prev_close=9.8)  # REST 回填的昨收
+        e = ms.get_entry("ROLL")
+        self.assertEqual(("2026-10-15", 5100, 9.8), (e.session_day, e.day_volume, e.prev_close))
+
+        # 第二天盘前第一笔：昨天的累计量 / 高低 / 昨收都作废，不能把今天的量加到昨天上
+        ms.handle_message({"T": "t", "S": "ROLL", "p": 10.7, "s": 30, "t": "2026-10-16T08:00:01Z"})
+        e = ms.get_entry("ROLL")
+        self.assertEqual("2026-10-16", e.session_day)
+        self.assertEqual((None, None, None, None), (e.day_volume, e.day_high, e.day_low, e.prev_close))
+        self.assertEqual(10.7, e.last_price)
+
+        ms.handle_message({"T": "d", "S": "ROLL", "o": 10.7, "h": 10.7, "l": 10.7, "c": 10.7, "v": 30, "t": "2026-10-16T04:00:00Z"})
+        ms.handle_message({"T": "t", "S": "ROLL", "p": 10.8, "s": 20, "t": "2026-10-16T08:00:02Z"})
+        self.assertEqual(50, ms.get_entry("ROLL").day_volume)
+
+    def test_trade_aggregate_uses_entry_current_under_lock(self):
+        from dataclasses import replace
+
+        ms = self.ms
+        t = "2026-10-16T14:00:00Z"
+        ms.handle_message({"T": "d", "S": "RACE", "o": 10.0, "h": 10.5, "l": 9.5, "c": 10.0, "v": 100, "t": t})
+        # 成交推送卡在锁上时，另一个写端（seed / 日线推送）把累计量改成了 1000
+        ms._write_lock.acquire()
+        try:
+            worker = threading.Thread(target=ms.handle_message, args=({"T": "t", "S": "RACE", "p": 10.6, "s": 5, "t": t},))
+            worker.start()
+            time.sleep(0.05)
+            ms._book["RACE"] = replace(ms._book["RACE"], day_volume=1000.0, day_high=11.0)
+        finally:
+            ms._write_lock.release()
+        worker.join(2)
+        e = ms.get_entry("RACE")
+        self.assertEqual((1005.0, 11.0, 10.6), (e.day_volume, e.day_high, e.last_price))
+
+    def test_unsubscribed_symbol_falls_back(self):
+        ms = self.ms
+        ms.set_symbols(["MOCKB"])
+        ms.start()
+        _wait_for(lambda: ms.get_entry("MOCKB"))
+        self.assertIsNone(ms.get_quote("MOCKC"))
+        # 没有昨收（还没 REST 回填）时不能给策略用
+        self.assertIsNone(ms.get_quote("MOCKB"))
+
+
+if __name__ == "__main__":
+    unittest.main()
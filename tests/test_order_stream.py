@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import queue
+import threading
+import time
+import unittest
+
+from websockets.sync.server import serve
+
+
+class FailClient:
+    def get_order_by_id(self, order_id):
+        raise AssertionError(f"unexpected REST poll for {order_id}")
+
+    def get_open_position(self, code):
+        raise AssertionError(f"unexpected REST position for {code}")
+
+
+class PositionClient(FailClient):
+    """订单只走推送；持仓是合并后的（已有 5 股 @ 9.72 + 本单 10 股 @ 10.5）。"""
+
+    def __init__(self):
+        self.positions = 0
+
+    def get_open_position(self, code):
+        self.positions += 1
+        return type("Pos", (), {"qty": "15", "avg_entry_price": "10.24"})()
+
+
+class FilledOrder:
+    status = "filled"
+    filled_qty = "3"
+    filled_avg_price = "9.9"
+
+
+class PollClient:
+    def __init__(self):
+        self.polls = 0
+
+    def get_order_by_id(self, order_id):
+        self.polls += 1
+        return FilledOrder()
+
+
+def _fill(order_id, symbol, qty, price, side="buy"):
+    return {
+        "stream": "trade_updates",
+        "data": {
+            "event": "fill",
+            "price": str(price),
+            "qty": str(qty),
+            "position_qty": str(qty),
+            "order": {
+                "id": order_id,
+                "symbol": symbol,
+                "side": side,
+                "status": "filled",
+                "filled_qty": str(qty),
+                "filled_avg_price": str(price),
+            },
+        },
+    }
+
+
+def _wait_for(fn, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if fn():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class OrderStreamTests(unittest.TestCase):
+    def setUp(self):
+        import app.order_stream as os_
+        import app.strategy_b as b
+
+        self.os = os_
+        self.b = b
+        self.cmds = queue.Queue()
+
+        def handler(ws):
+            auth = json.loads(ws.recv())
+            assert auth["action"] == "auth"
+            ws.send(json.dumps({"stream": "authorization", "data": {"status": "authorized", "action": "authenticate"}}))
+            listen = json.loads(ws.recv())
+            assert listen["data"]["streams"] == ["trade_updates"]
+            ws.send(json.dumps({"stream": "listening", "data": {"streams": ["trade_updates"]}}).encode())
+            while True:
+                cmd = self.cmds.get()
+                if cmd == "close":
+                    return
+                # Alpaca 交易流发二进制帧
+                ws.send(json.dumps(cmd).encode())
+
+        self.server = serve(handler, "127.0.0.1", 0)
+        port = self.server.socket.getsockname()[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.originals = {
+            "ORDER_STREAM_URL": os_.ORDER_STREAM_URL,
+            "ORDER_STREAM_ENABLED": os_.ORDER_STREAM_ENABLED,
+            "ORDER_STREAM_RECONNECT_MIN": os_.ORDER_STREAM_RECONNECT_MIN,
+        }
+        os_.ORDER_STREAM_URL = f"ws://127.0.0.1:{port}"
+        os_.ORDER_STREAM_ENABLED = 1
+        os_.ORDER_STREAM_RECONNECT_MIN = 30
+        os_._orders.clear()
+        self.assertTrue(os_.start())
+        self.assertTrue(_wait_for(os_.is_live))
+
+    def tearDown(self):
+        self.cmds.put("close")
+        self.os.stop()
+        self.server.shutdown()
+        for name, value in self.originals.items():
+            setattr(self.os, name, value)
+        self.os._orders.clear()
+
+    def test_fill_is_pushed_without_rest_polling(self):
+        b = self.b
+        threading.Timer(0.1, lambda: self.cmds.put(_fill("o1", "MOCKB", 10, 10.5))).start()
+
+        t0 = time.time()
+        client = PositionClient()
+        # 推送到终态后也按"真实持仓 > 订单成交"的口径返回，和轮询路径一致
+        self.assertEqual((15, 10.24), b._reconcile_fill(client, "MOCKB", "o1", wait_sec=3.0))
+        self.assertLess(time.time() - t0, 1.0)
+        self.assertEqual(1, client.positions)
+
+        # 没有持仓（查询报错）时用订单的成交数量 / 均价
+        self.cmds.put(_fill("o4", "MOCKB", 10, 10.5))
+        self.assertEqual((10, 10.5), b._reconcile_fill(FailClient(), "MOCKB", "o4", wait_sec=3.0))
+
+        # 事件先到、调用方后 watch 也不会漏
+        self.cmds.put(_fill("o2", "MOCKB", 5, 11.0, side="sell"))
+        self.assertTrue(_wait_for(lambda: self.os.get_order("o2")))
+        self.assertEqual(5, b._reconcile_sell_fill(FailClient(), "MOCKB", "o2", expected_real_qty=5))
+        self.assertEqual("sell", self.os.get_order("o2").side)
+
+    def test_disconnect_falls_back_to_polling(self):
+        b = self.b
+        client = PollClient()
+        threading.Timer(0.1, lambda: self.cmds.put("close")).start()
+
+        self.assertEqual((3, 9.9), b._reconcile_add_fill(client, "o3", wait_sec=3.0))
+        self.assertGreater(client.polls, 0)
+        self.assertFalse(self.os.is_live())
+
+
+if __name__ == "__main__":
+    unittest.main()
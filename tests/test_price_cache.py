@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+
+import numpy as np
+
+
+class _Cursor:
+    """把 pymysql 的 %s 占位符转给 sqlite3。"""
+
+    def __init__(self, conn):
+        self._cur = conn.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        return False
+
+    def execute(self, sql, args=None):
+        self._cur.execute(sql.replace("%s", "?"), tuple(str(a) for a in (args or ())))
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchmany(self, n):
+        return self._cur.fetchmany(n)
+
+
+class _Conn:
+    def __init__(self):
+        self.db = sqlite3.connect(":memory:")
+        self.db.execute(
+            "CREATE TABLE stock_prices_pool (symbol TEXT, `date` TEXT, `open` REAL, high REAL, low REAL, `close` REAL, volume REAL)"
+        )
+
+    def cursor(self):
+        return _Cursor(self.db)
+
+    def add(self, symbol, d, close, volume=1000.0):
+        self.db.execute(
+            "INSERT INTO stock_prices_pool VALUES (?,?,?,?,?,?,?)",
+            (symbol, d, close - 0.1, close + 0.2, close - 0.3, close, volume),
+        )
+
+
+class PriceCacheTests(unittest.TestCase):
+    def setUp(self):
+        import app.price_cache as pc
+
+        self.pc = pc
+        self.tmp = tempfile.TemporaryDirectory()
+        self._old_dir = pc.PRICE_CACHE_DIR
+        pc.PRICE_CACHE_DIR = self.tmp.name
+        pc._mmaps.clear()
+
+        self.conn = _Conn()
+        for d, a, b in (("2025-12-30", 10.0, 5.0), ("2025-12-31", 10.5, 5.1), ("2026-01-02", 11.0, 5.2)):
+            self.conn.add("aaa", d, a)
+            self.conn.add("BBB", d, b)
+
+    def tearDown(self):
+        self.pc.PRICE_CACHE_DIR = self._old_dir
+        self.pc._mmaps.clear()
+        self.tmp.cleanup()
+
+    def test_full_then_incremental_refresh(self):
+        pc = self.pc
+        r = pc.refresh(self.conn, full=True)
+        self.assertEqual(6, r["fetched"])
+        self.assertEqual([2025, 2026], r["years"])
+        self.assertEqual(date(2026, 1, 2), pc.max_date())
+
+        # 最后一天被改写 + 新的一天：增量只重拉 >= max_date
+        self.conn.db.execute("UPDATE stock_prices_pool SET `close`=11.3 WHERE symbol='aaa' AND `date`='2026-01-02'")
+        self.conn.add("CCC", "2026-01-05", 7.0)
+        self.conn.add("aaa", "2026-01-05", 11.8)
+        self.assertTrue(pc.ensure_fresh(self.conn))
+        self.assertFalse(pc.ensure_fresh(self.conn))
+
+        df = pc.load_frame("2025-12-31", "2026-01-05")
+        self.assertEqual(6, len(df))
+        self.assertEqual(date(2025, 12, 31), df["date"].iloc[0])
+        got = df[(df["symbol"] == "AAA") & (df["date"] == date(2026, 1, 2))]["close"].tolist()
+        self.assertEqual([11.3], got)
+
+        recs = pc.load_records(dates=[date(2025, 12, 30), date(2026, 1, 5)])
+        self.assertEqual(
+            [("AAA", date(2025, 12, 30)), ("AAA", date(2026, 1, 5)), ("BBB", date(2025, 12, 30)), ("CCC", date(2026, 1, 5))],
+            [(r["symbol"], r["trade_date"]) for r in recs],
+        )
+
+    def test_since_refills_history_and_symbols_written_first(self):
+        pc = self.pc
+        pc.refresh(self.conn, full=True)
+        # 历史缺口被补上（比 max_date 早），普通增量看不到
+        self.conn.add("DDD", "2025-12-31", 3.0)
+        pc.refresh(self.conn)
+        self.assertEqual([], pc.load_frame(symbols_filter=["DDD"])["close"].tolist())
+
+        seen = []
+        real_write_year = pc._write_year
+
+        def checking_write_year(year, cols):
+            # 年份目录写入时，引用到的 symbol_id 必须已经在 symbols.json 里
+            seen.append(int(cols["symbol_id"].max()) < len(pc.symbols()))
+            real_write_year(year, cols)
+
+        pc._write_year = checking_write_year
+        try:
+            r = pc.refresh(self.conn, since="2025-12-31")
+        finally:
+            pc._write_year = real_write_year
+        self.assertEqual([2025, 2026], r["years"])
+        self.assertEqual([True, True], seen)
+        self.assertEqual([3.0], pc.load_frame(symbols_filter=["DDD"])["close"].tolist())
+        self.assertEqual(7, len(pc.load_frame()))
+        self.assertEqual(date(2026, 1, 2), pc.max_date())
+
+    def test_single_year_range_is_zero_copy(self):
+        pc = self.pc
+        pc.refresh(self.conn, full=True)
+        arr = pc.load_arrays("2026-01-01", "2026-12-31")
+        self.assertIsInstance(arr["close"], np.memmap)
+        self.assertEqual([11.0, 5.2], arr["close"].tolist())
+
+        only_b = pc.load_frame(symbols_filter=["bbb"], sort_by_symbol=True)
+        self.assertEqual([5.0, 5.1, 5.2], only_b["close"].tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+
+def _quote(price, prev_close=9.0):
+    return {
+        "last_price": price,
+        "bid": price - 0.01,
+        "ask": price + 0.01,
+        "day_open": prev_close,
+        "day_high": price + 1,
+        "prev_close": prev_close,
+        "feed": "iex",
+    }
+
+
+class SharedQuoteCacheTests(unittest.TestCase):
+    def setUp(self):
+        import app.quote_cache as qc
+
+        self.qc = qc
+        self.tmp = tempfile.TemporaryDirectory()
+        self.originals = {
+            "SHARED_QUOTE_CACHE_ENABLED": qc.SHARED_QUOTE_CACHE_ENABLED,
+            "SHARED_QUOTE_CACHE_PATH": qc.SHARED_QUOTE_CACHE_PATH,
+            "SHARED_QUOTE_WAIT_SEC": qc.SHARED_QUOTE_WAIT_SEC,
+        }
+        qc.SHARED_QUOTE_CACHE_ENABLED = 1
+        qc.SHARED_QUOTE_CACHE_PATH = os.path.join(self.tmp.name, "quotes.sqlite3")
+
+    def tearDown(self):
+        for name, value in self.originals.items():
+            setattr(self.qc, name, value)
+        self.tmp.cleanup()
+
+    def test_fields_expire_independently(self):
+        qc = self.qc
+        now = time.time()
+        qc.put_quote("mockb", _quote(10.0), ts=now - 60)
+        self.assertIsNone(qc.get_quote("MOCKB", max_age=2))
+
+        # 只刷新实时字段，昨收沿用旧值但仍算新鲜
+        live = _quote(11.0)
+        live.pop("prev_close")
+        qc.put_quote("MOCKB", live, ts=now)
+        quote = qc.get_quote("MOCKB", max_age=2)
+        self.assertEqual(11.0, quote["last_price"])
+        self.assertEqual(9.0, quote["prev_close"])
+
+    def test_single_flight_only_one_fetch(self):
+        qc = self.qc
+        calls = []
+        started = threading.Event()
+
+        def slow_fetch(codes):
+            calls.append(list(codes))
+            started.set()
+            time.sleep(0.2)
+            return {c: _quote(10.0) for c in codes}
+
+        results = {}
+
+        def worker(name):
+            results[name] = qc.get_or_fetch_many(["MOCKB"], slow_fetch, max_age=5)
+
+        t1 = threading.Thread(target=worker, args=("a",))
+        t1.start()
+        started.wait(1)
+        t2 = threading.Thread(target=worker, args=("b",))
+        t2.start()
+        t1.join()
+        t2.join()
+
+        self.assertEqual([["MOCKB"]], calls)
+        self.assertEqual(10.0, results["a"]["MOCKB"]["last_price"])
+        self.assertEqual(10.0, results["b"]["MOCKB"]["last_price"])
+
+    def test_waiter_falls_back_when_owner_never_writes(self):
+        qc = self.qc
+        qc.SHARED_QUOTE_WAIT_SEC = 0.1
+        with qc._conn() as conn:
+            conn.execute(
+                "INSERT INTO fetch_leases (symbol, owner, expires_at) VALUES (?, ?, ?)",
+                ("MOCKB", "other:1", time.time() + 60),
+            )
+
+        got = qc.get_or_fetch_many(["MOCKB"], lambda codes: {c: _quote(12.0) for c in codes}, max_age=5)
+        self.assertEqual(12.0, got["MOCKB"]["last_price"])
+
+    def test_f_scan_and_ac_price_read_the_shared_cache(self):
+        import app.market_stream as ms
+        import app.strategy_b as b
+        import app.strategy_f as f
+        import ultimate_v1.alpaca_gateway as gw
+
+        qc = self.qc
+        quote = dict(_quote(10.5), day_low=8.8)
+        qc.put_quote("MOCKF", quote)
+        b._snapshot_quote_cache.pop("MOCKF", None)
+
+        def no_http(*_args, **_kwargs):
+            raise AssertionError("should be served from the shared cache")
+
+        saved = (b._snapshot_http, gw._snapshot_quote)
+        b._snapshot_http = gw._snapshot_quote = no_http
+        try:
+            bar = f._get_realtime_daily_bar("mockf")
+            price = gw.get_latest_stock_price("MOCKF")
+        finally:
+            b._snapshot_http, gw._snapshot_quote = saved
+            b._snapshot_quote_cache.pop("MOCKF", None)
+            b._snapshot_cache.pop("MOCKF", None)
+            ms._book.pop("MOCKF", None)
+        self.assertEqual((10.5, 11.5, 8.8, 9.0), (bar["close"], bar["high"], bar["low"], bar["prev_close"]))
+        self.assertEqual(10.5, price)
+
+
+if __name__ == "__main__":
+    unittest.main()
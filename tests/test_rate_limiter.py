@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import tempfile
+import threading
+import time
+import unittest
+
+
+class FakeOrder:
+    def __init__(self, side):
+        self.side = side
+
+
+class FakeTradingClient:
+    def __init__(self):
+        self.calls = []
+
+    def submit_order(self, order_data):
+        self.calls.append(("submit_order", order_data.side))
+        return "ok"
+
+    def get_account(self):
+        self.calls.append(("get_account", None))
+        return "acct"
+
+
+class RateLimiterTests(unittest.TestCase):
+    def setUp(self):
+        import app.rate_limiter as rl
+
+        self.rl = rl
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old = (rl.RATE_LIMIT_PATH, dict(rl.BUCKETS), rl.RATE_LIMIT_STATS_FLUSH_SEC)
+        rl.RATE_LIMIT_PATH = f"{self.tmp.name}/rl.sqlite3"
+        rl.RATE_LIMIT_STATS_FLUSH_SEC = 0
+        rl._stats.clear()
+
+    def tearDown(self):
+        rl = self.rl
+        rl.RATE_LIMIT_PATH, buckets, rl.RATE_LIMIT_STATS_FLUSH_SEC = self.old
+        rl.BUCKETS.clear()
+        rl.BUCKETS.update(buckets)
+        rl._stats.clear()
+        self.tmp.cleanup()
+
+    def test_high_lane_is_not_starved_by_low_lane(self):
+        rl = self.rl
+        # 每秒 10 个令牌，桶 6：low 只能用到预留线（3+2）以上的 1 个
+        rl.BUCKETS["orders"] = rl.Bucket("orders", per_min=600, burst=6)
+        self.assertLess(rl.acquire("orders", "low"), 0.05)
+
+        done = []
+        low = threading.Thread(target=lambda: done.append(rl.acquire("orders", "low")))
+        low.start()
+        time.sleep(0.02)
+
+        t0 = time.time()
+        for _ in range(5):
+            rl.acquire("orders", "high")
+        self.assertLess(time.time() - t0, 0.05)
+
+        low.join()
+        # 高优先级把预留令牌用掉后，low 要等桶重新涨回预留线以上
+        self.assertGreater(done[0], 0.3)
+
+    def test_client_proxy_routes_buckets_and_records_metrics(self):
+        rl = self.rl
+        client = rl.limit_client(FakeTradingClient())
+        self.assertIs(client, rl.limit_client(client))
+
+        self.assertEqual("ok", client.submit_order(order_data=FakeOrder("sell")))
+        self.assertEqual("acct", client.get_account())
+
+        m = rl.metrics()
+        lanes = {(x["bucket"], x["lane"]): x["calls"] for x in m["lanes"]}
+        self.assertEqual({("orders", "high"): 1, ("account", "normal"): 1}, lanes)
+        tokens = {x["bucket"]: x["tokens"] for x in m["buckets"]}
+        self.assertLess(tokens["orders"], rl.BUCKETS["orders"].burst)
+
+
+if __name__ == "__main__":
+    unittest.main()
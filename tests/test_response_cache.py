@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def setUp(self):
+        from ultimate_v1.response_cache import ResponseCache
+
+        self.clock = Clock()
+        self.spawned = []
+        self.cache = ResponseCache(lambda p: json.dumps(p).encode(), clock=self.clock, spawn=self.spawned.append)
+        self.calls = 0
+
+    def build(self):
+        self.calls += 1
+        return {"ok": True, "n": self.calls}
+
+    def test_ttl_then_stale_while_revalidate(self):
+        first = self.cache.get("/api/risk", self.build, ttl=10, stale=20)
+        self.clock.now += 5
+        self.assertIs(first, self.cache.get("/api/risk", self.build, ttl=10, stale=20))
+        self.assertEqual(1, self.calls)
+
+        # 过期但在 stale 窗口：先回旧数据，只排一次后台刷新
+        self.clock.now += 10
+        self.assertIs(first, self.cache.get("/api/risk", self.build, ttl=10, stale=20))
+        self.assertIs(first, self.cache.get("/api/risk", self.build, ttl=10, stale=20))
+        self.assertEqual(1, len(self.spawned))
+        self.spawned.pop()()
+        second = self.cache.get("/api/risk", self.build, ttl=10, stale=20)
+        self.assertEqual(b'{"ok": true, "n": 2}', second.body)
+        self.assertNotEqual(first.etag, second.etag)
+
+        # stale 窗口也过了：前台同步重建
+        self.clock.now += 100
+        self.assertEqual(3, json.loads(self.cache.get("/api/risk", self.build, ttl=10, stale=20).body)["n"])
+
+    def test_failures_not_cached_and_invalidate_drops_inflight_build(self):
+        self.cache.get("k", lambda: {"ok": False, "error": "x"}, ttl=10)
+        self.cache.get("k", self.build, ttl=10)
+        self.assertEqual(1, self.calls)
+
+        self.clock.now += 15
+        self.cache.get("k", self.build, ttl=10, stale=20)
+        self.cache.invalidate()
+        self.spawned.pop()()  # 作废前开始的刷新不能写回
+        self.assertEqual(3, json.loads(self.cache.get("k", self.build, ttl=10).body)["n"])
+
+    def test_concurrent_misses_build_once(self):
+        from ultimate_v1.response_cache import ResponseCache
+
+        cache = ResponseCache(lambda p: json.dumps(p).encode())
+        gate = threading.Event()
+        calls = []
+
+        def slow():
+            gate.wait(1)
+            calls.append(1)
+            return {"ok": True}
+
+        out = []
+        threads = [threading.Thread(target=lambda: out.append(cache.get("k", slow, ttl=10))) for _ in range(6)]
+        for th in threads:
+            th.start()
+        gate.set()
+        for th in threads:
+            th.join()
+        self.assertEqual(1, len(calls))
+        self.assertEqual(1, len({r.etag for r in out}))
+
+
+class WebAppEtagTests(unittest.TestCase):
+    def setUp(self):
+        from ultimate_v1 import web_app
+
+        self.web = web_app
+        self.saved = {name: getattr(web_app, name) for name in ("_auth_token", "_risk_payload", "_RESPONSE_CACHE")}
+        self.calls = 0
+
+        def risk():
+            self.calls += 1
+            return {"ok": True, "vix": 18}
+
+        web_app._auth_token = lambda: ""
+        web_app._risk_payload = risk
+        web_app._RESPONSE_CACHE = web_app.ResponseCache(web_app._encode_json)
+        self.log_message = web_app.Handler.log_message
+        web_app.Handler.log_message = lambda *a: None
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), web_app.Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.web.Handler.log_message = self.log_message
+        for name, value in self.saved.items():
+            setattr(self.web, name, value)
+
+    def test_if_none_match_returns_304_and_post_invalidates(self):
+        with urllib.request.urlopen(self.base + "/api/risk") as resp:
+            etag = resp.headers["ETag"]
+            self.assertEqual({"ok": True, "vix": 18}, json.loads(resp.read()))
+
+        req = urllib.request.Request(self.base + "/api/risk", headers={"If-None-Match": etag})
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            urllib.request.urlopen(req)
+        self.assertEqual(304, ctx.exception.code)
+        self.assertEqual(1, self.calls)
+
+        urllib.request.urlopen(urllib.request.Request(self.base + "/api/logout", data=b"{}", method="POST")).read()
+        urllib.request.urlopen(self.base + "/api/risk").read()
+        self.assertEqual(2, self.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
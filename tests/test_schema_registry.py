@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import threading
+import unittest
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, args=None):
+        if self.conn.fail:
+            raise RuntimeError("mysql gone away")
+        self.conn.ddl.append(" ".join(sql.split())[:40])
+
+
+class FakeConn:
+    def __init__(self):
+        self.ddl = []
+        self.fail = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class SchemaRegistryTests(unittest.TestCase):
+    def setUp(self):
+        from app import schema_registry
+
+        self.sr = schema_registry
+        self.saved = set(schema_registry._verified)
+        schema_registry.forget()
+
+    def tearDown(self):
+        self.sr.forget()
+        self.sr._verified.update(self.saved)
+
+    def test_hot_loop_ensures_hit_mysql_once(self):
+        from app import strategy_b as b
+        from app import strategy_f as f
+
+        conn = FakeConn()
+        for _ in range(3):
+            b._ensure_b_score_table(conn)
+            f._ensure_monster_watchlist_table(conn)
+            f._ensure_f_score_table(conn)
+        # B 和 F 的妖股观察池是同一张表，只建一次
+        b._ensure_monster_watchlist_table(conn)
+
+        self.assertEqual(3, len(conn.ddl))
+        self.assertTrue(self.sr.is_verified(b.B_SCORE_TABLE))
+        self.assertEqual(sorted([b.B_SCORE_TABLE, f.MONSTER_TABLE, f.F_SCORE_TABLE]), self.sr.verified())
+
+    def test_failure_is_not_memoized(self):
+        from app import strategy_b as b
+
+        conn = FakeConn()
+        conn.fail = True
+        with self.assertRaises(RuntimeError):
+            b._ensure_b_score_table(conn)
+        self.assertFalse(self.sr.is_verified(b.B_SCORE_TABLE))
+
+        conn.fail = False
+        b._ensure_b_score_table(conn)
+        b._ensure_b_score_table(conn)
+        self.assertEqual(1, len(conn.ddl))
+
+        self.sr.forget(b.B_SCORE_TABLE)
+        b._ensure_b_score_table(conn)
+        self.assertEqual(2, len(conn.ddl))
+
+    def test_concurrent_first_calls_run_once(self):
+        calls = []
+        gate = threading.Event()
+
+        def slow_ddl():
+            gate.wait(1)
+            calls.append(1)
+
+        threads = [threading.Thread(target=self.sr.ensure, args=("t", slow_ddl)) for _ in range(8)]
+        for th in threads:
+            th.start()
+        gate.set()
+        for th in threads:
+            th.join()
+        self.assertEqual([1], calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import unittest
+
+
+class StopTriggerTests(unittest.TestCase):
+    def setUp(self):
+        import app.bots.stop_trigger as st
+
+        self.st = st
+        st.clear()
+        while st.get_fired(0) is not None:
+            pass
+
+    def tearDown(self):
+        self.st.clear()
+
+    def _arm(self, **row):
+        th = self.st.threshold_from_row(row)
+        self.st._index[th.code] = th
+        return th
+
+    def test_threshold_uses_highest_of_stop_pending_and_giveback(self):
+        th = self._arm(
+            stock_code="mockb", stock_type="B", cost_price=10.0,
+            stop_loss_price=9.8, b_stop_pending_sl=None, b_peak_price=11.0,
+        )
+        # 最高涨 10%，允许回撤 2.5% -> 11 * 0.975 = 10.725；浮点里是 10.72499…，round(…, 2) 得 10.72
+        self.assertEqual(10.72, th.giveback_trigger)
+        self.assertEqual(10.72, th.trigger_below)
+
+        f = self.st.threshold_from_row({"stock_code": "MOCKF", "stock_type": "F", "cost_price": 10.0})
+        self.assertEqual(9.7, f.stop_loss)
+
+    def test_tick_raises_peak_then_fires_once(self):
+        st = self.st
+        self._arm(stock_code="MOCKB", stock_type="B", cost_price=10.0, stop_loss_price=9.8, b_peak_price=10.0)
+
+        st.on_tick("MOCKB", 9.9)
+        self.assertIsNone(st.get_fired(0))
+
+        st.on_tick("MOCKB", 11.0)
+        self.assertEqual(10.72, st.get("MOCKB").giveback_trigger)
+
+        st.on_tick("MOCKB", 10.70)
+        st.on_tick("MOCKB", 10.60)
+        self.assertEqual(("MOCKB", "B", 10.70, 10.72), st.get_fired(0))
+        self.assertIsNone(st.get_fired(0))
+        self.assertIsNone(st.get("MOCKB"))
+
+    def test_sell_bot_sleep_dispatches_fired_symbols(self):
+        import app.bots.split_core as sc
+
+        calls = []
+        originals = (sc._sell_one, sc.tb.market_stream.is_live)
+        try:
+            sc._sell_one = lambda code, stype, phase: calls.append((code, stype, phase)) or True
+            sc.tb.market_stream.is_live = lambda: True
+            self._arm(stock_code="MOCKF", stock_type="F", cost_price=10.0, stop_loss_price=9.7)
+            self.st.on_tick("MOCKF", 9.5)
+
+            config = sc.SplitBotConfig("sell", ("B", "F"), 0, 0)
+            traded = sc._sleep_with_stop_triggers(0.05, config, "regular")
+        finally:
+            sc._sell_one, sc.tb.market_stream.is_live = originals
+
+        self.assertTrue(traded)
+        self.assertEqual([("MOCKF", "F", "regular")], calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
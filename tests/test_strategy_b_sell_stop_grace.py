@@ -63,6 +63,59 @@ class StrategyBSellStopGraceTests(unittest.TestCase):
         self.assertEqual(1, len(calls))
         self.assertIn("STOP", calls[0][2])
 
+    def _run_preloaded_case(self, price: float, db_changes=None):
+        """和 _run_case 一样，但行由调用方预读后传入；db_changes 模拟预读之后库里被改过的列。"""
+        import app.strategy_b as b
+
+        calls = []
+        loads = []
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        row = {
+            "stock_code": "MOCKB",
+            "stock_type": "B",
+            "is_bought": 1,
+            "can_sell": 1,
+            "qty": 10,
+            "cost_price": 100.0,
+            "stop_loss_price": 99.0,
+            "trigger_price": 100.0,
+            "b_stage": 0,
+            "last_order_side": "buy",
+            "last_order_time": now_str,
+        }
+        db_row = dict(row, **(db_changes or {}))
+        originals = {
+            "_connect": b._connect,
+            "_load_one_b_row": b._load_one_b_row,
+            "get_snapshot_realtime": b.get_snapshot_realtime,
+            "_update_ops_fields": b._update_ops_fields,
+            "_sell_qty": b._sell_qty,
+        }
+        try:
+            b._connect = lambda: FakeConn()
+            b._load_one_b_row = lambda _conn, code: loads.append(code) or dict(db_row)
+            b.get_snapshot_realtime = lambda _code: (price, 100.0, "test")
+            b._update_ops_fields = lambda *_args, **_kwargs: None
+            b._sell_qty = lambda _conn, code, qty, reason: calls.append((code, qty, reason)) or True
+            result = b.strategy_B_sell("MOCKB", row=dict(row))
+            return result, calls, loads
+        finally:
+            for name, value in originals.items():
+                setattr(b, name, value)
+
+    def test_preloaded_row_is_rechecked_once_before_order(self):
+        result, calls, loads = self._run_preloaded_case(94.0, db_changes={"stop_loss_price": 98.5})
+
+        self.assertTrue(result)
+        self.assertEqual(1, len(calls))
+        self.assertIn("MOCKB", loads)
+
+    def test_stale_preloaded_row_skips_order(self):
+        result, calls, _loads = self._run_preloaded_case(94.0, db_changes={"qty": 4})
+
+        self.assertFalse(result)
+        self.assertEqual([], calls)
+
 
 if __name__ == "__main__":
     unittest.main()
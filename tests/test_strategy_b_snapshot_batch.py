@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import threading
+import time
+import unittest
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self._payload = payload
+        self.status_code = status_code
+        self.text = ""
+
+    def json(self):
+        return self._payload
+
+
+def _snap(price, prev_close):
+    return {
+        "latestTrade": {"p": price},
+        "latestQuote": {"bp": price - 0.01, "ap": price + 0.01},
+        "dailyBar": {"o": prev_close, "h": price + 1},
+        "prevDailyBar": {"c": prev_close},
+    }
+
+
+class StrategyBSnapshotBatchTests(unittest.TestCase):
+    def setUp(self):
+        import app.quote_cache as quote_cache
+        import app.strategy_b as b
+
+        self.b = b
+        self.quote_cache = quote_cache
+        self.shared_enabled = quote_cache.SHARED_QUOTE_CACHE_ENABLED
+        quote_cache.SHARED_QUOTE_CACHE_ENABLED = 0
+        self.originals = {
+            "_snapshots_http": b._snapshots_http,
+            "_snapshot_http": b._snapshot_http,
+            "_sleep_for_rate_limit": b._sleep_for_rate_limit,
+            "SNAPSHOT_BATCH_MAX_SYMBOLS": b.SNAPSHOT_BATCH_MAX_SYMBOLS,
+            "SNAPSHOT_BATCH_MAX_URL_CHARS": b.SNAPSHOT_BATCH_MAX_URL_CHARS,
+            "B_SCORE_WORKERS": b.B_SCORE_WORKERS,
+            "_score_b_candidate_pooled": b._score_b_candidate_pooled,
+        }
+        b._snapshot_cache.clear()
+        b._snapshot_quote_cache.clear()
+        b._sleep_for_rate_limit = lambda: None
+
+    def tearDown(self):
+        self.quote_cache.SHARED_QUOTE_CACHE_ENABLED = self.shared_enabled
+        for name, value in self.originals.items():
+            setattr(self.b, name, value)
+        self.b._snapshot_cache.clear()
+        self.b._snapshot_quote_cache.clear()
+
+    def test_chunks_respect_symbol_count_and_url_length(self):
+        b = self.b
+        b.SNAPSHOT_BATCH_MAX_SYMBOLS = 3
+        b.SNAPSHOT_BATCH_MAX_URL_CHARS = 1000
+        self.assertEqual([["A", "B", "C"], ["D"]], b._chunk_symbols_for_url(["A", "B", "C", "D"]))
+
+        b.SNAPSHOT_BATCH_MAX_SYMBOLS = 100
+        b.SNAPSHOT_BATCH_MAX_URL_CHARS = 16
+        chunks = b._chunk_symbols_for_url(["AAAA", "BBBB", "CCCC", "DDDD", "EEEE"])
+        self.assertEqual([["AAAA", "BBBB", "CCCC"], ["DDDD", "EEEE"]], chunks)
+        for chunk in chunks:
+            self.assertLessEqual(len(",".join(chunk)), 16)
+
+    def test_batch_fills_caches_for_single_symbol_calls(self):
+        b = self.b
+        requests_seen = []
+
+        def fake_batch(codes, feed):
+            requests_seen.append(list(codes))
+            return FakeResponse({code: _snap(10.0 + i, 9.0) for i, code in enumerate(codes)})
+
+        def fail_single(code, feed):
+            raise AssertionError(f"unexpected single snapshot call for {code}")
+
+        b._snapshots_http = fake_batch
+        b._snapshot_http = fail_single
+
+        quotes = b.get_snapshots_batch(["mockb", "MOCKC", "MOCKB"])
+
+        self.assertEqual([["MOCKB", "MOCKC"]], requests_seen)
+        self.assertEqual({"MOCKB", "MOCKC"}, set(quotes))
+        self.assertEqual(
+            {"last_price", "bid", "ask", "day_open", "day_high", "day_low", "prev_close", "day_volume", "feed"},
+            set(quotes["MOCKB"]),
+        )
+        self.assertEqual((10.0, 9.0, b.B_DATA_FEED), b.get_snapshot_realtime("MOCKB"))
+        self.assertEqual(11.0, b.get_snapshot_quote_realtime("MOCKC")["last_price"])
+
+    def test_failed_chunk_leaves_symbols_for_single_fallback(self):
+        b = self.b
+        b._snapshots_http = lambda codes, feed: FakeResponse({}, status_code=429)
+
+        quotes = b.get_snapshots_batch(["MOCKB"])
+
+        self.assertEqual({}, quotes)
+        self.assertNotIn("MOCKB", b._snapshot_cache)
+
+    def test_concurrent_scoring_overlaps_io_and_sorts_deterministically(self):
+        b = self.b
+        scores = {"AAA": 5.0, "BBB": 9.0, "CCC": 5.0, "DDD": None, "EEE": 9.0, "FFF": 1.0}
+
+        def fake_score(code, snap=None, row=None):
+            time.sleep(0.05 if code in ("AAA", "BBB") else 0.01)
+            if code == "FFF":
+                raise RuntimeError("boom")
+            sc = scores[code]
+            return None if sc is None else {"symbol": code, "score": sc, "snap": snap}
+
+        b._score_b_candidate_pooled = fake_score
+        b.B_SCORE_WORKERS = 6
+        t0 = time.time()
+        scored = b._score_b_candidates(None, sorted(scores), {"AAA": {"x": 1}})
+        elapsed = time.time() - t0
+
+        self.assertEqual(["BBB", "EEE", "AAA", "CCC"], [x["symbol"] for x in scored])
+        self.assertEqual({"x": 1}, scored[2]["snap"])
+        self.assertLess(elapsed, 0.12)
+
+    def test_rate_limit_slots_are_shared_across_threads(self):
+        import tempfile
+
+        from app import rate_limiter
+
+        b = self.b
+        b._sleep_for_rate_limit = self.originals["_sleep_for_rate_limit"]
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        old = (rate_limiter.RATE_LIMIT_PATH, rate_limiter.BUCKETS["data"])
+        rate_limiter.RATE_LIMIT_PATH = f"{tmp.name}/rl.sqlite3"
+        rate_limiter.BUCKETS["data"] = rate_limiter.Bucket("data", per_min=60 / 0.03, burst=1)
+        self.addCleanup(setattr, rate_limiter, "RATE_LIMIT_PATH", old[0])
+        self.addCleanup(rate_limiter.BUCKETS.__setitem__, "data", old[1])
+        stamps = []
+        lock = threading.Lock()
+
+        def call():
+            b._sleep_for_rate_limit()
+            with lock:
+                stamps.append(time.time())
+
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stamps.sort()
+        # 6 次调用领到 6 个相隔 0.03s 的槽
+        self.assertGreaterEqual(stamps[-1] - stamps[0], 0.03 * 5 - 0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import queue
+import socket
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _drain(q):
+    out = []
+    while True:
+        try:
+            out.append(q.get_nowait())
+        except queue.Empty:
+            return out
+
+
+class StreamHubTests(unittest.TestCase):
+    def _hub(self, topics, clock):
+        from ultimate_v1 import stream_hub
+
+        hub = stream_hub.StreamHub(topics, clock=clock)
+        hub._thread = threading.current_thread()  # 测试里手动 publish_once，不起后台线程
+        return hub
+
+    def test_builds_once_for_all_clients_and_only_pushes_changes(self):
+        from ultimate_v1.stream_hub import Topic
+
+        clock = Clock()
+        calls = {"risk": 0, "phase": 0}
+        values = {"risk": b'{"vix": 18}'}
+
+        def risk():
+            calls["risk"] += 1
+            return values["risk"]
+
+        def phase():
+            calls["phase"] += 1
+            return b'{"phase": "regular"}'
+
+        hub = self._hub([Topic("risk", 15, risk), Topic("phase", 5, phase)], clock)
+        clients = [hub.subscribe() for _ in range(5)]
+
+        self.assertEqual(["risk", "phase"], hub.publish_once())
+        clock.now += 6
+        self.assertEqual([], hub.publish_once())  # phase 重算了但没变，risk 没到期
+        self.assertEqual({"risk": 1, "phase": 2}, calls)
+
+        values["risk"] = b'{"vix": 30}'
+        clock.now += 10
+        self.assertEqual(["risk"], hub.publish_once())
+        for q in clients:
+            events = _drain(q)
+            self.assertEqual(3, len(events))
+            self.assertTrue(events[-1].startswith(b"id: 3\nevent: risk\ndata: {\"vix\": 30}"))
+
+        # 新连接先拿到每个主题的最新快照
+        late = hub.subscribe()
+        self.assertEqual([b"event: risk", b"event: phase"], [m.split(b"\n")[1] for m in _drain(late)])
+
+    def test_slow_client_is_dropped(self):
+        from ultimate_v1 import stream_hub
+
+        clock = Clock()
+        n = {"v": 0}
+
+        def build():
+            n["v"] += 1
+            return b"%d" % n["v"]
+
+        hub = self._hub([stream_hub.Topic("state", 1, build)], clock)
+        slow = hub.subscribe()
+        for _ in range(stream_hub.STREAM_QUEUE_SIZE + 1):
+            clock.now += 1
+            hub.publish_once()
+        self.assertFalse(hub.is_subscribed(slow))
+        self.assertEqual(1, hub.stats()["dropped"])
+
+
+class WebAppStreamTests(unittest.TestCase):
+    def test_stream_endpoint_sends_snapshot(self):
+        from ultimate_v1 import stream_hub, web_app
+
+        saved = {name: getattr(web_app, name) for name in ("_auth_token", "_STREAM_HUB")}
+        log_message = web_app.Handler.log_message
+        hub = stream_hub.StreamHub([stream_hub.Topic("risk", 60, lambda: web_app._encode_json({"vix": 18}))])
+        hub.publish_once()
+        web_app._auth_token = lambda: ""
+        web_app._STREAM_HUB = hub
+        web_app.Handler.log_message = lambda *a: None
+        server = ThreadingHTTPServer(("127.0.0.1", 0), web_app.Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            with socket.create_connection(server.server_address, timeout=5) as sock:
+                sock.sendall(b"GET /api/stream HTTP/1.1\r\nHost: x\r\n\r\n")
+                data = b""
+                while b"data: " not in data or not data.endswith(b"\n\n"):
+                    data += sock.recv(4096)
+            head, _, body = data.partition(b"\r\n\r\n")
+            self.assertIn(b"text/event-stream", head)
+            event = body.split(b"\n\n")[1]
+            self.assertEqual({"vix": 18}, json.loads(event.split(b"data: ", 1)[1]))
+        finally:
+            server.shutdown()
+            server.server_close()
+            web_app.Handler.log_message = log_message
+            for name, value in saved.items():
+                setattr(web_app, name, value)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from test_backtest_b_vec import _fixture  # noqa: E402
+
+
+class SweepTests(unittest.TestCase):
+    def test_build_combos_grid_and_random(self):
+        import sweep_strategy_b as sw
+
+        grid = {"B_MIN_UP_PCT": [0.02, 0.03], "TRAIL_BACKOFF_PCT": [0.05, 0.07, 0.1]}
+        full = sw.build_combos(grid)
+        self.assertEqual(6, len(full))
+        picked = sw.build_combos(grid, random_n=4, seed=1)
+        self.assertEqual(4, len(picked))
+        self.assertTrue(all(p in full for p in picked))
+        self.assertEqual(len(picked), len({tuple(p.values()) for p in picked}))
+
+    def test_parallel_sweep_matches_single_runs(self):
+        import backtest_strategy_b_pool as bp
+        import backtest_strategy_b_vec as bv
+        import sweep_strategy_b as sw
+
+        df, symbols, trigger_map, start = _fixture()
+        cube = bv.build_price_cube(df, symbols)
+        run_kwargs = dict(
+            symbols=symbols, start_date=start, initial_capital=20000.0,
+            trade_notional=2100.0, sim_mode="stop_first", trigger_map=trigger_map,
+        )
+        combos = sw.build_combos({"B_MIN_UP_PCT": [0.02, 0.04], "TRAIL_BACKOFF_PCT": [0.05, 0.1]})
+        result = sw.run_sweep(cube, combos, run_kwargs, workers=2)
+
+        self.assertEqual(list(range(1, 5)), result["rank"].tolist())
+        self.assertTrue((np.diff(result["total_return_pct"].to_numpy()) <= 0).all())
+
+        old = bp.B_MIN_UP_PCT, bp.TRAIL_BACKOFF_PCT
+        try:
+            for row in result.itertuples():
+                bp.B_MIN_UP_PCT, bp.TRAIL_BACKOFF_PCT = row.B_MIN_UP_PCT, row.TRAIL_BACKOFF_PCT
+                trades, equity, summary = bv.backtest_pool_vec(cube=cube, **run_kwargs)
+                self.assertEqual(summary["total_return_pct"], row.total_return_pct)
+                self.assertEqual(len(trades), row.trade_count)
+                self.assertEqual(sw.max_drawdown_pct(equity["total_equity"]), row.max_drawdown_pct)
+        finally:
+            bp.B_MIN_UP_PCT, bp.TRAIL_BACKOFF_PCT = old
+
+
+if __name__ == "__main__":
+    unittest.main()
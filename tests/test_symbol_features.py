@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, args=None):
+        self.conn.queries.append(sql)
+
+    def fetchall(self):
+        return self.conn.rows
+
+    def fetchone(self):
+        return {"d": max((r["as_of_date"] for r in self.conn.rows), default=None)}
+
+
+class FakeConn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def _bars(symbol, n, seed):
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range("2025-01-02", periods=n)
+    close = rng.uniform(10, 20, n)
+    volume = rng.integers(0, 3, n) * rng.uniform(1e5, 1e6, n)  # 约 1/3 是 0 量
+    return pd.DataFrame(
+        {
+            "symbol": symbol,
+            "date": days,
+            "open": close,
+            "high": close * 1.03,
+            "low": close * 0.97,
+            "close": close,
+            "volume": volume,
+        }
+    )
+
+
+class SymbolFeaturesTests(unittest.TestCase):
+    def setUp(self):
+        import app.symbol_features as sf
+
+        self.sf = sf
+        self.saved = {k: getattr(sf, k) for k in ("_features", "_max_as_of", "_loaded_day", "_last_attempt", "_checked_at")}
+
+    def tearDown(self):
+        for k, v in self.saved.items():
+            setattr(self.sf, k, v)
+
+    def test_vectorized_features_match_per_symbol_queries(self):
+        from app import strategy_q as q
+
+        frames = [_bars("AAA", 120, 1), _bars("bbb", 30, 2)]
+        df = pd.concat(frames).sample(frac=1, random_state=3)  # 乱序输入
+        out = self.sf.compute_features(df)
+
+        a = frames[0].tail(90)
+        closes, vols = list(a["close"]), list(a["volume"])
+        feat = out.loc["AAA"]
+        self.assertEqual(90, feat["bars"])
+        self.assertEqual(a["date"].iloc[-1].date(), feat["as_of_date"])
+        positive = [v for v in frames[0]["volume"] if v > 0][-20:]
+        self.assertAlmostEqual(np.mean(positive), feat["avg_vol20"])
+        self.assertEqual([round(c, 6) for c in reversed(closes[-30:])], json.loads(feat["recent_closes"]))
+
+        stats = q._stats_from_bars([{"close": c, "high": c * 1.03, "low": c * 0.97, "volume": v} for c, v in zip(closes, vols)])
+        for key in ("ma5", "ma10", "ma20", "ma50", "ret3", "ret5", "ret10", "high20", "low20", "vol20"):
+            self.assertAlmostEqual(stats[key], feat[key], msg=key)
+        self.assertEqual(30, out.loc["BBB"]["bars"])
+
+    def test_get_only_trusts_symbols_at_latest_date(self):
+        sf = self.sf
+        today = date.today()
+        fresh, lagging = today - timedelta(days=1), today - timedelta(days=2)
+        conn = FakeConn(
+            [
+                {"symbol": "aaa", "as_of_date": fresh, "bars": 90, "last_close": 10.0, "recent_closes": "[10, 9]"},
+                {"symbol": "BBB", "as_of_date": lagging, "bars": 90, "last_close": 20.0, "recent_closes": "[]"},
+            ]
+        )
+        sf._loaded_day = None
+        sf._last_attempt = 0.0
+
+        self.assertEqual([10.0, 9.0], sf.get("AAA", conn)["recent_closes"])
+        self.assertIsNone(sf.get("BBB", conn))
+        self.assertIsNone(sf.get("CCC", conn))
+        # 同一天内不再查库
+        self.assertEqual(1, len(conn.queries))
+
+        sf._max_as_of = today - timedelta(days=sf.SYMBOL_FEATURES_MAX_AGE_DAYS + 1)
+        sf._features["AAA"]["as_of_date"] = sf._max_as_of
+        self.assertIsNone(sf.get("AAA"))
+
+    def test_reloads_same_day_when_table_gets_newer_bars(self):
+        sf = self.sf
+        today = date.today()
+        yesterday, before = today - timedelta(days=1), today - timedelta(days=2)
+        conn = FakeConn([{"symbol": "AAA", "as_of_date": before, "bars": 90, "last_close": 10.0, "recent_closes": "[]"}])
+        sf._loaded_day = None
+        sf._last_attempt = 0.0
+        self.assertEqual(10.0, sf.get("AAA", conn)["last_close"])
+
+        # 进程先于当天的 build 载入；build 跑完后下一次检查就换成新数据
+        conn.rows = [{"symbol": "AAA", "as_of_date": yesterday, "bars": 90, "last_close": 11.0, "recent_closes": "[]"}]
+        self.assertEqual(10.0, sf.get("AAA", conn)["last_close"])
+        sf._checked_at -= sf.SYMBOL_FEATURES_CHECK_SEC + 1
+        self.assertEqual(11.0, sf.get("AAA", conn)["last_close"])
+        self.assertEqual(yesterday, sf._max_as_of)
+
+        # 没有更新的日期：只查一次 MAX，不重载整表
+        queries = len(conn.queries)
+        sf._checked_at -= sf.SYMBOL_FEATURES_CHECK_SEC + 1
+        sf.get("AAA", conn)
+        self.assertEqual(queries + 1, len(conn.queries))
+        self.assertIn("MAX", conn.queries[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import unittest
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, args=None):
+        self.conn.executed.append((" ".join(sql.split()), args))
+        if "GROUP BY" in sql:
+            self._rows = self.conn.stored_rows
+        return len(self.conn.executed)
+
+    def executemany(self, sql, rows):
+        raise AssertionError("per-row writes are not expected")
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConn:
+    def __init__(self, stored_rows):
+        self.stored_rows = stored_rows
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+class SyncOpsIntradayVolumeTests(unittest.TestCase):
+    def setUp(self):
+        import app.sync_ops_intraday_volume as sov
+
+        self.sov = sov
+        self.saved = {
+            name: getattr(sov, name)
+            for name in ("SOURCE", "_connect", "_ensure_columns", "_fetch_yahoo_chart_volume", "_download_batch")
+        }
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(self.sov, name, value)
+
+    def test_only_changed_symbols_are_written_in_one_join(self):
+        sov = self.sov
+        stored = [
+            {"symbol": "AAA", "min_volume": 100, "max_volume": 100, "null_rows": 0},
+            {"symbol": "BBB", "min_volume": 200, "max_volume": 200, "null_rows": 0},
+            {"symbol": "CCC", "min_volume": None, "max_volume": None, "null_rows": 1},
+            {"symbol": "DDD", "min_volume": 5, "max_volume": 7, "null_rows": 0},
+        ]
+        fetched = {"AAA": 100, "BBB": 250, "CCC": 30, "DDD": 5}
+        conn = FakeConn(stored)
+        sov.SOURCE = "chart_meta"
+        sov._connect = lambda: conn
+        sov._ensure_columns = lambda _conn: None
+        sov._fetch_yahoo_chart_volume = lambda symbol: (symbol, fetched[symbol])
+        sov._download_batch = lambda symbols: self.fail(f"unexpected fallback {symbols}")
+
+        total, failed = sov.sync_once()
+
+        self.assertEqual((4, 0), (total, failed))
+        inserts = [args for sql, args in conn.executed if sql.startswith("INSERT INTO")]
+        updates = [sql for sql, _ in conn.executed if sql.startswith("UPDATE")]
+        self.assertEqual([["BBB", 250, "CCC", 30, "DDD", 5]], inserts)
+        self.assertEqual(1, len(updates))
+        self.assertIn("JOIN", updates[0])
+
+    def test_nothing_written_when_all_unchanged(self):
+        sov = self.sov
+        conn = FakeConn([{"symbol": "AAA", "min_volume": 1, "max_volume": 1, "null_rows": 0}])
+        sov.SOURCE = "chart_meta"
+        sov._connect = lambda: conn
+        sov._ensure_columns = lambda _conn: None
+        sov._fetch_yahoo_chart_volume = lambda symbol: (symbol, 1)
+
+        sov.sync_once()
+
+        self.assertFalse([sql for sql, _ in conn.executed if not sql.startswith("SELECT")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import gzip
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer
+
+
+class NegotiateTests(unittest.TestCase):
+    def test_accept_encoding_and_etag_variants(self):
+        from ultimate_v1 import http_compress as hc
+
+        self.assertEqual("gzip", hc.negotiate("deflate, gzip;q=0.5"))
+        self.assertIsNone(hc.negotiate("gzip;q=0, identity"))
+        self.assertIsNone(hc.negotiate(""))
+        self.assertEqual(hc.ENCODINGS[0], hc.negotiate("*"))
+
+        etag = hc.etag_for(b"x")
+        self.assertTrue(hc.etag_matches(f'W/{hc.variant_etag(etag, "gzip")}, "other"', etag))
+        self.assertFalse(hc.etag_matches('"other"', etag))
+
+        variants = {}
+        small, enc = hc.encoded(b"{}", "gzip", variants)
+        self.assertEqual((b"{}", None), (small, enc))
+        big = b'{"rows": [' + b'{"symbol": "AAPL"},' * 200 + b"]}"
+        data, enc = hc.encoded(big, "gzip", variants)
+        self.assertEqual(("gzip", big), (enc, gzip.decompress(data)))
+        self.assertIs(data, hc.encoded(big, "gzip", variants)[0])
+
+
+class WebAppCompressionTests(unittest.TestCase):
+    def setUp(self):
+        from ultimate_v1 import web_app
+
+        self.web = web_app
+        self.saved = {name: getattr(web_app, name) for name in ("_auth_token", "fetch_all")}
+        self.log_message = web_app.Handler.log_message
+        web_app._auth_token = lambda: ""
+        web_app.Handler.log_message = lambda *a: None
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), web_app.Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.web.Handler.log_message = self.log_message
+        for name, value in self.saved.items():
+            setattr(self.web, name, value)
+
+    def test_index_is_precompressed_and_revalidates(self):
+        req = urllib.request.Request(self.base + "/", headers={"Accept-Encoding": "gzip"})
+        with urllib.request.urlopen(req) as resp:
+            self.assertEqual("gzip", resp.headers["Content-Encoding"])
+            self.assertEqual(self.web.INDEX_HTML, gzip.decompress(resp.read()).decode("utf-8"))
+            etag = resp.headers["ETag"]
+
+        req = urllib.request.Request(self.base + "/", headers={"If-None-Match": etag})
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            urllib.request.urlopen(req)
+        self.assertEqual(304, ctx.exception.code)
+
+    def test_trade_records_since_filters_in_sql(self):
+        queries = []
+
+        def fake_fetch_all(sql, args=None):
+            queries.append((sql, args))
+            if "FROM orders" in sql:
+                return [{"event_time": datetime.now().replace(microsecond=0), "symbol": "AAPL", "side": "BUY", "order_id": "1", "source": "orders"}]
+            return []
+
+        self.web.fetch_all = fake_fetch_all
+        since = datetime.now().replace(microsecond=0) - timedelta(minutes=1)
+        payload = self.web._trade_records_payload(since.isoformat(sep=" "))
+        self.assertTrue(payload["incremental"])
+        self.assertEqual(1, len(payload["rows"]))
+        self.assertEqual(payload["cursor"], self.web._json_default(payload["rows"][0]["event_time"]))
+        self.assertTrue(all(args == (since,) and ">= %s" in sql for sql, args in queries))
+
+        queries.clear()
+        payload = self.web._trade_records_payload((since - timedelta(days=1)).isoformat(sep=" "))
+        self.assertFalse(payload["incremental"])
+        self.assertTrue(all(args is None for _, args in queries))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,7 +5,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import date, timedelta
 
-from .config import alpaca_credentials, env_str, settings
+from .config import alpaca_credentials, env_float, env_str, settings
 
 
 @dataclass
@@ -54,7 +54,9 @@ def trading_client():
     key, secret, paper = alpaca_credentials(s)
     if not key or not secret:
         raise RuntimeError("缺少 Alpaca API 密钥")
-    return TradingClient(key, secret, paper=paper)
+    from app import rate_limiter
+
+    return rate_limiter.limit_client(TradingClient(key, secret, paper=paper))
 
 
 def stock_data_client():
@@ -64,7 +66,9 @@ def stock_data_client():
     key, secret, _paper = alpaca_credentials(s)
     if not key or not secret:
         raise RuntimeError("缺少 Alpaca API 密钥")
-    return StockHistoricalDataClient(key, secret)
+    from app import rate_limiter
+
+    return rate_limiter.limit_client(StockHistoricalDataClient(key, secret), account_bucket="data")
 
 
 def get_daily_closes(symbol: str, days: int = 60, feed: str | None = None) -> list[float]:
@@ -91,39 +95,62 @@ def get_daily_closes(symbol: str, days: int = 60, feed: str | None = None) -> li
     return closes
 
 
+def _snapshot_quote(symbol: str, feed: str) -> dict:
+    """一次 snapshot 请求，转成 app.quote_cache 的报价字段。"""
+    from alpaca.data.requests import StockSnapshotRequest
+
+    resp = stock_data_client().get_stock_snapshot(StockSnapshotRequest(symbol_or_symbols=[symbol], feed=feed))
+    snap = resp.get(symbol) if isinstance(resp, dict) else getattr(resp, symbol, None)
+    if snap is None:
+        raise RuntimeError(f"snapshot missing: {symbol}")
+    trade = snap.latest_trade
+    quote = snap.latest_quote
+    bar = snap.daily_bar
+    prev = snap.previous_daily_bar
+    return {
+        "last_price": float(trade.price) if trade and trade.price else None,
+        "bid": float(quote.bid_price) if quote and quote.bid_price else None,
+        "ask": float(quote.ask_price) if quote and quote.ask_price else None,
+        "day_open": float(bar.open) if bar else None,
+        "day_high": float(bar.high) if bar else None,
+        "day_low": float(bar.low) if bar else None,
+        "prev_close": float(prev.close) if prev else None,
+        "day_volume": float(bar.volume) if bar else None,
+        "feed": feed,
+    }
+
+
 def get_latest_stock_price(symbol: str, feed: str | None = None) -> float:
     """读取 Alpaca 最新股票成交价；没有成交价时用 bid/ask 中间价。"""
-    from alpaca.data.requests import StockLatestQuoteRequest, StockLatestTradeRequest
-
     symbol = (symbol or "").strip().upper()
     if not symbol:
         return 0.0
-    client = stock_data_client()
-    feed_name = feed or env_str("ALPACA_DATA_FEED", "iex")
 
-    try:
-        trade_resp = client.get_stock_latest_trade(
-            StockLatestTradeRequest(symbol_or_symbols=[symbol], feed=feed_name)
-        )
-        trade = trade_resp.get(symbol) if isinstance(trade_resp, dict) else getattr(trade_resp, symbol, None)
-        price = float(getattr(trade, "price", 0) or 0)
-        if price > 0:
-            return price
-    except Exception:
-        pass
+    # 本进程开了 websocket 行情时直接读推送的最新价
+    from app import market_stream, quote_cache
+
+    live_price = market_stream.get_last_price(symbol)
+    if live_price:
+        return float(live_price)
 
+    # 和 B/F 共用跨进程报价缓存：别的机器人刚拉过就直接用，过期时只有一个进程去请求
+    feed_name = feed or env_str("ALPACA_DATA_FEED", "iex")
     try:
-        quote_resp = client.get_stock_latest_quote(
-            StockLatestQuoteRequest(symbol_or_symbols=[symbol], feed=feed_name)
+        quote = quote_cache.get_or_fetch(
+            symbol,
+            lambda code: _snapshot_quote(code, feed_name),
+            env_float("B_SNAPSHOT_CACHE_SEC", 2.0),
         )
-        quote = quote_resp.get(symbol) if isinstance(quote_resp, dict) else getattr(quote_resp, symbol, None)
-        bid = float(getattr(quote, "bid_price", 0) or 0)
-        ask = float(getattr(quote, "ask_price", 0) or 0)
-        if bid > 0 and ask > 0:
-            return (bid + ask) / 2.0
     except Exception:
-        pass
+        return 0.0
 
+    price = float(quote.get("last_price") or 0)
+    if price > 0:
+        return price
+    bid = float(quote.get("bid") or 0)
+    ask = float(quote.get("ask") or 0)
+    if bid > 0 and ask > 0:
+        return (bid + ask) / 2.0
     return 0.0
 
 
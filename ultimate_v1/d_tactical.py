@@ -6,6 +6,8 @@ from datetime import date, timedelta
 import os
 from typing import Any
 
+from app import schema_registry
+
 from . import alpaca_gateway
 from .db import db_conn, fetch_all
 
@@ -33,6 +35,7 @@ DEFAULT_UNDERLYINGS = [
 ]
 
 
+@schema_registry.once("ultimate_v1.d_tactical")
 def ensure_d_tactical_schema() -> None:
     """创建 D 战术仓需要的轻量表，并写入默认期权标的。"""
     with db_conn() as conn:
@@ -1,21 +1,282 @@
 from __future__ import annotations
 
-"""MySQL 连接工具，所有 V1 模块统一从这里拿数据库连接。"""
+"""MySQL 连接工具，所有 V1 模块统一从这里拿数据库连接。
 
+连接走进程内连接池（按连接参数分池）：
+- 有上限，借不到时排队等待，超时报错；
+- 借出前对闲置过久的连接 ping 一次，坏连接丢弃重建；
+- 超过最大存活时间的连接归还时直接关闭，避免被 MySQL wait_timeout 掐断；
+- 每次借出都是干净的事务边界：归还时回滚未提交的内容并恢复 autocommit。
+
+策略模块（strategy_b / strategy_f / strategy_q）的 _connect() 也从这里借连接，
+conn.close() 只是归还。DB_POOL_ENABLED=0 可退回每次新建连接。
+"""
+
+import os
+import threading
+import time
 from contextlib import contextmanager
 from typing import Iterator
 
 import pymysql
 from pymysql.cursors import DictCursor
 
-from .config import Settings, settings
+from .config import Settings, env_bool, env_float, env_int, settings
 
+DB_POOL_ENABLED = env_bool("DB_POOL_ENABLED", True)
+# 峰值：机器人主连接 + B 打分主连接 + B_SCORE_WORKERS 路打分，或 async 卖出 8 路 + 主循环占用
+DB_POOL_MAX_SIZE = env_int("DB_POOL_MAX_SIZE", 16)
+DB_POOL_MAX_LIFETIME_SEC = env_float("DB_POOL_MAX_LIFETIME_SEC", 1800.0)
+DB_POOL_PING_IDLE_SEC = env_float("DB_POOL_PING_IDLE_SEC", 30.0)
+DB_POOL_TIMEOUT_SEC = env_float("DB_POOL_TIMEOUT_SEC", 30.0)
 
-@contextmanager
-def db_conn(s: Settings | None = None) -> Iterator[pymysql.connections.Connection]:
-    """提供带事务的数据库连接：正常提交，异常回滚。"""
-    s = s or settings()
-    conn = pymysql.connect(
+
+class _PooledRaw:
+    """池里的一条真实连接及其时间戳。"""
+
+    __slots__ = ("conn", "created_at", "last_used_at")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.time()
+        self.last_used_at = self.created_at
+
+
+class PooledConnection:
+    """借出的连接代理：用法和 pymysql 连接一样，close() 归还到池里。"""
+
+    def __init__(self, pool: "ConnectionPool", raw: _PooledRaw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise pymysql.err.InterfaceError(0, "connection already returned to pool")
+        return getattr(raw.conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw)
+
+    def __del__(self):
+        # 调用方忘记 close 时兜底归还，防止池被借空
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, connect_kwargs: dict, max_size: int | None = None, name: str = ""):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.autocommit = bool(self.connect_kwargs.get("autocommit", False))
+        self.max_size = max(int(max_size or DB_POOL_MAX_SIZE), 1)
+        self.name = name or (
+            f"{self.connect_kwargs.get('host')}:{self.connect_kwargs.get('port')}/"
+            f"{self.connect_kwargs.get('database') or self.connect_kwargs.get('db')}"
+            f" autocommit={int(self.autocommit)}"
+        )
+        self._cond = threading.Condition()
+        self._idle: list[_PooledRaw] = []
+        self._in_use: dict[int, _PooledRaw] = {}
+        self._reserved = 0
+        self.checkouts = 0
+        self.created = 0
+        self.recycled = 0
+        self.discarded = 0
+        self.timeouts = 0
+        self.wait_total_sec = 0.0
+        self.wait_max_sec = 0.0
+
+    def _open(self) -> _PooledRaw:
+        return _PooledRaw(pymysql.connect(**self.connect_kwargs))
+
+    @staticmethod
+    def _close_quietly(raw: _PooledRaw) -> None:
+        try:
+            raw.conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, raw: _PooledRaw, now: float) -> bool:
+        if now - raw.created_at > DB_POOL_MAX_LIFETIME_SEC:
+            self.recycled += 1
+            return False
+        if now - raw.last_used_at > DB_POOL_PING_IDLE_SEC:
+            try:
+                raw.conn.ping(reconnect=False)
+            except Exception:
+                self.discarded += 1
+                return False
+        return True
+
+    def _total(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._reserved
+
+    def acquire(self, timeout: float | None = None) -> PooledConnection:
+        timeout = DB_POOL_TIMEOUT_SEC if timeout is None else timeout
+        started = time.time()
+        deadline = started + max(timeout, 0.0)
+        raw = None
+        with self._cond:
+            while True:
+                now = time.time()
+                while self._idle:
+                    candidate = self._idle.pop()  # LIFO：最近用过的最可能还活着
+                    if self._healthy(candidate, now):
+                        raw = candidate
+                        break
+                    self._close_quietly(candidate)
+                if raw is not None or self._total() < self.max_size:
+                    break
+                left = deadline - now
+                if left <= 0:
+                    self.timeouts += 1
+                    raise TimeoutError(f"db pool exhausted: {self.name} max_size={self.max_size}")
+                self._cond.wait(left)
+            waited = time.time() - started
+            self.checkouts += 1
+            self.wait_total_sec += waited
+            self.wait_max_sec = max(self.wait_max_sec, waited)
+            if raw is not None:
+                self._in_use[id(raw)] = raw
+            else:
+                # 先占一个名额，建连接放到锁外面做
+                self._reserved += 1
+
+        if raw is None:
+            try:
+                raw = self._open()
+            except Exception:
+                with self._cond:
+                    self._reserved -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._reserved -= 1
+                self.created += 1
+                self._in_use[id(raw)] = raw
+        return PooledConnection(self, raw)
+
+    def _release(self, raw: _PooledRaw) -> None:
+        keep = True
+        try:
+            conn = raw.conn
+            if not getattr(conn, "open", False):
+                keep = False
+            else:
+                # 每次借出都是独立事务：没提交的内容回滚，autocommit 恢复成池的默认值。
+                # 非 autocommit 时总是回滚：pymysql 不从 EOF 包更新 server_status，
+                # 只跑过 SELECT 的连接 IN_TRANS 位可能没置上，但已经握着一个旧快照
+                if not conn.get_autocommit():
+                    conn.rollback()
+                if conn.get_autocommit() != self.autocommit:
+                    conn.autocommit(self.autocommit)
+        except Exception:
+            keep = False
+
+        now = time.time()
+        with self._cond:
+            self._in_use.pop(id(raw), None)
+            if not keep:
+                self.discarded += 1
+            elif now - raw.created_at > DB_POOL_MAX_LIFETIME_SEC:
+                self.recycled += 1
+                keep = False
+            else:
+                raw.last_used_at = now
+                self._idle.append(raw)
+            self._cond.notify()
+        if not keep:
+            self._close_quietly(raw)
+
+    def close_all(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for raw in idle:
+            self._close_quietly(raw)
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._cond:
+            raws = list(self._idle) + list(self._in_use.values())
+            idle = len(self._idle)
+            in_use = len(self._in_use) + self._reserved
+        ages = [now - r.created_at for r in raws]
+        return {
+            "name": self.name,
+            "max_size": self.max_size,
+            "size": idle + in_use,
+            "idle": idle,
+            "in_use": in_use,
+            "checkouts": self.checkouts,
+            "created": self.created,
+            "recycled": self.recycled,
+            "discarded": self.discarded,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(self.wait_total_sec * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+            "wait_max_ms": round(self.wait_max_sec * 1000, 3),
+            "conn_age_max_sec": round(max(ages), 1) if ages else 0.0,
+            "conn_age_avg_sec": round(sum(ages) / len(ages), 1) if ages else 0.0,
+        }
+
+
+_POOLS: dict[tuple, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _pool_key(kwargs: dict) -> tuple:
+    return tuple(sorted((k, repr(v)) for k, v in kwargs.items()))
+
+
+def get_pool(**connect_kwargs) -> ConnectionPool:
+    key = _pool_key(connect_kwargs)
+    pool = _POOLS.get(key)
+    if pool is not None:
+        return pool
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = ConnectionPool(connect_kwargs)
+            _POOLS[key] = pool
+        return pool
+
+
+def pooled_connect(**connect_kwargs):
+    """pymysql.connect 的池化替身：参数相同的调用共享一个池。"""
+    if not DB_POOL_ENABLED:
+        return pymysql.connect(**connect_kwargs)
+    return get_pool(**connect_kwargs).acquire()
+
+
+def pool_stats() -> list[dict]:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    return [p.stats() for p in pools]
+
+
+def _reset_pools_after_fork() -> None:
+    # 子进程不能复用父进程的 socket
+    global _POOLS_LOCK
+    _POOLS.clear()
+    _POOLS_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+def _settings_kwargs(s: Settings) -> dict:
+    return dict(
         host=s.db_host,
         port=s.db_port,
         user=s.db_user,
@@ -25,6 +286,13 @@ def db_conn(s: Settings | None = None) -> Iterator[pymysql.connections.Connectio
         cursorclass=DictCursor,
         autocommit=False,
     )
+
+
+@contextmanager
+def db_conn(s: Settings | None = None) -> Iterator[pymysql.connections.Connection]:
+    """提供带事务的数据库连接：正常提交，异常回滚。"""
+    s = s or settings()
+    conn = pooled_connect(**_settings_kwargs(s))
     try:
         yield conn
         conn.commit()
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+"""看板 HTTP 响应压缩：按 Accept-Encoding 协商 br / gzip。
+
+- brotli 是可选依赖，没装就只用 gzip；
+- 小于 WEB_COMPRESS_MIN_BYTES 的响应不压，压了也省不了几个字节；
+- 同一份 bytes 的压缩结果可以放进调用方给的 variants 字典里复用，
+  静态页面启动时压一次，缓存接口每份缓存压一次；
+- 压缩后的 ETag 带 -gzip / -br 后缀，etag_matches() 比较时会去掉后缀。
+"""
+
+import gzip
+import hashlib
+
+from .config import env_int
+
+try:
+    import brotli  # type: ignore
+except Exception:
+    brotli = None
+
+WEB_COMPRESS_MIN_BYTES = env_int("WEB_COMPRESS_MIN_BYTES", 1024)
+WEB_GZIP_LEVEL = env_int("WEB_GZIP_LEVEL", 6)
+WEB_BROTLI_QUALITY = env_int("WEB_BROTLI_QUALITY", 5)
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """从 Accept-Encoding 里挑一个我们支持的编码；都不支持返回 None。"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    for enc in ENCODINGS:
+        if accepted.get(enc, accepted.get("*", 0.0)) > 0:
+            return enc
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=WEB_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=WEB_GZIP_LEVEL, mtime=0)
+
+
+def encoded(body: bytes, encoding: str | None, variants: dict | None = None) -> tuple[bytes, str | None]:
+    """返回 (要发送的 bytes, Content-Encoding)；太小或客户端不支持时原样返回。"""
+    if encoding is None or len(body) < WEB_COMPRESS_MIN_BYTES:
+        return body, None
+    if variants is not None and encoding in variants:
+        return variants[encoding], encoding
+    data = compress(body, encoding)
+    if variants is not None:
+        variants[encoding] = data
+    return data, encoding
+
+
+def variant_etag(etag: str, encoding: str | None) -> str:
+    return etag if not encoding else f'{etag[:-1]}-{encoding}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    base = etag.strip('"')
+    for tag in (if_none_match or "").split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        tag = tag.removeprefix("W/").strip('"')
+        for enc in ("gzip", "br"):
+            tag = tag.removesuffix(f"-{enc}")
+        if tag == base:
+            return True
+    return False
+
+
+class StaticBody:
+    """启动时就编码、压缩好的静态响应。"""
+
+    def __init__(self, body: bytes, content_type: str, compressible: bool = True):
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag_for(body)
+        self.compressible = compressible
+        self.variants: dict[str, bytes] = {}
+        if compressible and len(body) >= WEB_COMPRESS_MIN_BYTES:
+            for enc in ENCODINGS:
+                self.variants[enc] = compress(body, enc)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+"""机器人日志的内存索引：/api/bot_logs 直接从内存回，不再每次读文件尾。
+
+过去每个请求对每个机器人读最后 120KB 再 splitlines，12 个机器人一次轮询就是 1MB+ 的读盘。
+现在每个机器人一个 _BotLog：
+- 记住文件读到的位置，只读新追加的完整行，放进有上限的环形缓冲（LOG_INDEX_LINES 行）；
+- 同一个机器人 LOG_INDEX_POLL_SEC 内最多 stat 一次文件，期间的请求全走内存；
+- 文件被轮转（inode 变了）或被清空（变短）时重置缓冲，从新文件尾部重新建；
+- 游标是进程内单调递增的虚拟偏移：轮转前后不会倒退，刚启动时等于文件字节偏移；
+  客户端的 since 落在缓冲之外（太旧 / 重置之前 / 比当前还大）、或 since 之后的新行超过
+  lines 条时回全量（最后 lines 行），append=False；
+- 每行按 "时间 | LEVEL | 内容" 解析级别，续行（traceback）沿用上一行的级别，支持按最低级别和关键字过滤。
+"""
+
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from .config import env_float, env_int
+
+LOG_INDEX_LINES = env_int("LOG_INDEX_LINES", 2000)
+LOG_INDEX_POLL_SEC = env_float("LOG_INDEX_POLL_SEC", 1.0)
+# 首次打开 / 落后太多时只从文件尾部这么多字节开始建索引
+LOG_INDEX_TAIL_BYTES = env_int("LOG_INDEX_TAIL_BYTES", 256_000)
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+_LEVEL_RE = re.compile(r"\|\s*(DEBUG|INFO|WARNING|ERROR|CRITICAL)\s*\|")
+
+
+@dataclass
+class LogSlice:
+    """一次读取的结果：lines 是 append=True 时只含 since 之后的新行。"""
+
+    path: Path | None
+    lines: list[str]
+    offset: int
+    append: bool
+
+
+class _BotLog:
+    def __init__(self, path: Path, max_lines: int):
+        self.path = path
+        self.inode: int | None = None
+        self.file_pos = 0
+        self.vbase = 0  # 虚拟偏移 = vbase + 文件内偏移
+        self.floor = 0  # 缓冲能覆盖的最早虚拟偏移；since 小于它就回全量
+        self.level = "INFO"
+        self.skip_partial = False  # 从文件中间开始读时，第一段不完整的行要丢掉
+        self.ring: deque[tuple[int, str, str]] = deque(maxlen=max_lines)  # (行尾虚拟偏移, 级别, 内容)
+        self.checked_at = 0.0
+
+    @property
+    def vpos(self) -> int:
+        return self.vbase + self.file_pos
+
+    def poll(self) -> None:
+        st = self.path.stat()
+        if self.inode is not None and (st.st_ino != self.inode or st.st_size < self.file_pos):
+            # 轮转或被清空：虚拟偏移往前跳一格，之前发出去的游标都落到 floor 以下
+            self.vbase = self.vpos + 1
+            self.file_pos = 0
+            self.ring.clear()
+            self.inode = None
+        if self.inode is None:
+            self.inode = st.st_ino
+            self.file_pos = max(0, st.st_size - LOG_INDEX_TAIL_BYTES)
+            self.floor = self.vpos
+            self.skip_partial = self.file_pos > 0
+        elif st.st_size - self.file_pos > LOG_INDEX_TAIL_BYTES:
+            # 落后太多，中间的直接跳过
+            self.file_pos = st.st_size - LOG_INDEX_TAIL_BYTES
+            self.ring.clear()
+            self.floor = self.vpos
+            self.skip_partial = True
+        if st.st_size <= self.file_pos:
+            return
+        with self.path.open("rb") as fh:
+            fh.seek(self.file_pos)
+            data = fh.read(st.st_size - self.file_pos)
+        if self.skip_partial:
+            cut = data.find(b"\n") + 1
+            if not cut:
+                return
+            self.skip_partial = False
+            self.file_pos += cut
+            self.floor = self.vpos
+            data = data[cut:]
+        end = data.rfind(b"\n") + 1
+        pos = self.vpos
+        for raw in data[:end].splitlines(keepends=True):
+            pos += len(raw)
+            text = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            m = _LEVEL_RE.search(text)
+            if m:
+                self.level = m.group(1)
+            if len(self.ring) == self.ring.maxlen:
+                self.floor = self.ring[0][0]
+            self.ring.append((pos, self.level, text))
+        self.file_pos += end
+
+
+class LogIndex:
+    """按机器人名维护日志索引；resolve(bot) 返回日志文件路径或 None。"""
+
+    def __init__(
+        self,
+        resolve: Callable[[str], Path | None],
+        max_lines: int = LOG_INDEX_LINES,
+        poll_sec: float = LOG_INDEX_POLL_SEC,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._resolve = resolve
+        self._max_lines = max_lines
+        self._poll_sec = poll_sec
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._logs: dict[str, _BotLog] = {}
+        self._stats = {"polls": 0, "reads": 0, "errors": 0}
+
+    def _tracker(self, bot_name: str) -> _BotLog | None:
+        tracker = self._logs.get(bot_name)
+        if tracker is not None and (self._clock() - tracker.checked_at < self._poll_sec or tracker.path.exists()):
+            return tracker
+        path = self._resolve(bot_name)
+        if path is None:
+            self._logs.pop(bot_name, None)
+            return None
+        if tracker is None or tracker.path != path:
+            tracker = self._logs[bot_name] = _BotLog(path, self._max_lines)
+        return tracker
+
+    def read(
+        self,
+        bot_name: str,
+        since: int | None = None,
+        lines: int = 120,
+        level: str = "",
+        keyword: str = "",
+    ) -> LogSlice:
+        """从内存取日志；level 是最低级别（如 WARNING），keyword 不区分大小写的子串。"""
+        limit = max(1, min(lines, 500))
+        min_rank = LEVELS.get(str(level or "").upper(), 0)
+        needle = str(keyword or "").lower()
+        with self._lock:
+            self._stats["reads"] += 1
+            tracker = self._tracker(bot_name)
+            if tracker is None:
+                return LogSlice(None, [], 0, False)
+            now = self._clock()
+            if now - tracker.checked_at >= self._poll_sec:
+                tracker.checked_at = now
+                self._stats["polls"] += 1
+                try:
+                    tracker.poll()
+                except Exception as exc:
+                    self._stats["errors"] += 1
+                    return LogSlice(tracker.path, [f"[log read error] {tracker.path}: {exc}"], 0, False)
+            vpos = tracker.vpos
+            append = since is not None and tracker.floor <= since <= vpos
+            out = []
+            for end, lvl, text in reversed(tracker.ring):
+                if append and end <= since:
+                    break
+                if min_rank and LEVELS.get(lvl, 20) < min_rank:
+                    continue
+                if needle and needle not in text.lower():
+                    continue
+                if len(out) >= limit:
+                    # since 之后的新行超过 limit：只回最后 limit 行的全量，客户端不能拼在旧行后面
+                    append = False
+                    break
+                out.append(text)
+            out.reverse()
+            return LogSlice(tracker.path, out, vpos, append)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "bots": {name: {"path": str(t.path), "lines": len(t.ring), "offset": t.vpos} for name, t in sorted(self._logs.items())},
+            }
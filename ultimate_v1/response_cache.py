@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+"""看板 JSON 接口的进程内响应缓存。
+
+按「接口路径 + 查询串」缓存序列化好的响应体：
+- 每个接口自己的 TTL，TTL 内直接返回缓存；
+- 过期后在 stale 窗口内先返回旧数据，同时后台线程重建（stale-while-revalidate）；
+- 同一个 key 并发未命中只有一个线程真正去拼数据，其余线程等它的结果（single-flight）；
+- 响应体算一个 ETag，浏览器带 If-None-Match 命中时由 web_app 回 304；
+- {"ok": false} 的失败结果不缓存，下一次请求重新拼；
+- 任何 POST 操作之后 invalidate()，正在重建的旧数据也不会写回缓存。
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from .config import env_bool, env_float
+from .http_compress import etag_for
+
+WEB_CACHE_ENABLED = env_bool("WEB_CACHE_ENABLED", True)
+WEB_CACHE_STALE_SEC = env_float("WEB_CACHE_STALE_SEC", 60.0)
+# 等别的线程拼数据最多等这么久，超时自己拼一份（不写缓存）
+WEB_CACHE_WAIT_SEC = env_float("WEB_CACHE_WAIT_SEC", 30.0)
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """一份序列化好的响应；variants 存压缩后的版本，每份只压一次。"""
+
+    body: bytes
+    etag: str
+    built_at: float
+    variants: dict = field(default_factory=dict, compare=False, repr=False)
+
+
+class _Entry:
+    __slots__ = ("value", "building")
+
+    def __init__(self):
+        self.value: CachedResponse | None = None
+        self.building: threading.Event | None = None
+
+
+def _spawn_daemon(target: Callable[[], None]) -> None:
+    threading.Thread(target=target, name="web-cache-refresh", daemon=True).start()
+
+
+class ResponseCache:
+    """key -> CachedResponse；encode 负责把 payload 变成 bytes。"""
+
+    def __init__(
+        self,
+        encode: Callable[[object], bytes],
+        clock: Callable[[], float] = time.monotonic,
+        spawn: Callable[[Callable[[], None]], None] = _spawn_daemon,
+    ):
+        self._encode = encode
+        self._clock = clock
+        self._spawn = spawn
+        self._lock = threading.Lock()
+        self._entries: dict[str, _Entry] = {}
+        self._generation = 0
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "waits": 0, "refreshes": 0, "errors": 0}
+
+    def render(self, payload) -> CachedResponse:
+        body = self._encode(payload)
+        return CachedResponse(body, etag_for(body), self._clock())
+
+    def get(self, key: str, build: Callable[[], object], ttl: float, stale: float | None = None) -> CachedResponse:
+        """取缓存；需要时调用 build() 重建。build 抛出的异常原样抛给调用方。"""
+        if not WEB_CACHE_ENABLED or ttl <= 0:
+            return self.render(build())
+        stale = WEB_CACHE_STALE_SEC if stale is None else stale
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            value = entry.value
+            age = self._clock() - value.built_at if value is not None else None
+            if value is not None and age < ttl:
+                self._stats["hits"] += 1
+                return value
+            if value is not None and age < ttl + stale:
+                self._stats["stale_hits"] += 1
+                if entry.building is None:
+                    done = entry.building = threading.Event()
+                    gen = self._generation
+                    self._spawn(lambda: self._refresh(key, entry, build, done, gen))
+                return value
+            waiter = entry.building
+            if waiter is None:
+                done = entry.building = threading.Event()
+                gen = self._generation
+                self._stats["misses"] += 1
+            else:
+                self._stats["waits"] += 1
+
+        if waiter is not None:
+            waiter.wait(WEB_CACHE_WAIT_SEC)
+            with self._lock:
+                fresh = entry.value
+            # 拼数据的线程失败或超时：自己拼一份直接返回
+            return fresh if fresh is not None and fresh is not value else self.render(build())
+
+        return self._build(key, entry, build, done, gen)
+
+    def _build(self, key: str, entry: _Entry, build, done: threading.Event, gen: int) -> CachedResponse:
+        try:
+            payload = build()
+            resp = self.render(payload)
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+                if entry.building is done:
+                    entry.building = None
+            done.set()
+            raise
+        cacheable = not (isinstance(payload, dict) and payload.get("ok") is False)
+        with self._lock:
+            if cacheable and gen == self._generation and self._entries.get(key) is entry:
+                entry.value = resp
+            if entry.building is done:
+                entry.building = None
+        done.set()
+        return resp
+
+    def _refresh(self, key: str, entry: _Entry, build, done: threading.Event, gen: int) -> None:
+        with self._lock:
+            self._stats["refreshes"] += 1
+        try:
+            self._build(key, entry, build, done, gen)
+        except Exception as exc:
+            # 后台刷新失败保留旧数据，等 stale 窗口过完再由前台请求报错
+            print(f"[WEB CACHE] refresh {key} failed: {exc}", flush=True)
+
+    def invalidate(self, prefix: str = "") -> None:
+        """清掉 prefix 开头的缓存（默认全部）；进行中的重建结果作废。"""
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = self._clock()
+            return {
+                **self._stats,
+                "enabled": WEB_CACHE_ENABLED,
+                "entries": {
+                    key: round(now - e.value.built_at, 1)
+                    for key, e in sorted(self._entries.items())
+                    if e.value is not None
+                },
+            }
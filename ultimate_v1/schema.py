@@ -2,6 +2,8 @@ from __future__ import annotations
 
 """数据库自动迁移：补齐旧表字段，并创建持仓展示表。"""
 
+from app import schema_registry
+
 from .config import settings
 from .db import db_conn
 
@@ -416,8 +418,9 @@ def ensure_control_state_tables() -> None:
             )
 
 
+@schema_registry.once("ultimate_v1.schema")
 def ensure_schema() -> None:
-    """启动时统一执行所有 V1 表结构检查。"""
+    """启动时统一执行所有 V1 表结构检查；每个进程只成功执行一次（见 app/schema_registry.py）。"""
     ensure_stock_operations_columns()
     if settings().enable_position_holdings:
         ensure_position_holdings_table()
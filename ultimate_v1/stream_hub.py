@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+"""看板 Server-Sent Events 推送：一个发布线程算数据，所有浏览器共享。
+
+过去每个浏览器各自定时轮询 /api/*，服务端负载随打开的页面数线性增长。
+现在 /api/stream 的每个连接只是一个订阅队列：
+- 发布线程按各主题自己的间隔调用 builder（返回已序列化的 JSON bytes），
+  内容和上次一样就不发，变了才推给所有订阅者；
+- 新连接先收到每个主题的最新快照，之后只收变化；
+- 没有订阅者时发布线程空等，不碰数据库 / Alpaca；
+- 某个浏览器读得太慢、队列满了就踢掉它，浏览器 EventSource 会自动重连。
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from .config import env_float, env_int
+
+STREAM_TICK_SEC = env_float("STREAM_TICK_SEC", 1.0)
+STREAM_KEEPALIVE_SEC = env_float("STREAM_KEEPALIVE_SEC", 15.0)
+STREAM_QUEUE_SIZE = env_int("STREAM_QUEUE_SIZE", 64)
+STREAM_MAX_CLIENTS = env_int("STREAM_MAX_CLIENTS", 32)
+
+
+@dataclass
+class Topic:
+    """一个推送主题：interval 秒算一次 build()。"""
+
+    name: str
+    interval: float
+    build: Callable[[], bytes]
+    last_body: bytes | None = None
+    last_run: float = 0.0
+
+
+def format_event(name: str, body: bytes, event_id: int) -> bytes:
+    """按 SSE 格式编码一条消息；JSON 里本来就没有换行。"""
+    data = body.replace(b"\n", b"\ndata: ")
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, name.encode("utf-8"), data)
+
+
+class StreamHub:
+    def __init__(self, topics: list[Topic], clock: Callable[[], float] = time.monotonic):
+        self._topics = {t.name: t for t in topics}
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._subscribers: set[queue.Queue] = set()
+        self._seq = 0
+        self._thread: threading.Thread | None = None
+        self._stats = {"published": 0, "unchanged": 0, "errors": 0, "dropped": 0}
+
+    # ---------- 订阅 ----------
+    def subscribe(self) -> queue.Queue | None:
+        """注册一个订阅者，返回它的队列；连接数超上限返回 None。"""
+        q: queue.Queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        with self._lock:
+            if len(self._subscribers) >= STREAM_MAX_CLIENTS:
+                return None
+            for topic in self._topics.values():
+                if topic.last_body is not None:
+                    self._seq += 1
+                    q.put_nowait(format_event(topic.name, topic.last_body, self._seq))
+            self._subscribers.add(q)
+            self._wake.notify_all()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="web-stream", daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def is_subscribed(self, q: queue.Queue) -> bool:
+        with self._lock:
+            return q in self._subscribers
+
+    def poke(self) -> None:
+        """让所有主题在下一拍立刻重算（网页操作之后调用）。"""
+        for topic in self._topics.values():
+            topic.last_run = 0.0
+
+    # ---------- 发布 ----------
+    def publish_once(self) -> list[str]:
+        """跑一遍到期的主题，返回这次真正推送了的主题名。"""
+        now = self._clock()
+        sent = []
+        for topic in self._topics.values():
+            if topic.last_body is not None and now - topic.last_run < topic.interval:
+                continue
+            topic.last_run = now
+            try:
+                body = topic.build()
+            except Exception as exc:
+                self._stats["errors"] += 1
+                print(f"[WEB STREAM] {topic.name} failed: {exc}", flush=True)
+                continue
+            if body == topic.last_body:
+                self._stats["unchanged"] += 1
+                continue
+            self._broadcast(topic, body)
+            sent.append(topic.name)
+        return sent
+
+    def _broadcast(self, topic: Topic, body: bytes) -> None:
+        with self._lock:
+            topic.last_body = body
+            self._seq += 1
+            message = format_event(topic.name, body, self._seq)
+            for q in list(self._subscribers):
+                try:
+                    q.put_nowait(message)
+                except queue.Full:
+                    # 读不动的连接直接断开，浏览器重连后重新拿快照
+                    self._subscribers.discard(q)
+                    self._stats["dropped"] += 1
+            self._stats["published"] += 1
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._subscribers:
+                    self._wake.wait()
+            self.publish_once()
+            time.sleep(STREAM_TICK_SEC)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "clients": len(self._subscribers),
+                "topics": {name: t.interval for name, t in self._topics.items()},
+            }
@@ -9,6 +9,7 @@ import contextlib
 import csv
 import importlib.util
 import io
+import queue
 import socket
 import time
 from datetime import date, datetime, time as dt_time
@@ -17,15 +18,19 @@ from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from urllib.parse import parse_qs, urlparse
 
-from . import alpaca_gateway
+from . import alpaca_gateway, http_compress
 from .bot_supervisor import managed_bot_names, process_status, set_bot_runtime, sync_from_controls
 from .capital_manager import get_capital_allocation, get_strategy_used_capital
-from .config import env_str, settings
-from .db import db_conn, fetch_all
+from .config import env_float, env_str, settings
+from .db import db_conn, fetch_all, pool_stats
 from .d_tactical import d_tactical_payload, option_preview, submit_option_combo
+from .log_index import LogIndex
 from .exposure_manager import latest_exposure_state, latest_rebalance_actions, refresh_exposure_plan
+from app import bot_metrics, rate_limiter, schema_registry
 from app.quick_trade import latest_events as latest_quick_trade_events
 from .rebalance_monthly import generate_rebalance_report
+from .response_cache import ResponseCache
+from .stream_hub import STREAM_KEEPALIVE_SEC, StreamHub, Topic
 from .risk_controller import CAPITAL_MODE_LABELS, get_risk_state
 from .schema import ensure_schema
 from .state_store import bot_controls, bot_heartbeats, capital_state_rows, equity_curve, get_app_setting, latest_risk_state, set_app_setting
@@ -47,8 +52,23 @@ def _json_default(value):
     return str(value)
 
 
+def _encode_json(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
 _QUOTE_REFRESH_TS = 0.0
 
+# 手机轮询频繁、又要打 Alpaca / 多条 SQL 的接口走响应缓存，秒数可用 WEB_CACHE_TTL_<名字> 覆盖
+_RESPONSE_CACHE = ResponseCache(_encode_json)
+CACHED_ENDPOINT_TTLS = {
+    "/api/capital": env_float("WEB_CACHE_TTL_CAPITAL", 15.0),
+    "/api/risk": env_float("WEB_CACHE_TTL_RISK", 15.0),
+    "/api/holdings": env_float("WEB_CACHE_TTL_HOLDINGS", 10.0),
+    "/api/exposure": env_float("WEB_CACHE_TTL_EXPOSURE", 30.0),
+    "/api/equity_curve": env_float("WEB_CACHE_TTL_EQUITY_CURVE", 60.0),
+    "/api/market_categories": env_float("WEB_CACHE_TTL_MARKET_CATEGORIES", 60.0),
+}
+
 
 def _safe_float(value, default: float = 0.0) -> float:
     """把数据库/接口里的数字安全转成 float。"""
@@ -84,6 +104,29 @@ def _auth_token() -> str:
     return hmac.new(_auth_secret().encode("utf-8"), f"dashboard:{password}".encode("utf-8"), hashlib.sha256).hexdigest()
 
 
+def _cached_body(path: str, build) -> bytes:
+    """推送线程和 GET 共用同一份响应缓存，同一份数据只算一次。"""
+    with rate_limiter.lane("low"):
+        return _RESPONSE_CACHE.get(path, build, CACHED_ENDPOINT_TTLS[path]).body
+
+
+def _stream_body(build) -> bytes:
+    with rate_limiter.lane("low"):
+        return _encode_json(build())
+
+
+# /api/stream 的推送主题：名字对应前端 EventSource 的事件名，间隔可用 STREAM_INTERVAL_<名字> 覆盖
+_STREAM_HUB = StreamHub(
+    [
+        Topic("holdings", env_float("STREAM_INTERVAL_HOLDINGS", 10.0), lambda: _cached_body("/api/holdings", _holdings_payload)),
+        Topic("risk", env_float("STREAM_INTERVAL_RISK", 15.0), lambda: _cached_body("/api/risk", _risk_payload)),
+        Topic("state", env_float("STREAM_INTERVAL_STATE", 5.0), lambda: _stream_body(_state_payload)),
+        Topic("trade_phase", env_float("STREAM_INTERVAL_TRADE_PHASE", 5.0), lambda: _stream_body(_trade_phase_payload)),
+        Topic("bot_logs", env_float("STREAM_INTERVAL_BOT_LOGS", 5.0), lambda: _stream_body(lambda: _bot_logs_payload(140))),
+    ]
+)
+
+
 def _allocation_payload() -> dict:
     """组装资金池接口数据。"""
     allocation = get_capital_allocation()
@@ -493,6 +536,17 @@ def _quick_trade_payload() -> dict:
         return {"ok": False, "error": str(exc), "events": []}
 
 
+def _bot_metrics_payload(bot: str, limit: int) -> dict:
+    """拆分机器人最近几轮的分段耗时（bot_round_metrics）。"""
+    try:
+        with db_conn() as conn:
+            rounds = bot_metrics.recent_rounds(conn, bot.strip(), limit)
+        return {"ok": True, "rounds": rounds}
+    except Exception as exc:
+        return {"ok": False, "error": str(exc), "rounds": []}
+
+
+@schema_registry.once("stock_quote_cache")
 def _ensure_stock_quote_cache() -> None:
     """缓存本地日线缺失的观察票价格，主要补 ETF/ADR/OTC 代码。"""
     with db_conn() as conn:
@@ -563,6 +617,14 @@ def _refresh_missing_quotes(symbols: list[str]) -> None:
         return
 
     unresolved: list[str] = []
+    try:
+        from app.strategy_b import get_snapshots_batch
+
+        # 一次批量请求预热缓存（含跨进程共享缓存），下面逐只读取基本都命中
+        get_snapshots_batch(targets)
+    except Exception as exc:
+        print(f"[HOLDINGS QUOTE] alpaca batch snapshot failed: {exc}", flush=True)
+
     with db_conn() as conn:
         with conn.cursor() as cur:
             for symbol in targets:
@@ -919,8 +981,23 @@ def _curve_payload(period: str) -> dict:
     return payload
 
 
-def _trade_records_payload() -> dict:
-    """读取当天买卖机器人记录，限制在面板内滚动展示。"""
+def _parse_since(raw: str) -> datetime | None:
+    """解析列表接口的 since 游标；只接受今天的时间，跨天或格式不对就回全量。"""
+    try:
+        since = datetime.fromisoformat(str(raw or "").strip())
+    except ValueError:
+        return None
+    return since if since.date() == date.today() else None
+
+
+def _trade_records_payload(since: str = "") -> dict:
+    """读取当天买卖机器人记录，限制在面板内滚动展示。
+
+    since 传上次返回的 cursor 时只查这个时间点（含）之后的记录，前端按 key 去重后合并。
+    """
+    since_dt = _parse_since(since)
+    since_sql = "AND {col} >= %s" if since_dt else ""
+    since_args = (since_dt,) if since_dt else None
     rows: list[dict] = []
     try:
         rows.extend(
@@ -940,9 +1017,11 @@ def _trade_records_payload() -> dict:
                 FROM orders
                 WHERE DATE(created_at)=CURDATE()
                   AND UPPER(side) IN ('BUY','SELL')
+                  {since_sql}
                 ORDER BY created_at DESC, order_id DESC
                 LIMIT 200
-                """
+                """.format(since_sql=since_sql.format(col="created_at")),
+                since_args,
             )
         )
     except Exception as exc:
@@ -966,9 +1045,11 @@ def _trade_records_payload() -> dict:
                 FROM stock_operations
                 WHERE DATE(last_order_time)=CURDATE()
                   AND LOWER(last_order_side) IN ('buy','sell')
+                  {since_sql}
                 ORDER BY last_order_time DESC, id DESC
                 LIMIT 200
-                """
+                """.format(since_sql=since_sql.format(col="last_order_time")),
+                since_args,
             )
         )
     except Exception as exc:
@@ -991,9 +1072,11 @@ def _trade_records_payload() -> dict:
                     'bot_lifecycle_events' AS source
                 FROM bot_lifecycle_events
                 WHERE DATE(created_at)=CURDATE()
+                  {since_sql}
                 ORDER BY created_at DESC, id DESC
                 LIMIT 200
-                """
+                """.format(since_sql=since_sql.format(col="created_at")),
+                since_args,
             )
         )
     except Exception as exc:
@@ -1019,7 +1102,9 @@ def _trade_records_payload() -> dict:
         seen.add(k)
         cleaned.append(row)
     cleaned.sort(key=lambda r: str(r.get("event_time") or ""), reverse=True)
-    return {"ok": True, "rows": cleaned[:200]}
+    cleaned = cleaned[:200]
+    cursor = (cleaned[0].get("event_time") if cleaned else None) or since_dt
+    return {"ok": True, "rows": cleaned, "cursor": _json_default(cursor) if cursor else "", "incremental": since_dt is not None}
 
 
 def _candidate_log_dirs() -> list[Path]:
@@ -1045,18 +1130,14 @@ def _candidate_log_dirs() -> list[Path]:
     return out
 
 
-def _tail_text_file(path: Path, lines: int = 120) -> list[str]:
-    try:
-        if not path.exists() or not path.is_file():
-            return []
-        size = path.stat().st_size
-        with path.open("rb") as fh:
-            fh.seek(max(0, size - 120_000))
-            data = fh.read()
-        text = data.decode("utf-8", errors="replace")
-        return text.splitlines()[-max(1, min(lines, 500)):]
-    except Exception as exc:
-        return [f"[log read error] {path}: {exc}"]
+def _parse_log_cursor(raw: str) -> dict[str, int]:
+    """since=b_buy_bot:1234,ac_bot:99 → {"b_buy_bot": 1234, "ac_bot": 99}。"""
+    out: dict[str, int] = {}
+    for part in str(raw or "").split(","):
+        name, _, offset = part.strip().rpartition(":")
+        if name and offset.isdigit():
+            out[name] = int(offset)
+    return out
 
 
 def _bot_log_path(bot_name: str) -> Path | None:
@@ -1074,10 +1155,15 @@ def _bot_log_path(bot_name: str) -> Path | None:
     return None
 
 
-def _bot_log_fallback_lines(bot_name: str) -> list[str]:
+# 日志文件在内存里建索引，/api/bot_logs 和推送都从这里取
+_LOG_INDEX = LogIndex(lambda bot_name: _bot_log_path(bot_name))
+
+
+def _bot_log_fallback_lines(bot_name: str, heartbeat_map: dict | None = None) -> list[str]:
     lines: list[str] = []
     try:
-        heartbeat_map = {row["bot_name"]: row for row in bot_heartbeats()}
+        if heartbeat_map is None:
+            heartbeat_map = {row["bot_name"]: row for row in bot_heartbeats()}
         hb = heartbeat_map.get(bot_name)
         if hb:
             lines.append(
@@ -1107,27 +1193,43 @@ def _bot_log_fallback_lines(bot_name: str) -> list[str]:
     return lines or ["暂无日志文件；机器人启动后会写入独立日志。"]
 
 
-def _bot_logs_payload(lines: int = 120) -> dict:
-    """读取每个机器人最近日志，给日志聚焦页展示。"""
+def _bot_logs_payload(lines: int = 120, since: str = "", level: str = "", keyword: str = "") -> dict:
+    """读取每个机器人最近日志，给日志聚焦页展示。
+
+    since 传上次返回的 cursor（机器人:偏移）时，append=True 的行只包含新增部分，前端接到旧行后面。
+    level / keyword 在服务端过滤（最低级别、不区分大小写的关键字）。
+    """
     bots = sorted(managed_bot_names())
     process_map = {row["bot_name"]: row for row in process_status()}
+    offsets = _parse_log_cursor(since)
+    heartbeat_map = None
     rows = []
+    cursor = []
     for bot_name in bots:
-        path = _bot_log_path(bot_name)
-        log_lines = _tail_text_file(path, lines) if path else []
-        if not log_lines:
-            log_lines = _bot_log_fallback_lines(bot_name)
+        piece = _LOG_INDEX.read(bot_name, offsets.get(bot_name), lines, level, keyword)
+        log_lines = piece.lines
+        if piece.path:
+            cursor.append(f"{bot_name}:{piece.offset}")
+        if not log_lines and not piece.append and not level and not keyword:
+            # 没有日志内容才查库兜底，心跳整批只查一次
+            if heartbeat_map is None:
+                try:
+                    heartbeat_map = {row["bot_name"]: row for row in bot_heartbeats()}
+                except Exception:
+                    heartbeat_map = {}
+            log_lines = _bot_log_fallback_lines(bot_name, heartbeat_map)
         proc = process_map.get(bot_name) or {}
         rows.append(
             {
                 "bot_name": bot_name,
                 "running": bool(proc.get("running")),
                 "pid": proc.get("pid"),
-                "log_path": str(path) if path else "",
+                "log_path": str(piece.path) if piece.path else "",
                 "lines": log_lines,
+                "append": piece.append,
             }
         )
-    return {"ok": True, "rows": rows}
+    return {"ok": True, "rows": rows, "cursor": ",".join(cursor)}
 
 
 def _clear_bot_log_payload(payload: dict) -> dict:
@@ -1239,6 +1341,7 @@ def _trade_phase_payload() -> dict:
     }
 
 
+@schema_registry.once(env_str("PRICE_CATEGORY_TABLE", "stock_price_category_snapshots"))
 def _ensure_price_category_table() -> None:
     """确保行情分类快照表存在。数据由 scripts/refresh_stock_price_categories.py 生成。"""
     table = env_str("PRICE_CATEGORY_TABLE", "stock_price_category_snapshots")
@@ -3414,12 +3517,24 @@ INDEX_HTML = r"""<!doctype html>
       }
       grid.innerHTML = botLogWindowHtml({title: row.bot_name, status, running, meta: path, lines, clearable: true});
     }
+    // 日志按 since 游标（机器人:字节偏移）只拉新增的行，接在已有行后面
+    let botLogCursor = '';
+    function mergeBotLogs(payload) {
+      if (!payload || !payload.ok) return payload;
+      const prev = Object.fromEntries((botLogRows || []).map(r => [r.bot_name, r]));
+      payload.rows = (payload.rows || []).map(r => r.append
+        ? {...r, lines: [...(prev[r.bot_name]?.lines || []), ...(r.lines || [])].slice(-140)}
+        : r);
+      botLogCursor = payload.cursor || '';
+      return payload;
+    }
     async function loadBotLogs() {
       const meta = document.getElementById('botLogsMeta');
       if (meta) meta.textContent = '加载中...';
       try {
-        const payload = await api('/api/bot_logs?lines=140');
-        renderBotLogs(payload);
+        const since = botLogCursor && botLogRows.length ? `&since=${encodeURIComponent(botLogCursor)}` : '';
+        const payload = await api(`/api/bot_logs?lines=140${since}`);
+        renderBotLogs(mergeBotLogs(payload));
       } catch (e) {
         renderBotLogs({rows:[{bot_name:'日志', running:false, log_path:'', lines:[`读取失败：${e.message || e}`]}]});
       }
@@ -3585,7 +3700,7 @@ INDEX_HTML = r"""<!doctype html>
       alert(`${result.message || '订单已提交'}\n订单 ${result.order_id || '--'}\n状态 ${result.status || '--'}`);
       closeManualOrderModal();
       setLowerView('trades');
-      renderTradeRecords(await api('/api/trade_records'));
+      await loadTradeRecords();
       await loadAll();
     }
     function setQuickQuote(last='--', bid='--', ask='--') {
@@ -4009,15 +4124,37 @@ INDEX_HTML = r"""<!doctype html>
           return `<tr><td>${timeText}</td><td><span class="side-pill ${sideClass}">${sideLabel}</span></td><td>${r.strategy_group || '--'}</td><td><b>${r.symbol || '--'}</b></td><td>${Number(r.qty || 0).toFixed(2)}</td><td>${priceText}</td><td>${r.status || '--'}</td><td>${r.note || ''}</td></tr>`;
         }).join('') + `</tbody>`;
     }
+    // 交易记录按 since 游标只拉新增；订单状态会原地更新，所以每分钟还是拉一次全量
+    let tradeRecordsCursor = '';
+    let tradeRecordsFullAt = 0;
+    function tradeRecordKey(r) {
+      return [r.event_time, r.symbol, r.side, r.order_id, r.source].map(v => String(v || '')).join('|');
+    }
+    async function fetchTradeRecords() {
+      const incremental = tradeRecordsCursor && Date.now() - tradeRecordsFullAt < 60000;
+      const payload = await api(incremental ? `/api/trade_records?since=${encodeURIComponent(tradeRecordsCursor)}` : '/api/trade_records');
+      if (!payload || !payload.ok) return payload;
+      if (payload.incremental) {
+        const seen = new Set();
+        payload.rows = [...(payload.rows || []), ...(latestTradeRecords || [])]
+          .filter(r => { const k = tradeRecordKey(r); if (seen.has(k)) return false; seen.add(k); return true; })
+          .sort((a, b) => String(b.event_time || '').localeCompare(String(a.event_time || '')))
+          .slice(0, 200);
+      } else {
+        tradeRecordsFullAt = Date.now();
+      }
+      tradeRecordsCursor = payload.cursor || '';
+      return payload;
+    }
     async function loadTradeRecords() {
-      renderTradeRecords(await api('/api/trade_records'));
+      renderTradeRecords(await fetchTradeRecords());
     }
     async function loadCurve(period=currentPeriod) {
       currentPeriod = period;
       document.querySelectorAll('.tab').forEach(b => b.classList.toggle('active', b.dataset.period === period));
       const [curve, trades] = await Promise.all([
         api(`/api/equity_curve?period=${period}`),
-        api('/api/trade_records')
+        fetchTradeRecords()
       ]);
       latestEquityCurve = curve;
       drawChart(curve);
@@ -4541,8 +4678,27 @@ INDEX_HTML = r"""<!doctype html>
       } else {
         document.getElementById('modeValue').textContent = 'ERROR';
       }
-      const tone = riskTone(risk);
+      renderRisk(risk, state);
+      renderState(state);
+      latestQuickTradeEvents = quickTrade.events || [];
+      renderPhase(phase);
+      if (dTactical.ok) renderDTactical(dTactical);
+      applyHoldings(holdings);
+      renderQuickTrade();
+      renderLowerView();
+      if (lowerView === 'market') await loadMarketCategories(currentCategory);
+      if (lowerView === 'strategy') await loadStrategy2Config();
+      if (document.body.classList.contains('log-focus') && !streamLive) await loadBotLogs();
+      await loadCurve(currentPeriod);
+      lastFullLoad = Date.now();
+      } finally {
+        if (refreshBtn) refreshBtn.classList.remove('loading');
+      }
+    }
+    function renderRisk(risk, state) {
       window.latestRiskPayload = risk;
+      if (state) window.latestStatePayload = state;
+      state = window.latestStatePayload || {};
       const riskSelect = document.getElementById('riskPreferenceSelect');
       if (riskSelect) riskSelect.value = risk.risk_preference || '中性';
       const marketExposure = Number(risk.recommended_exposure || 0);
@@ -4558,25 +4714,35 @@ INDEX_HTML = r"""<!doctype html>
       void marketRisk.offsetWidth;
       marketRisk.classList.add('fresh');
       renderRebalanceAdvice(state.exposure_state, risk);
+    }
+    function renderState(state) {
+      window.latestStatePayload = state;
       window.latestBotProcesses = state.bot_processes || [];
       latestBotHeartbeats = state.bot_heartbeats || [];
       latestBotControls = state.bot_controls || [];
-      latestQuickTradeEvents = quickTrade.events || [];
       renderBots(latestBotHeartbeats, latestBotControls);
-      renderPhase(phase);
-      if (dTactical.ok) renderDTactical(dTactical);
+    }
+    function applyHoldings(holdings) {
       latestHoldings = holdings.rows || [];
       updateManualHeldQty();
       renderHoldings();
-      renderQuickTrade();
-      renderLowerView();
-      if (lowerView === 'market') await loadMarketCategories(currentCategory);
-      if (lowerView === 'strategy') await loadStrategy2Config();
-      if (document.body.classList.contains('log-focus')) await loadBotLogs();
-      await loadCurve(currentPeriod);
-      } finally {
-        if (refreshBtn) refreshBtn.classList.remove('loading');
-      }
+    }
+    // 服务端推送：持仓 / 风控 / 机器人状态 / 交易阶段 / 日志变了才推；连上后轮询降到 2 分钟一次全量
+    let streamLive = false;
+    let lastFullLoad = 0;
+    function startStream() {
+      if (!window.EventSource) return;
+      const es = new EventSource('/api/stream');
+      const on = (name, fn) => es.addEventListener(name, e => {
+        try { fn(JSON.parse(e.data)); } catch (ex) { console.warn('stream', name, ex); }
+      });
+      es.onopen = () => { streamLive = true; };
+      es.onerror = () => { streamLive = false; };
+      on('holdings', applyHoldings);
+      on('risk', risk => renderRisk(risk));
+      on('state', state => { renderState(state); if (window.latestRiskPayload) renderRisk(window.latestRiskPayload, state); });
+      on('trade_phase', renderPhase);
+      on('bot_logs', payload => { if (document.body.classList.contains('log-focus')) renderBotLogs(mergeBotLogs(payload)); });
     }
     document.querySelectorAll('.tab').forEach(b => b.addEventListener('click', () => loadCurve(b.dataset.period)));
     document.querySelectorAll('.holding-tab').forEach(b => b.addEventListener('click', () => {
@@ -4660,7 +4826,8 @@ INDEX_HTML = r"""<!doctype html>
       if (status) status.textContent = '未保存';
     });
     loadAll();
-    setInterval(loadAll, 30000);
+    startStream();
+    setInterval(() => { if (!streamLive || Date.now() - lastFullLoad > 120000) loadAll(); }, 30000);
   </script>
 </body>
 </html>"""
@@ -4730,33 +4897,123 @@ LOGIN_HTML = r"""<!doctype html>
 </html>"""
 
 
+# 页面启动时编码、压缩一次，之后每个请求直接发现成的 bytes
+_INDEX_PAGE = http_compress.StaticBody(INDEX_HTML.encode("utf-8"), "text/html; charset=utf-8")
+_LOGIN_PAGE = http_compress.StaticBody(LOGIN_HTML.encode("utf-8"), "text/html; charset=utf-8")
+_ASSET_CACHE: dict[str, http_compress.StaticBody] = {}
+
+
 class Handler(BaseHTTPRequestHandler):
     def _send_json(self, payload: dict | list, status: int = 200, headers: dict[str, str] | None = None) -> None:
-        body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+        self._send_json_body(_encode_json(payload), status, headers)
+
+    def _send_json_body(
+        self,
+        body: bytes,
+        status: int = 200,
+        headers: dict[str, str] | None = None,
+        variants: dict | None = None,
+        etag: str = "",
+    ) -> None:
+        self._send_bytes(body, "application/json; charset=utf-8", status, headers, variants, etag)
+
+    def _send_bytes(
+        self,
+        body: bytes,
+        content_type: str,
+        status: int = 200,
+        headers: dict[str, str] | None = None,
+        variants: dict | None = None,
+        etag: str = "",
+        compressible: bool = True,
+    ) -> None:
+        """按 Accept-Encoding 压缩后发送；variants 用来复用已经压好的版本。"""
+        encoding = http_compress.negotiate(self.headers.get("Accept-Encoding", "")) if compressible else None
+        data, used = http_compress.encoded(body, encoding, variants)
         self.send_response(status)
-        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Type", content_type)
         for key, value in (headers or {}).items():
             self.send_header(key, value)
-        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", http_compress.variant_etag(etag, used))
+        if compressible:
+            self.send_header("Vary", "Accept-Encoding")
+        if used:
+            self.send_header("Content-Encoding", used)
+        self.send_header("Content-Length", str(len(data)))
         self.end_headers()
-        self.wfile.write(body)
+        self.wfile.write(data)
+
+    def _not_modified(self, etag: str, headers: dict[str, str] | None = None) -> bool:
+        """If-None-Match 命中就回 304 并返回 True。"""
+        if not http_compress.etag_matches(self.headers.get("If-None-Match", ""), etag):
+            return False
+        encoding = http_compress.negotiate(self.headers.get("Accept-Encoding", ""))
+        self.send_response(304)
+        self.send_header("ETag", http_compress.variant_etag(etag, encoding))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        return True
+
+    def _send_static(self, page: http_compress.StaticBody, cache_control: str) -> None:
+        headers = {"Cache-Control": cache_control}
+        if self._not_modified(page.etag, headers):
+            return
+        self._send_bytes(page.body, page.content_type, headers=headers, variants=page.variants, etag=page.etag,
+                         compressible=page.compressible)
+
+    def _send_cached(self, parsed, build) -> None:
+        """走响应缓存发送 JSON；浏览器带的 If-None-Match 和 ETag 一致时回 304。"""
+        path = parsed.path
+        query = "&".join(sorted(parsed.query.split("&"))) if parsed.query else ""
+        key = f"{path}?{query}" if query else path
+
+        def build_low_lane():
+            # 后台刷新线程也要走低优先级通道
+            with rate_limiter.lane("low"):
+                return build()
+
+        resp = _RESPONSE_CACHE.get(key, build_low_lane, CACHED_ENDPOINT_TTLS[path])
+        headers = {"Cache-Control": "private, no-cache"}
+        if self._not_modified(resp.etag, headers):
+            return
+        self._send_json_body(resp.body, headers=headers, variants=resp.variants, etag=resp.etag)
+
+    def _send_stream(self) -> None:
+        """SSE 长连接：只从推送队列里取现成的消息写出去，不做任何查询。"""
+        q = _STREAM_HUB.subscribe()
+        if q is None:
+            self._send_json({"ok": False, "error": "too_many_streams"}, 503)
+            return
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("X-Accel-Buffering", "no")
+            self.end_headers()
+            self.wfile.write(b"retry: 3000\n\n")
+            self.wfile.flush()
+            while True:
+                try:
+                    message = q.get(timeout=STREAM_KEEPALIVE_SEC)
+                except queue.Empty:
+                    if not _STREAM_HUB.is_subscribed(q):
+                        return
+                    message = b": ping\n\n"
+                self.wfile.write(message)
+                self.wfile.flush()
+        except OSError:
+            # 浏览器关页面 / 断网
+            pass
+        finally:
+            _STREAM_HUB.unsubscribe(q)
 
     def _send_html(self) -> None:
-        body = INDEX_HTML.encode("utf-8")
-        self.send_response(200)
-        self.send_header("Content-Type", "text/html; charset=utf-8")
-        self.send_header("Content-Length", str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
+        self._send_static(_INDEX_PAGE, "private, no-cache")
 
     def _send_login_html(self) -> None:
-        body = LOGIN_HTML.encode("utf-8")
-        self.send_response(200)
-        self.send_header("Content-Type", "text/html; charset=utf-8")
-        self.send_header("Cache-Control", "no-store")
-        self.send_header("Content-Length", str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
+        self._send_static(_LOGIN_PAGE, "no-store")
 
     def _send_asset(self, path: str) -> None:
         """发送项目内静态资源，目前用于 logo。"""
@@ -4766,14 +5023,13 @@ class Handler(BaseHTTPRequestHandler):
         if not asset_path.exists() or not asset_path.is_file():
             self._send_json({"ok": False, "error": "asset_not_found"}, 404)
             return
-        content_type = "image/png" if asset_path.suffix.lower() == ".png" else "application/octet-stream"
-        body = asset_path.read_bytes()
-        self.send_response(200)
-        self.send_header("Content-Type", content_type)
-        self.send_header("Cache-Control", "public, max-age=3600")
-        self.send_header("Content-Length", str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
+        page = _ASSET_CACHE.get(name)
+        if page is None:
+            is_png = asset_path.suffix.lower() == ".png"
+            content_type = "image/png" if is_png else "application/octet-stream"
+            # png 本身已压缩，再 gzip 没意义
+            page = _ASSET_CACHE[name] = http_compress.StaticBody(asset_path.read_bytes(), content_type, compressible=not is_png)
+        self._send_static(page, "public, max-age=3600")
 
     def log_message(self, fmt: str, *args) -> None:
         print(f"[WEB] {self.address_string()} {fmt % args}", flush=True)
@@ -4822,6 +5078,11 @@ class Handler(BaseHTTPRequestHandler):
         self._send_json({"ok": True}, headers={"Set-Cookie": cookie})
 
     def do_GET(self) -> None:
+        # 看板刷新触发的 Alpaca 请求走低优先级通道，不和交易机器人抢额度
+        with rate_limiter.lane("low"):
+            self._handle_get()
+
+    def _handle_get(self) -> None:
         try:
             parsed = urlparse(self.path)
             path = parsed.path
@@ -4837,11 +5098,11 @@ class Handler(BaseHTTPRequestHandler):
             if path == "/":
                 self._send_html()
             elif path == "/api/capital":
-                self._send_json(_allocation_payload())
+                self._send_cached(parsed, _allocation_payload)
             elif path == "/api/risk":
-                self._send_json(_risk_payload())
+                self._send_cached(parsed, _risk_payload)
             elif path == "/api/holdings":
-                self._send_json(_holdings_payload())
+                self._send_cached(parsed, _holdings_payload)
             elif path == "/api/major_events":
                 self._send_json(_major_events_payload())
             elif path == "/api/quick_trade":
@@ -4861,24 +5122,41 @@ class Handler(BaseHTTPRequestHandler):
             elif path == "/api/state":
                 self._send_json(_state_payload())
             elif path == "/api/exposure":
-                self._send_json(_exposure_payload())
+                self._send_cached(parsed, _exposure_payload)
             elif path == "/api/trade_phase":
                 self._send_json(_trade_phase_payload())
+            elif path == "/api/db_pool":
+                self._send_json({"ok": True, "pools": pool_stats()})
+            elif path == "/api/rate_limits":
+                self._send_json({"ok": True, **rate_limiter.metrics()})
+            elif path == "/api/web_cache":
+                self._send_json({"ok": True, **_RESPONSE_CACHE.stats(), "stream": _STREAM_HUB.stats(), "logs": _LOG_INDEX.stats()})
+            elif path == "/api/stream":
+                self._send_stream()
+            elif path == "/api/bot_metrics":
+                qs = parse_qs(parsed.query)
+                try:
+                    limit = int(qs.get("limit", ["20"])[0])
+                except Exception:
+                    limit = 20
+                self._send_json(_bot_metrics_payload(qs.get("bot", [""])[0], limit))
             elif path == "/api/market_categories":
                 selected = parse_qs(parsed.query).get("category", [""])[0]
-                self._send_json(_market_categories_payload(selected))
+                self._send_cached(parsed, lambda: _market_categories_payload(selected))
             elif path == "/api/equity_curve":
                 period = parse_qs(parsed.query).get("period", ["week"])[0]
-                self._send_json(_curve_payload(period))
+                self._send_cached(parsed, lambda: _curve_payload(period))
             elif path == "/api/trade_records":
-                self._send_json(_trade_records_payload())
+                self._send_json(_trade_records_payload(parse_qs(parsed.query).get("since", [""])[0]))
             elif path == "/api/bot_logs":
                 qs = parse_qs(parsed.query)
                 try:
                     lines = int(qs.get("lines", ["120"])[0])
                 except Exception:
                     lines = 120
-                self._send_json(_bot_logs_payload(lines))
+                self._send_json(
+                    _bot_logs_payload(lines, qs.get("since", [""])[0], qs.get("level", [""])[0], qs.get("q", [""])[0])
+                )
             elif path == "/api/stock_quote":
                 symbol = parse_qs(parsed.query).get("symbol", [""])[0]
                 self._send_json(_stock_quote_payload(symbol))
@@ -4892,6 +5170,14 @@ class Handler(BaseHTTPRequestHandler):
             self._send_json({"ok": False, "error": str(exc)}, 500)
 
     def do_POST(self) -> None:
+        try:
+            self._handle_post()
+        finally:
+            # 任何操作都可能改资金 / 风控 / 持仓，缓存整体作废，推送主题下一拍重算
+            _RESPONSE_CACHE.invalidate()
+            _STREAM_HUB.poke()
+
+    def _handle_post(self) -> None:
         try:
             path = urlparse(self.path).path
             payload = self._read_json()